@@ -0,0 +1,256 @@
+import math
+import threading
+import time
+from flask import request, jsonify
+from deadlines import remaining
+from profiler import annotate_request
+
+# Admission control and load shedding, per worker.
+#
+# Every request except health checks, operator endpoints and event streams is put in a
+# class, highest priority first:
+#   write  POST/PUT/PATCH/DELETE (log writes, profile updates)
+#   read   GET/HEAD
+#   ai     Gemini routes and the bulk import/export (ADMISSION_ROUTE_CLASSES)
+# A worker runs at most ADMISSION_CAPACITY admitted requests at once (its gthread API
+# threads). Each lower class leaves ADMISSION_RESERVED_THREADS of them free for every
+# class above it, so an AI spike can't take the threads log writes need, and a request
+# never jumps ahead of a higher class that is waiting. A request that can't start waits
+# up to its class's ADMISSION_MAX_WAIT_MS (none for ai: an AI call that has to queue is
+# better retried later) and is then shed with a 503 and Retry-After.
+#
+# Waiting holds a gunicorn thread, and gunicorn.conf.py only adds ADMISSION_QUEUE_THREADS
+# of them beyond the capacity. At most one fewer than that may wait (the last is kept to
+# admit or shed the next arrival), and each lower class again leaves
+# ADMISSION_RESERVED_THREADS of those for every class above it; a request that can't
+# start and finds no waiting slot is shed at once. Otherwise waiters would take every
+# thread and a log write would queue, unprioritized, inside gunicorn.
+#
+# Limits adapt to observed latency. Each class compares its recent latency (queue wait
+# plus service time, median of the last ADMISSION_WINDOW requests) with its baseline:
+# the lowest recent median it has seen, which creeps up slowly so a lasting change in
+# the workload becomes the new normal. Within ADMISSION_LATENCY_TOLERANCE of the
+# baseline the class's concurrency limit grows towards its ceiling; above it, the
+# limit shrinks in proportion. A slow-down in a higher class also shrinks the lowest
+# busy class below it, so under overload ai is shed first, then reads, and writes
+# keep their latency.
+#
+# State is per worker, like the rate limiter's memory backend: every worker has its own
+# threads, so each one protects its own.
+
+CLASSES = ('write', 'read', 'ai')  # Highest priority first
+EXEMPT_PREFIXES = ('/api/health', '/api/admin', '/api/events')  # Probes, operators, and streams (capped by events.py)
+BASELINE_DRIFT = 0.02  # Per window, how far a class's baseline latency creeps up towards recent latency
+LIMIT_SMOOTHING = 0.2  # How far one window moves a limit towards its new value
+
+_local = threading.local()
+_controller = None
+
+
+class RequestClass:
+    def __init__(self, name, rank, ceiling, max_wait, adaptive):
+        self.name = name
+        self.rank = rank              # 0 = highest priority
+        self.ceiling = ceiling        # Most requests of this class a worker runs at once
+        self.limit = float(ceiling)   # Current adaptive limit, 1..ceiling
+        self.max_wait = max_wait
+        self.adaptive = adaptive
+        self.inflight = 0
+        self.waiting = 0
+        self.window = []              # Latencies since the limit was last updated
+        self.baseline_latency = None
+        self.recent_latency = None
+        self.queue_wait = 0.0         # EWMA of admission wait, seconds
+        self.admitted = 0
+        self.shed = 0
+
+
+class AdmissionController:
+    def __init__(self, capacity, reserved, max_wait_ms, tolerance=1.5, window=10, queue_threads=8):
+        self.capacity = max(1, capacity)
+        self.reserved = reserved
+        self.wait_slots = max(0, queue_threads - 1)
+        self.tolerance = tolerance
+        self.window = window
+        self.condition = threading.Condition()
+        self.total = 0
+        self.classes = {}
+        for rank, name in enumerate(CLASSES):
+            ceiling = max(1, self.capacity - reserved * rank)
+            self.classes[name] = RequestClass(name, rank, ceiling, max_wait_ms.get(name, 0) / 1000.0, adaptive=rank > 0)
+
+    def _can_start(self, cls):
+        if cls.inflight >= max(1, int(cls.limit)) or self.total >= cls.ceiling:
+            return False
+        return not any(other.waiting for other in self.classes.values() if other.rank < cls.rank)
+
+    def _can_wait(self, cls):
+        waiting = sum(other.waiting for other in self.classes.values())
+        return waiting < self.wait_slots - self.reserved * cls.rank
+
+    def admit(self, name, queued_for=0.0):
+        """Blocks until a request of class `name` may start; returns the seconds it waited, or None to shed it."""
+        cls = self.classes[name]
+        started = time.monotonic()
+        max_wait = cls.max_wait - queued_for
+        budget = remaining()  # Never wait past the request's deadline
+        if budget is not None:
+            max_wait = min(max_wait, budget)
+        with self.condition:
+            if not self._can_start(cls) and not self._can_wait(cls):
+                cls.shed += 1
+                return None
+            cls.waiting += 1
+            try:
+                while not self._can_start(cls):
+                    left = started + max_wait - time.monotonic()
+                    if left <= 0:
+                        cls.shed += 1
+                        return None
+                    self.condition.wait(left)
+                cls.inflight += 1
+                cls.admitted += 1
+                self.total += 1
+            finally:
+                cls.waiting -= 1
+                self.condition.notify_all()  # A class that stopped waiting may unblock lower ones
+            waited = time.monotonic() - started
+            cls.queue_wait += 0.1 * (waited - cls.queue_wait)
+            return waited
+
+    def release(self, name, latency):
+        with self.condition:
+            cls = self.classes[name]
+            cls.inflight -= 1
+            self.total -= 1
+            self._record(cls, latency)
+            self.condition.notify_all()
+
+    def _record(self, cls, latency):
+        cls.window.append(latency)
+        if len(cls.window) < self.window:
+            return
+        window, cls.window = sorted(cls.window), []
+        recent = window[len(window) // 2]
+        cls.recent_latency = recent
+        if cls.baseline_latency is None:
+            cls.baseline_latency = recent
+            return
+        cls.baseline_latency = min(recent, cls.baseline_latency + BASELINE_DRIFT * (recent - cls.baseline_latency))
+        gradient = max(0.5, min(1.0, self.tolerance * cls.baseline_latency / recent)) if recent > 0 else 1.0
+        if cls.adaptive:
+            self._resize(cls, gradient)
+        if gradient < 1.0:
+            # This class is slowing down: take capacity from the lowest class that is using some
+            for lower in sorted(self.classes.values(), key=lambda c: -c.rank):
+                if lower.rank > cls.rank and lower.inflight > 0 and lower.limit > 1:
+                    self._resize(lower, gradient)
+                    break
+
+    def _resize(self, cls, gradient):
+        # Healthy (gradient 1): grow by about sqrt(limit) per window, up to the ceiling.
+        # Congested: shrink towards limit * gradient.
+        target = cls.limit * gradient + (math.sqrt(cls.limit) if gradient >= 1.0 else 0.0)
+        cls.limit = min(cls.ceiling, max(1.0, cls.limit + LIMIT_SMOOTHING * (target - cls.limit)))
+
+    def retry_after(self, name):
+        """Seconds a shed client should wait: about one typical request of its class."""
+        cls = self.classes[name]
+        typical = cls.recent_latency or 1.0
+        return max(1, min(30, int(math.ceil(typical))))
+
+    def stats(self):
+        with self.condition:
+            return {
+                'capacity': self.capacity,
+                'wait_slots': self.wait_slots,
+                'inflight': self.total,
+                'classes': {name: {
+                    'limit': round(cls.limit, 2),
+                    'ceiling': cls.ceiling,
+                    'inflight': cls.inflight,
+                    'waiting': cls.waiting,
+                    'admitted': cls.admitted,
+                    'shed': cls.shed,
+                    'queue_wait_ms': round(cls.queue_wait * 1000, 1),
+                    'recent_latency_ms': round(cls.recent_latency * 1000, 1) if cls.recent_latency is not None else None,
+                    'baseline_latency_ms': round(cls.baseline_latency * 1000, 1) if cls.baseline_latency is not None else None,
+                } for name, cls in self.classes.items()},
+            }
+
+
+def classify(config, method, path):
+    """The request class for a route, or None for routes admission control leaves alone."""
+    if method == 'OPTIONS' or path == '/' or path.startswith(EXEMPT_PREFIXES):
+        return None
+    best, best_length = None, -1
+    for key, name in config.ADMISSION_ROUTE_CLASSES.items():
+        rule_method, _, prefix = key.rpartition(' ')
+        if path.startswith(prefix) and rule_method in ('', method) and len(prefix) > best_length:
+            best, best_length = name, len(prefix)
+    if best is not None:
+        return best
+    return 'read' if method in ('GET', 'HEAD') else 'write'
+
+
+def proxy_queue_seconds():
+    """Time spent queued before this worker, from a proxy's X-Request-Start (seconds, ms or us since the epoch)."""
+    header = request.headers.get('X-Request-Start', '')
+    try:
+        value = float(header[2:] if header.startswith('t=') else header)
+    except ValueError:
+        return 0.0
+    if value > 1e14:
+        value /= 1e6
+    elif value > 1e11:
+        value /= 1e3
+    return min(30.0, max(0.0, time.time() - value))  # Clamped: proxy and worker clocks may disagree
+
+
+def get_admission_controller():
+    return _controller
+
+
+def init_admission(app, config):
+    """Registers the admission hooks. Call after init_deadlines so queue waits count against the deadline."""
+    global _controller
+    if not config.ADMISSION_ENABLED:
+        return None
+    _controller = AdmissionController(
+        capacity=config.ADMISSION_CAPACITY,
+        reserved=config.ADMISSION_RESERVED_THREADS,
+        max_wait_ms=config.ADMISSION_MAX_WAIT_MS,
+        tolerance=config.ADMISSION_LATENCY_TOLERANCE,
+        window=config.ADMISSION_WINDOW,
+        queue_threads=config.ADMISSION_QUEUE_THREADS,
+    )
+
+    @app.before_request
+    def admit_request():
+        _local.admitted = None
+        name = classify(config, request.method, request.path)
+        if name is None:
+            return None
+        waited = _controller.admit(name, proxy_queue_seconds())
+        if waited is None:
+            retry_after = _controller.retry_after(name)
+            annotate_request(shed=name)
+            response = jsonify({'error': 'Server is busy, please retry shortly', 'retry_after_seconds': retry_after})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        _local.admitted = (name, time.monotonic() - waited)
+        if waited >= 0.001:
+            annotate_request(admission_wait_ms=round(waited * 1000, 1))
+        return None
+
+    @app.teardown_request
+    def release_request(exc):
+        admitted = getattr(_local, 'admitted', None)
+        if admitted is None:
+            return
+        _local.admitted = None
+        name, started = admitted
+        _controller.release(name, time.monotonic() - started)
+
+    return _controller
@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask import jsonify
+from db import get_db_client
+
+# Last successful AI result per user and kind (e.g. 'workout_recommendation'), served
+# flagged as stale while Gemini is unavailable. Kept in a small in-process LRU and
+# persisted to the `ai_last_results` table:
+#   user_id uuid, kind text, payload jsonb, generated_at timestamptz, primary key (user_id, kind)
+
+RESULTS_TABLE = 'ai_last_results'
+MAX_CACHED_RESULTS = 2000
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def remember_result(user_id, kind, payload):
+    """Stores a fresh result. Persistence failures are logged, never raised."""
+    generated_at = datetime.now(timezone.utc).isoformat()
+    entry = {'payload': payload, 'generated_at': generated_at}
+    with _lock:
+        _cache[(user_id, kind)] = entry
+        _cache.move_to_end((user_id, kind))
+        while len(_cache) > MAX_CACHED_RESULTS:
+            _cache.popitem(last=False)
+    try:
+        get_db_client().table(RESULTS_TABLE).upsert(
+            {'user_id': user_id, 'kind': kind, 'payload': payload, 'generated_at': generated_at},
+            on_conflict='user_id,kind',
+        ).execute()
+    except Exception as e:
+        print(f"Warning: Failed to persist last AI result ({kind}). User: {user_id}. Error: {e}")
+
+
+def last_result(user_id, kind):
+    """Returns {'payload', 'generated_at'} for the last good result, or None."""
+    with _lock:
+        entry = _cache.get((user_id, kind))
+        if entry:
+            _cache.move_to_end((user_id, kind))
+            return entry
+    try:
+        response = get_db_client().table(RESULTS_TABLE).select('payload, generated_at').eq('user_id', user_id).eq('kind', kind).maybe_single().execute()
+    except Exception as e:
+        print(f"Warning: Failed to load last AI result ({kind}). User: {user_id}. Error: {e}")
+        return None
+    if response is None or not response.data:
+        return None
+    entry = {'payload': response.data['payload'], 'generated_at': response.data['generated_at']}
+    with _lock:
+        _cache[(user_id, kind)] = entry
+    return entry
+
+
+def stale_response_body(entry):
+    """The stored payload, flagged so clients can show it as a cached result."""
+    return {**entry['payload'], 'stale': True, 'generated_at': entry['generated_at']}
+
+
+def stale_or_unavailable(user_id, kind, error_message, error=None):
+    """
+    Response for when Gemini can't be used: the user's last good result flagged as stale,
+    or a 503 with Retry-After if there is nothing to fall back to.
+    """
+    entry = last_result(user_id, kind)
+    if entry:
+        return jsonify(stale_response_body(entry)), 200
+    body = {'error': error_message}
+    if error is not None and getattr(error, 'user_message', None):
+        body['details'] = error.user_message
+    response = jsonify(body)
+    response.status_code = 503
+    retry_after = getattr(error, 'retry_after', None)
+    response.headers['Retry-After'] = str(retry_after or 30)
+    return response
@@ -1,7 +1,13 @@
+import hmac
 from functools import wraps
 from flask import request, jsonify
 from supabase import Client
 from db import get_db_client # Or initialize a client here per request
+from circuit_breaker import CircuitOpenError
+from deadlines import DeadlineExceededError
+from config import Config
+from rate_limit import check_rate_limit
+from profiler import span, annotate_request
 
 # This is a simplified version. Supabase client library handles JWT verification
 # when you set the session or use its methods with a user's token.
@@ -16,6 +22,9 @@ def token_required(f):
                 token = auth_header.split(" ")[1]
             except IndexError:
                 return jsonify({'message': 'Bearer token malformed'}), 401
+        elif request.accept_mimetypes.best == 'text/event-stream':
+            # A browser EventSource can't send headers; accept the token in the query for streams only
+            token = request.args.get('access_token')
 
         if not token:
             return jsonify({'message': 'Token is missing'}), 401
@@ -23,16 +32,48 @@ def token_required(f):
         try:
             # Use the existing service client from db.py to verify the token
             service_client = get_db_client()
-            user_response = service_client.auth.get_user(token)
+            with span('auth', 'get_user'):
+                user_response = service_client.auth.get_user(token)
             current_user = user_response.user
             if not current_user:
                 return jsonify({'message': 'Token is invalid or expired'}), 401
+        except DeadlineExceededError:
+            raise  # Answered with a 504 by deadlines.init_deadlines, not reported as a bad token
+        except CircuitOpenError as e:
+            # Supabase is failing; don't report a valid token as invalid
+            response = jsonify({'message': 'Authentication service temporarily unavailable'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
         except Exception as e:
             print(f"Token validation error: {e}")
             return jsonify({'message': 'Token is invalid or an error occurred'}), 401
         
+        annotate_request(user_id=current_user.id)
+        limited = check_rate_limit(Config, current_user.id)
+        if limited:
+            retry_after, limit = limited
+            response = jsonify({'message': 'Too many requests, please slow down', 'retry_after_seconds': retry_after})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after)
+            response.headers['X-RateLimit-Limit'] = str(limit)
+            response.headers['X-RateLimit-Remaining'] = '0'
+            return response
+
         # Make user info available to the route
         # Be careful what you pass through; user.id is usually sufficient.
         kwargs['current_user_id'] = current_user.id
         return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+def admin_required(f):
+    """Guards operator endpoints with the shared Config.ADMIN_TOKEN (X-Admin-Token header)."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not Config.ADMIN_TOKEN:
+            return jsonify({'message': 'Admin endpoints are disabled (ADMIN_TOKEN is not set)'}), 404
+        supplied = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), Config.ADMIN_TOKEN.encode('utf-8')):
+            return jsonify({'message': 'Admin token is missing or invalid'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,68 @@
+import re
+import click
+from db import get_db_client, call_rpc, iter_user_rows
+from direct_db import read_rows
+
+# Delta sync for offline-first clients (GET /api/sync), backed by the change log in
+# migration 0006.
+#
+# A client keeps the cursor from its last sync and sends it back as ?since=. The answer
+# holds only the rows inserted or updated since then (their current state) and the ids
+# deleted since then, for profiles and the log tables, plus the next cursor. Without a
+# cursor, or with one older than CHANGE_LOG_RETENTION_DAYS, the answer is every row with
+# "reset": true, and the client replaces its cache.
+#
+# Until migration 0006 is deployed every sync is such a full snapshot with no cursor,
+# which is what clients fetched before /sync existed.
+
+SYNC_TABLES = ['profiles', 'workout_logs', 'exercise_details', 'nutrition_logs', 'weight_tracker', 'water_intake_logs']
+CURSOR_PATTERN = re.compile(r'^\d{1,20}$')  # An xid8, as text
+
+
+def full_snapshot(user_id):
+    """Every synced row for the user, in the shape sync_changes() returns for a reset."""
+    tables = {}
+    for table in SYNC_TABLES:
+        if table == 'profiles':
+            response = get_db_client().table('profiles').select('*').eq('user_id', user_id).execute()
+            if response is None or not hasattr(response, 'data'):
+                raise Exception('Malformed database response while reading profile')
+            rows = response.data or []
+        else:
+            rows = list(iter_user_rows(table, user_id))
+        tables[table] = {'upserts': rows, 'deletes': []}
+    return {'cursor': None, 'reset': True, 'tables': tables}
+
+
+def get_changes(user_id, cursor=None):
+    """
+    {'cursor', 'reset', 'tables': {table: {'upserts': [rows], 'deletes': [ids]}}} for
+    everything that changed since `cursor`, in one round trip once migration 0006 is deployed.
+    """
+    rows = read_rows('sync_changes', user_id, cursor)
+    if rows:
+        return rows[0]['changes']
+    changes = call_rpc('sync_changes', {'p_user_id': user_id, 'p_since': cursor})
+    if changes is not None:
+        return changes
+    return full_snapshot(user_id)
+
+
+def prune_change_log(days):
+    """Deletes change log entries older than `days`; returns how many, or None before migration 0006."""
+    return call_rpc('prune_change_log', {'p_older_than': f"{int(days)} days"})
+
+
+def register_commands(app):
+    """Adds the `flask prune-change-log` maintenance command."""
+
+    @app.cli.command('prune-change-log')
+    @click.option('--days', type=int, default=None, help='Keep this many days of changes (default: CHANGE_LOG_RETENTION_DAYS).')
+    def prune_change_log_command(days):
+        """Delete old change log entries; clients with older cursors get a full resync."""
+        days = app.config['CHANGE_LOG_RETENTION_DAYS'] if days is None else days
+        removed = prune_change_log(days)
+        if removed is None:
+            click.echo("The change log isn't deployed (run `flask migrate`).")
+        else:
+            click.echo(f"Removed {removed} change log entries older than {days} days.")
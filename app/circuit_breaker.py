@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import deque
+
+# Per-dependency circuit breakers.
+#
+# A breaker watches the last `window_size` calls to one upstream. Once at least
+# `min_calls` have been seen, it opens when the failure rate or the slow-call rate
+# (calls slower than `slow_call_seconds`) crosses its threshold. While open, calls
+# fail immediately with CircuitOpenError instead of tying up a worker. After
+# `open_seconds` it lets `half_open_max_calls` probe calls through: if they all
+# succeed it closes again, any failure re-opens it.
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is temporarily unavailable (circuit open)")
+        self.name = name
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_rate_threshold=0.5, slow_call_seconds=10.0, slow_rate_threshold=0.8,
+                 window_size=20, min_calls=5, open_seconds=30.0, half_open_max_calls=2):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.half_open_in_flight = 0
+        self.half_open_successes = 0
+        self.outcomes = deque(maxlen=window_size)  # (failed, slow)
+        self.latencies = deque(maxlen=200)         # seconds, successful calls only
+
+    def _transition(self, state):
+        if state != self.state:
+            print(f"INFO [circuit_breaker]: {self.name} {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state in (OPEN, HALF_OPEN):
+            self.half_open_in_flight = 0
+            self.half_open_successes = 0
+        if state == CLOSED:
+            self.outcomes.clear()
+
+    def allow_request(self):
+        """Raises CircuitOpenError if the call must not go ahead; otherwise reserves a slot."""
+        with self.lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(self.name, remaining)
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.half_open_in_flight >= self.half_open_max_calls:
+                    raise CircuitOpenError(self.name, 1)
+                self.half_open_in_flight += 1
+
+    def is_open(self):
+        """True while calls would be rejected (without reserving a half-open probe slot)."""
+        with self.lock:
+            if self.state == OPEN:
+                return self.opened_at + self.open_seconds > time.monotonic()
+            return self.state == HALF_OPEN and self.half_open_in_flight >= self.half_open_max_calls
+
+    def retry_after(self):
+        with self.lock:
+            return max(1, int(self.opened_at + self.open_seconds - time.monotonic() + 0.999))
+
+    def record_success(self, duration):
+        slow = duration >= self.slow_call_seconds
+        with self.lock:
+            self.latencies.append(duration)
+            if self.state == HALF_OPEN:
+                self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+                if slow:
+                    self._transition(OPEN)
+                    return
+                self.half_open_successes += 1
+                if self.half_open_successes >= self.half_open_max_calls:
+                    self._transition(CLOSED)
+                return
+            self.outcomes.append((False, slow))
+            self._evaluate()
+
+    def record_failure(self, duration=0.0):
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self._transition(OPEN)
+                return
+            self.outcomes.append((True, duration >= self.slow_call_seconds))
+            self._evaluate()
+
+    def record_timeout(self, duration, budget):
+        """
+        Records a call the caller's deadline cut off after `duration`. It counts as a
+        failure only if its `budget` covered the usual (p95) latency; with less than
+        that the dependency never had a fair chance, so the call is just released.
+        """
+        p95 = self.latency_percentile(95)
+        if budget > 0 and (p95 is None or budget >= p95):
+            self.record_failure(duration)
+            return
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+
+    def _evaluate(self):
+        if self.state != CLOSED or len(self.outcomes) < self.min_calls:
+            return
+        total = len(self.outcomes)
+        failures = sum(1 for failed, _ in self.outcomes if failed)
+        slow = sum(1 for _, was_slow in self.outcomes if was_slow)
+        if failures / total >= self.failure_rate_threshold or slow / total >= self.slow_rate_threshold:
+            self._transition(OPEN)
+
+    def call(self, fn, *args, **kwargs):
+        """Runs fn through the breaker, recording its outcome and latency."""
+        self.allow_request()
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure(time.monotonic() - started)
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def latency_percentile(self, percentile):
+        """Observed latency (seconds) at the given percentile, or None with too few samples."""
+        with self.lock:
+            samples = sorted(self.latencies)
+        if len(samples) < 10:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def stats(self):
+        with self.lock:
+            total = len(self.outcomes)
+            return {
+                'state': self.state,
+                'calls_in_window': total,
+                'failure_rate': round(sum(1 for failed, _ in self.outcomes if failed) / total, 3) if total else 0.0,
+                'slow_rate': round(sum(1 for _, slow in self.outcomes if slow) / total, 3) if total else 0.0,
+            }
+
+
+_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name, **settings):
+    """Returns the process-wide breaker for `name`, creating it with `settings` on first use."""
+    with _registry_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, **settings)
+        return _breakers[name]
+
+
+def all_breakers():
+    with _registry_lock:
+        return dict(_breakers)
@@ -0,0 +1,269 @@
+import csv
+import multiprocessing
+import os
+import time
+from collections import deque
+from datetime import date, timedelta
+import click
+import numpy as np
+import psycopg2
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional; without it reports are written as CSV only
+    pyarrow = None
+
+# Cross-user cohort analytics: `flask cohort-report`.
+#
+# Profiles are streamed in batches of --chunk-users users. Each batch goes to a worker
+# in a process pool. The worker streams those users' log rows for the window through a
+# server-side cursor, --chunk-rows at a time, into dense user x day count matrices.
+# It then reduces them with numpy to per-week and per-cohort sums, and only those small
+# partials travel back to the parent, which adds them up. Memory per worker is bounded
+# by chunk_users x window days, whatever the table sizes. Batches don't depend on each
+# other, so throughput scales with the number of workers until the database is the
+# bottleneck.
+#
+# The window is --weeks complete ISO weeks (Monday to Sunday) ending before the current
+# week. Cohorts are profile columns (COHORT_DIMENSIONS); users without a value fall in
+# 'unknown'. Reads go straight to Postgres (DATABASE_URL), like `flask migrate`.
+
+LOG_TABLES = {
+    # source: (table, summed column or None)
+    'workout': ('workout_logs', 'duration_minutes'),
+    'nutrition': ('nutrition_logs', None),
+    'water': ('water_intake_logs', None),
+    'weight': ('weight_tracker', None),
+}
+COHORT_DIMENSIONS = ('fitness_level', 'primary_goal', 'activity_level', 'gender', 'subscription_tier')
+DEFAULT_DIMENSIONS = ('fitness_level', 'primary_goal')
+DEFAULT_WORKOUT_GOAL = 5
+
+# Per-user sums folded into each cohort, in this order
+COHORT_SUMS = ('users', 'active_users', 'active_user_weeks', 'workouts', 'workout_minutes',
+               'goal_weeks', 'nutrition_days', 'water_days', 'weight_days')
+
+_worker_connection = None
+
+
+def report_window(weeks, today=None):
+    """(first Monday, last Sunday) of the `weeks` complete weeks before the current one."""
+    today = today or date.today()
+    end = today - timedelta(days=today.weekday() + 1)
+    return end - timedelta(days=weeks * 7 - 1), end
+
+
+def _init_worker(database_url):
+    global _worker_connection
+    _worker_connection = psycopg2.connect(database_url, application_name='fitmind-cohort-report')
+    _worker_connection.set_session(readonly=True)
+
+
+def _stream_counts(connection, table, value_column, user_ids, start, days, chunk_rows):
+    """
+    Per-(user, day) row counts, plus sums of `value_column`, for `user_ids` over the window,
+    as flat arrays indexed user * days + day. Rows arrive chunk_rows at a time.
+    """
+    cells = len(user_ids) * days
+    counts = np.zeros(cells, dtype=np.int32)
+    sums = np.zeros(cells, dtype=np.float64) if value_column else None
+    value_sql = f", coalesce(t.{value_column}, 0)" if value_column else ''
+    with connection.cursor(name=f"cohort_{table}") as cursor:
+        cursor.itersize = chunk_rows
+        # Users come back as their batch position, so each row is plain numbers numpy can take as is
+        cursor.execute(
+            f"select u.ix - 1, t.date - %(start)s::date{value_sql} "
+            f"from unnest(%(users)s::uuid[]) with ordinality as u(id, ix) "
+            f"join public.{table} t on t.user_id = u.id "
+            f"where t.date between %(start)s::date and %(start)s::date + %(last)s::integer",
+            {'users': user_ids, 'start': start, 'last': days - 1},
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            chunk = np.asarray(rows, dtype=np.float64)
+            cell = chunk[:, 0].astype(np.int64) * days + chunk[:, 1].astype(np.int64)
+            counts += np.bincount(cell, minlength=cells).astype(np.int32)
+            if value_column:
+                sums += np.bincount(cell, weights=chunk[:, 2], minlength=cells)
+    counts = counts.reshape(len(user_ids), days)
+    return counts, (sums.reshape(len(user_ids), days) if value_column else None)
+
+
+def summarize_batch(batch):
+    """
+    Worker task: cohort partials for one batch of users.
+    `batch` is (start ISO date, weeks, chunk_rows, user_ids, workout_goals, {dimension: labels}).
+    Returns {'weekly': {source: active users per week}, 'cohorts': {(dimension, label): sums}}.
+    """
+    start, weeks, chunk_rows, user_ids, goals, labels = batch
+    days = weeks * 7
+    logged = {}
+    for source, (table, value_column) in LOG_TABLES.items():
+        counts, sums = _stream_counts(_worker_connection, table, value_column, user_ids, start, days, chunk_rows)
+        logged[source] = counts
+        if source == 'workout':
+            workouts_per_week = counts.reshape(len(user_ids), weeks, 7).sum(axis=2)
+            minutes = sums.sum(axis=1)
+    _worker_connection.rollback()  # End the read transaction so the connection doesn't sit idle in it
+
+    active_days = np.zeros((len(user_ids), days), dtype=bool)
+    for counts in logged.values():
+        active_days |= counts > 0
+    active_weeks = active_days.reshape(len(user_ids), weeks, 7).any(axis=2)
+
+    weekly = {source: (counts.reshape(len(user_ids), weeks, 7).sum(axis=2) > 0).sum(axis=0) for source, counts in logged.items()}
+    weekly['any'] = active_weeks.sum(axis=0)
+
+    per_user = np.column_stack([
+        np.ones(len(user_ids)),
+        active_weeks.any(axis=1),
+        active_weeks.sum(axis=1),
+        workouts_per_week.sum(axis=1),
+        minutes,
+        (workouts_per_week >= np.asarray(goals)[:, None]).sum(axis=1),
+        (logged['nutrition'] > 0).sum(axis=1),
+        (logged['water'] > 0).sum(axis=1),
+        (logged['weight'] > 0).sum(axis=1),
+    ]).astype(np.float64)
+
+    cohorts = {}
+    for dimension, values in labels.items():
+        names, inverse = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+        totals = np.zeros((len(names), per_user.shape[1]))
+        np.add.at(totals, inverse, per_user)
+        for name, row in zip(names, totals):
+            cohorts[(dimension, str(name))] = row
+    return {'weekly': weekly, 'cohorts': cohorts}
+
+
+def _iter_batches(connection, dimensions, chunk_users):
+    """(user_ids, workout_goals, {dimension: labels}) for every profile, chunk_users at a time."""
+    with connection.cursor(name='cohort_profiles') as cursor:
+        cursor.itersize = chunk_users
+        cursor.execute(
+            f"select user_id::text, coalesce(weekly_workout_goal, {DEFAULT_WORKOUT_GOAL})"
+            + ''.join(f", coalesce({dimension}::text, 'unknown')" for dimension in dimensions)
+            + " from public.profiles order by user_id"
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_users)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            yield list(columns[0]), list(columns[1]), {dimension: list(columns[2 + i]) for i, dimension in enumerate(dimensions)}
+
+
+def _merge(totals, partial):
+    for source, counts in partial['weekly'].items():
+        totals['weekly'][source] = totals['weekly'].get(source, 0) + counts
+    for key, sums in partial['cohorts'].items():
+        totals['cohorts'][key] = totals['cohorts'].get(key, 0) + sums
+
+
+def build_cohort_report(database_url, weeks=12, dimensions=DEFAULT_DIMENSIONS, workers=None,
+                        chunk_users=2000, chunk_rows=50000, today=None, echo=print):
+    """
+    Computes the report. Returns (weekly_rows, cohort_rows), each a list of dicts.
+    At most workers x 2 batches are queued at once, so the profile stream can't run
+    ahead of the pool.
+    """
+    unknown = [d for d in dimensions if d not in COHORT_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown cohort dimensions: {', '.join(unknown)} (choose from {', '.join(COHORT_DIMENSIONS)})")
+    workers = workers or os.cpu_count() or 1
+    start, end = report_window(weeks, today)
+    totals = {'weekly': {}, 'cohorts': {}}
+    started = time.monotonic()
+    batches = 0
+
+    # spawn, not fork: forked children would share the parent's libpq socket
+    context = multiprocessing.get_context('spawn')
+    connection = psycopg2.connect(database_url, application_name='fitmind-cohort-report')
+    try:
+        with context.Pool(workers, initializer=_init_worker, initargs=(database_url,)) as pool:
+            pending = deque()
+            for user_ids, goals, labels in _iter_batches(connection, dimensions, chunk_users):
+                pending.append(pool.apply_async(summarize_batch, ((start.isoformat(), weeks, chunk_rows, user_ids, goals, labels),)))
+                batches += 1
+                while len(pending) >= workers * 2:
+                    _merge(totals, pending.popleft().get())
+            while pending:
+                _merge(totals, pending.popleft().get())
+    finally:
+        connection.close()
+    echo(f"Summarized {batches} batch(es) of up to {chunk_users} users with {workers} worker(s) in {time.monotonic() - started:.1f}s")
+
+    weekly_rows = []
+    for week in range(weeks):
+        row = {'week_start': (start + timedelta(days=week * 7)).isoformat()}
+        for source in ('any',) + tuple(LOG_TABLES):
+            counts = totals['weekly'].get(source)
+            row[f"{source}_loggers" if source != 'any' else 'active_loggers'] = int(counts[week]) if counts is not None else 0
+        weekly_rows.append(row)
+
+    cohort_rows = []
+    for (dimension, label), sums in sorted(totals['cohorts'].items()):
+        values = {name: float(value) for name, value in zip(COHORT_SUMS, sums)}
+        user_weeks = values['users'] * weeks
+        cohort_rows.append({
+            'dimension': dimension,
+            'cohort': label,
+            'window_start': start.isoformat(),
+            'window_end': end.isoformat(),
+            'users': int(values['users']),
+            'active_users': int(values['active_users']),
+            'weekly_active_rate': round(values['active_user_weeks'] / user_weeks, 4),
+            'workouts_per_user_week': round(values['workouts'] / user_weeks, 3),
+            'workouts_per_active_user_week': round(values['workouts'] / (values['active_users'] * weeks), 3) if values['active_users'] else 0.0,
+            'workout_minutes_per_user_week': round(values['workout_minutes'] / user_weeks, 1),
+            'workout_goal_adherence': round(values['goal_weeks'] / user_weeks, 4),  # Share of user-weeks meeting weekly_workout_goal
+            'nutrition_days_per_week': round(values['nutrition_days'] / user_weeks, 3),
+            'water_days_per_week': round(values['water_days'] / user_weeks, 3),
+            'weight_days_per_week': round(values['weight_days'] / user_weeks, 3),
+        })
+    return weekly_rows, cohort_rows
+
+
+def write_rows(rows, path_without_extension, output_format):
+    """Writes rows as CSV or Parquet and returns the file path."""
+    if output_format == 'parquet':
+        path = f"{path_without_extension}.parquet"
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), path)
+        return path
+    path = f"{path_without_extension}.csv"
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(rows[0].keys()) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def register_commands(app):
+    """Adds the `flask cohort-report` command."""
+
+    @app.cli.command('cohort-report')
+    @click.option('--weeks', type=click.IntRange(min=1), default=12, help='Complete weeks to cover, ending last Sunday.')
+    @click.option('--by', 'dimensions', multiple=True, type=click.Choice(COHORT_DIMENSIONS),
+                  help='Profile column to group by; repeatable (default: fitness_level and primary_goal).')
+    @click.option('--workers', type=click.IntRange(min=1), default=None, help='Worker processes (default: one per CPU).')
+    @click.option('--chunk-users', type=click.IntRange(min=1), default=2000, help='Users per worker task; bounds worker memory.')
+    @click.option('--chunk-rows', type=click.IntRange(min=1), default=50000, help='Log rows fetched per round trip.')
+    @click.option('--format', 'output_format', type=click.Choice(('csv', 'parquet')), default='csv')
+    @click.option('--output-dir', default='cohort-report', help='Directory for weekly_active and cohorts files.')
+    def cohort_report_command(weeks, dimensions, workers, chunk_users, chunk_rows, output_format, output_dir):
+        """Aggregate all users' logs into weekly-active and per-cohort metrics."""
+        database_url = app.config.get('DATABASE_URL')
+        if not database_url:
+            raise click.ClickException('DATABASE_URL is not set (Supabase: Project Settings > Database > Connection string).')
+        if output_format == 'parquet' and pyarrow is None:
+            raise click.ClickException('Parquet output needs the pyarrow package; use --format csv or install it.')
+        weekly_rows, cohort_rows = build_cohort_report(
+            database_url, weeks=weeks, dimensions=dimensions or DEFAULT_DIMENSIONS, workers=workers,
+            chunk_users=chunk_users, chunk_rows=chunk_rows, echo=click.echo,
+        )
+        os.makedirs(output_dir, exist_ok=True)
+        for name, rows in (('weekly_active', weekly_rows), ('cohorts', cohort_rows)):
+            click.echo(f"Wrote {len(rows)} rows to {write_rows(rows, os.path.join(output_dir, name), output_format)}")
@@ -11,5 +11,151 @@ class Config:
     SUPABASE_KEY = os.environ.get("SUPABASE_KEY") # This should be the SERVICE_ROLE_KEY for admin actions, or ANON_KEY if backend acts as user
     SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") # More secure for backend operations
     GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+    GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash-preview-04-17") # 'standard' tier: workout and meal plans
+    GEMINI_FAST_MODEL = os.environ.get("GEMINI_FAST_MODEL", "gemini-2.0-flash-lite") # 'fast' tier: chat and insights; keep it a non-thinking model
     FLASK_SECRET_KEY = os.environ.get("FLASK_SECRET_KEY", "your_default_secret_key") # Change this!
-    CLIENT_ORIGIN_URL = os.environ.get("CLIENT_ORIGIN_URL", "http://localhost:5500") # Your Netlify URL in prod
\ No newline at end of file
+    CLIENT_ORIGIN_URL = os.environ.get("CLIENT_ORIGIN_URL", "http://localhost:5500") # Your Netlify URL in prod
+
+    # Response compression (gzip, or brotli when the `brotli` package is installed)
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024)) # Bytes; smaller bodies aren't worth compressing
+    COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 4))
+
+    # Bulk history import (/api/import)
+    IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 1000)) # Rows per insert round trip
+    MAX_CONTENT_LENGTH = int(os.environ.get("MAX_UPLOAD_MB", 100)) * 1024 * 1024 # Flask rejects larger request bodies with 413
+
+    # Write-behind buffering for /log/water (off by default)
+    WATER_WRITE_BEHIND = os.environ.get("WATER_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+    WATER_FLUSH_INTERVAL_SECONDS = float(os.environ.get("WATER_FLUSH_INTERVAL_SECONDS", 2))
+    WATER_JOURNAL_DIR = os.environ.get("WATER_JOURNAL_DIR", "/tmp/fitmind-water-journal") # Must be local to the host, shared by its workers
+
+    # Circuit breakers (see circuit_breaker.py)
+    GEMINI_BREAKER_FAILURE_RATE = float(os.environ.get("GEMINI_BREAKER_FAILURE_RATE", 0.5))
+    GEMINI_BREAKER_SLOW_CALL_SECONDS = float(os.environ.get("GEMINI_BREAKER_SLOW_CALL_SECONDS", 20))
+    GEMINI_BREAKER_OPEN_SECONDS = float(os.environ.get("GEMINI_BREAKER_OPEN_SECONDS", 30))
+    SUPABASE_BREAKER_FAILURE_RATE = float(os.environ.get("SUPABASE_BREAKER_FAILURE_RATE", 0.5))
+    SUPABASE_BREAKER_SLOW_CALL_SECONDS = float(os.environ.get("SUPABASE_BREAKER_SLOW_CALL_SECONDS", 3))
+    SUPABASE_BREAKER_OPEN_SECONDS = float(os.environ.get("SUPABASE_BREAKER_OPEN_SECONDS", 10))
+
+    # Recommendation engine selection: 'ai' (Gemini), 'local' (rule-based templates) or 'auto'
+    # (Gemini unless its breaker is open or it is slower than LOCAL_FALLBACK_LATENCY_SECONDS at p90)
+    RECOMMENDER_DEFAULT_ENGINE = os.environ.get("RECOMMENDER_DEFAULT_ENGINE", "auto")
+    RECOMMENDER_TIER_COLUMN = os.environ.get("RECOMMENDER_TIER_COLUMN", "subscription_tier") # profiles column read when a tier mapping is set
+    RECOMMENDER_ENGINE_BY_TIER = dict( # e.g. "free:local,premium:ai"
+        pair.split(":", 1) for pair in os.environ.get("RECOMMENDER_ENGINE_BY_TIER", "").split(",") if ":" in pair
+    )
+    LOCAL_FALLBACK_LATENCY_SECONDS = float(os.environ.get("LOCAL_FALLBACK_LATENCY_SECONDS", 8))
+
+    # Semantic answer cache for standalone, non-personal /chat/context-aware questions
+    SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.68)) # cosine similarity
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 256)) # per page_context/constraints
+    SEMANTIC_CACHE_MAX_NAMESPACES = int(os.environ.get("SEMANTIC_CACHE_MAX_NAMESPACES", 64)) # least recently used evicted
+    SEMANTIC_CACHE_TTL_SECONDS = int(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", 24 * 3600))
+
+    # Bundled food database (food_db.py); build the index with `flask build-food-index`
+    FOOD_DATA_PATH = os.environ.get("FOOD_DATA_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "foods.csv"))
+    FOOD_INDEX_PATH = os.environ.get("FOOD_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "foods.idx"))
+
+    # Per-user rate limiting (rate_limit.py): token buckets charged by route cost
+    RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+    RATE_LIMIT_CAPACITY = float(os.environ.get("RATE_LIMIT_CAPACITY", 120)) # Burst size, in tokens
+    RATE_LIMIT_REFILL_PER_SECOND = float(os.environ.get("RATE_LIMIT_REFILL_PER_SECOND", 1)) # Sustained tokens per second
+    RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory") # 'memory' (per worker) or 'sqlite' (shared by the host's workers)
+    RATE_LIMIT_SQLITE_PATH = os.environ.get("RATE_LIMIT_SQLITE_PATH", "/tmp/fitmind-rate-limit.sqlite3") # Must be local to the host
+    RATE_LIMIT_COSTS = { # Route prefix -> tokens per request; unlisted routes cost 1
+        "/api/recommend": 20,
+        "/api/recommend/plans": 5, # Plan reads, and regenerating one part of a plan
+        "/api/insights": 20,
+        "/api/chat": 10,
+        "/api/import": 30,
+        "/api/export": 15,
+        "/api/dashboard": 5,
+        "/api/sync": 5,
+        "/api/progress": 3,
+        "/api/foods/search": 0.5, # Autocomplete fires per keystroke
+        **{
+            prefix: float(cost) for prefix, cost in
+            (pair.rsplit(":", 1) for pair in os.environ.get("RATE_LIMIT_COSTS", "").split(",") if ":" in pair) # e.g. "/api/chat:5,/api/export:30"
+        },
+    }
+
+    # Worker lifecycle (lifecycle.py, gunicorn.conf.py)
+    WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+    WARMUP_GEMINI = os.environ.get("WARMUP_GEMINI", "true").lower() in ("1", "true", "yes") # One count_tokens call per worker start
+    WARMUP_TIMEOUT_SECONDS = float(os.environ.get("WARMUP_TIMEOUT_SECONDS", 30)) # Ready anyway after this, with failed checks reported
+    DRAIN_TIMEOUT_SECONDS = float(os.environ.get("DRAIN_TIMEOUT_SECONDS", 25)) # Time in-flight AI calls get after SIGTERM
+
+    # Operator endpoints (/api/admin/*) and request profiling (profiler.py)
+    ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN") # Unset disables /api/admin and X-Profile requests
+    PROFILER_SAMPLE_RATE = float(os.environ.get("PROFILER_SAMPLE_RATE", 0)) # Fraction of requests profiled without the header
+    PROFILER_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILER_SAMPLE_INTERVAL_MS", 5))
+    SLOW_REQUEST_THRESHOLD_MS = float(os.environ.get("SLOW_REQUEST_THRESHOLD_MS", 2000)) # 0 disables the slow-request log
+    PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/fitmind-profiles") # Must be local to the host, shared by its workers
+    PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 200))
+
+    # Direct Postgres connection (Supabase: Project Settings > Database), used by `flask migrate`
+    DATABASE_URL = os.environ.get("DATABASE_URL")
+
+    # Direct pooled Postgres reads for hot GET routes (direct_db.py); PostgREST stays the default
+    DIRECT_DB_READS = os.environ.get("DIRECT_DB_READS", "false").lower() in ("1", "true", "yes")
+    DIRECT_DB_URL = os.environ.get("DIRECT_DB_URL", DATABASE_URL) # Session pooler or direct connection
+    DIRECT_DB_POOL_SIZE = int(os.environ.get("DIRECT_DB_POOL_SIZE", 4)) # Per worker; keep workers x size under the database's connection limit
+    DIRECT_DB_ACQUIRE_TIMEOUT_SECONDS = float(os.environ.get("DIRECT_DB_ACQUIRE_TIMEOUT_SECONDS", 0.5)) # Then fall back to PostgREST
+    DIRECT_DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DIRECT_DB_STATEMENT_TIMEOUT_MS", 5000))
+    DIRECT_DB_PREPARE = os.environ.get("DIRECT_DB_PREPARE", "true").lower() in ("1", "true", "yes") # false behind a transaction-mode pooler
+
+    # Request deadlines and hedged upstream calls (deadlines.py)
+    REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", 10)) # Budget for routes not listed below; 0 disables
+    REQUEST_DEADLINES = { # Route prefix -> seconds (longest prefix wins, 0 = no deadline); keep them under GUNICORN_TIMEOUT
+        "/api/recommend": 45,
+        "/api/insights": 30,
+        "/api/chat": 30,
+        "/api/import": 0, # Long uploads; bounded by the per-call timeouts of the client libraries
+        "/api/export": 0, # Streamed after the view returns
+        "/api/sync": 30, # Without a cursor it sends the user's whole history
+        **{
+            prefix: float(seconds) for prefix, seconds in
+            (pair.rsplit(":", 1) for pair in os.environ.get("REQUEST_DEADLINES", "").split(",") if ":" in pair) # e.g. "/api/chat:20,/api/dashboard:5"
+        },
+    }
+    DEADLINE_WRITE_MIN_SECONDS = float(os.environ.get("DEADLINE_WRITE_MIN_SECONDS", 5)) # Least time any call gets once a request has written
+    HEDGE_READS = os.environ.get("HEDGE_READS", "true").lower() in ("1", "true", "yes") # PostgREST and auth GETs
+    HEDGE_GEMINI = os.environ.get("HEDGE_GEMINI", "false").lower() in ("1", "true", "yes") # A backup generation is billed too
+    HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", 95)) # Observed latency after which the backup goes out
+    HEDGE_MIN_DELAY_MS = float(os.environ.get("HEDGE_MIN_DELAY_MS", 20))
+    HEDGE_MAX_RATIO = float(os.environ.get("HEDGE_MAX_RATIO", 0.05)) # At most this fraction of an upstream's calls get a backup; 0 disables
+    HEDGE_MAX_THREADS = int(os.environ.get("HEDGE_MAX_THREADS", 8)) # Per worker; calls run unhedged when all are busy
+
+    # Dashboard push updates over Server-Sent Events (events.py, /api/events)
+    EVENTS_ENABLED = os.environ.get("EVENTS_ENABLED", "true").lower() in ("1", "true", "yes")
+    EVENTS_SOCKET_DIR = os.environ.get("EVENTS_SOCKET_DIR", "/tmp/fitmind-events") # Must be local to the host, shared by its workers
+    EVENTS_MAX_STREAMS = int(os.environ.get("EVENTS_MAX_STREAMS", 64)) # Per worker; gunicorn.conf.py adds a thread for each
+    EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("EVENTS_HEARTBEAT_SECONDS", 20)) # Keep under the proxy's idle timeout
+    EVENTS_STREAM_MAX_SECONDS = float(os.environ.get("EVENTS_STREAM_MAX_SECONDS", 600)) # Then the client reconnects and its token is checked again
+    EVENTS_RETRY_MS = int(os.environ.get("EVENTS_RETRY_MS", 3000)) # EventSource reconnect delay
+
+    # Delta sync for offline clients (change_log.py, /api/sync; needs migration 0006)
+    CHANGE_LOG_RETENTION_DAYS = int(os.environ.get("CHANGE_LOG_RETENTION_DAYS", 90)) # `flask prune-change-log` keeps this much; older cursors get a full resync
+
+    # Admission control and load shedding (admission.py); limits are per worker
+    ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+    ADMISSION_CAPACITY = int(os.environ.get("ADMISSION_CAPACITY", os.environ.get("GUNICORN_THREADS", 4))) # Requests a worker runs at once, SSE streams aside
+    ADMISSION_RESERVED_THREADS = int(os.environ.get("ADMISSION_RESERVED_THREADS", 1)) # Kept free for each higher class: reads leave 1 for writes, ai leaves 2
+    ADMISSION_QUEUE_THREADS = int(os.environ.get("ADMISSION_QUEUE_THREADS", 8)) # Threads gunicorn.conf.py adds for requests waiting to be admitted
+    ADMISSION_MAX_WAIT_MS = { # Longest a request may queue for a slot before it's shed with a 503
+        "write": float(os.environ.get("ADMISSION_MAX_WAIT_WRITE_MS", 2000)),
+        "read": float(os.environ.get("ADMISSION_MAX_WAIT_READ_MS", 500)),
+        "ai": float(os.environ.get("ADMISSION_MAX_WAIT_AI_MS", 0)),
+    }
+    ADMISSION_LATENCY_TOLERANCE = float(os.environ.get("ADMISSION_LATENCY_TOLERANCE", 1.5)) # Recent/baseline latency ratio at which a class's limit starts shrinking
+    ADMISSION_WINDOW = int(os.environ.get("ADMISSION_WINDOW", 10)) # Requests per limit update
+    ADMISSION_ROUTE_CLASSES = { # "[METHOD ]route prefix" -> 'write', 'read' or 'ai' (longest prefix wins); otherwise GET/HEAD are reads and the rest writes
+        "/api/recommend": "ai",
+        "GET /api/recommend/plans": "read", # Stored plans; regenerating one is still ai
+        "/api/insights": "ai",
+        "/api/chat": "ai",
+        "/api/import": "ai", # Long bulk requests share the lowest class with the AI routes
+        "/api/export": "ai",
+    }
@@ -0,0 +1,191 @@
+from datetime import date, timedelta
+import click
+from db import get_db_client, call_rpc, replace_rows
+from direct_db import read_rows, MIN_DATE, MAX_DATE
+
+# Per-user daily rollup, stored in the `daily_summary` table keyed by (user_id, date):
+#   calories, protein_g, carbs_g, fat_g, nutrition_log_count,
+#   water_ml, water_log_count,
+#   workout_count, workout_minutes, calories_burned,
+#   weight_kg (last weigh-in of the day)
+# Count/sum columns default to 0 so a partial upsert creates a valid row.
+#
+# Every log write recomputes the columns its table feeds for the (user, date) it touched,
+# from that day's raw rows. A day only holds a handful of rows, so this stays cheap, and
+# because the columns are rebuilt rather than incremented it is idempotent: backdated
+# entries and retries converge on the right totals. Concurrent writes for the same day do
+# too through the refresh_daily_summary function, which serializes refreshes of a day
+# (migration 0007). The PostgREST fallback reads and upserts in separate requests, so
+# there a refresh that read before another write landed can commit last and leave stale
+# totals until the day's next write or `flask rebuild-daily-summary`.
+
+SUMMARY_TABLE = 'daily_summary'
+
+# Which daily_summary columns each log table feeds, and how to derive them from that day's rows.
+SOURCES = {
+    'nutrition': ('nutrition_logs', 'calories, protein_g, carbs_g, fat_g'),
+    'water': ('water_intake_logs', 'amount_ml'),
+    'workout': ('workout_logs', 'duration_minutes, calories_burned'),
+    'weight': ('weight_tracker', 'weight_kg, created_at'),
+}
+
+EMPTY_ROW = {
+    'calories': 0, 'protein_g': 0, 'carbs_g': 0, 'fat_g': 0, 'nutrition_log_count': 0,
+    'water_ml': 0, 'water_log_count': 0,
+    'workout_count': 0, 'workout_minutes': 0, 'calories_burned': 0,
+    'weight_kg': None,
+}
+
+
+def _sum(rows, key):
+    return sum(row.get(key) or 0 for row in rows)
+
+
+def summarize_rows(source, rows):
+    """Folds one day's rows from a single log table into its daily_summary columns."""
+    if source == 'nutrition':
+        return {
+            'calories': _sum(rows, 'calories'),
+            'protein_g': _sum(rows, 'protein_g'),
+            'carbs_g': _sum(rows, 'carbs_g'),
+            'fat_g': _sum(rows, 'fat_g'),
+            'nutrition_log_count': len(rows),
+        }
+    if source == 'water':
+        return {'water_ml': _sum(rows, 'amount_ml'), 'water_log_count': len(rows)}
+    if source == 'workout':
+        return {
+            'workout_count': len(rows),
+            'workout_minutes': _sum(rows, 'duration_minutes'),
+            'calories_burned': _sum(rows, 'calories_burned'),
+        }
+    if source == 'weight':
+        latest = max(rows, key=lambda r: r.get('created_at') or '') if rows else None
+        return {'weight_kg': latest.get('weight_kg') if latest else None}
+    raise ValueError(f"Unknown daily summary source: {source}")
+
+
+def refresh_daily_summary(user_id, day_str, *sources):
+    """
+    Recomputes the daily_summary columns fed by `sources` for one user and day.
+    Only those columns are upserted, so concurrent writes to different log tables for
+    the same day never overwrite each other's totals.
+    Failures are logged and swallowed so a summary problem never fails the log write itself.
+    """
+    supabase = get_db_client()
+    day_str = str(day_str)[:10]
+    try:
+        # One round trip when the refresh_daily_summary function (migration 0004) is deployed
+        refreshed = call_rpc('refresh_daily_summary', {'p_user_id': user_id, 'p_date': day_str, 'p_sources': list(sources)})
+        if refreshed is not None:
+            return refreshed
+        row = {'user_id': user_id, 'date': day_str}
+        for source in sources:
+            table, columns = SOURCES[source]
+            response = supabase.table(table).select(columns).eq('user_id', user_id).eq('date', day_str).execute()
+            if response is None or not hasattr(response, 'data'):
+                raise Exception(f"Malformed database response while summarizing {table}")
+            row.update(summarize_rows(source, response.data or []))
+
+        supabase.table(SUMMARY_TABLE).upsert(row, on_conflict='user_id,date').execute()
+        return row
+    except Exception as e:
+        print(f"Warning: Failed to refresh daily summary for {day_str}. User: {user_id}. Error: {e}")
+        return None
+
+
+def get_daily_summaries(user_id, start_date=None, end_date=None, columns='*'):
+    """Returns the user's daily_summary rows (oldest first), optionally bounded by ISO dates."""
+    rows = read_rows('daily_summaries', user_id, start_date or MIN_DATE, end_date or MAX_DATE)
+    if rows is not None:
+        if columns != '*':
+            names = [name.strip() for name in columns.split(',')]
+            rows = [{name: row.get(name) for name in names} for row in rows]
+        return rows
+    query = get_db_client().table(SUMMARY_TABLE).select(columns).eq('user_id', user_id)
+    if start_date:
+        query = query.gte('date', start_date)
+    if end_date:
+        query = query.lte('date', end_date)
+    response = query.order('date', desc=False).execute()
+    if response is None or not hasattr(response, 'data'):
+        raise Exception('Malformed database response for daily summary')
+    return response.data or []
+
+
+def workout_streak(days_by_date, today, max_days=30):
+    """Consecutive days with a workout, counting back from `today` ({ISO date: summary row})."""
+    streak_days = 0
+    current_date = today
+    while streak_days <= max_days:
+        day_row = days_by_date.get(current_date.isoformat())
+        if not day_row or (day_row.get('workout_count', 0) or 0) <= 0:
+            break
+        streak_days += 1
+        current_date -= timedelta(days=1)
+    return streak_days
+
+
+def _fetch_all(supabase, table, columns, user_id=None, since=None, page_size=1000):
+    """Pages through a log table in (date, id) order so rebuilds don't load everything at once."""
+    offset = 0
+    while True:
+        query = supabase.table(table).select(columns)
+        if user_id:
+            query = query.eq('user_id', user_id)
+        if since:
+            query = query.gte('date', since)
+        response = query.order('date').order('id').range(offset, offset + page_size - 1).execute()
+        rows = response.data if response and response.data else []
+        yield from rows
+        if len(rows) < page_size:
+            break
+        offset += page_size
+
+
+def rebuild_daily_summaries(user_id=None, since=None):
+    """
+    Rebuilds daily_summary from the raw log tables for one user (or everyone) from `since` onwards.
+    Used to backfill the table and to repair drift. Only the folded per-day totals are kept
+    in memory, never the raw rows. Returns the number of rows written.
+    """
+    supabase = get_db_client()
+    days = {}
+
+    for source, (table, columns) in SOURCES.items():
+        for row in _fetch_all(supabase, table, f"id, user_id, date, {columns}", user_id, since):
+            key = (row['user_id'], str(row['date'])[:10])
+            summary = days.setdefault(key, {'user_id': key[0], 'date': key[1], **EMPTY_ROW})
+            if source == 'weight':
+                # Keep the last weigh-in of the day
+                weighed_at = row.get('created_at') or ''
+                if weighed_at >= summary.get('_weight_at', ''):
+                    summary['weight_kg'] = row.get('weight_kg')
+                    summary['_weight_at'] = weighed_at
+                continue
+            for column, value in summarize_rows(source, [row]).items():
+                summary[column] += value
+
+    summary_rows = []
+    for key in sorted(days):
+        summary = days[key]
+        summary.pop('_weight_at', None)
+        summary_rows.append(summary)
+
+    # Days that no longer have any logs must not keep stale totals around.
+    return replace_rows(SUMMARY_TABLE, summary_rows, ('user_id', 'date'), user_id=user_id, since=since)
+
+
+def register_commands(app):
+    """Adds the `flask rebuild-daily-summary` maintenance command."""
+
+    @app.cli.command('rebuild-daily-summary')
+    @click.option('--user-id', default=None, help='Only rebuild this user (default: all users).')
+    @click.option('--since', default=None, help='Only rebuild days on or after this ISO date.')
+    @click.option('--days', type=int, default=None, help='Only rebuild the last N days.')
+    def rebuild_daily_summary_command(user_id, since, days):
+        """Rebuild the daily_summary rollup from the raw log tables."""
+        if days is not None and not since:
+            since = (date.today() - timedelta(days=days)).isoformat()
+        count = rebuild_daily_summaries(user_id=user_id, since=since)
+        click.echo(f"Rebuilt {count} daily summary rows.")
@@ -0,0 +1,90 @@
+import hashlib
+import time
+from datetime import date
+from functools import wraps
+from flask import request, make_response
+from db import get_db_client
+
+# Per-user data versions, one per table, stored in the `user_data_versions` table:
+#   user_id uuid, table_name text, version bigint, primary key (user_id, table_name)
+# Write endpoints bump the version of the table they touched; read endpoints derive
+# an ETag from the versions they depend on so repeat views can be answered with 304
+# without running the main query.
+
+VERSIONS_TABLE = 'user_data_versions'
+
+
+def bump_data_version(user_id, *table_names):
+    """
+    Marks the given tables as changed for this user.
+    The version is a nanosecond timestamp, so concurrent bumps never need a read-modify-write.
+    Failures are logged and swallowed: a missed bump must never fail the write that triggered it.
+    Returns the new version, which also serves as the id of the events the write publishes.
+    """
+    if not table_names:
+        return None
+    version = time.time_ns()
+    rows = [{'user_id': user_id, 'table_name': name, 'version': version} for name in table_names]
+    try:
+        get_db_client().table(VERSIONS_TABLE).upsert(rows, on_conflict='user_id,table_name').execute()
+    except Exception as e:
+        print(f"Warning: Failed to bump data version for {', '.join(table_names)}. User: {user_id}. Error: {e}")
+    return version
+
+
+def get_data_versions(user_id):
+    """Returns {table_name: version} for every table this user has written to."""
+    response = get_db_client().table(VERSIONS_TABLE).select('table_name, version').eq('user_id', user_id).execute()
+    if response is None or not hasattr(response, 'data') or response.data is None:
+        raise Exception('Malformed database response for data versions')
+    return {row['table_name']: row['version'] for row in response.data}
+
+
+def compute_etag(user_id, table_names, versions, extra=''):
+    """
+    Builds an opaque ETag from the user, the request path/query, the relevant table versions
+    and today's date: windows such as ?days=30 are relative to today, so yesterday's response
+    must not revalidate even if nothing was written since.
+    """
+    parts = [str(user_id), request.path, request.query_string.decode('utf-8', 'replace'), date.today().isoformat()]
+    parts.extend(f"{name}:{versions.get(name, 0)}" for name in table_names)
+    if extra:
+        parts.append(extra)
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def conditional_get(*table_names, extra=None):
+    """
+    Decorator for GET routes guarded by token_required.
+    Answers 304 Not Modified when the client's If-None-Match matches the current versions
+    of `table_names`, otherwise runs the route and attaches the ETag to a successful response.
+    `extra`, if given, is called with the user id and its result is mixed into the ETag
+    (for state that isn't in the database yet, such as buffered writes).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            current_user_id = kwargs.get('current_user_id')
+            try:
+                versions = get_data_versions(current_user_id)
+                etag = compute_etag(current_user_id, table_names, versions, extra(current_user_id) if extra else '')
+            except Exception as e:
+                # Without versions we cannot validate anything, so just serve the full response.
+                print(f"Warning: Could not load data versions, skipping ETag. User: {current_user_id}. Error: {e}")
+                return f(*args, **kwargs)
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            # Responses are per user, so shared caches must not store them and browsers must revalidate.
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Authorization')
+            return response
+        return decorated_function
+    return decorator
+
@@ -1,8 +1,97 @@
+import copy
+import time
+import httpx
 from supabase import create_client, Client
 from config import Config
+from circuit_breaker import get_breaker
+from profiler import record_span
+from deadlines import call_timeout, hedged, expired, exceeded, DeadlineExceededError
+
+# httpx timeout phases, capped individually by the request deadline
+TIMEOUT_PHASES = ('connect', 'read', 'write', 'pool')
+
+supabase_breaker = get_breaker(
+    'supabase',
+    failure_rate_threshold=Config.SUPABASE_BREAKER_FAILURE_RATE,
+    slow_call_seconds=Config.SUPABASE_BREAKER_SLOW_CALL_SECONDS,
+    open_seconds=Config.SUPABASE_BREAKER_OPEN_SECONDS,
+)
+
+
+class BreakerTransport(httpx.BaseTransport):
+    """
+    Wraps the httpx transport used by the Supabase client so every PostgREST and auth
+    request goes through the Supabase circuit breaker. 5xx responses and transport
+    errors count as failures; while the breaker is open requests fail immediately.
+    Each request's timeouts are capped by the request deadline, and reads are
+    hedged (see deadlines.py).
+    """
+
+    def __init__(self, inner, breaker):
+        self.inner = inner
+        self.breaker = breaker
+
+    def _send(self, request, stage, idempotent):
+        timeout = call_timeout(stage, idempotent)
+        if timeout is not None:
+            # A copy per attempt, so a hedged backup gets what is left of the budget when it starts
+            request = copy.copy(request)
+            request.extensions = {**request.extensions, 'timeout': {
+                phase: timeout if limit is None else min(limit, timeout)
+                for phase, limit in request.extensions.get('timeout', dict.fromkeys(TIMEOUT_PHASES)).items()
+            }}
+        started = time.monotonic()
+        response = self.inner.handle_request(request)
+        return response, time.monotonic() - started
+
+    def handle_request(self, request):
+        stage = f"supabase {request.method} {request.url.path}"
+        idempotent = request.method in ('GET', 'HEAD')
+        budget = call_timeout(stage, idempotent)  # Out of time: fail before touching the breaker
+        self.breaker.allow_request()
+        started = time.monotonic()
+        span_started = time.perf_counter()
+        try:
+            response, duration = hedged(
+                Config, 'supabase', lambda: self._send(request, stage, idempotent), self.breaker,
+                enabled=idempotent and Config.HEDGE_READS, discard=lambda result: result[0].close(),
+            )
+        except Exception as e:
+            if expired():
+                self.breaker.record_timeout(time.monotonic() - started, budget or 0.0)
+                if isinstance(e, DeadlineExceededError):
+                    raise
+                raise exceeded(stage) from e
+            self.breaker.record_failure(time.monotonic() - started)
+            raise
+        finally:
+            record_span('supabase', f"{request.method} {request.url.path}", span_started, time.perf_counter() - span_started)
+        if response.status_code >= 500:
+            self.breaker.record_failure(duration)
+        else:
+            self.breaker.record_success(duration)
+        return response
+
+    def close(self):
+        self.inner.close()
+
+
+def _wrap_http_client(http_client):
+    if http_client is not None and not isinstance(getattr(http_client, '_transport', None), BreakerTransport):
+        http_client._transport = BreakerTransport(http_client._transport, supabase_breaker)
+
+
+def install_circuit_breaker(client):
+    """Routes the client's PostgREST and auth HTTP traffic through the Supabase breaker."""
+    try:
+        _wrap_http_client(client.postgrest.session)
+        _wrap_http_client(getattr(client.auth, '_http_client', None))
+    except Exception as e:
+        print(f"Warning: Could not install Supabase circuit breaker: {e}")
 
 try:
     supabase_client: Client = create_client(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_ROLE_KEY) # Use service role for backend
+    install_circuit_breaker(supabase_client)
     # If you only want to operate in user context after they log in via frontend,
     # you might pass the user's JWT from frontend to backend and initialize client per request:
     # supabase_client.auth.set_session(access_token, refresh_token)
@@ -32,6 +121,7 @@ def get_db_client():
                 # Attempt to create and assign to the global variable
                 new_client_instance = create_client(url, key)
                 if new_client_instance:
+                    install_circuit_breaker(new_client_instance)
                     supabase_client = new_client_instance # Assign to the global variable
                     print("INFO [get_db_client]: Supabase client re-initialized successfully.")
                 else:
@@ -51,5 +141,92 @@ def get_db_client():
             "Check application logs for errors regarding Supabase URL/Key, "
             "connectivity, or other initialization issues."
         )
-    
-    return supabase_client
\ No newline at end of file
+
+    # The PostgREST client is recreated lazily after auth events; make sure it stays wrapped.
+    _wrap_http_client(getattr(supabase_client, '_postgrest', None) and supabase_client._postgrest.session)
+    return supabase_client
+
+# Postgres functions from app/migrations that turned out not to be deployed yet
+_missing_rpcs = set()
+MISSING_FUNCTION_CODES = {'PGRST202', '42883'}
+
+
+def call_rpc(name, params):
+    """
+    Calls a Postgres function (app/migrations) through PostgREST and returns its data.
+    Returns None if the function isn't deployed yet; callers then use their query-based
+    path, and the function isn't tried again until the worker restarts.
+    """
+    if name in _missing_rpcs:
+        return None
+    try:
+        return get_db_client().rpc(name, params).execute().data
+    except Exception as e:
+        if getattr(e, 'code', None) in MISSING_FUNCTION_CODES:
+            _missing_rpcs.add(name)
+            print(f"Warning: Postgres function {name} is not deployed (run `flask migrate`), using the query fallback.")
+            return None
+        raise
+
+
+def iter_user_rows(table, user_id, chunk_size=1000):
+    """
+    Yields every row of `table` for the user, fetched in keyset-ordered chunks (id > last seen id).
+    Unlike OFFSET paging, each chunk is an index range scan, and only one chunk is held in memory.
+    """
+    last_id = None
+    while True:
+        query = get_db_client().table(table).select('*').eq('user_id', user_id)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        response = query.order('id', desc=False).limit(chunk_size).execute()
+        if response is None or not hasattr(response, 'data'):
+            raise Exception(f"Malformed database response while reading {table}")
+        rows = response.data or []
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1]['id']
+
+
+def replace_rows(table, rows, key_columns, user_id=None, since=None, chunk_size=500):
+    """
+    Makes `table` (one user's rows, or everyone's; with `since`, only dates on or after it)
+    hold exactly `rows`, keyed by `key_columns` (user_id first, the most selective last).
+    The rows are upserted first and only the keys missing from them are deleted afterwards,
+    so readers never see the table emptied halfway through a rebuild.
+    """
+    supabase = get_db_client()
+    for i in range(0, len(rows), chunk_size):
+        supabase.table(table).upsert(rows[i:i + chunk_size], on_conflict=','.join(key_columns)).execute()
+
+    kept = {tuple(str(row[column]) for column in key_columns) for row in rows}
+    stale = {}  # (leading key values) -> [last key values]
+    offset = 0
+    while True:
+        query = supabase.table(table).select(', '.join(key_columns))
+        if user_id:
+            query = query.eq('user_id', user_id)
+        if since:
+            query = query.gte('date', since)
+        for column in key_columns:
+            query = query.order(column)
+        response = query.range(offset, offset + chunk_size - 1).execute()
+        if response is None or not hasattr(response, 'data'):
+            raise Exception(f"Malformed database response while reading {table}")
+        existing = response.data or []
+        for row in existing:
+            key = tuple(str(row[column]) for column in key_columns)
+            if key not in kept:
+                stale.setdefault(key[:-1], []).append(key[-1])
+        if len(existing) < chunk_size:
+            break
+        offset += chunk_size
+
+    for prefix, values in stale.items():
+        for i in range(0, len(values), chunk_size):
+            query = supabase.table(table).delete()
+            for column, value in zip(key_columns, prefix):
+                query = query.eq(column, value)
+            query.in_(key_columns[-1], values[i:i + chunk_size]).execute()
+    return len(rows)
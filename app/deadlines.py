@@ -0,0 +1,250 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from flask import request, jsonify
+from circuit_breaker import CLOSED
+from profiler import annotate_request
+
+# Per-request deadlines and hedged upstream calls.
+#
+# Each request gets a time budget when it arrives: REQUEST_DEADLINE_SECONDS, or a
+# REQUEST_DEADLINES entry for its route (longest prefix wins, 0 = no deadline).
+# Each upstream call takes its timeout from what is left of that budget:
+#   supabase  db.BreakerTransport, covering every PostgREST call and auth.get_user
+#   postgres  direct_db reads, through the pool acquire timeout and statement_timeout
+#   gemini    generate_content's request timeout
+# A read started after the budget is spent fails at once with DeadlineExceededError,
+# and so does a call that an exhausted budget cut short. The response is then a
+# 504 rather than the route's usual 500. Gemini calls raise GeminiUnavailableError
+# as before, so the AI routes can still fall back to local recommendations.
+#
+# Writes are never refused. Once a request has sent one, every later call gets at
+# least DEADLINE_WRITE_MIN_SECONDS, so the deadline never leaves a log saved with
+# its daily summary or data version not updated.
+#
+# Hedging: an idempotent call still running after the upstream's observed
+# HEDGE_PERCENTILE latency (from its circuit breaker) sends one backup request on a
+# helper thread, and the first successful answer wins. It covers PostgREST and auth
+# GETs, plus Gemini with HEDGE_GEMINI (off by default, since a backup generation is
+# billed). Backups are capped at HEDGE_MAX_RATIO of each upstream's calls, and none
+# are sent while its breaker isn't closed or before it has enough latency samples.
+
+_local = threading.local()
+
+
+class DeadlineExceededError(Exception):
+    """The request's time budget ran out before or during an upstream call."""
+
+    def __init__(self, stage, budget):
+        super().__init__(f"Request deadline of {budget:g}s exceeded ({stage})")
+        self.stage = stage
+        self.budget = budget
+
+
+class RequestDeadline:
+    def __init__(self, budget, write_min_seconds):
+        self.budget = budget
+        self.expires = time.monotonic() + budget
+        self.write_min_seconds = write_min_seconds
+        self.wrote = False
+        self.exceeded = None  # stage that ran out of time, if any
+
+
+def _current():
+    return getattr(_local, 'deadline', None)
+
+
+def remaining():
+    """Seconds left in the current request's budget, or None without a deadline."""
+    deadline = _current()
+    return None if deadline is None else deadline.expires - time.monotonic()
+
+
+def expired():
+    deadline = _current()
+    return deadline is not None and time.monotonic() >= deadline.expires
+
+
+def exceeded(stage):
+    """Marks the current request as out of time and returns the error to raise."""
+    deadline = _current()
+    deadline.exceeded = deadline.exceeded or stage
+    return DeadlineExceededError(stage, deadline.budget)
+
+
+def call_timeout(stage, idempotent=True):
+    """
+    The timeout (seconds) for one upstream call, or None without a deadline.
+    Raises DeadlineExceededError for a read once the budget is spent, unless the
+    request has already written something.
+    """
+    deadline = _current()
+    if deadline is None:
+        return None
+    left = deadline.expires - time.monotonic()
+    if not idempotent:
+        deadline.wrote = True
+    if deadline.wrote:
+        return max(left, deadline.write_min_seconds)
+    if left <= 0:
+        raise exceeded(stage)
+    return left
+
+
+def budget_for(config, path):
+    """The deadline (seconds) for a request path; 0 means none."""
+    for prefix, seconds in sorted(config.REQUEST_DEADLINES.items(), key=lambda item: len(item[0]), reverse=True):
+        if path.startswith(prefix):
+            return float(seconds)
+    return config.REQUEST_DEADLINE_SECONDS
+
+
+# --- hedging -------------------------------------------------------------------
+
+class Hedger:
+    """Runs hedged calls on a small shared thread pool, within a per-upstream backup allowance."""
+
+    def __init__(self, max_threads, max_ratio, percentile, min_delay):
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='hedge')
+        self.slots = threading.BoundedSemaphore(max_threads)
+        self.max_ratio = max_ratio
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.lock = threading.Lock()
+        self.allowance = {}  # upstream name -> backups it may still send (earned per call)
+        self.counts = {}     # upstream name -> {'calls', 'hedged', 'backup_won'}
+
+    def _earn(self, name):
+        with self.lock:
+            self.allowance[name] = min(10.0, self.allowance.get(name, 0.0) + self.max_ratio)
+            counts = self.counts.setdefault(name, {'calls': 0, 'hedged': 0, 'backup_won': 0})
+            counts['calls'] += 1
+
+    def _spend(self, name):
+        with self.lock:
+            if self.allowance.get(name, 0.0) < 1.0:
+                return False
+            self.allowance[name] -= 1.0
+            self.counts[name]['hedged'] += 1
+            return True
+
+    def _submit(self, call, deadline):
+        def run():
+            _local.deadline = deadline  # Same budget as the request that sent it
+            try:
+                return call()
+            finally:
+                _local.deadline = None
+                self.slots.release()
+        return self.executor.submit(run)
+
+    def call(self, name, call, breaker, discard=None):
+        """
+        Returns call()'s result. If the call is still running after the upstream's
+        observed latency percentile, a second call() goes out and the first one to
+        succeed wins. A late winner's result is passed to `discard`.
+        """
+        self._earn(name)
+        delay = breaker.latency_percentile(self.percentile)
+        budget = remaining()
+        if delay is None or breaker.state != CLOSED or (budget is not None and budget <= delay):
+            return call()
+        if not self.slots.acquire(blocking=False):
+            return call()
+        if not self.slots.acquire(blocking=False):
+            self.slots.release()
+            return call()
+        deadline = _current()
+        primary = self._submit(call, deadline)
+        done, _ = wait([primary], timeout=max(delay, self.min_delay))
+        if done or not self._spend(name) or expired():
+            self.slots.release()
+            return primary.result()
+
+        annotate_request(hedged=name)
+        backup = self._submit(call, deadline)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [future for future in done if future.exception() is None]
+            if not succeeded:
+                error = error or next(iter(done)).exception()
+                continue
+            winner = primary if primary in succeeded else backup
+            if winner is backup:
+                with self.lock:
+                    self.counts[name]['backup_won'] += 1
+            if discard is not None:
+                for loser in pending | set(succeeded) - {winner}:
+                    loser.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
+            return winner.result()
+        raise error
+
+    def stats(self):
+        with self.lock:
+            return {name: dict(counts) for name, counts in self.counts.items()}
+
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger(config):
+    """The process-wide hedger; its threads start on first use."""
+    global _hedger
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger(
+                max_threads=config.HEDGE_MAX_THREADS,
+                max_ratio=config.HEDGE_MAX_RATIO,
+                percentile=config.HEDGE_PERCENTILE,
+                min_delay=config.HEDGE_MIN_DELAY_MS / 1000.0,
+            )
+        return _hedger
+
+
+def hedged(config, name, call, breaker, enabled=True, discard=None):
+    """Runs an idempotent upstream call through the hedger, or directly when hedging is off."""
+    if not enabled or config.HEDGE_MAX_RATIO <= 0:
+        return call()
+    return get_hedger(config).call(name, call, breaker, discard)
+
+
+# --- Flask integration ---------------------------------------------------------
+
+def _timeout_response(deadline):
+    response = jsonify({
+        'error': 'Request timed out',
+        'details': f"The server could not finish within {deadline.budget:g}s ({deadline.exceeded}). Please try again.",
+    })
+    response.status_code = 504
+    return response
+
+
+def init_deadlines(app, config):
+    """Starts each request's deadline and turns deadline failures into 504s."""
+
+    @app.before_request
+    def start_deadline():
+        budget = budget_for(config, request.path)
+        _local.deadline = RequestDeadline(budget, config.DEADLINE_WRITE_MIN_SECONDS) if budget > 0 else None
+
+    @app.after_request
+    def report_deadline(response):
+        deadline = _current()
+        if deadline is not None and deadline.exceeded and response.status_code >= 500:
+            # Routes turn any upstream exception into a 500; say what actually happened
+            annotate_request(deadline_exceeded=deadline.exceeded)
+            return _timeout_response(deadline)
+        return response
+
+    @app.errorhandler(DeadlineExceededError)
+    def handle_deadline_exceeded(e):
+        deadline = _current() or RequestDeadline(e.budget, 0)
+        deadline.exceeded = deadline.exceeded or e.stage
+        return _timeout_response(deadline)
+
+    @app.teardown_request
+    def clear_deadline(exc):
+        _local.deadline = None
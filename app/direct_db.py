@@ -0,0 +1,287 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+from config import Config
+from circuit_breaker import get_breaker, CircuitOpenError
+from flask import current_app
+from profiler import record_span
+from deadlines import call_timeout, expired, exceeded
+
+# Optional direct Postgres read path for the hot GET routes (dashboard, progress, log lists).
+#
+# PostgREST stays the default. With DIRECT_DB_READS on, the routes first try
+# read_rows(), which runs one of the fixed READS below on a pooled psycopg2
+# connection. Callers get back the same rows PostgREST would have returned:
+# dates and timestamps as ISO strings, numerics as numbers, embeds as lists.
+# read_rows() returns None whenever the direct path can't answer, and the caller
+# takes its PostgREST path. That happens when the path is off, the pool is
+# exhausted past DIRECT_DB_ACQUIRE_TIMEOUT_SECONDS, the breaker is open, or the
+# query fails.
+#
+# Scoping: there is no ad-hoc SQL. Every statement in READS takes the user id as
+# $1 and filters on it. The connection uses the same privileged role as the
+# service key, so RLS does not apply and the WHERE clause is the only guard.
+# Sessions are read-only.
+#
+# Routes that pass the rows straight through use read_json() instead. It returns the
+# JSON text Postgres renders for the rows, which is the same rendering PostgREST uses,
+# and the route sends that text as the response body. For long lists this skips
+# decoding the rows and encoding them again. Python-side casting costs more CPU than
+# json_agg plus json.loads, and the response encode costs more than either.
+#
+# Reads take their timeouts from the request deadline (deadlines.py): the pool wait
+# and, near the end of the budget, the statement_timeout. A read the deadline cuts
+# off raises DeadlineExceededError instead of falling back to PostgREST.
+#
+# Each statement is PREPAREd once per connection and then run with EXECUTE.
+# Transaction-mode poolers (Supavisor on :6543) don't keep prepared statements
+# between transactions, so set DIRECT_DB_PREPARE=false there, or point
+# DIRECT_DB_URL at the session pooler (:5432).
+
+READS = {
+    # name: (parameter types after the user id, SQL with $1 = user id)
+    'profile_goals': ((), "select weekly_workout_goal, daily_activity_goal from profiles where user_id = $1"),
+    'profile_target_weight': ((), "select target_weight_kg from profiles where user_id = $1"),
+    'dashboard_totals': ((), """
+        select (select count(*) from workout_logs where user_id = $1) as total_workouts,
+               (select weight_kg from weight_tracker where user_id = $1 order by date desc, created_at desc limit 1) as current_weight_kg"""),
+    'daily_summaries': (('date', 'date'), "select * from daily_summary where user_id = $1 and date between $2 and $3 order by date"),
+    'workout_logs': (('date', 'date'), """
+        select w.*, coalesce((select json_agg(e) from exercise_details e where e.workout_log_id = w.id and e.user_id = $1), '[]') as exercise_details
+        from workout_logs w where w.user_id = $1 and w.date between $2 and $3 order by w.date desc, w.id desc"""),
+    'workout_logs_asc': (('date', 'date'), """
+        select w.*, coalesce((select json_agg(e) from exercise_details e where e.workout_log_id = w.id and e.user_id = $1), '[]') as exercise_details
+        from workout_logs w where w.user_id = $1 and w.date between $2 and $3 order by w.date, w.id"""),
+    'nutrition_logs': (('date', 'date'), "select * from nutrition_logs where user_id = $1 and date between $2 and $3 order by date desc, created_at desc"),
+    'nutrition_logs_asc': (('date', 'date'), "select * from nutrition_logs where user_id = $1 and date between $2 and $3 order by date, id"),
+    'weight_logs': (('date', 'date'), "select * from weight_tracker where user_id = $1 and date between $2 and $3 order by date desc, id desc"),
+    'weight_series': (('date', 'date'), "select date, weight_kg from weight_tracker where user_id = $1 and date between $2 and $3 order by date, id"),
+    'water_logs': (('date', 'date'), "select * from water_intake_logs where user_id = $1 and date between $2 and $3 order by date desc, id desc"),
+    'sync_changes': (('text',), "select public.sync_changes($1, $2) as changes"),  # Migration 0006; $2 = cursor or null
+}
+# Open date bounds for the (date, date) ranges above
+MIN_DATE = '-infinity'
+MAX_DATE = 'infinity'
+
+_TZ_OFFSET = re.compile(r'[+-]\d\d$')
+
+
+def _cast_date(value, cursor):
+    return value  # Postgres already sends YYYY-MM-DD, which is what PostgREST returns
+
+
+def _cast_timestamp(value, cursor):
+    # '2024-05-01 18:00:00.123+00' -> '2024-05-01T18:00:00.123+00:00', as PostgREST renders it
+    if value is None:
+        return None
+    value = value.replace(' ', 'T', 1)
+    return value + ':00' if _TZ_OFFSET.search(value) else value
+
+
+def _cast_numeric(value, cursor):
+    if value is None:
+        return None
+    # Integral numerics stay ints, as in PostgREST's JSON; NaN/Infinity go through float()
+    return float(value) if '.' in value or not value[-1].isdigit() else int(value)
+
+
+DATE = psycopg2.extensions.new_type((1082,), 'FITMIND_DATE', _cast_date)
+TIMESTAMP = psycopg2.extensions.new_type((1114, 1184), 'FITMIND_TIMESTAMP', _cast_timestamp)
+NUMERIC = psycopg2.extensions.new_type((1700,), 'FITMIND_NUMERIC', _cast_numeric)
+
+
+class PoolTimeoutError(Exception):
+    """No pooled connection became free within the acquire timeout."""
+
+
+class ConnectionPool:
+    """
+    A bounded pool of read-only connections. Unlike psycopg2.pool it keeps every
+    connection it opened (up to max_size), and makes callers wait up to
+    acquire_timeout for one instead of raising as soon as all are busy.
+    """
+
+    def __init__(self, dsn, max_size, acquire_timeout, statement_timeout_ms, prepare=True):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.statement_timeout_ms = statement_timeout_ms
+        self.prepare = prepare
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.lock = threading.Lock()
+        self.idle = []  # LIFO, so a quiet worker keeps reusing one warm connection
+        self.prepared = {}  # id(connection) -> statement names prepared on it
+
+    def _connect(self):
+        connection = psycopg2.connect(
+            self.dsn,
+            application_name='fitmind-direct-reads',
+            options=f"-c statement_timeout={int(self.statement_timeout_ms)} -c timezone=UTC",
+        )
+        connection.set_session(readonly=True, autocommit=True)
+        for caster in (DATE, TIMESTAMP, NUMERIC):
+            psycopg2.extensions.register_type(caster, connection)
+        return connection
+
+    @contextmanager
+    def connection(self, timeout=None):
+        acquire_timeout = self.acquire_timeout if timeout is None else min(self.acquire_timeout, timeout)
+        if not self.slots.acquire(timeout=acquire_timeout):
+            raise PoolTimeoutError(f"No direct Postgres connection free within {acquire_timeout:.3g}s")
+        connection = None
+        healthy = False
+        try:
+            with self.lock:
+                connection = self.idle.pop() if self.idle else None
+            if connection is None or connection.closed:
+                connection = self._connect()
+            try:
+                yield connection
+            except (psycopg2.DataError, psycopg2.errors.UndefinedFunction):
+                healthy = True  # Rejected input (SQLSTATE class 22) or a missing function; an autocommit connection is unaffected
+                raise
+            healthy = True
+        finally:
+            if connection is not None:
+                if healthy and not connection.closed:
+                    with self.lock:
+                        self.idle.append(connection)
+                else:
+                    self.prepared.pop(id(connection), None)
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            self.slots.release()
+
+    def execute(self, name, params, as_json=False, timeout=None):
+        """
+        Runs READS[name] with `params` (user id first). Returns the rows as dicts, or
+        with as_json the JSON array text Postgres renders for them. A `timeout` (seconds)
+        shorter than the pool's statement timeout caps both the wait for a connection
+        and the statement.
+        """
+        types, sql = READS[name]
+        if as_json:
+            name, sql = f"{name}_json", f"select coalesce(json_agg(t), '[]')::text from ({sql}) t"
+        timeout_ms = None if timeout is None else max(1, int(timeout * 1000))
+        with self.connection(timeout) as connection:
+            with connection.cursor() as cursor:
+                if timeout_ms is not None and timeout_ms < self.statement_timeout_ms:
+                    # Only near the end of a request's budget; RESET restores the session's own timeout
+                    cursor.execute(f"set statement_timeout = {timeout_ms}")
+                    try:
+                        return self._run(cursor, name, types, sql, params, as_json)
+                    finally:
+                        if not connection.closed:
+                            cursor.execute("reset statement_timeout")
+                return self._run(cursor, name, types, sql, params, as_json)
+
+    def _run(self, cursor, name, types, sql, params, as_json):
+        if self.prepare:
+            prepared = self.prepared.setdefault(id(cursor.connection), set())
+            if name not in prepared:
+                cursor.execute(f"prepare {name} ({', '.join(('uuid',) + types)}) as {sql}")
+                prepared.add(name)
+            cursor.execute(f"execute {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            # Same statement, numbered placeholders rewritten for psycopg2
+            cursor.execute(re.sub(r'\$(\d+)', lambda m: f"%(p{m.group(1)})s", sql),
+                           {f"p{i}": value for i, value in enumerate(params, start=1)})
+        if as_json:
+            return cursor.fetchone()[0]
+        columns = [column.name for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# READS whose Postgres function turned out not to be deployed yet (like db._missing_rpcs)
+_missing_reads = set()
+
+
+def get_pool(config):
+    """The process-wide pool, or None when the direct read path is off or not configured."""
+    global _pool
+    if not config.DIRECT_DB_READS or not config.DIRECT_DB_URL:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                config.DIRECT_DB_URL,
+                max_size=config.DIRECT_DB_POOL_SIZE,
+                acquire_timeout=config.DIRECT_DB_ACQUIRE_TIMEOUT_SECONDS,
+                statement_timeout_ms=config.DIRECT_DB_STATEMENT_TIMEOUT_MS,
+                prepare=config.DIRECT_DB_PREPARE,
+            )
+        return _pool
+
+
+def _read(name, user_id, params, as_json):
+    pool = get_pool(Config)
+    if pool is None or name in _missing_reads:
+        return None
+    # Same database as PostgREST, so the same thresholds as the Supabase breaker
+    breaker = get_breaker(
+        'postgres',
+        failure_rate_threshold=Config.SUPABASE_BREAKER_FAILURE_RATE,
+        slow_call_seconds=Config.SUPABASE_BREAKER_SLOW_CALL_SECONDS,
+        open_seconds=Config.SUPABASE_BREAKER_OPEN_SECONDS,
+    )
+    stage = f"postgres {name}"
+    timeout = call_timeout(stage)  # Out of time: fail here rather than after the PostgREST fallback
+    started = time.perf_counter()
+    try:
+        breaker.allow_request()
+    except CircuitOpenError:
+        return None
+    try:
+        result = pool.execute(name, (str(user_id),) + tuple(params), as_json, timeout)
+    except psycopg2.DataError as e:
+        # The caller's input was invalid (e.g. a malformed date); Postgres itself answered fine
+        breaker.record_success(time.perf_counter() - started)
+        print(f"Warning: Direct Postgres read {name} rejected its parameters, using PostgREST. User: {user_id}. Error: {e}")
+        return None
+    except psycopg2.errors.UndefinedFunction as e:
+        # The read needs a migration that hasn't run (SQLSTATE 42883); not a database failure
+        breaker.record_success(time.perf_counter() - started)
+        _missing_reads.add(name)
+        print(f"Warning: Direct Postgres read {name} needs a function that is not deployed (run `flask migrate`), using PostgREST. Error: {e}")
+        return None
+    except Exception as e:
+        if expired():
+            breaker.record_timeout(time.perf_counter() - started, timeout)
+            raise exceeded(stage) from e
+        breaker.record_failure(time.perf_counter() - started)
+        print(f"Warning: Direct Postgres read {name} failed, using PostgREST. User: {user_id}. Error: {e}")
+        return None
+    finally:
+        record_span('postgres', name, started, time.perf_counter() - started)
+    breaker.record_success(time.perf_counter() - started)
+    return result
+
+
+def read_rows(name, user_id, *params):
+    """
+    Runs one of the READS for `user_id` over the direct connection pool.
+    Returns the rows, or None when the caller should use PostgREST instead.
+    """
+    return _read(name, user_id, params, as_json=False)
+
+
+def read_json(name, user_id, *params):
+    """Like read_rows, but returns a ready-to-send JSON response of the rows (or None)."""
+    body = _read(name, user_id, params, as_json=True)
+    if body is None:
+        return None
+    return current_app.response_class(body, mimetype='application/json')
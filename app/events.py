@@ -0,0 +1,282 @@
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import date, timedelta
+from daily_summary import get_daily_summaries, workout_streak
+
+# Dashboard push updates over Server-Sent Events (GET /api/events).
+#
+# When /log/workout, /log/nutrition, /log/weight or /log/water succeed they publish a
+# `dashboard` event saying how the /dashboard/summary numbers moved, e.g.
+#   {"date": "2025-06-02", "inc": {"calories_today": 420, "protein_today": 30, "nutrition_logs_today": 1}}
+# and open streams apply it to the numbers they already have instead of polling the
+# summary and re-running its aggregate queries. Values that don't move by a fixed
+# amount (latest weight, workout streak) come in "set".
+#
+# Event ids are the data version the write bumped (data_versions.py). /dashboard/summary
+# returns the version its numbers include; a client opens /events?since=<version> and
+# ignores events with an id at or below it. When the user has written since then, a
+# stream fell behind, or the client didn't say what it has, the stream sends `resync`
+# and the client reloads the summary once.
+#
+# Fan-out: each worker keeps its own streams' subscriptions in memory. A worker binds a
+# Unix datagram socket in EVENTS_SOCKET_DIR when it opens its first stream, and a
+# publishing worker sends every event to each socket there as well as delivering it to
+# its own streams. Delivery is best-effort: an event a busy or dying worker misses is
+# caught up by `resync` on the client's next reconnect.
+#
+# An idle stream is a parked thread and nothing more. It wakes for its own user's events
+# and a heartbeat comment every EVENTS_HEARTBEAT_SECONDS, and ends after
+# EVENTS_STREAM_MAX_SECONDS so the client reconnects with a freshly checked token. Each
+# worker serves at most EVENTS_MAX_STREAMS streams, on threads gunicorn.conf.py adds for
+# them, so open streams never take a thread the API needs.
+
+DASHBOARD_VERSION_TABLE = 'daily_summary'  # Bumped by every log write the dashboard shows
+MAX_DATAGRAM = 65536
+CLOSE = b'close'  # Sent to a worker's own socket to end its streams (close_streams)
+
+_bus = None
+
+
+class Subscription:
+    """One open stream: the events waiting to be written to it."""
+
+    def __init__(self, user_id, max_pending):
+        self.user_id = user_id
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.ready = threading.Event()
+        self.overflowed = False  # Events were dropped; the client must resync
+        self.closed = False
+
+    def push(self, message):
+        if len(self.pending) >= self.max_pending:
+            self.overflowed = True
+        else:
+            self.pending.append(message)
+        self.ready.set()
+
+    def wait(self, timeout):
+        """Blocks until events arrive, the stream is closed or `timeout` passes; returns the events."""
+        self.ready.wait(timeout)
+        self.ready.clear()
+        events = []
+        while self.pending:
+            events.append(self.pending.popleft())
+        return events
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+
+class EventBus:
+    def __init__(self, socket_dir, max_streams, max_pending=100):
+        self.socket_dir = socket_dir
+        self.max_streams = max_streams
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)  # user_id -> {Subscription}
+        self.stream_count = 0
+        self.closing = False
+        self.socket = None       # This worker's receiving socket, bound with its first stream
+        self.socket_path = None
+        self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sender.setblocking(False)  # A peer that can't keep up loses the event, never stalls the write
+
+    # --- subscriptions ---------------------------------------------------
+
+    def subscribe(self, user_id):
+        """Opens a subscription, or returns None when this worker has no stream to spare."""
+        with self.lock:
+            if self.closing or self.stream_count >= self.max_streams:
+                return None
+            if self.socket_path is None:
+                self._bind()
+            subscription = Subscription(user_id, self.max_pending)
+            self.subscriptions[user_id].add(subscription)
+            self.stream_count += 1
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.user_id)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions[subscription.user_id]
+            self.stream_count -= 1
+
+    def _deliver(self, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(message['user_id'], ()))
+        for subscription in subscriptions:
+            subscription.push(message)
+
+    def close_all(self):
+        with self.lock:
+            self.closing = True
+            subscriptions = [s for user_subscriptions in self.subscriptions.values() for s in user_subscriptions]
+        for subscription in subscriptions:
+            subscription.close()
+
+    def close_streams(self):
+        """
+        Ends every open stream so a draining worker can exit. Safe to call from a signal
+        handler: it only sends a datagram to this worker's own socket, and the receiver
+        thread does the rest.
+        """
+        self.closing = True
+        if self.socket_path:
+            try:
+                self.sender.sendto(CLOSE, self.socket_path)
+            except OSError:
+                pass
+
+    # --- cross-worker fan-out ----------------------------------------------
+
+    def _bind(self):
+        try:
+            os.makedirs(self.socket_dir, exist_ok=True)
+            path = os.path.join(self.socket_dir, f"{os.getpid()}.sock")
+            try:
+                os.unlink(path)  # Left behind by an earlier process with this pid
+            except FileNotFoundError:
+                pass
+            receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            receiver.bind(path)
+        except OSError as e:
+            print(f"Warning: Could not bind event socket in {self.socket_dir}, streams on this worker only get its own events: {e}")
+            self.socket_path = ''
+            return
+        self.socket, self.socket_path = receiver, path
+        threading.Thread(target=self._receive, name='event-bus', daemon=True).start()
+        atexit.register(self._unbind)
+        print(f"INFO [events]: Listening for events from other workers on {path}")
+
+    def _unbind(self):
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+    def _receive(self):
+        while True:
+            try:
+                datagram = self.socket.recv(MAX_DATAGRAM)
+            except OSError:
+                return
+            if datagram == CLOSE:
+                self.close_all()
+                continue
+            try:
+                message = json.loads(datagram)
+            except ValueError:
+                continue
+            self._deliver(message)
+
+    def _peers(self):
+        # Listed on every publish: a few microseconds, and a worker that just bound its
+        # socket gets every event from then on
+        try:
+            names = os.listdir(self.socket_dir)
+        except FileNotFoundError:
+            return []
+        return [path for path in (os.path.join(self.socket_dir, name) for name in names if name.endswith('.sock')) if path != self.socket_path]
+
+    def publish(self, user_id, event, data, event_id):
+        """Delivers an event to the user's streams on this worker and sends it to the other workers."""
+        message = {'user_id': user_id, 'event': event, 'id': event_id, 'data': data}
+        self._deliver(message)
+        datagram = json.dumps(message, separators=(',', ':'), default=str).encode('utf-8')
+        for path in self._peers():
+            try:
+                self.sender.sendto(datagram, path)
+            except ConnectionRefusedError:
+                # Nobody is bound to it: the worker that created it is gone
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except (BlockingIOError, FileNotFoundError):
+                pass  # Peer backlogged or just exited; its streams resync on reconnect
+            except OSError as e:
+                print(f"Warning: Failed to send event to {path}: {e}")
+
+
+def format_event(event, data, event_id=None):
+    """One SSE message."""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+# --- dashboard events --------------------------------------------------------
+
+def _amount(value):
+    try:
+        value = float(value or 0)
+    except (TypeError, ValueError):
+        return 0
+    return int(value) if value.is_integer() else value
+
+
+def dashboard_change(user_id, source, payload):
+    """
+    How one saved log (its inserted payload) moves the /dashboard/summary numbers,
+    as {'date', 'inc', 'set'}, or None if it changes nothing the dashboard shows.
+    """
+    today = date.today()
+    day = date.fromisoformat(str(payload['date'])[:10])
+    inc, changes = {}, {}
+    if source == 'nutrition' and day == today:
+        inc = {'calories_today': _amount(payload.get('calories')), 'protein_today': _amount(payload.get('protein_g')), 'nutrition_logs_today': 1}
+    elif source == 'water' and day == today:
+        inc = {'water_intake_today_ml': _amount(payload.get('amount_ml')), 'water_logs_today': 1}
+    elif source == 'workout':
+        inc['total_workouts'] = 1
+        if day == today:
+            inc['workouts_today_count'] = 1
+        if today - timedelta(days=today.weekday()) <= day <= today:
+            inc['workouts_this_week'] = 1
+            inc['calories_burned_this_week'] = _amount(payload.get('calories_burned'))
+        if timedelta(0) <= today - day <= timedelta(days=31):
+            # A streak isn't a running total; recount it from the rollups the write just refreshed
+            rows = get_daily_summaries(user_id, start_date=(today - timedelta(days=31)).isoformat(), end_date=today.isoformat(), columns='date, workout_count')
+            changes['current_streak'] = workout_streak({str(row['date'])[:10]: row for row in rows}, today)
+    elif source == 'weight' and day >= today:
+        changes['current_weight_kg'] = payload.get('weight_kg')
+    if not inc and not changes:
+        return None
+    return {'date': day.isoformat(), 'inc': inc, 'set': changes}
+
+
+def publish_log(user_id, source, payload, version=None):
+    """Publishes the dashboard event for one saved log. Never raises: the write has already succeeded."""
+    if _bus is None:
+        return
+    try:
+        change = dashboard_change(user_id, source, payload)
+        if change is not None:
+            _bus.publish(user_id, 'dashboard', change, version or time.time_ns())
+    except Exception as e:
+        print(f"Warning: Failed to publish {source} event. User: {user_id}. Error: {e}")
+
+
+def init_events(config):
+    global _bus
+    if not config.EVENTS_ENABLED:
+        return None
+    _bus = EventBus(config.EVENTS_SOCKET_DIR, config.EVENTS_MAX_STREAMS)
+    return _bus
+
+
+def get_event_bus():
+    return _bus
@@ -0,0 +1,255 @@
+from datetime import date, datetime, timedelta, timezone
+import click
+import numpy as np
+from db import get_db_client, replace_rows
+from exercise_recency import exercise_key, iter_workouts_with_exercises
+
+# Per-exercise strength analytics, stored in the `exercise_weekly_stats` table keyed by
+# (user_id, exercise_key, week_start):
+#   exercise_name, sessions, total_sets, total_reps, tonnage_kg (sets x reps x weight),
+#   best_weight_kg, best_e1rm_kg, best_set_weight_kg, best_set_reps, updated_at
+#
+# Each exercise_details row is `sets` sets of `reps` at `weight_kg`. Estimated 1RM uses
+# the Epley formula and only counts sets of 1-12 reps, where it is reasonably accurate.
+# Personal records are the maxima over an exercise's weeks, so they never need their
+# own table.
+#
+# log_workout recomputes the weeks and exercises a new workout touched from that week's
+# raw rows (idempotent, like daily_summary); `flask rebuild-exercise-stats` recomputes
+# everything in one vectorized pass.
+
+STATS_TABLE = 'exercise_weekly_stats'
+E1RM_MAX_REPS = 12
+TREND_WEEKS = 8
+
+
+def week_start(day):
+    """Monday of the ISO week containing `day` (ISO string or date)."""
+    day = date.fromisoformat(str(day)[:10]) if not isinstance(day, date) else day
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def _numbers(rows, key, default):
+    """Column of floats, with `default` for missing or unparseable values."""
+    raw = [row.get(key) for row in rows]
+    try:
+        values = np.array([np.nan if v is None or v == '' else v for v in raw], dtype=np.float64)
+    except (TypeError, ValueError):
+        values = np.empty(len(raw), dtype=np.float64)
+        for i, v in enumerate(raw):
+            try:
+                values[i] = float(v)
+            except (TypeError, ValueError):
+                values[i] = np.nan
+    return np.where(np.isnan(values), default, values)
+
+
+def estimated_1rm(weights, reps):
+    """Epley 1RM per set; NaN where it isn't meaningful (no load, 0 or >12 reps)."""
+    valid = (weights > 0) & (reps >= 1) & (reps <= E1RM_MAX_REPS)
+    e1rm = np.where(reps <= 1, weights, weights * (1.0 + reps / 30.0))
+    return np.where(valid, e1rm, np.nan)
+
+
+def aggregate_exercise_rows(rows):
+    """
+    Folds flat exercise rows ({'user_id', 'workout_log_id', 'date', 'exercise_name', 'sets',
+    'reps', 'weight_kg'}) into exercise_weekly_stats rows, one per (user, exercise, week).
+    """
+    # Names and dates repeat heavily, so normalize each distinct value once
+    names, weeks = {}, {}
+    group_keys = []
+    kept = []
+    for row in rows:
+        name, day = row.get('exercise_name'), str(row.get('date') or '')[:10]
+        if name not in names:
+            names[name] = exercise_key(name)
+        if not names[name] or not day:
+            continue
+        if day not in weeks:
+            weeks[day] = week_start(day)
+        group_keys.append(f"{row['user_id']}|{names[name]}|{weeks[day]}")
+        kept.append(row)
+    rows = kept
+    if not rows:
+        return []
+    group_keys = np.array(group_keys)
+    keys, group = np.unique(group_keys, return_inverse=True)
+    n = len(keys)
+
+    sets = _numbers(rows, 'sets', 1.0)
+    reps = _numbers(rows, 'reps', 0.0)
+    weights = _numbers(rows, 'weight_kg', 0.0)
+    total_reps = sets * reps
+    tonnage = total_reps * weights
+    e1rm = estimated_1rm(weights, reps)
+
+    # Sessions: distinct workouts per group
+    _, workout_codes = np.unique(np.array([str(row.get('workout_log_id')) for row in rows]), return_inverse=True)
+    pairs = np.unique(group.astype(np.int64) * (workout_codes.max() + 1) + workout_codes)
+    sessions = np.bincount(pairs // (workout_codes.max() + 1), minlength=n)
+
+    best_weight = np.full(n, -np.inf)
+    np.maximum.at(best_weight, group, weights)
+    # Row with the highest e1RM per group: sort by (group, e1RM) with NaN first, take each group's last
+    order = np.lexsort((np.nan_to_num(e1rm, nan=-1.0), group))
+    last_in_group = order[np.r_[np.flatnonzero(np.diff(group[order])), len(order) - 1]]
+    # Latest spelling of the name per group (rows arrive oldest first)
+    last_row = np.zeros(n, dtype=np.int64)
+    np.maximum.at(last_row, group, np.arange(len(rows)))
+
+    sums = {
+        'total_sets': np.bincount(group, weights=sets, minlength=n),
+        'total_reps': np.bincount(group, weights=total_reps, minlength=n),
+        'tonnage_kg': np.bincount(group, weights=tonnage, minlength=n),
+    }
+    results = []
+    for g, key in enumerate(keys):
+        user_id, ex_key, week = key.split('|', 2)
+        best = last_in_group[g]
+        has_e1rm = not np.isnan(e1rm[best])
+        results.append({
+            'user_id': user_id,
+            'exercise_key': ex_key,
+            'week_start': week,
+            'exercise_name': str(rows[last_row[g]]['exercise_name']).strip(),
+            'sessions': int(sessions[g]),
+            'total_sets': round(float(sums['total_sets'][g]), 2),
+            'total_reps': round(float(sums['total_reps'][g]), 2),
+            'tonnage_kg': round(float(sums['tonnage_kg'][g]), 2),
+            'best_weight_kg': round(float(best_weight[g]), 2) if best_weight[g] > 0 else None,
+            'best_e1rm_kg': round(float(e1rm[best]), 2) if has_e1rm else None,
+            'best_set_weight_kg': round(float(weights[best]), 2) if has_e1rm else None,
+            'best_set_reps': int(reps[best]) if has_e1rm else None,
+        })
+    return results
+
+
+def _flatten(workouts, exercise_keys=None):
+    for workout in workouts:
+        for exercise in workout.get('exercise_details') or []:
+            if exercise_keys is None or exercise_key(exercise.get('exercise_name')) in exercise_keys:
+                yield {**exercise, 'user_id': workout['user_id'], 'workout_log_id': workout['id'], 'date': workout['date']}
+
+
+def refresh_exercise_stats(user_id, day_str, exercises):
+    """
+    Recomputes the week of `day_str` for the exercises a new workout logged, from that week's
+    raw rows. Failures are logged and swallowed so analytics never fail the log write itself.
+    """
+    supabase = get_db_client()
+    try:
+        keys = {exercise_key(e.get('exercise_name')) for e in exercises} - {''}
+        if not keys:
+            return
+        start = week_start(day_str)
+        end = (date.fromisoformat(start) + timedelta(days=6)).isoformat()
+        response = supabase.table('workout_logs').select(
+            'id, user_id, date, exercise_details(exercise_name, sets, reps, weight_kg)'
+        ).eq('user_id', user_id).gte('date', start).lte('date', end).execute()
+        if response is None or not hasattr(response, 'data'):
+            raise Exception('Malformed database response for workout_logs')
+        rows = aggregate_exercise_rows(list(_flatten(response.data or [], keys)))
+        if rows:
+            now = datetime.now(timezone.utc).isoformat()
+            supabase.table(STATS_TABLE).upsert([{**row, 'updated_at': now} for row in rows], on_conflict='user_id,exercise_key,week_start').execute()
+    except Exception as e:
+        print(f"Warning: Failed to refresh exercise stats for week of {day_str}. User: {user_id}. Error: {e}")
+
+
+def rebuild_exercise_stats(user_id=None):
+    """Recomputes exercise_weekly_stats from workout history in one batch. Returns rows written."""
+    supabase = get_db_client()
+    rows = aggregate_exercise_rows(list(_flatten(iter_workouts_with_exercises(supabase, user_id))))
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [{**row, 'updated_at': now} for row in rows]
+    return replace_rows(STATS_TABLE, rows, ('user_id', 'exercise_key', 'week_start'), user_id=user_id)
+
+
+def _fetch_weekly_stats(user_id, exercise=None, page_size=1000):
+    supabase = get_db_client()
+    offset = 0
+    while True:
+        query = supabase.table(STATS_TABLE).select('*').eq('user_id', user_id)
+        if exercise:
+            query = query.eq('exercise_key', exercise_key(exercise))
+        response = query.order('exercise_key').order('week_start').range(offset, offset + page_size - 1).execute()
+        if response is None or not hasattr(response, 'data'):
+            raise Exception('Malformed database response for exercise stats')
+        rows = response.data or []
+        yield from rows
+        if len(rows) < page_size:
+            break
+        offset += page_size
+
+
+def _trend_per_week(weeks, values):
+    """Least-squares slope of weekly best e1RM over the last TREND_WEEKS weeks, kg per week."""
+    points = [(date.fromisoformat(str(w)[:10]).toordinal() / 7.0, v) for w, v in zip(weeks, values) if v is not None][-TREND_WEEKS:]
+    if len(points) < 3:
+        return None
+    x, y = np.array(points).T
+    if np.ptp(x) == 0:
+        return None
+    slope, _ = np.polyfit(x, y, 1)
+    return round(float(slope), 3)
+
+
+def get_exercise_progress(user_id, exercise=None, since=None):
+    """
+    Per-exercise records and weekly series from exercise_weekly_stats. Records cover the
+    whole history; `since` (ISO date) only trims the returned series.
+    """
+    by_exercise = {}
+    for row in _fetch_weekly_stats(user_id, exercise):
+        by_exercise.setdefault(row['exercise_key'], []).append(row)
+
+    results = []
+    for key, weeks in by_exercise.items():
+        e1rm_weeks = [w for w in weeks if w.get('best_e1rm_kg') is not None]
+        best_e1rm = max(e1rm_weeks, key=lambda w: float(w['best_e1rm_kg'])) if e1rm_weeks else None
+        weighted = [w for w in weeks if w.get('best_weight_kg') is not None]
+        heaviest = max(weighted, key=lambda w: float(w['best_weight_kg'])) if weighted else None
+        biggest = max(weeks, key=lambda w: float(w.get('tonnage_kg') or 0))
+        results.append({
+            'exercise_key': key,
+            'exercise_name': weeks[-1]['exercise_name'],
+            'total_sessions': sum(w.get('sessions') or 0 for w in weeks),
+            'last_week': weeks[-1]['week_start'],
+            'records': {
+                'best_e1rm_kg': best_e1rm['best_e1rm_kg'] if best_e1rm else None,
+                'best_e1rm_week': best_e1rm['week_start'] if best_e1rm else None,
+                'best_set': {'weight_kg': best_e1rm['best_set_weight_kg'], 'reps': best_e1rm['best_set_reps']} if best_e1rm else None,
+                'heaviest_weight_kg': heaviest['best_weight_kg'] if heaviest else None,
+                'heaviest_weight_week': heaviest['week_start'] if heaviest else None,
+                'max_weekly_tonnage_kg': biggest.get('tonnage_kg'),
+                'max_weekly_tonnage_week': biggest['week_start'],
+            },
+            'e1rm_trend_kg_per_week': _trend_per_week([w['week_start'] for w in weeks], [w.get('best_e1rm_kg') and float(w['best_e1rm_kg']) for w in weeks]),
+            'series': [
+                {
+                    'week_start': w['week_start'],
+                    'sessions': w.get('sessions'),
+                    'sets': w.get('total_sets'),
+                    'reps': w.get('total_reps'),
+                    'tonnage_kg': w.get('tonnage_kg'),
+                    'best_weight_kg': w.get('best_weight_kg'),
+                    'best_e1rm_kg': w.get('best_e1rm_kg'),
+                }
+                for w in weeks
+                if not since or str(w['week_start']) >= week_start(since)
+            ],
+        })
+    results.sort(key=lambda item: (item['last_week'], item['total_sessions']), reverse=True)
+    return results
+
+
+def register_commands(app):
+    """Adds the `flask rebuild-exercise-stats` maintenance command."""
+
+    @app.cli.command('rebuild-exercise-stats')
+    @click.option('--user-id', default=None, help='Only rebuild this user (default: all users).')
+    def rebuild_exercise_stats_command(user_id):
+        """Rebuild exercise_weekly_stats (1RM, best sets, weekly volume) from workout history."""
+        count = rebuild_exercise_stats(user_id=user_id)
+        click.echo(f"Rebuilt {count} exercise weekly stats rows.")
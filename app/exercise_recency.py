@@ -0,0 +1,146 @@
+import re
+from datetime import datetime, timezone
+import click
+from db import get_db_client, replace_rows
+
+# Per-user index of the exercises someone actually does, stored in the `exercise_recency`
+# table keyed by (user_id, exercise_key):
+#   exercise_key (normalized name), exercise_name (as last entered), use_count,
+#   last_used_date, last_workout_log_id, last_sets, last_reps, last_weight_kg,
+#   best_weight_kg, updated_at
+#
+# log_workout folds each new workout's exercises in, so clients can offer "what you did
+# last time" without pulling the whole workout history. A backdated workout bumps the
+# counts but never overwrites the "last" values from a more recent session.
+# `flask rebuild-exercise-recency` recomputes it from exercise_details to repair drift.
+
+RECENCY_TABLE = 'exercise_recency'
+SORTS = {
+    'recent': ('last_used_date', 'use_count'),
+    'frequent': ('use_count', 'last_used_date'),
+}
+
+
+def exercise_key(name):
+    """'Bench  Press ' and 'bench press' are the same exercise."""
+    return re.sub(r'\s+', ' ', str(name or '').strip().lower())
+
+
+def _fold(entries, user_id, day_str, workout_log_id, exercises):
+    """Folds one workout's exercises into `entries` (exercise_key -> row). Returns the keys touched."""
+    latest, heaviest = {}, {}
+    for exercise in exercises:
+        key = exercise_key(exercise.get('exercise_name'))
+        if not key:
+            continue
+        latest[key] = exercise  # The last set of rows for an exercise within a workout wins
+        try:
+            weight = float(exercise.get('weight_kg'))
+        except (TypeError, ValueError):
+            continue
+        heaviest[key] = max(weight, heaviest.get(key, weight))
+    for key, exercise in latest.items():
+        name = str(exercise['exercise_name']).strip()
+        entry = entries.setdefault(key, {
+            'user_id': user_id, 'exercise_key': key, 'exercise_name': name,
+            'use_count': 0, 'last_used_date': None, 'last_workout_log_id': None,
+            'last_sets': None, 'last_reps': None, 'last_weight_kg': None, 'best_weight_kg': None,
+        })
+        entry['use_count'] += 1
+        if key in heaviest and (entry['best_weight_kg'] is None or heaviest[key] > float(entry['best_weight_kg'])):
+            entry['best_weight_kg'] = heaviest[key]
+        if entry['last_used_date'] is None or day_str >= str(entry['last_used_date'])[:10]:
+            entry.update({
+                'exercise_name': name,
+                'last_used_date': day_str,
+                'last_workout_log_id': workout_log_id,
+                'last_sets': exercise.get('sets'),
+                'last_reps': exercise.get('reps'),
+                'last_weight_kg': exercise.get('weight_kg'),
+            })
+    return list(latest)
+
+
+def record_workout_exercises(user_id, day_str, workout_log_id, exercises):
+    """
+    Folds a newly logged workout into the user's exercise index: one read of the rows it
+    touches and one upsert. Failures are logged and swallowed so the index never fails the
+    log write itself.
+    """
+    if not exercises:
+        return
+    day_str = str(day_str)[:10]
+    supabase = get_db_client()
+    try:
+        keys = list({exercise_key(e.get('exercise_name')) for e in exercises} - {''})
+        if not keys:
+            return
+        response = supabase.table(RECENCY_TABLE).select('*').eq('user_id', user_id).in_('exercise_key', keys).execute()
+        entries = {row['exercise_key']: row for row in (response.data if response and response.data else [])}
+        touched = _fold(entries, user_id, day_str, workout_log_id, exercises)
+        now = datetime.now(timezone.utc).isoformat()
+        rows = [{**entries[key], 'updated_at': now} for key in touched]
+        supabase.table(RECENCY_TABLE).upsert(rows, on_conflict='user_id,exercise_key').execute()
+    except Exception as e:
+        print(f"Warning: Failed to update exercise recency for workout {workout_log_id}. User: {user_id}. Error: {e}")
+
+
+def _like_literal(text):
+    """
+    `text` escaped to match itself in a LIKE pattern. PostgREST also reads `*` as `%` and
+    has no escape for it, so `*` is dropped.
+    """
+    return re.sub(r'([\\%_])', r'\\\1', text.replace('*', ''))
+
+
+def get_recent_exercises(user_id, sort='recent', limit=20, search=None):
+    """The user's exercises, most recently or most frequently used first."""
+    primary, secondary = SORTS[sort]
+    query = get_db_client().table(RECENCY_TABLE).select(
+        'exercise_name, use_count, last_used_date, last_workout_log_id, last_sets, last_reps, last_weight_kg, best_weight_kg'
+    ).eq('user_id', user_id)
+    if search:
+        query = query.ilike('exercise_key', f"%{_like_literal(exercise_key(search))}%")
+    response = query.order(primary, desc=True).order(secondary, desc=True).limit(limit).execute()
+    if response is None or not hasattr(response, 'data'):
+        raise Exception('Malformed database response for exercise recency')
+    return response.data or []
+
+
+def iter_workouts_with_exercises(supabase, user_id=None, page_size=500):
+    """Pages through workouts with their exercises in (date, id) order."""
+    offset = 0
+    while True:
+        query = supabase.table('workout_logs').select('id, user_id, date, exercise_details(exercise_name, sets, reps, weight_kg)')
+        if user_id:
+            query = query.eq('user_id', user_id)
+        response = query.order('date').order('id').range(offset, offset + page_size - 1).execute()
+        rows = response.data if response and response.data else []
+        yield from rows
+        if len(rows) < page_size:
+            break
+        offset += page_size
+
+
+def rebuild_exercise_recency(user_id=None):
+    """Recomputes exercise_recency from workout history for one user (or everyone). Returns rows written."""
+    supabase = get_db_client()
+    per_user = {}  # user_id -> {exercise_key: row}
+    for workout in iter_workouts_with_exercises(supabase, user_id):
+        entries = per_user.setdefault(workout['user_id'], {})
+        _fold(entries, workout['user_id'], str(workout['date'])[:10], workout['id'], workout.get('exercise_details') or [])
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [{**row, 'updated_at': now} for entries in per_user.values() for row in entries.values()]
+
+    return replace_rows(RECENCY_TABLE, rows, ('user_id', 'exercise_key'), user_id=user_id)
+
+
+def register_commands(app):
+    """Adds the `flask rebuild-exercise-recency` maintenance command."""
+
+    @app.cli.command('rebuild-exercise-recency')
+    @click.option('--user-id', default=None, help='Only rebuild this user (default: all users).')
+    def rebuild_exercise_recency_command(user_id):
+        """Rebuild the exercise_recency index from workout history."""
+        count = rebuild_exercise_recency(user_id=user_id)
+        click.echo(f"Rebuilt {count} exercise recency rows.")
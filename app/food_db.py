@@ -0,0 +1,419 @@
+import csv
+import heapq
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+from collections import defaultdict
+import click
+
+# Bundled food/nutrient database (data/foods.csv) compiled into a compact, read-only
+# index file that every worker memory-maps, so the pages are shared and nothing is
+# parsed at startup. Build it once with `flask build-food-index` (or `python food_db.py`,
+# which needs no database credentials).
+#
+# Layout (little-endian):
+#   header       MAGIC, counts and section offsets (HEADER)
+#   records      one fixed-size RECORD per food: string refs (incl. the normalized name) and
+#                per-serving nutrients
+#   tokens       (token ref, food id, position) for every word of every name, sorted by token
+#                bytes -- the foods matching a word prefix are one contiguous range
+#   prefixes     (prefix ref, completions start, count) for every prefix of every token, sorted
+#   completions  uint32 food ids: the best COMPLETIONS_PER_PREFIX foods per prefix, pre-ranked,
+#                so a single-word autocomplete is a binary search plus a slice
+#   trigrams     (trigram code, postings start, postings count) sorted by code
+#   postings     uint32 food ids, one run per trigram -- fallback for misspelled queries
+#   strings      utf-8 blob referenced by (offset, length) pairs
+#
+# Food ids are row positions in foods.csv, so rows should only ever be appended.
+
+MAGIC = b'FITFOOD1'
+HEADER = struct.Struct('<8s7I7I')  # magic, 7 section counts, 7 section offsets
+RECORD = struct.Struct('<IHIHIHIHIHfffff')  # name, normalized name, serving, category, protein source refs; grams, kcal, p, c, f
+TOKEN = struct.Struct('<IHIH')  # token offset/length, food id, word position in the name
+PREFIX = struct.Struct('<IHII')  # prefix offset/length, completions start, count
+RUN = struct.Struct('<III')  # trigram code, postings start, count
+ID = struct.Struct('<I')
+
+COMPLETIONS_PER_PREFIX = 64
+EXACT_SCAN_LIMIT = 64        # multi-word queries scan a word's full token range up to this size
+FUZZY_MAX_POSTINGS = 500     # trigrams in more names than this only count if nothing rarer matched
+FUZZY_POOL = 40              # candidates re-scored exactly per fuzzy query
+FUZZY_MIN_COVERAGE = 0.5     # share of the query's trigrams a fuzzy suggestion must contain
+# Words in free-text descriptions that say nothing about which food it is
+DESCRIPTION_STOPWORDS = {
+    'a', 'an', 'and', 'the', 'of', 'with', 'some', 'my', 'homemade', 'one', 'two', 'three', 'half',
+    'g', 'grams', 'oz', 'cup', 'cups', 'slice', 'slices', 'serving', 'servings', 'bowl', 'plate', 'piece', 'pieces',
+}
+
+_index = None
+_index_lock = threading.Lock()
+_missing_logged = False
+
+
+def normalize_food_name(text):
+    return ' '.join(re.sub(r'[^a-z0-9%]+', ' ', (text or '').lower()).split())
+
+
+def _trigrams(normalized):
+    padded = f"  {normalized} ".encode('utf-8')
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _trigram_code(trigram):
+    return int.from_bytes(trigram, 'big')
+
+
+def _rank_key(name_words, prefix, position, food_id):
+    """Autocomplete order: whole name starts with the query, earliest matching word, shorter name."""
+    name = ' '.join(name_words)
+    return (not name.startswith(prefix), position, len(name), food_id)
+
+
+# --- building ---------------------------------------------------------------
+
+def build_food_index(source_path, output_path):
+    """Compiles the CSV dataset into the index file. Returns the number of foods."""
+    with open(source_path, newline='', encoding='utf-8') as handle:
+        foods = list(csv.DictReader(handle))
+
+    strings = bytearray()
+    string_refs = {}
+
+    def ref(value):
+        data = (value or '').encode('utf-8')
+        if data not in string_refs:
+            string_refs[data] = (len(strings), len(data))
+            strings.extend(data)
+        return string_refs[data]
+
+    records, tokens, postings_by_code = [], [], defaultdict(list)
+    prefix_positions = defaultdict(dict)  # prefix -> {food_id: earliest position}
+    names = []
+    for food_id, row in enumerate(foods):
+        words = normalize_food_name(row['name']).split()
+        names.append(words)
+        records.append(RECORD.pack(
+            *ref(row['name'].strip()), *ref(' '.join(words)), *ref(row['serving'].strip()),
+            *ref(row.get('category', '').strip()), *ref(row.get('protein_source', '').strip()),
+            float(row['serving_g'] or 0), float(row['calories'] or 0), float(row['protein_g'] or 0),
+            float(row['carbs_g'] or 0), float(row['fat_g'] or 0),
+        ))
+        for position, word in enumerate(words):
+            tokens.append((word.encode('utf-8'), food_id, position))
+            for end in range(1, len(word) + 1):
+                seen = prefix_positions[word[:end]]
+                if food_id not in seen:
+                    seen[food_id] = position
+        for trigram in _trigrams(' '.join(words)):
+            postings_by_code[_trigram_code(trigram)].append(food_id)
+
+    tokens.sort()
+    token_bytes = b''.join(TOKEN.pack(*ref(word.decode('utf-8')), food_id, position) for word, food_id, position in tokens)
+
+    prefix_entries, completions = [], []
+    for prefix in sorted(prefix_positions, key=lambda p: p.encode('utf-8')):
+        best = heapq.nsmallest(
+            COMPLETIONS_PER_PREFIX,
+            (_rank_key(names[food_id], prefix, position, food_id) for food_id, position in prefix_positions[prefix].items()),
+        )
+        prefix_entries.append(PREFIX.pack(*ref(prefix), len(completions), len(best)))
+        completions.extend(key[-1] for key in best)
+
+    runs, postings = [], []
+    for code in sorted(postings_by_code):
+        ids = postings_by_code[code]
+        runs.append(RUN.pack(code, len(postings), len(ids)))
+        postings.extend(ids)
+
+    sections = [
+        b''.join(records), token_bytes, b''.join(prefix_entries), struct.pack(f'<{len(completions)}I', *completions),
+        b''.join(runs), struct.pack(f'<{len(postings)}I', *postings), bytes(strings),
+    ]
+    counts = [len(records), len(tokens), len(prefix_entries), len(completions), len(runs), len(postings), len(strings)]
+    offsets, offset = [], HEADER.size
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section)
+
+    tmp_path = f"{output_path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(tmp_path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, *counts, *offsets))
+        for section in sections:
+            out.write(section)
+    os.replace(tmp_path, output_path)  # Workers that already mapped the old file keep reading it
+    return len(records)
+
+
+# --- querying ---------------------------------------------------------------
+
+class FoodIndex:
+    def __init__(self, path):
+        with open(path, 'rb') as handle:
+            self.buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.food_count, self.token_count, self.prefix_count, _, self.run_count, _, _,
+         self.records_offset, self.tokens_offset, self.prefixes_offset, self.completions_offset,
+         self.runs_offset, self.postings_offset, self.strings_offset) = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a food index (bad magic)")
+        self.path = path
+
+    def _string(self, offset, length):
+        start = self.strings_offset + offset
+        return self.buffer[start:start + length]
+
+    def _ids(self, section_offset, start, count):
+        return struct.unpack_from(f'<{count}I', self.buffer, section_offset + start * ID.size)
+
+    def _lower_bound(self, count, read_key, key):
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if read_key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _token_word(self, i):
+        offset, length = struct.unpack_from('<IH', self.buffer, self.tokens_offset + i * TOKEN.size)
+        return self._string(offset, length)
+
+    def _token_range(self, word):
+        """[lo, hi) of token entries whose word starts with `word`."""
+        key = word.encode('utf-8')
+        lo = self._lower_bound(self.token_count, self._token_word, key)
+        hi = self._lower_bound(self.token_count, self._token_word, key + b'\xff')  # 0xff never occurs in utf-8
+        return lo, hi
+
+    def _prefix_at(self, i):
+        offset, length = struct.unpack_from('<IH', self.buffer, self.prefixes_offset + i * PREFIX.size)
+        return self._string(offset, length)
+
+    def _completions(self, prefix):
+        """Pre-ranked food ids for a single-word prefix (at most COMPLETIONS_PER_PREFIX)."""
+        key = prefix.encode('utf-8')
+        i = self._lower_bound(self.prefix_count, self._prefix_at, key)
+        if i == self.prefix_count or self._prefix_at(i) != key:
+            return ()
+        _, _, start, count = PREFIX.unpack_from(self.buffer, self.prefixes_offset + i * PREFIX.size)
+        return self._ids(self.completions_offset, start, count)
+
+    def _candidates(self, word):
+        """Foods with a word starting with `word`: exact when few, else the best pre-ranked ones."""
+        lo, hi = self._token_range(word)
+        if hi - lo <= EXACT_SCAN_LIMIT:
+            return {TOKEN.unpack_from(self.buffer, self.tokens_offset + i * TOKEN.size)[2] for i in range(lo, hi)}
+        return set(self._completions(word))
+
+    def _name_words(self, food_id):
+        offset, length = struct.unpack_from('<IH', self.buffer, self.records_offset + food_id * RECORD.size + 6)
+        return self._string(offset, length).decode('utf-8').split()
+
+    def get(self, food_id):
+        if not 0 <= food_id < self.food_count:
+            return None
+        (name_off, name_len, _, _, serving_off, serving_len, category_off, category_len, source_off, source_len,
+         grams, calories, protein, carbs, fat) = RECORD.unpack_from(self.buffer, self.records_offset + food_id * RECORD.size)
+        return {
+            'id': food_id,
+            'name': self._string(name_off, name_len).decode('utf-8'),
+            'serving': self._string(serving_off, serving_len).decode('utf-8'),
+            'serving_g': round(grams, 1),
+            'calories': round(calories),
+            'protein_g': round(protein, 1),
+            'carbs_g': round(carbs, 1),
+            'fat_g': round(fat, 1),
+            'category': self._string(category_off, category_len).decode('utf-8'),
+            'protein_source': self._string(source_off, source_len).decode('utf-8') or None,
+        }
+
+    def _run_code(self, i):
+        return ID.unpack_from(self.buffer, self.runs_offset + i * RUN.size)[0]
+
+    def _fuzzy(self, normalized):
+        """[(coverage, similarity, food_id)] for names sharing trigrams with the query, best first."""
+        query_trigrams = _trigrams(normalized)
+        runs = []
+        for trigram in query_trigrams:
+            code = _trigram_code(trigram)
+            i = self._lower_bound(self.run_count, self._run_code, code)
+            if i < self.run_count:
+                found, start, count = RUN.unpack_from(self.buffer, self.runs_offset + i * RUN.size)
+                if found == code:
+                    runs.append((count, start))
+        runs.sort()
+
+        # Rare trigrams pick the candidates; the best of those are then scored exactly
+        overlap = defaultdict(int)
+        for n, (count, start) in enumerate(runs):
+            if n and count > FUZZY_MAX_POSTINGS:
+                break
+            for food_id in self._ids(self.postings_offset, start, count):
+                overlap[food_id] += 1
+        scored = []
+        for food_id, _ in heapq.nlargest(FUZZY_POOL, overlap.items(), key=lambda item: (item[1], -item[0])):
+            name_trigrams = _trigrams(' '.join(self._name_words(food_id)))
+            shared = len(query_trigrams & name_trigrams)
+            scored.append((shared / len(query_trigrams), shared / len(query_trigrams | name_trigrams), food_id))
+        scored.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return scored
+
+    def search(self, query, limit=10):
+        """
+        Autocomplete: foods whose name has a word starting with every query word, ranked by
+        whole-name prefix, then earliest matching word, then shorter names. Falls back to
+        fuzzy trigram matches when nothing matches, so typos still return something.
+        """
+        normalized = normalize_food_name(query)
+        if not normalized:
+            return []
+        words = normalized.split()
+        if len(words) == 1:
+            ids = self._completions(words[0])[:limit]
+        else:
+            # Candidates come from the rarest word; the rest are checked against each name
+            ranges = {word: self._token_range(word) for word in words}
+            rarest = min(words, key=lambda word: ranges[word][1] - ranges[word][0])
+            ranked = []
+            for food_id in self._candidates(rarest):
+                name_words = self._name_words(food_id)
+                positions = [_word_position(name_words, word) for word in words]
+                if None not in positions:
+                    ranked.append(_rank_key(name_words, normalized, max(positions), food_id))
+            ids = [key[-1] for key in heapq.nsmallest(limit, ranked)]
+        if ids or len(normalized) < 3:
+            return [dict(self.get(food_id), match='prefix') for food_id in ids]
+
+        return [
+            dict(self.get(food_id), match='fuzzy', similarity=round(coverage, 3))
+            for coverage, _, food_id in self._fuzzy(normalized)[:limit]
+            if coverage >= FUZZY_MIN_COVERAGE
+        ]
+
+    def best_match(self, description):
+        """
+        The single food to auto-fill a log entry from, or None when no food name contains every
+        word of the description. Filler words and quantities are ignored and plurals are folded,
+        but words must match whole: "apple pie" is not Apple and "ham" is not Hamburger. Ties go
+        to the food naming the description earliest, then to shorter names.
+        """
+        words = _description_words(description)
+        if not words:
+            return None
+        ranges = {word: self._token_range(word) for word in words}
+        rarest = min(words, key=lambda word: ranges[word][1] - ranges[word][0])
+        best_key, best_id = None, None
+        for food_id in self._candidates(rarest):
+            name_words = [_fold_plural(word) for word in self._name_words(food_id)]
+            if not all(word in name_words for word in words):
+                continue
+            key = (min(name_words.index(word) for word in words), len(name_words), food_id)
+            if best_key is None or key < best_key:
+                best_key, best_id = key, food_id
+        return dict(self.get(best_id), match='exact') if best_id is not None else None
+
+    def suggest(self, description, limit=5):
+        """Foods to offer when best_match finds none: a search over the description's content words."""
+        return self.search(' '.join(_description_words(description)), limit)
+
+    def protein_sources(self, text):
+        """Protein sources named in free text, from foods whose name starts with one of its words."""
+        sources = set()
+        words = set(normalize_food_name(text).split())
+        words |= {word[:-1] for word in words if len(word) > 3 and word.endswith('s')}
+        for word in words:
+            for food_id in self._completions(word):
+                if self._name_words(food_id)[0] != word:
+                    break  # Completions list names starting with the word first
+                source = self.get(food_id)['protein_source']
+                if source:
+                    sources.add(source)
+        return sorted(sources)
+
+
+def _fold_plural(word):
+    return word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+
+
+def _description_words(description):
+    """The words of a free-text food description that name the food, plurals folded."""
+    return [
+        _fold_plural(word)
+        for word in normalize_food_name(description).split()
+        if word not in DESCRIPTION_STOPWORDS and not word.isdigit()
+    ]
+
+
+def _word_position(name_words, word):
+    """Index of the first name word starting with `word`, or None."""
+    return next((i for i, name_word in enumerate(name_words) if name_word.startswith(word)), None)
+
+
+def get_food_index(config):
+    """The memory-mapped index at Config.FOOD_INDEX_PATH, or None if it hasn't been built."""
+    global _index, _missing_logged
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _index is None:
+            try:
+                _index = FoodIndex(config.FOOD_INDEX_PATH)
+                print(f"INFO [food_db]: Loaded food index {config.FOOD_INDEX_PATH} ({_index.food_count} foods)")
+            except (OSError, ValueError) as e:
+                if not _missing_logged:
+                    print(f"Warning: Food index unavailable, run `flask build-food-index`. Error: {e}")
+                    _missing_logged = True
+                return None
+        return _index
+
+
+def scale_nutrients(food, servings=None, quantity_g=None):
+    """
+    Calories and macros for `servings` servings, or `quantity_g` grams, of a food.
+    Raises ValueError unless the amounts given are finite positive numbers.
+    """
+    amounts = {name: float(value) for name, value in (('servings', servings), ('quantity_g', quantity_g)) if value is not None}
+    if not all(math.isfinite(value) and value > 0 for value in amounts.values()):
+        raise ValueError('servings and quantity_g must be positive numbers')
+    if 'quantity_g' in amounts and food['serving_g']:
+        factor = amounts['quantity_g'] / food['serving_g']
+    else:
+        factor = amounts.get('servings', 1.0)
+    return {
+        'calories': round(food['calories'] * factor),
+        'protein_g': round(food['protein_g'] * factor, 1),
+        'carbs_g': round(food['carbs_g'] * factor, 1),
+        'fat_g': round(food['fat_g'] * factor, 1),
+    }
+
+
+def register_commands(app):
+    """Adds the `flask build-food-index` command."""
+
+    @app.cli.command('build-food-index')
+    @click.option('--source', default=None, help='Food CSV (default: Config.FOOD_DATA_PATH).')
+    @click.option('--output', default=None, help='Index file to write (default: Config.FOOD_INDEX_PATH).')
+    def build_food_index_command(source, output):
+        """Compile the bundled food dataset into the memory-mapped search index."""
+        source = source or app.config['FOOD_DATA_PATH']
+        output = output or app.config['FOOD_INDEX_PATH']
+        count = build_food_index(source, output)
+        click.echo(f"Indexed {count} foods into {output} ({os.path.getsize(output)} bytes).")
+
+
+if __name__ == '__main__':
+    # `python food_db.py` builds the index without importing main.py, whose routes need
+    # Supabase credentials at import time (the Docker build has none)
+    import argparse
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='Compile the bundled food dataset into the memory-mapped search index.')
+    parser.add_argument('--source', default=Config.FOOD_DATA_PATH, help='Food CSV (default: Config.FOOD_DATA_PATH).')
+    parser.add_argument('--output', default=Config.FOOD_INDEX_PATH, help='Index file to write (default: Config.FOOD_INDEX_PATH).')
+    args = parser.parse_args()
+    count = build_food_index(args.source, args.output)
+    print(f"Indexed {count} foods into {args.output} ({os.path.getsize(args.output)} bytes).")
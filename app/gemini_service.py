@@ -1,15 +1,37 @@
+import json
+import time
 import google.generativeai as genai
 from config import Config
+from circuit_breaker import get_breaker, CircuitOpenError
+from lifecycle import ai_call, WorkerDrainingError
+from profiler import span, annotate_request
+from deadlines import call_timeout, remaining, expired, exceeded, hedged
 
 genai.configure(api_key=Config.GEMINI_API_KEY)
 
-# Enhanced Generation Configuration for Fitness AI
-generation_config = {
-    "temperature": 0.8,  # Increased for more creative and engaging responses
-    "top_p": 0.95,       # Allow for diverse vocabulary while maintaining focus
-    "top_k": 64,         # Increased for more varied word choices
-    "max_output_tokens": 3072, # Increased for detailed workout plans and insights
-    "response_mime_type": "text/plain",
+# Generation profiles: each caller picks the one matching what it shows the user.
+# Chat replies are cut to ~480 characters by format_chat_response, so generating
+# thousands of tokens there only adds latency and cost. Each profile sets:
+#   tier               'standard' (Config.GEMINI_MODEL) or 'fast' (Config.GEMINI_FAST_MODEL)
+#   max_output_tokens  cap sized to the output format the prompt asks for, with headroom
+#   temperature, top_p, top_k
+#   stop_sequences     end generation where the model would start inventing the next turn
+# On 2.5 "thinking" models, max_output_tokens also covers the thinking tokens, and this
+# SDK can't turn thinking off. The short-output profiles therefore use the fast tier,
+# which should be a non-thinking model; otherwise tight caps can leave no room for the answer.
+GENERATION_PROFILES = {
+    'default': {"tier": "standard", "temperature": 0.8, "top_p": 0.95, "top_k": 64, "max_output_tokens": 3072},
+    # 2-4 sentences, trimmed to 480 characters for the chat bubble
+    'chat': {"tier": "fast", "temperature": 0.7, "top_p": 0.95, "top_k": 40, "max_output_tokens": 256,
+             "stop_sequences": ["\nUser:", "\nBot:", "USER'S CURRENT QUESTION"]},
+    # Title, warm-up, main sets, cool-down and a tip
+    'workout': {"tier": "standard", "temperature": 0.8, "top_p": 0.95, "top_k": 64, "max_output_tokens": 2048},
+    # Title, ingredients, steps and nutrition facts
+    'meal': {"tier": "standard", "temperature": 0.8, "top_p": 0.95, "top_k": 64, "max_output_tokens": 1536},
+    # Exactly 3-4 bullet points, grounded in the user's numbers
+    'insights': {"tier": "fast", "temperature": 0.5, "top_p": 0.9, "top_k": 40, "max_output_tokens": 512},
+    # One block, day or ingredient swap of a stored structured plan (plans.py), as JSON
+    'plan_part': {"tier": "fast", "temperature": 0.7, "top_p": 0.95, "top_k": 40, "max_output_tokens": 1024},
 }
 
 safety_settings = [
@@ -19,11 +41,7 @@ safety_settings = [
     {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
 ]
 
-model = genai.GenerativeModel(
-    model_name="gemini-2.5-flash-preview-04-17", # Latest model for enhanced capabilities
-    generation_config=generation_config,
-    safety_settings=safety_settings,
-    system_instruction="""You are FitMind AI, an expert fitness and nutrition coach with advanced knowledge in:
+SYSTEM_INSTRUCTION = """You are FitMind AI, an expert fitness and nutrition coach with advanced knowledge in:
     - Exercise physiology and program design
     - Sports nutrition and meal planning  
     - Behavioral psychology and motivation
@@ -37,50 +55,184 @@ model = genai.GenerativeModel(
     ✓ Backed by fitness science principles
     
     Format responses to be engaging, using emojis appropriately, and structure information clearly for easy reading."""
+
+MODEL_TIERS = {
+    'standard': Config.GEMINI_MODEL,
+    'fast': Config.GEMINI_FAST_MODEL,
+}
+models = {
+    tier: genai.GenerativeModel(model_name=model_name, safety_settings=safety_settings, system_instruction=SYSTEM_INSTRUCTION)
+    for tier, model_name in MODEL_TIERS.items()
+}
+model = models['standard']
+
+
+def generation_config_for(profile, response_schema=None, max_output_tokens=None):
+    """
+    The per-call generation config for a GENERATION_PROFILES entry. With a
+    response_schema, Gemini returns JSON constrained to it instead of text.
+    """
+    settings = GENERATION_PROFILES[profile]
+    config = {key: value for key, value in settings.items() if key != 'tier'}
+    if max_output_tokens:
+        config["max_output_tokens"] = max_output_tokens
+    if response_schema is not None:
+        config["response_mime_type"] = "application/json"
+        config["response_schema"] = response_schema
+        config.pop("stop_sequences", None)
+    else:
+        config["response_mime_type"] = "text/plain"
+    return config
+
+
+gemini_breaker = get_breaker(
+    'gemini',
+    failure_rate_threshold=Config.GEMINI_BREAKER_FAILURE_RATE,
+    slow_call_seconds=Config.GEMINI_BREAKER_SLOW_CALL_SECONDS,
+    open_seconds=Config.GEMINI_BREAKER_OPEN_SECONDS,
 )
 
-def generate_text_from_gemini(prompt_parts):
+BLOCKED_MESSAGE = "I'm unable to generate this recommendation due to content policies. Please try a different request."
+EMPTY_MESSAGE = "I'm having trouble generating a detailed response right now. Please try again in a moment."
+DRAINING_MESSAGE = "I'm restarting for an update. Please try again in a few seconds."
+DRAINING_RETRY_AFTER = 5
+DEADLINE_MESSAGE = "That took longer than expected. Please try again in a moment."
+
+
+class GeminiUnavailableError(Exception):
+    """Raised by generate_text_strict when Gemini failed or its circuit breaker is open."""
+
+    def __init__(self, user_message, retry_after=None):
+        super().__init__(user_message)
+        self.user_message = user_message
+        self.retry_after = retry_after
+
+
+def _error_message(e):
+    """Maps an exception from the Gemini API to a user-facing message."""
+    if isinstance(e, CircuitOpenError):
+        return "I'm currently experiencing high demand. Please try again in a few minutes."
+    error_msg = str(e).lower()
+
+    # Provide specific error messages for common issues
+    if 'quota' in error_msg or 'limit' in error_msg:
+        return "I'm currently experiencing high demand. Please try again in a few minutes."
+    elif 'safety' in error_msg or 'blocked' in error_msg:
+        return "I'm unable to process this request due to content guidelines. Please try rephrasing your request."
+    elif 'network' in error_msg or 'connection' in error_msg:
+        return "I'm having connectivity issues. Please check your internet connection and try again."
+    else:
+        return "I'm temporarily unavailable. Please try again later."
+
+
+def _generate(tier, full_prompt, profile, generation_config):
+    """One generate_content call, timed out with whatever is left of the request deadline."""
+    timeout = call_timeout(f"gemini {profile}")
+    request_options = {'timeout': timeout} if timeout is not None else None
+    return models[tier].generate_content(full_prompt, generation_config=generation_config, request_options=request_options)
+
+
+def gemini_available():
+    """False while the Gemini breaker is open, so callers can skip prompt building entirely."""
+    return not gemini_breaker.is_open()
+
+
+def generate_text_strict(prompt_parts, profile='default', response_schema=None, max_output_tokens=None):
+    """
+    Like generate_text_from_gemini, but raises GeminiUnavailableError instead of returning
+    a canned message when Gemini fails or its breaker is open, so callers can fall back.
+    Content-policy blocks are not outages and still return the policy message.
+    `profile` names the GENERATION_PROFILES entry to generate with; max_output_tokens
+    overrides its cap, and response_schema switches it to JSON output.
+    """
+    settings = GENERATION_PROFILES[profile]
+    generation_config = generation_config_for(profile, response_schema, max_output_tokens)
+    # Convert list to single string if needed
+    if isinstance(prompt_parts, list):
+        full_prompt = '\n'.join(str(part) for part in prompt_parts)
+    else:
+        full_prompt = str(prompt_parts)
+
+    try:
+        with ai_call(): # Counted so a draining worker can wait for it
+            # Not worth starting when what is left of the request's budget is under the usual latency
+            budget = remaining()
+            typical = gemini_breaker.latency_percentile(50)
+            if budget is not None and budget <= (typical or 0):
+                exceeded(f"gemini {profile}")
+                raise GeminiUnavailableError(DEADLINE_MESSAGE)
+            try:
+                gemini_breaker.allow_request()
+            except CircuitOpenError as e:
+                raise GeminiUnavailableError(_error_message(e), retry_after=e.retry_after)
+
+            started = time.monotonic()
+            try:
+                with span('gemini', f"generate_content {profile}"):
+                    response = hedged(Config, 'gemini', lambda: _generate(settings['tier'], full_prompt, profile, generation_config),
+                                      gemini_breaker, enabled=Config.HEDGE_GEMINI)
+            except Exception as e:
+                if expired():
+                    gemini_breaker.record_timeout(time.monotonic() - started, budget)
+                    exceeded(f"gemini {profile}")
+                    print(f"Gemini call cut off by the request deadline after {time.monotonic() - started:.1f}s")
+                    raise GeminiUnavailableError(DEADLINE_MESSAGE)
+                gemini_breaker.record_failure(time.monotonic() - started)
+                print(f"Error calling Gemini API: {e}")
+                raise GeminiUnavailableError(_error_message(e))
+            gemini_breaker.record_success(time.monotonic() - started)
+            usage = getattr(response, 'usage_metadata', None)
+            if usage is not None:
+                annotate_request(gemini_profile=profile, gemini_output_tokens=getattr(usage, 'candidates_token_count', None))
+    except WorkerDrainingError:
+        raise GeminiUnavailableError(DRAINING_MESSAGE, retry_after=DRAINING_RETRY_AFTER)
+
+    # Check if response was blocked
+    if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
+        feedback = response.prompt_feedback
+        if hasattr(feedback, 'block_reason') and feedback.block_reason:
+            print(f"Content blocked. Reason: {feedback.block_reason}")
+            return BLOCKED_MESSAGE
+
+    # Return the generated text or handle empty response
+    try:
+        text = response.text
+    except Exception as e: # .text raises when the candidate has no parts (e.g. finish_reason SAFETY)
+        print(f"Could not read Gemini response text: {e}")
+        text = None
+    if text:
+        return text.strip()
+    print("Empty response received from Gemini API")
+    raise GeminiUnavailableError(EMPTY_MESSAGE)
+
+
+def generate_json_strict(prompt_parts, response_schema, profile='default', max_output_tokens=None):
+    """
+    generate_text_strict with JSON output constrained to `response_schema`. Returns the
+    decoded JSON, or None when the prompt was blocked by content policy. Output that
+    isn't valid JSON (usually cut off at the token cap) raises GeminiUnavailableError.
+    """
+    text = generate_text_strict(prompt_parts, profile, response_schema, max_output_tokens)
+    if text == BLOCKED_MESSAGE:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        print(f"Gemini returned malformed JSON ({profile}, {len(text)} chars): {e}")
+        raise GeminiUnavailableError(EMPTY_MESSAGE)
+
+
+def generate_text_from_gemini(prompt_parts, profile='default'):
     """
     Generates text using the enhanced Gemini API for fitness coaching.
     prompt_parts: A list of strings forming the prompt.
+    profile: The GENERATION_PROFILES entry to generate with.
     Returns: Generated text response or error message.
     """
     try:
-        # Convert list to single string if needed
-        if isinstance(prompt_parts, list):
-            full_prompt = '\n'.join(str(part) for part in prompt_parts)
-        else:
-            full_prompt = str(prompt_parts)
-        
-        response = model.generate_content(full_prompt)
-        
-        # Check if response was blocked
-        if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-            feedback = response.prompt_feedback
-            if hasattr(feedback, 'block_reason') and feedback.block_reason:
-                print(f"Content blocked. Reason: {feedback.block_reason}")
-                return "I'm unable to generate this recommendation due to content policies. Please try a different request."
-        
-        # Return the generated text or handle empty response
-        if hasattr(response, 'text') and response.text:
-            return response.text.strip()
-        else:
-            print("Empty response received from Gemini API")
-            return "I'm having trouble generating a detailed response right now. Please try again in a moment."
-            
-    except Exception as e:
-        print(f"Error calling Gemini API: {e}")
-        error_msg = str(e).lower()
-        
-        # Provide specific error messages for common issues
-        if 'quota' in error_msg or 'limit' in error_msg:
-            return "I'm currently experiencing high demand. Please try again in a few minutes."
-        elif 'safety' in error_msg or 'blocked' in error_msg:
-            return "I'm unable to process this request due to content guidelines. Please try rephrasing your request."
-        elif 'network' in error_msg or 'connection' in error_msg:
-            return "I'm having connectivity issues. Please check your internet connection and try again."
-        else:
-            return "I'm temporarily unavailable. Please try again later."
+        return generate_text_strict(prompt_parts, profile)
+    except GeminiUnavailableError as e:
+        return e.user_message
 
 # Example usage (will be called from routes)
 # if __name__ == '__main__':
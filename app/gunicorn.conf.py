@@ -0,0 +1,60 @@
+import os
+import signal
+
+# Gunicorn settings for the production container (see Dockerfile).
+#
+# Threaded workers let one worker keep serving logs while a Gemini call is in flight.
+# GUNICORN_THREADS (or ADMISSION_CAPACITY, if larger) threads run API requests. A request
+# waiting for admission (admission.py) holds a thread too, so ADMISSION_QUEUE_THREADS
+# more are added for waiters, and admission.py never lets more than that wait: the next
+# request always finds a thread and is admitted or shed by priority, instead of queueing
+# in gunicorn. An open /api/events stream holds a thread for its whole life, so each
+# worker also gets EVENTS_MAX_STREAMS threads; the pool only starts them as streams open,
+# and events.py refuses streams beyond that.
+# Each worker warms up as soon as it boots (lifecycle.py). On SIGTERM it stops starting
+# new AI calls and waits up to DRAIN_TIMEOUT_SECONDS for the ones in flight before
+# exiting. graceful_timeout is longer than that, so the master doesn't kill a worker
+# that is still draining.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+if os.environ.get('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+    threads = max(threads, int(os.environ.get('ADMISSION_CAPACITY', threads)))
+    threads += int(os.environ.get('ADMISSION_QUEUE_THREADS', 8))
+if os.environ.get('EVENTS_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+    threads += int(os.environ.get('EVENTS_MAX_STREAMS', 64))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+preload_app = False  # Warm-up threads and connection pools must be created per worker, after fork
+
+_drain_timeout = float(os.environ.get('DRAIN_TIMEOUT_SECONDS', 25))
+graceful_timeout = int(_drain_timeout) + 5
+
+
+def post_worker_init(worker):
+    from config import Config
+    from lifecycle import begin_drain, start_warm_up
+    from events import get_event_bus
+
+    start_warm_up(worker.wsgi, Config)
+    event_bus = get_event_bus()
+
+    # Gunicorn's own SIGTERM handler stops the accept loop; drain AI work first
+    gunicorn_handler = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        begin_drain()
+        if event_bus is not None:
+            event_bus.close_streams()  # Open SSE streams would otherwise hold the worker until graceful_timeout
+        if callable(gunicorn_handler):
+            gunicorn_handler(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+def worker_exit(server, worker):
+    from lifecycle import begin_drain, wait_for_drain
+
+    begin_drain()
+    wait_for_drain(_drain_timeout)
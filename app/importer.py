@@ -0,0 +1,300 @@
+import csv
+import io
+import json
+import re
+from collections import Counter
+from datetime import date, datetime
+from postgrest.types import ReturnMethod
+from db import get_db_client, iter_user_rows
+
+# Columns we accept per table, with the aliases other apps commonly export them under.
+# Anything else in the file is ignored; id/user_id are always assigned by us.
+IMPORT_COLUMNS = {
+    'workout_logs': {
+        'date': ('date', 'day', 'workout_date', 'start_date', 'start_time'),
+        'type': ('type', 'workout_type', 'activity', 'activity_type', 'workout'),
+        'duration_minutes': ('duration_minutes', 'duration', 'minutes', 'duration_min'),
+        'calories_burned': ('calories_burned', 'active_calories', 'energy_burned', 'kcal_burned'),
+        'notes': ('notes', 'note', 'comment', 'comments', 'description'),
+    },
+    'exercise_details': {
+        'workout_log_id': ('workout_log_id', 'workout_id'),
+        'exercise_name': ('exercise_name', 'exercise', 'name', 'movement'),
+        'sets': ('sets', 'set_count'),
+        'reps': ('reps', 'repetitions', 'rep_count'),
+        'weight_kg': ('weight_kg', 'weight', 'load', 'load_kg'),
+    },
+    'nutrition_logs': {
+        'date': ('date', 'day', 'meal_date'),
+        'meal_type': ('meal_type', 'meal', 'meal_name'),
+        'food_item_description': ('food_item_description', 'food', 'food_name', 'item', 'description'),
+        'calories': ('calories', 'kcal', 'energy', 'energy_kcal'),
+        'protein_g': ('protein_g', 'protein'),
+        'carbs_g': ('carbs_g', 'carbs', 'carbohydrates', 'carbohydrates_g'),
+        'fat_g': ('fat_g', 'fat', 'total_fat'),
+    },
+    'weight_tracker': {
+        'date': ('date', 'day', 'measured_on', 'measurement_date'),
+        'weight_kg': ('weight_kg', 'weight', 'body_weight', 'kg'),
+    },
+    'water_intake_logs': {
+        'date': ('date', 'day'),
+        'amount_ml': ('amount_ml', 'amount', 'water_ml', 'water', 'ml', 'volume_ml'),
+    },
+}
+
+INTEGER_COLUMNS = {'duration_minutes', 'calories_burned', 'sets', 'reps', 'amount_ml'}
+NUMERIC_COLUMNS = {'calories', 'protein_g', 'carbs_g', 'fat_g', 'weight_kg'}
+
+# Which columns identify "the same entry" when deduplicating against existing rows.
+DEDUPE_KEYS = {
+    'workout_logs': ('date', 'type', 'duration_minutes'),
+    'nutrition_logs': ('date', 'meal_type', 'food_item_description', 'calories'),
+    'weight_tracker': ('date', 'weight_kg'),
+    'water_intake_logs': ('date', 'amount_ml'),
+}
+
+# Insert order: workouts must exist before their exercise details can reference them.
+TABLE_ORDER = ['workout_logs', 'exercise_details', 'nutrition_logs', 'weight_tracker', 'water_intake_logs']
+
+
+class ImportRowError(ValueError):
+    """Raised for a single row that can't be mapped; the import continues with the next row."""
+
+
+def normalize_header(name):
+    """'Weight (kg)' -> 'weight_kg', 'Workout Type' -> 'workout_type'."""
+    name = name.strip().lower()
+    name = re.sub(r'\(([^)]*)\)', r' \1', name)
+    return re.sub(r'[^a-z0-9]+', '_', name).strip('_')
+
+
+def _alias_map(table):
+    return {alias: column for column, aliases in IMPORT_COLUMNS[table].items() for alias in aliases}
+
+
+def _coerce(column, value):
+    if value is None or (isinstance(value, str) and value.strip() == ''):
+        return None
+    if column == 'date':
+        text = str(value).strip()
+        try:
+            return date.fromisoformat(text[:10]).isoformat()
+        except ValueError:
+            try:
+                return datetime.fromisoformat(text.replace('Z', '+00:00')).date().isoformat()
+            except ValueError:
+                raise ImportRowError(f"Unrecognised date '{text}' (expected ISO 8601)")
+    if column in INTEGER_COLUMNS:
+        try:
+            return int(round(float(value)))
+        except (TypeError, ValueError):
+            raise ImportRowError(f"Column {column} must be numeric, got '{value}'")
+    if column in NUMERIC_COLUMNS:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ImportRowError(f"Column {column} must be numeric, got '{value}'")
+    return str(value).strip() if isinstance(value, str) else value
+
+
+def map_row(table, raw_row):
+    """Maps a parsed source row onto the table's schema. Returns (row, source_id)."""
+    if table not in IMPORT_COLUMNS:
+        raise ImportRowError(f"Unknown table '{table}'")
+    aliases = _alias_map(table)
+    row = {}
+    source_id = None
+    for key, value in raw_row.items():
+        if key is None:
+            continue
+        normalized = normalize_header(str(key))
+        if normalized == 'id':
+            source_id = value
+            continue
+        column = aliases.get(normalized)
+        if column and column not in row:
+            row[column] = _coerce(column, value)
+
+    if table != 'exercise_details' and not row.get('date'):
+        raise ImportRowError(f"Missing date for {table} row")
+    required = {
+        'workout_logs': ('type', 'duration_minutes'),
+        'exercise_details': ('workout_log_id', 'exercise_name'),
+        'nutrition_logs': ('meal_type', 'food_item_description', 'calories'),
+        'weight_tracker': ('weight_kg',),
+        'water_intake_logs': ('amount_ml',),
+    }[table]
+    missing = [column for column in required if row.get(column) in (None, '')]
+    if missing:
+        raise ImportRowError(f"Missing {', '.join(missing)} for {table} row")
+    return row, source_id
+
+
+def iter_ndjson(stream, default_table=None):
+    """
+    Yields (table, raw_row) from NDJSON. Accepts our export format ({"table", "data"}),
+    flat objects carrying a "table" key, or flat objects for `default_table`.
+    """
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            yield None, ImportRowError(f"Line {line_number}: invalid JSON")
+            continue
+        if isinstance(obj, dict) and isinstance(obj.get('data'), dict) and 'table' in obj:
+            yield obj['table'], obj['data']
+        elif isinstance(obj, dict):
+            table = obj.pop('table', None) or default_table
+            yield table, obj
+        else:
+            yield None, ImportRowError(f"Line {line_number}: expected a JSON object")
+
+
+def iter_csv(stream, default_table=None):
+    """
+    Yields (table, raw_row) from CSV. Accepts our sectioned export format, where each
+    section's header row starts with `table`, or a plain single-table CSV for `default_table`.
+    """
+    reader = csv.reader(stream)
+    header = None
+    for record in reader:
+        if not record or all(not cell.strip() for cell in record):
+            continue
+        if header is None or normalize_header(record[0]) == 'table':
+            header = record
+            continue
+        row = dict(zip(header, record))
+        table = row.pop(header[0], None) if normalize_header(header[0]) == 'table' else None
+        yield table or default_table, row
+
+
+class HistoryImporter:
+    """
+    Maps, dedupes and inserts parsed rows for one user in fixed-size chunks.
+    Memory is bounded by the chunk buffers plus one small dedupe key per existing row
+    of the tables being imported (never the existing rows themselves).
+    """
+
+    def __init__(self, user_id, chunk_size=1000):
+        self.supabase = get_db_client()
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.buffers = {table: [] for table in TABLE_ORDER}
+        self.existing_keys = {}
+        self.workout_id_map = {}       # source workout id -> new/existing workout id
+        self.skipped_workouts = set()  # source workout ids that were duplicates
+        self.rows_read = 0
+        self.inserted = Counter()
+        self.skipped_duplicates = 0
+        self.errors = []
+        self.min_date = None
+        self.touched_tables = set()
+
+    def _dedupe_key(self, table, row):
+        return tuple(str(row.get(column)) for column in DEDUPE_KEYS[table])
+
+    def _load_existing(self, table):
+        if table not in self.existing_keys:
+            counts = Counter()
+            ids = {}
+            for existing in iter_user_rows(table, self.user_id):
+                try:
+                    key = tuple(str(_coerce(column, existing.get(column))) for column in DEDUPE_KEYS[table])
+                except ImportRowError:
+                    continue
+                counts[key] += 1
+                if table == 'workout_logs':
+                    ids.setdefault(key, []).append(existing['id'])
+            self.existing_keys[table] = (counts, ids)
+        return self.existing_keys[table]
+
+    def add(self, table, raw_row):
+        """Maps one parsed row and queues it. Returns True when a chunk was flushed."""
+        self.rows_read += 1
+        try:
+            if isinstance(raw_row, Exception):
+                raise raw_row
+            if not table:
+                raise ImportRowError('Row has no table; pass ?table= for single-table files')
+            row, source_id = map_row(table, raw_row)
+        except ImportRowError as e:
+            if len(self.errors) < 100:
+                self.errors.append(f"Row {self.rows_read}: {e}")
+            return False
+
+        if table == 'exercise_details':
+            if row['workout_log_id'] in self.skipped_workouts:
+                self.skipped_duplicates += 1
+                return False
+        else:
+            counts, ids = self._load_existing(table)
+            key = self._dedupe_key(table, row)
+            if counts[key] > 0:
+                counts[key] -= 1
+                self.skipped_duplicates += 1
+                if table == 'workout_logs' and source_id is not None:
+                    self.skipped_workouts.add(source_id)
+                    if ids.get(key):
+                        self.workout_id_map[source_id] = ids[key].pop(0)
+                return False
+            if self.min_date is None or row['date'] < self.min_date:
+                self.min_date = row['date']
+
+        row['user_id'] = self.user_id
+        self.buffers[table].append((source_id, row))
+        if len(self.buffers[table]) >= self.chunk_size:
+            self.flush(table)
+            return True
+        return False
+
+    def flush(self, table=None):
+        """Inserts buffered rows (all tables when `table` is None), parents before children."""
+        tables = TABLE_ORDER if table is None else (['workout_logs', table] if table == 'exercise_details' else [table])
+        for name in tables:
+            buffered = self.buffers[name]
+            if not buffered:
+                continue
+            self.buffers[name] = []
+
+            if name == 'exercise_details':
+                rows = []
+                for _, row in buffered:
+                    mapped_id = self.workout_id_map.get(row['workout_log_id'])
+                    if mapped_id is None:
+                        if len(self.errors) < 100:
+                            self.errors.append(f"Exercise '{row.get('exercise_name')}' references unknown workout {row['workout_log_id']}")
+                        continue
+                    rows.append({**row, 'workout_log_id': mapped_id})
+            else:
+                rows = [row for _, row in buffered]
+            if not rows:
+                continue
+
+            if name == 'workout_logs':
+                # Need the new ids back so exercise details can be re-pointed at them.
+                response = self.supabase.table(name).insert(rows).execute()
+                for (source_id, _), inserted in zip(buffered, response.data or []):
+                    if source_id is not None:
+                        self.workout_id_map[source_id] = inserted['id']
+            else:
+                self.supabase.table(name).insert(rows, returning=ReturnMethod.minimal).execute()
+            self.inserted[name] += len(rows)
+            self.touched_tables.add(name)
+
+    def progress(self, event='progress'):
+        return {
+            'event': event,
+            'rows_read': self.rows_read,
+            'inserted': dict(self.inserted),
+            'skipped_duplicates': self.skipped_duplicates,
+            'error_count': len(self.errors),
+        }
+
+
+def open_text_stream(file_storage):
+    """Wraps an uploaded file in a line-oriented text stream without reading it all into memory."""
+    return io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
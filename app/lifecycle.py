@@ -0,0 +1,182 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Worker lifecycle: warm-up before readiness, and draining of AI calls on shutdown.
+#
+#   warming  -> the worker is up (liveness passes) but /api/health/ready answers 503
+#               until warm-up has opened the Supabase (PostgREST + auth), direct
+#               Postgres and Gemini connections, loaded the food index and served
+#               one request.
+#   ready    -> readiness passes.
+#   draining -> SIGTERM received (see gunicorn.conf.py): readiness answers 503 again,
+#               new Gemini calls are refused with GeminiUnavailableError so routes take
+#               their existing fallbacks, and calls already in flight get
+#               DRAIN_TIMEOUT_SECONDS to finish before the worker exits.
+#
+# Warm-up runs in a background thread in each worker, so a slow dependency delays
+# readiness but never blocks the worker from answering liveness probes. Once
+# WARMUP_TIMEOUT_SECONDS has passed the worker turns ready anyway, and the failed
+# checks are reported in the readiness body.
+
+_condition = threading.Condition()
+_state = {'phase': 'warming', 'inflight_ai_calls': 0, 'warmup_seconds': None}
+_checks = {}  # name -> {'ok': bool, 'seconds' | 'error'}
+
+
+class WorkerDrainingError(Exception):
+    """Raised by ai_call() once the worker has started draining."""
+
+
+def readiness():
+    """(is_ready, body) for /api/health/ready."""
+    with _condition:
+        body = {'status': _state['phase'], 'inflight_ai_calls': _state['inflight_ai_calls'], 'checks': dict(_checks)}
+        if _state['warmup_seconds'] is not None:
+            body['warmup_seconds'] = _state['warmup_seconds']
+        return _state['phase'] == 'ready', body
+
+
+def is_draining():
+    return _state['phase'] == 'draining'
+
+
+@contextmanager
+def ai_call():
+    """Tracks one in-flight AI call; refuses to start new ones while draining."""
+    with _condition:
+        if _state['phase'] == 'draining':
+            raise WorkerDrainingError('Worker is shutting down')
+        _state['inflight_ai_calls'] += 1
+    try:
+        yield
+    finally:
+        with _condition:
+            _state['inflight_ai_calls'] -= 1
+            _condition.notify_all()
+
+
+def begin_drain():
+    """Stops new AI work. Safe to call from a signal handler; never blocks."""
+    if _state['phase'] != 'draining':
+        _state['phase'] = 'draining'  # Plain assignment; taking the lock here could deadlock the handler
+        print(f"INFO [lifecycle]: Draining, {_state['inflight_ai_calls']} AI call(s) in flight")
+
+
+def wait_for_drain(timeout):
+    """Blocks until in-flight AI calls finish or `timeout` passes. Returns how many were abandoned."""
+    deadline = time.monotonic() + timeout
+    with _condition:
+        while _state['inflight_ai_calls'] > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            _condition.wait(remaining)
+        abandoned = _state['inflight_ai_calls']
+    if abandoned:
+        print(f"Warning: Drain deadline of {timeout}s passed with {abandoned} AI call(s) still in flight")
+    else:
+        print("INFO [lifecycle]: Drained all in-flight AI calls")
+    return abandoned
+
+
+# --- warm-up ---------------------------------------------------------------
+
+def _warm_supabase(app, config):
+    from db import get_db_client
+    client = get_db_client()
+    client.table('profiles').select('id').limit(1).execute()
+    try:
+        # Auth has its own HTTP client; a bogus token still opens (and pools) its connection
+        client.auth.get_user('warm-up')
+    except Exception:
+        pass
+
+
+def _warm_postgres(app, config):
+    from direct_db import get_pool
+    pool = get_pool(config)
+    if pool is not None:
+        with pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute('select 1')
+
+
+def _warm_gemini(app, config):
+    from gemini_service import models
+    for tier_model in models.values():
+        tier_model.count_tokens('warm-up')  # Opens the API connection without paying for a generation
+
+
+def _warm_food_index(app, config):
+    from food_db import get_food_index
+    get_food_index(config)
+
+
+def _warm_request(app, config):
+    response = app.test_client().get('/api/health/live')
+    if response.status_code != 200:
+        raise Exception(f"Warm-up request returned {response.status_code}")
+
+
+WARMUP_STEPS = [
+    # (name, step, retried until the warm-up deadline)
+    ('supabase', _warm_supabase, True),
+    ('postgres', _warm_postgres, True),  # Direct read pool, when DIRECT_DB_READS is on
+    ('gemini', _warm_gemini, True),
+    ('food_index', _warm_food_index, False),
+    ('request', _warm_request, False),
+]
+
+
+def _run_warm_up(app, config):
+    started = time.monotonic()
+    deadline = started + config.WARMUP_TIMEOUT_SECONDS
+    for name, step, retry in WARMUP_STEPS:
+        if name == 'gemini' and not config.WARMUP_GEMINI:
+            continue
+        attempt = 0
+        while not is_draining():
+            step_started = time.monotonic()
+            try:
+                step(app, config)
+                result = {'ok': True, 'seconds': round(time.monotonic() - step_started, 3)}
+            except Exception as e:
+                result = {'ok': False, 'error': str(e)[:200]}
+            with _condition:
+                _checks[name] = result
+            if result['ok'] or not retry or time.monotonic() >= deadline:
+                if not result['ok']:
+                    print(f"Warning: Warm-up step '{name}' failed, continuing without it: {result['error']}")
+                break
+            attempt += 1
+            time.sleep(min(2 ** attempt * 0.25, 5, max(0.0, deadline - time.monotonic())))
+    with _condition:
+        if _state['phase'] != 'warming':
+            return  # Draining before warm-up finished
+        _state['phase'] = 'ready'
+        _state['warmup_seconds'] = round(time.monotonic() - started, 3)
+    print(f"INFO [lifecycle]: Worker ready after {_state['warmup_seconds']}s warm-up")
+
+
+def start_warm_up(app, config):
+    """Starts warm-up in the background once per worker; readiness flips when it completes."""
+    with _condition:
+        if _state.get('warm_up_started'):
+            return
+        _state['warm_up_started'] = True
+        if not config.WARMUP_ENABLED:
+            _state['phase'] = 'ready'
+            return
+    threading.Thread(target=_run_warm_up, args=(app, config), name='warm-up', daemon=True).start()
+
+
+def init_lifecycle(app, config):
+    """
+    Makes sure warm-up runs under any server: gunicorn.conf.py starts it as soon as a
+    worker boots, and otherwise the first request (usually a probe) does. CLI commands
+    never serve requests, so they never warm up.
+    """
+    @app.before_request
+    def _ensure_warm_up():
+        start_warm_up(app, config)
@@ -0,0 +1,273 @@
+import hashlib
+import random
+from datetime import date
+
+# Deterministic, template-driven workout and meal plans.
+#
+# Used as a zero-latency tier next to Gemini: plans are assembled from the same inputs
+# the prompts use (fitness level, goal, recent workout types, calorie ranges, recently
+# eaten proteins) and seeded per user and day, so the same request returns the same
+# plan all day and a fresh one tomorrow. Pure Python, no I/O.
+
+LEVEL_PARAMS = {
+    'beginner': {'sets': 2, 'strength_reps': '10-12', 'rest_seconds': 90, 'interval_seconds': 30, 'exercises': 4, 'duration': 30},
+    'intermediate': {'sets': 3, 'strength_reps': '8-10', 'rest_seconds': 75, 'interval_seconds': 40, 'exercises': 5, 'duration': 40},
+    'advanced': {'sets': 4, 'strength_reps': '6-8', 'rest_seconds': 60, 'interval_seconds': 45, 'exercises': 6, 'duration': 45},
+}
+
+EXERCISES = {
+    'strength': {
+        'beginner': ['Goblet Squat', 'Dumbbell Bench Press', 'Seated Cable Row', 'Glute Bridge', 'Dumbbell Shoulder Press', 'Lat Pulldown', 'Bodyweight Split Squat'],
+        'intermediate': ['Barbell Back Squat', 'Bench Press', 'Bent-Over Row', 'Romanian Deadlift', 'Overhead Press', 'Pull-Up (assisted if needed)', 'Walking Lunge'],
+        'advanced': ['Back Squat', 'Deadlift', 'Weighted Pull-Up', 'Incline Bench Press', 'Push Press', 'Bulgarian Split Squat', 'Pendlay Row'],
+    },
+    'cardio': {
+        'beginner': ['Brisk Walk or Easy Cycle', 'Step-Ups', 'Marching High Knees', 'Low-Impact Jumping Jacks', 'Rowing Machine (easy pace)'],
+        'intermediate': ['Jog or Steady Cycle', 'Rowing Machine Intervals', 'Jump Rope', 'Stair Climber', 'Shadow Boxing'],
+        'advanced': ['Tempo Run', 'Rowing Sprints', 'Assault Bike Intervals', 'Double-Unders', 'Hill Sprints'],
+    },
+    'hiit': {
+        'beginner': ['Squat to Reach', 'Incline Push-Ups', 'Fast Feet', 'Standing Mountain Climbers', 'Step Jacks'],
+        'intermediate': ['Jump Squats', 'Push-Ups', 'Mountain Climbers', 'Kettlebell Swings', 'Skater Hops'],
+        'advanced': ['Burpees', 'Tuck Jumps', 'Clap Push-Ups', 'Heavy Kettlebell Swings', 'Box Jumps'],
+    },
+    'functional': {
+        'beginner': ['Bodyweight Squat', 'Dead Bug', 'Farmer Carry', 'Bird Dog', 'Wall Push-Ups'],
+        'intermediate': ['Kettlebell Goblet Squat', 'Renegade Row', 'Suitcase Carry', 'Turkish Get-Up (light)', 'Plank Shoulder Taps'],
+        'advanced': ['Front Squat', 'Single-Arm Snatch', 'Sandbag Clean', 'Turkish Get-Up', 'Hanging Knee Raise'],
+    },
+}
+
+WARM_UPS = ['Arm circles', 'Leg swings', 'Hip openers', 'Bodyweight squats', 'Inchworms', 'Cat-cow', 'Light jog in place', 'Band pull-aparts']
+COOL_DOWNS = ['Hamstring stretch', 'Quad stretch', 'Child\'s pose', 'Chest doorway stretch', 'Hip flexor stretch', 'Deep breathing']
+
+TIPS = {
+    'strength': 'When you hit the top of the rep range on every set, add 2.5-5% load next session.',
+    'cardio': 'Keep most of the session conversational; add 5 minutes next time if it felt easy.',
+    'hiit': 'Quality over speed: stop a round early rather than letting form break down.',
+    'functional': 'Move slowly under control; these patterns carry over to everyday strength.',
+}
+
+
+def _seeded_rng(*parts):
+    """Stable across processes (unlike hash()), so every worker builds the same plan."""
+    digest = hashlib.sha256('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+
+def _normalize_level(fitness_level):
+    level = (fitness_level or 'beginner').lower()
+    return level if level in LEVEL_PARAMS else 'beginner'
+
+
+def choose_focus(primary_goal, recent_workouts):
+    """Goal-driven focus, rotated away from what the user did recently (same heuristic as the AI prompt)."""
+    goal = (primary_goal or '').lower()
+    if 'loss' in goal or 'lose' in goal or 'fat' in goal:
+        focus = 'hiit'
+    elif 'muscle' in goal or 'gain' in goal or 'strength' in goal:
+        focus = 'strength'
+    elif 'endurance' in goal or 'cardio' in goal:
+        focus = 'cardio'
+    else:
+        focus = 'functional'
+
+    recent_types = ' '.join((w.get('type') or '').lower() for w in recent_workouts or [])
+    if 'strength' in recent_types and focus == 'strength':
+        focus = 'hiit' if 'loss' in goal else 'functional'
+    elif 'cardio' in recent_types and focus in ('cardio', 'hiit'):
+        focus = 'strength' if 'endurance' not in goal else 'functional'
+    return focus
+
+
+def build_workout_plan(fitness_level, primary_goal, recent_workouts, seed_key=''):
+    """Returns a structured workout plan dict (warm_up, main, cool_down, ...)."""
+    level = _normalize_level(fitness_level)
+    params = LEVEL_PARAMS[level]
+    focus = choose_focus(primary_goal, recent_workouts)
+    rng = _seeded_rng(seed_key, date.today().isoformat(), level, focus)
+
+    picks = rng.sample(EXERCISES[focus][level], min(params['exercises'], len(EXERCISES[focus][level])))
+    main = []
+    for name in picks:
+        if focus == 'strength' or focus == 'functional':
+            main.append({'exercise': name, 'sets': params['sets'], 'reps': params['strength_reps'], 'rest_seconds': params['rest_seconds']})
+        else:
+            main.append({'exercise': name, 'sets': params['sets'] + 1, 'reps': f"{params['interval_seconds']}s work", 'rest_seconds': 60 - params['interval_seconds'] + 15})
+
+    return {
+        'title': f"{level.title()} {focus.upper() if focus == 'hiit' else focus.title()} Session",
+        'focus': focus,
+        'fitness_level': level,
+        'primary_goal': primary_goal,
+        'duration_minutes': params['duration'],
+        'warm_up': [{'exercise': name, 'duration_seconds': 60} for name in rng.sample(WARM_UPS, 4)],
+        'main': main,
+        'cool_down': [{'exercise': name, 'duration_seconds': 45} for name in rng.sample(COOL_DOWNS, 3)],
+        'tip': TIPS[focus],
+    }
+
+
+def render_workout_text(plan):
+    """Plain-text rendering in the same shape the AI recommendation uses."""
+    lines = [
+        f"💪 {plan['title']}",
+        f"A {plan['duration_minutes']}-minute {plan['focus']} session matched to your {plan['fitness_level']} level and your goal: {plan['primary_goal']}.",
+        "",
+        "🔥 Warm-up (5 minutes)",
+    ]
+    lines.extend(f"• {item['exercise']} - {item['duration_seconds']}s" for item in plan['warm_up'])
+    lines.extend(["", "🏋️ Main workout"])
+    lines.extend(f"• {item['exercise']}: {item['sets']} x {item['reps']}, rest {item['rest_seconds']}s" for item in plan['main'])
+    lines.extend(["", "🧘 Cool-down"])
+    lines.extend(f"• {item['exercise']} - {item['duration_seconds']}s" for item in plan['cool_down'])
+    lines.extend(["", f"💡 {plan['tip']}"])
+    return '\n'.join(lines)
+
+
+# --- meals -------------------------------------------------------------------
+
+# Per portion: (name, portion, kcal, protein_g, carbs_g, fat_g, tags)
+PROTEINS = [
+    ('chicken breast', '150 g', 248, 46, 0, 5, {'meat'}),
+    ('salmon fillet', '140 g', 290, 31, 0, 18, {'fish'}),
+    ('tuna (canned in water)', '120 g', 140, 31, 0, 1, {'fish'}),
+    ('lean beef mince', '130 g', 260, 34, 0, 13, {'meat'}),
+    ('eggs', '3 large', 215, 19, 1, 15, {'egg', 'vegetarian'}),
+    ('firm tofu', '200 g', 290, 31, 6, 17, {'soy', 'vegetarian', 'vegan'}),
+    ('greek yogurt', '250 g', 240, 25, 10, 10, {'dairy', 'vegetarian'}),
+    ('lentils (cooked)', '200 g', 230, 18, 40, 1, {'vegetarian', 'vegan'}),
+    ('chickpeas (cooked)', '200 g', 330, 18, 55, 5, {'vegetarian', 'vegan'}),
+    ('turkey breast', '150 g', 200, 44, 0, 2, {'meat'}),
+]
+CARBS = [
+    ('brown rice (cooked)', '150 g', 170, 4, 36, 1, {'vegan', 'vegetarian', 'gluten_free'}),
+    ('quinoa (cooked)', '150 g', 180, 7, 32, 3, {'vegan', 'vegetarian', 'gluten_free'}),
+    ('sweet potato', '200 g', 172, 3, 40, 0, {'vegan', 'vegetarian', 'gluten_free'}),
+    ('wholegrain bread', '2 slices', 160, 8, 28, 2, {'vegan', 'vegetarian', 'gluten'}),
+    ('rolled oats', '60 g', 225, 8, 40, 4, {'vegan', 'vegetarian'}),
+    ('wholewheat pasta (cooked)', '150 g', 190, 8, 38, 1, {'vegan', 'vegetarian', 'gluten'}),
+]
+VEGETABLES = ['broccoli', 'spinach', 'bell peppers', 'zucchini', 'green beans', 'cherry tomatoes', 'mixed salad leaves', 'carrots']
+FATS = [
+    ('avocado', '1/2', 120, 1, 6, 11, {'vegan', 'vegetarian'}),
+    ('olive oil', '1 tbsp', 120, 0, 0, 14, {'vegan', 'vegetarian'}),
+    ('almonds', '20 g', 115, 4, 4, 10, {'vegan', 'vegetarian', 'nuts'}),
+    ('feta cheese', '30 g', 80, 4, 1, 6, {'vegetarian', 'dairy'}),
+]
+
+ALLERGEN_TAGS = {
+    'nut': 'nuts', 'almond': 'nuts', 'peanut': 'nuts',
+    'dairy': 'dairy', 'lactose': 'dairy', 'milk': 'dairy',
+    'gluten': 'gluten', 'wheat': 'gluten', 'celiac': 'gluten', 'coeliac': 'gluten',
+    'egg': 'egg', 'fish': 'fish', 'seafood': 'fish', 'soy': 'soy',
+}
+
+CALORIE_RANGES = {
+    'breakfast': '300-500',
+    'lunch': '400-700',
+    'dinner': '400-600',
+    'snack': '100-300',
+}
+
+
+def _allowed(tags, diet_prefs, allergies):
+    diet = (diet_prefs or '').lower()
+    if 'vegan' in diet and 'vegan' not in tags:
+        return False
+    if 'vegetarian' in diet and not tags & {'vegetarian', 'vegan'}:
+        return False
+    if 'pescatarian' in diet and 'meat' in tags:
+        return False
+    allergy_text = (allergies or '').lower()
+    blocked = {tag for word, tag in ALLERGEN_TAGS.items() if word in allergy_text}
+    if 'gluten' in diet:
+        blocked.add('gluten')
+    return not tags & blocked
+
+
+def build_meal_plan(meal_type, primary_goal, diet_prefs, allergies, recent_proteins, seed_key=''):
+    """
+    Returns a structured meal plan dict (ingredients, steps, macros, ...), or None when no
+    protein in the catalogue is safe for the user's allergies.
+    """
+    meal_type = meal_type if meal_type in CALORIE_RANGES else 'lunch'
+    calorie_range = CALORIE_RANGES[meal_type]
+    low, high = (int(x) for x in calorie_range.split('-'))
+    goal = (primary_goal or '').lower()
+    target = low + (high - low) * (0.35 if 'loss' in goal else 0.75 if 'gain' in goal or 'muscle' in goal else 0.55)
+    rng = _seeded_rng(seed_key, date.today().isoformat(), meal_type)
+
+    recent = {p.lower() for p in recent_proteins or []}
+    # An unmatched diet falls back to the vegan proteins; allergies are never relaxed
+    proteins = [p for p in PROTEINS if _allowed(p[6], diet_prefs, allergies)] or [p for p in PROTEINS if 'vegan' in p[6] and _allowed(p[6], None, allergies)]
+    if not proteins:
+        return None
+    fresh = [p for p in proteins if not any(r in p[0] for r in recent)]
+    protein = rng.choice(fresh or proteins)
+    carbs = [c for c in CARBS if _allowed(c[6], diet_prefs, allergies)]
+    if meal_type == 'breakfast':
+        carbs = [c for c in carbs if c[0] in ('rolled oats', 'wholegrain bread', 'sweet potato')] or carbs
+    fats = [f for f in FATS if _allowed(f[6], diet_prefs, allergies)]
+    vegetables = rng.sample(VEGETABLES, 2)
+
+    components = [protein]
+    if meal_type != 'snack' and carbs:
+        components.append(rng.choice(carbs))
+    if fats:
+        components.append(rng.choice(fats))
+
+    base_kcal = sum(c[2] for c in components) + 50  # ~50 kcal of vegetables
+    scale = max(0.4, min(1.6, target / base_kcal))
+
+    def scaled(value):
+        return round(value * scale)
+
+    macros = {
+        'calories': scaled(base_kcal),
+        'protein_g': scaled(sum(c[3] for c in components) + 3),
+        'carbs_g': scaled(sum(c[4] for c in components) + 8),
+        'fat_g': scaled(sum(c[5] for c in components)),
+    }
+    ingredients = [{'item': c[0], 'quantity': c[1] if abs(scale - 1) < 0.1 else f"{c[1]} x{scale:.1f}"} for c in components]
+    ingredients.extend({'item': veg, 'quantity': '1 cup'} for veg in vegetables)
+
+    protein_name = protein[0].split(' (')[0]
+    steps = [
+        f"Prepare the {protein_name}: season simply and cook (pan, oven or air fryer) until done." if 'yogurt' not in protein_name else f"Spoon the {protein_name} into a bowl.",
+        f"Steam or sauté the {vegetables[0]} and {vegetables[1]} for 4-6 minutes.",
+    ]
+    if len(components) > 2 or (len(components) == 2 and components[1] in CARBS):
+        steps.append(f"Cook or warm the {components[1][0].split(' (')[0]} while the protein rests.")
+    steps.append("Plate everything together and finish with the healthy fat; season to taste.")
+
+    return {
+        'title': f"{protein_name.title()} {meal_type.title()} Bowl",
+        'meal_type': meal_type,
+        'calorie_range': calorie_range,
+        'ingredients': ingredients,
+        'steps': steps,
+        'macros': macros,
+        'tip': 'Batch-cook the protein and carbs for 2-3 days to make this a 5-minute meal.',
+    }
+
+
+def render_meal_text(plan):
+    """Plain-text rendering in the same shape the AI recommendation uses."""
+    macros = plan['macros']
+    lines = [
+        f"🍽️ {plan['title']}",
+        f"Built for a {plan['calorie_range']} kcal {plan['meal_type']} with a solid protein anchor.",
+        "",
+        "🛒 Ingredients",
+    ]
+    lines.extend(f"• {item['item']} - {item['quantity']}" for item in plan['ingredients'])
+    lines.extend(["", "👩‍🍳 Steps"])
+    lines.extend(f"{i}. {step}" for i, step in enumerate(plan['steps'], 1))
+    lines.extend([
+        "",
+        f"📊 Approx. nutrition: {macros['calories']} kcal, {macros['protein_g']} g protein, {macros['carbs_g']} g carbs, {macros['fat_g']} g fat",
+        "",
+        f"💡 {plan['tip']}",
+    ])
+    return '\n'.join(lines)
@@ -7,9 +7,31 @@ from routes.dashboard_routes import dashboard_bp
 from routes.recommend_routes import recommend_bp
 from routes.progress_routes import progress_bp
 from routes.chat_routes import chat_bp
+from routes.export_routes import export_bp
+from routes.import_routes import import_bp
+from routes.food_routes import food_bp
+from routes.admin_routes import admin_bp
+from routes.events_routes import events_bp
+from routes.sync_routes import sync_bp
 from db import get_db_client # To ensure it's initialized on startup
+from json_provider import FastJSONProvider
+from compression import init_compression
+from daily_summary import register_commands as register_daily_summary_commands
+from water_buffer import init_water_buffer
+from food_db import register_commands as register_food_db_commands
+from exercise_recency import register_commands as register_exercise_recency_commands
+from exercise_analytics import register_commands as register_exercise_stats_commands
+from migrate import register_commands as register_migrate_commands
+from cohort_analytics import register_commands as register_cohort_report_commands
+from change_log import register_commands as register_change_log_commands
+from lifecycle import readiness, init_lifecycle
+from profiler import init_profiler
+from deadlines import init_deadlines
+from admission import init_admission
+from events import init_events
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app) # orjson-backed when available, ISO dates and Decimal support
 app.config.from_object(Config)
 app.secret_key = Config.FLASK_SECRET_KEY # Important for session management if you use Flask sessions
 
@@ -21,9 +43,33 @@ except Exception as e:
     print(f"Failed to initialize Supabase client on startup: {e}")
 
 
+# Opt-in write-behind buffering for water logs
+try:
+    init_water_buffer(Config)
+except Exception as e:
+    print(f"Failed to start water write-behind buffer, falling back to direct inserts: {e}")
+
+# Per-user SSE streams of dashboard changes, fanned out between this host's workers
+init_events(Config)
+
+# Per-request tracing, slow-request log and on-demand profiles (registered first so it times the other hooks)
+init_profiler(app, Config)
+
+# Per-request deadlines for upstream calls; calls cut off by one answer 504
+init_deadlines(app, Config)
+
+# Per-worker admission control: sheds AI, then reads, with a 503 before log writes slow down
+init_admission(app, Config)
+
 # CORS Configuration
 CORS(app, resources={r"/api/*": {"origins": Config.CLIENT_ORIGIN_URL}}, supports_credentials=True)
 
+# Compress large responses (gzip/brotli) for clients that accept it
+init_compression(app)
+
+# Warm-up before readiness; SIGTERM draining is wired up in gunicorn.conf.py
+init_lifecycle(app, Config)
+
 # Register Blueprints
 app.register_blueprint(profile_bp, url_prefix='/api')
 app.register_blueprint(log_bp, url_prefix='/api') # /api/log/workout etc.
@@ -31,15 +77,38 @@ app.register_blueprint(dashboard_bp, url_prefix='/api') # /api/dashboard/summary
 app.register_blueprint(recommend_bp, url_prefix='/api') # /api/recommend/workout
 app.register_blueprint(progress_bp, url_prefix='/api') # /api/progress/weight
 app.register_blueprint(chat_bp, url_prefix='/api') # /api/chat/context-aware
+app.register_blueprint(export_bp, url_prefix='/api') # /api/export?format=ndjson|csv
+app.register_blueprint(import_bp, url_prefix='/api') # /api/import
+app.register_blueprint(food_bp, url_prefix='/api') # /api/foods/search?q=
+app.register_blueprint(admin_bp, url_prefix='/api') # /api/admin/profiles (X-Admin-Token)
+app.register_blueprint(events_bp, url_prefix='/api') # /api/events (Server-Sent Events)
+app.register_blueprint(sync_bp, url_prefix='/api') # /api/sync?since=<cursor>
+
+# CLI maintenance commands (flask migrate, rebuild-daily-summary, rebuild-exercise-recency, rebuild-exercise-stats, build-food-index, cohort-report, prune-change-log)
+register_migrate_commands(app)
+register_daily_summary_commands(app)
+register_exercise_recency_commands(app)
+register_exercise_stats_commands(app)
+register_food_db_commands(app)
+register_cohort_report_commands(app)
+register_change_log_commands(app)
 
 @app.route('/')
 def home():
     return "FitTrack AI Flask Backend is running!"
 
 @app.route('/api/health', methods=['GET'])
+@app.route('/api/health/live', methods=['GET'])
 def health_check():
+    # Liveness: the process is serving requests. Says nothing about its dependencies.
     return jsonify({"status": "healthy", "message": "API is up and running"}), 200
 
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    # Readiness: warmed up and not draining; route traffic here only when this is 200
+    ready, body = readiness()
+    return jsonify(body), 200 if ready else 503
+
 if __name__ == '__main__':
     # This is for local development only. Gunicorn is used in Docker for production.
     app.run(host='0.0.0.0', port=10000, debug=True)
\ No newline at end of file
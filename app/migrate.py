@@ -0,0 +1,190 @@
+import hashlib
+import os
+import re
+import click
+import psycopg2
+
+# Versioned SQL migrations in app/migrations, applied with `flask migrate`.
+#
+# Files are named NNNN_description.sql and applied in order. Each file runs in a single
+# transaction, unless its first line is `-- migrate:no-transaction` (needed for CREATE
+# INDEX CONCURRENTLY). Those are run statement by statement and must be written to be
+# re-runnable, since a failure can leave them half applied; an INVALID index left by a
+# failed concurrent build is dropped before its statement runs again.
+# Applied versions and their checksums are recorded in `app_schema_migrations`; editing
+# a file after it has been applied is reported rather than silently ignored.
+# Runs connect straight to Postgres (Config.DATABASE_URL), not through PostgREST, and
+# hold an advisory lock, so two deploys can't migrate at the same time.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATIONS_TABLE = 'app_schema_migrations'
+FILENAME_PATTERN = re.compile(r'^(\d{4})_([a-z0-9_]+)\.sql$')
+NO_TRANSACTION_MARKER = '-- migrate:no-transaction'
+CONCURRENT_INDEX_PATTERN = re.compile(r'^create\s+(?:unique\s+)?index\s+concurrently\s+if\s+not\s+exists\s+(\w+)', re.IGNORECASE)
+LOCK_KEY = 0x66697474  # pg_advisory_lock key shared by all runners
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, 'r', encoding='utf-8') as handle:
+            self.sql = handle.read()
+        self.checksum = hashlib.sha256(self.sql.encode('utf-8')).hexdigest()
+        self.transactional = not self.sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Migrations in `directory`, ordered by version."""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = FILENAME_PATTERN.match(filename)
+        if match:
+            migrations.append(Migration(match.group(1), match.group(2), os.path.join(directory, filename)))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise Exception(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def split_statements(sql):
+    """Splits a no-transaction migration into statements (one per `;` at the end of a line)."""
+    statements = []
+    for chunk in re.split(r';\s*$', sql, flags=re.MULTILINE):
+        lines = [line for line in chunk.splitlines() if line.strip() and not line.strip().startswith('--')]
+        if lines:
+            statements.append('\n'.join(lines))
+    return statements
+
+
+def _ensure_migrations_table(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            create table if not exists public.{MIGRATIONS_TABLE} (
+                version text primary key,
+                name text not null,
+                checksum text not null,
+                applied_at timestamptz not null default now()
+            )
+        """)
+
+
+def applied_migrations(connection):
+    """{version: checksum} of the migrations already applied."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"select version, checksum from public.{MIGRATIONS_TABLE}")
+        return dict(cursor.fetchall())
+
+
+def _drop_invalid_index(cursor, statement):
+    """
+    A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind, which `if not exists`
+    would then skip on the rerun. Drops it first, so the statement builds it again.
+    """
+    match = CONCURRENT_INDEX_PATTERN.match(statement.strip())
+    if not match:
+        return
+    cursor.execute(
+        "select i.indexrelid::regclass::text from pg_index i join pg_class c on c.oid = i.indexrelid"
+        " where c.relname = %s and not i.indisvalid",
+        (match.group(1).lower(),),
+    )
+    for (index_name,) in cursor.fetchall():
+        cursor.execute(f"drop index concurrently if exists {index_name}")
+
+
+def apply_migration(connection, migration):
+    if migration.transactional:
+        connection.autocommit = False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(migration.sql)
+                cursor.execute(f"insert into public.{MIGRATIONS_TABLE} (version, name, checksum) values (%s, %s, %s)",
+                               (migration.version, migration.name, migration.checksum))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.autocommit = True
+        return
+    with connection.cursor() as cursor:
+        for statement in split_statements(migration.sql):
+            _drop_invalid_index(cursor, statement)
+            cursor.execute(statement)
+        cursor.execute(f"insert into public.{MIGRATIONS_TABLE} (version, name, checksum) values (%s, %s, %s)",
+                       (migration.version, migration.name, migration.checksum))
+
+
+def migrate(database_url, target=None, dry_run=False, directory=MIGRATIONS_DIR, echo=print):
+    """
+    Applies pending migrations up to and including `target` (default: all). Returns the
+    versions applied (or, with dry_run, the ones that would be).
+    """
+    migrations = discover_migrations(directory)
+    connection = psycopg2.connect(database_url)
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("select pg_advisory_lock(%s)", (LOCK_KEY,))
+        _ensure_migrations_table(connection)
+        applied = applied_migrations(connection)
+        for migration in migrations:
+            if migration.version in applied and applied[migration.version] != migration.checksum:
+                echo(f"Warning: Migration {migration.version}_{migration.name} changed after it was applied; not re-running it.")
+
+        pending = [m for m in migrations if m.version not in applied and (target is None or m.version <= target)]
+        for migration in pending:
+            if dry_run:
+                echo(f"Would apply {migration.version}_{migration.name}")
+                continue
+            echo(f"Applying {migration.version}_{migration.name}...")
+            apply_migration(connection, migration)
+        return [m.version for m in pending]
+    finally:
+        connection.close()
+
+
+def migration_status(database_url, directory=MIGRATIONS_DIR):
+    """[(version, name, state)] where state is 'applied', 'pending' or 'changed'."""
+    connection = psycopg2.connect(database_url)
+    connection.autocommit = True
+    try:
+        _ensure_migrations_table(connection)
+        applied = applied_migrations(connection)
+    finally:
+        connection.close()
+    status = []
+    for migration in discover_migrations(directory):
+        if migration.version not in applied:
+            state = 'pending'
+        elif applied[migration.version] != migration.checksum:
+            state = 'changed'
+        else:
+            state = 'applied'
+        status.append((migration.version, migration.name, state))
+    return status
+
+
+def register_commands(app):
+    """Adds the `flask migrate` command."""
+
+    @app.cli.command('migrate')
+    @click.option('--target', default=None, help='Stop after this version (e.g. 0003).')
+    @click.option('--dry-run', is_flag=True, help='List pending migrations without applying them.')
+    @click.option('--status', 'show_status', is_flag=True, help='Show each migration as applied, pending or changed.')
+    def migrate_command(target, dry_run, show_status):
+        """Apply the SQL migrations in app/migrations to DATABASE_URL."""
+        database_url = app.config.get('DATABASE_URL')
+        if not database_url:
+            raise click.ClickException('DATABASE_URL is not set (Supabase: Project Settings > Database > Connection string).')
+        if show_status:
+            for version, name, state in migration_status(database_url):
+                click.echo(f"{version}_{name}: {state}")
+            return
+        applied = migrate(database_url, target=target, dry_run=dry_run, echo=click.echo)
+        if not applied:
+            click.echo('Database schema is up to date.')
+        elif not dry_run:
+            click.echo(f"Applied {len(applied)} migration(s).")
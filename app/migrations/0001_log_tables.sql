@@ -0,0 +1,91 @@
+-- Core tables: profiles and the per-user log tables.
+--
+-- `create ... if not exists` throughout, so this also applies cleanly to projects
+-- that created these tables by hand in the Supabase dashboard.
+-- Log ids are bigint identities: exports page by id (keyset) and exercise_details
+-- references workout_logs.id.
+
+create table if not exists public.profiles (
+    user_id uuid primary key references auth.users (id) on delete cascade,
+    primary_goal text,
+    fitness_level text,
+    date_of_birth date,
+    gender text,
+    height_cm numeric,
+    initial_weight_kg numeric,
+    target_weight_kg numeric,
+    activity_level text,
+    dietary_preferences text,
+    allergies_intolerances text,
+    weekly_workout_goal integer not null default 5,
+    daily_activity_goal integer not null default 3,
+    subscription_tier text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create table if not exists public.workout_logs (
+    id bigint generated by default as identity primary key,
+    user_id uuid not null references auth.users (id) on delete cascade,
+    date date not null default current_date,
+    type text,
+    duration_minutes integer,
+    calories_burned integer,
+    notes text,
+    created_at timestamptz not null default now()
+);
+
+create table if not exists public.exercise_details (
+    id bigint generated by default as identity primary key,
+    workout_log_id bigint not null references public.workout_logs (id) on delete cascade,
+    user_id uuid not null references auth.users (id) on delete cascade,
+    exercise_name text not null,
+    sets integer,
+    reps integer,
+    weight_kg numeric,
+    created_at timestamptz not null default now()
+);
+
+create table if not exists public.nutrition_logs (
+    id bigint generated by default as identity primary key,
+    user_id uuid not null references auth.users (id) on delete cascade,
+    date date not null default current_date,
+    meal_type text,
+    food_item_description text,
+    calories numeric,
+    protein_g numeric,
+    carbs_g numeric,
+    fat_g numeric,
+    created_at timestamptz not null default now()
+);
+
+create table if not exists public.weight_tracker (
+    id bigint generated by default as identity primary key,
+    user_id uuid not null references auth.users (id) on delete cascade,
+    date date not null default current_date,
+    weight_kg numeric not null,
+    created_at timestamptz not null default now()
+);
+
+create table if not exists public.water_intake_logs (
+    id bigint generated by default as identity primary key,
+    user_id uuid not null references auth.users (id) on delete cascade,
+    date date not null default current_date,
+    amount_ml integer not null,
+    created_at timestamptz not null default now()
+);
+
+-- The backend uses the service role, which bypasses RLS; these policies only matter
+-- for clients talking to Supabase directly with a user's JWT.
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['profiles', 'workout_logs', 'exercise_details', 'nutrition_logs', 'weight_tracker', 'water_intake_logs'] loop
+        execute format('alter table public.%I enable row level security', t);
+        if not exists (select 1 from pg_policies where schemaname = 'public' and tablename = t and policyname = 'owner access') then
+            execute format('create policy "owner access" on public.%I using (auth.uid() = user_id) with check (auth.uid() = user_id)', t);
+        end if;
+    end loop;
+end
+$$;
@@ -0,0 +1,90 @@
+-- Tables maintained by the backend itself (see the module named next to each).
+-- All are keyed by user first, so every lookup is a primary-key range scan.
+
+-- data_versions.py: per-user, per-table versions behind the ETags
+create table if not exists public.user_data_versions (
+    user_id uuid not null references auth.users (id) on delete cascade,
+    table_name text not null,
+    version bigint not null,
+    primary key (user_id, table_name)
+);
+
+-- daily_summary.py: per-user daily rollup of the log tables
+create table if not exists public.daily_summary (
+    user_id uuid not null references auth.users (id) on delete cascade,
+    date date not null,
+    calories numeric not null default 0,
+    protein_g numeric not null default 0,
+    carbs_g numeric not null default 0,
+    fat_g numeric not null default 0,
+    nutrition_log_count integer not null default 0,
+    water_ml bigint not null default 0,
+    water_log_count integer not null default 0,
+    workout_count integer not null default 0,
+    workout_minutes bigint not null default 0,
+    calories_burned bigint not null default 0,
+    weight_kg numeric,
+    primary key (user_id, date)
+);
+
+-- ai_results.py: last good AI result per kind, served as stale while Gemini is down
+create table if not exists public.ai_last_results (
+    user_id uuid not null references auth.users (id) on delete cascade,
+    kind text not null,
+    payload jsonb not null,
+    generated_at timestamptz not null default now(),
+    primary key (user_id, kind)
+);
+
+-- exercise_recency.py: the exercises each user actually does
+create table if not exists public.exercise_recency (
+    user_id uuid not null references auth.users (id) on delete cascade,
+    exercise_key text not null,
+    exercise_name text not null,
+    use_count integer not null default 0,
+    last_used_date date,
+    last_workout_log_id bigint,
+    last_sets integer,
+    last_reps integer,
+    last_weight_kg numeric,
+    best_weight_kg numeric,
+    updated_at timestamptz not null default now(),
+    primary key (user_id, exercise_key)
+);
+
+-- The two exercise_recency.SORTS orders
+create index if not exists exercise_recency_recent_idx
+    on public.exercise_recency (user_id, last_used_date desc, use_count desc);
+create index if not exists exercise_recency_frequent_idx
+    on public.exercise_recency (user_id, use_count desc, last_used_date desc);
+
+-- exercise_analytics.py: weekly per-exercise volume and strength stats
+create table if not exists public.exercise_weekly_stats (
+    user_id uuid not null references auth.users (id) on delete cascade,
+    exercise_key text not null,
+    week_start date not null,
+    exercise_name text not null,
+    sessions integer not null default 0,
+    total_sets numeric not null default 0,
+    total_reps numeric not null default 0,
+    tonnage_kg numeric not null default 0,
+    best_weight_kg numeric,
+    best_e1rm_kg numeric,
+    best_set_weight_kg numeric,
+    best_set_reps integer,
+    updated_at timestamptz not null default now(),
+    primary key (user_id, exercise_key, week_start)
+);
+
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['user_data_versions', 'daily_summary', 'ai_last_results', 'exercise_recency', 'exercise_weekly_stats'] loop
+        execute format('alter table public.%I enable row level security', t);
+        if not exists (select 1 from pg_policies where schemaname = 'public' and tablename = t and policyname = 'owner read') then
+            execute format('create policy "owner read" on public.%I for select using (auth.uid() = user_id)', t);
+        end if;
+    end loop;
+end
+$$;
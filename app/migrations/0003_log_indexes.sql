@@ -0,0 +1,42 @@
+-- migrate:no-transaction
+-- Composite and covering indexes for the hot log-table queries. Built CONCURRENTLY so
+-- they can be added to a live database without blocking writes, which cannot run
+-- inside a transaction (hence the marker above).
+--
+-- (user_id, date desc, <tiebreak> desc) serves every "this user's rows, newest/oldest
+-- first" listing, the progress date ranges and the (user_id, date) lookups that
+-- refresh_daily_summary runs on each write. The INCLUDE columns are exactly what those
+-- refreshes and the dashboard read, so they are index-only scans and never touch the heap.
+-- (user_id, id) serves the export's keyset paging (id > last seen id order by id).
+
+create index concurrently if not exists workout_logs_user_date_idx
+    on public.workout_logs (user_id, date desc, id desc)
+    include (duration_minutes, calories_burned);
+create index concurrently if not exists workout_logs_user_id_idx
+    on public.workout_logs (user_id, id);
+
+-- Foreign keys aren't indexed automatically; without this every workout_logs ->
+-- exercise_details embed is a sequential scan of exercise_details.
+create index concurrently if not exists exercise_details_workout_log_idx
+    on public.exercise_details (workout_log_id);
+create index concurrently if not exists exercise_details_user_id_idx
+    on public.exercise_details (user_id, id);
+
+create index concurrently if not exists nutrition_logs_user_date_idx
+    on public.nutrition_logs (user_id, date desc, id desc)
+    include (calories, protein_g, carbs_g, fat_g);
+create index concurrently if not exists nutrition_logs_user_id_idx
+    on public.nutrition_logs (user_id, id);
+
+-- created_at orders weigh-ins within a day (the daily summary keeps the last one)
+create index concurrently if not exists weight_tracker_user_date_idx
+    on public.weight_tracker (user_id, date desc, created_at desc)
+    include (weight_kg);
+create index concurrently if not exists weight_tracker_user_id_idx
+    on public.weight_tracker (user_id, id);
+
+create index concurrently if not exists water_intake_logs_user_date_idx
+    on public.water_intake_logs (user_id, date desc, created_at desc)
+    include (amount_ml);
+create index concurrently if not exists water_intake_logs_user_id_idx
+    on public.water_intake_logs (user_id, id);
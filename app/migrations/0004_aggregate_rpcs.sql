@@ -0,0 +1,89 @@
+-- Aggregate functions, called through PostgREST rpc() (see db.call_rpc).
+-- They're SECURITY INVOKER (the default), so callers using a user's JWT stay
+-- restricted by RLS. The backend's service role sees every row.
+-- plpgsql rather than sql: plpgsql caches its query plans per connection. A sql
+-- function with SET search_path is re-planned on every call, which made these
+-- about 4x slower than the separate queries they replace.
+
+-- Everything daily_summary holds for one user and day, from the raw logs.
+-- With the 0003 covering indexes, each subquery is an index-only scan.
+create or replace function public.daily_log_totals(p_user_id uuid, p_date date)
+returns table (
+    calories numeric, protein_g numeric, carbs_g numeric, fat_g numeric, nutrition_log_count integer,
+    water_ml bigint, water_log_count integer,
+    workout_count integer, workout_minutes bigint, calories_burned bigint,
+    weight_kg numeric
+)
+language plpgsql stable
+set search_path = public
+as $$
+begin
+    return query
+    select n.calories, n.protein_g, n.carbs_g, n.fat_g, n.nutrition_log_count,
+           w.water_ml, w.water_log_count,
+           k.workout_count, k.workout_minutes, k.calories_burned,
+           (select wt.weight_kg from public.weight_tracker wt
+             where wt.user_id = p_user_id and wt.date = p_date
+             order by wt.created_at desc limit 1)
+    from (select coalesce(sum(nl.calories), 0) as calories, coalesce(sum(nl.protein_g), 0) as protein_g,
+                 coalesce(sum(nl.carbs_g), 0) as carbs_g, coalesce(sum(nl.fat_g), 0) as fat_g,
+                 count(*)::integer as nutrition_log_count
+            from public.nutrition_logs nl where nl.user_id = p_user_id and nl.date = p_date) n,
+         (select coalesce(sum(wl.amount_ml), 0)::bigint as water_ml, count(*)::integer as water_log_count
+            from public.water_intake_logs wl where wl.user_id = p_user_id and wl.date = p_date) w,
+         (select count(*)::integer as workout_count, coalesce(sum(wo.duration_minutes), 0)::bigint as workout_minutes,
+                 coalesce(sum(wo.calories_burned), 0)::bigint as calories_burned
+            from public.workout_logs wo where wo.user_id = p_user_id and wo.date = p_date) k;
+end
+$$;
+
+-- daily_summary.refresh_daily_summary in one round trip instead of a read and an upsert.
+-- Only the columns fed by p_sources ('nutrition', 'water', 'workout', 'weight') change on
+-- an existing row, so concurrent writes to different log tables never overwrite each other.
+create or replace function public.refresh_daily_summary(p_user_id uuid, p_date date, p_sources text[])
+returns public.daily_summary
+language plpgsql volatile
+set search_path = public
+as $$
+declare
+    result public.daily_summary;
+begin
+    insert into public.daily_summary as s (
+        user_id, date, calories, protein_g, carbs_g, fat_g, nutrition_log_count,
+        water_ml, water_log_count, workout_count, workout_minutes, calories_burned, weight_kg
+    )
+    select p_user_id, p_date, t.calories, t.protein_g, t.carbs_g, t.fat_g, t.nutrition_log_count,
+           t.water_ml, t.water_log_count, t.workout_count, t.workout_minutes, t.calories_burned, t.weight_kg
+    from public.daily_log_totals(p_user_id, p_date) t
+    on conflict (user_id, date) do update set
+        calories = case when 'nutrition' = any(p_sources) then excluded.calories else s.calories end,
+        protein_g = case when 'nutrition' = any(p_sources) then excluded.protein_g else s.protein_g end,
+        carbs_g = case when 'nutrition' = any(p_sources) then excluded.carbs_g else s.carbs_g end,
+        fat_g = case when 'nutrition' = any(p_sources) then excluded.fat_g else s.fat_g end,
+        nutrition_log_count = case when 'nutrition' = any(p_sources) then excluded.nutrition_log_count else s.nutrition_log_count end,
+        water_ml = case when 'water' = any(p_sources) then excluded.water_ml else s.water_ml end,
+        water_log_count = case when 'water' = any(p_sources) then excluded.water_log_count else s.water_log_count end,
+        workout_count = case when 'workout' = any(p_sources) then excluded.workout_count else s.workout_count end,
+        workout_minutes = case when 'workout' = any(p_sources) then excluded.workout_minutes else s.workout_minutes end,
+        calories_burned = case when 'workout' = any(p_sources) then excluded.calories_burned else s.calories_burned end,
+        weight_kg = case when 'weight' = any(p_sources) then excluded.weight_kg else s.weight_kg end
+    returning s.* into result;
+    return result;
+end
+$$;
+
+-- The dashboard's two remaining raw-table reads (total workouts, latest weigh-in) in
+-- one round trip; both are index-only scans.
+create or replace function public.dashboard_totals(p_user_id uuid)
+returns table (total_workouts bigint, current_weight_kg numeric)
+language plpgsql stable
+set search_path = public
+as $$
+begin
+    return query
+    select (select count(*) from public.workout_logs wo where wo.user_id = p_user_id),
+           (select wt.weight_kg from public.weight_tracker wt
+             where wt.user_id = p_user_id
+             order by wt.date desc, wt.created_at desc limit 1);
+end
+$$;
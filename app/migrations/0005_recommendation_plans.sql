@@ -0,0 +1,28 @@
+-- plans.py: structured workout and meal plans (GET /recommend/*?format=structured).
+-- `plan` holds the parsed plan, `context` the profile inputs it was generated from,
+-- so one block or ingredient can be regenerated later without re-reading the profile.
+-- `version` is bumped on every partial regeneration and checked on update.
+create table if not exists public.recommendation_plans (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null references auth.users (id) on delete cascade,
+    kind text not null check (kind in ('workout', 'meal')),
+    engine text not null,
+    plan jsonb not null,
+    context jsonb not null default '{}',
+    version integer not null default 1,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+-- plans.list_plans and plans.latest_plan: a user's newest plans, optionally of one kind
+create index if not exists recommendation_plans_user_kind_idx
+    on public.recommendation_plans (user_id, kind, created_at desc);
+
+alter table public.recommendation_plans enable row level security;
+do $$
+begin
+    if not exists (select 1 from pg_policies where schemaname = 'public' and tablename = 'recommendation_plans' and policyname = 'owner read') then
+        create policy "owner read" on public.recommendation_plans for select using (auth.uid() = user_id);
+    end if;
+end
+$$;
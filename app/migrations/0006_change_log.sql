@@ -0,0 +1,166 @@
+-- Change log behind GET /api/sync (change_log.py).
+--
+-- Statement-level triggers on profiles and the log tables record which rows every
+-- insert, update and delete touched, tagged with the writing transaction's id (xid8).
+-- Rows aren't copied: sync_changes() reads each touched row's current state, so a row
+-- edited ten times since the cursor is sent once, and a row that no longer exists is
+-- reported as deleted (log ids are identities and never reused).
+--
+-- The cursor is the xmin of the snapshot sync_changes() reads with. Every transaction
+-- below it has finished, so no change can commit behind a cursor a client already
+-- holds. Changes from transactions at or above it are sent on the next sync, possibly
+-- a second time. A long-running transaction anywhere in the database holds the cursor
+-- back: clients see changes later, never lose them.
+
+create table if not exists public.change_log (
+    id bigint generated always as identity primary key,
+    user_id uuid not null, -- No foreign key: a deleted user's cascaded row deletes log here in the same statement
+    table_name text not null,
+    row_id bigint, -- null for profiles, which are keyed by user_id
+    xact xid8 not null default pg_current_xact_id(),
+    changed_at timestamptz not null default now()
+);
+
+-- sync_changes: one user's entries per table since a cursor
+create index if not exists change_log_user_table_xact_idx
+    on public.change_log (user_id, table_name, xact);
+-- prune_change_log
+create index if not exists change_log_changed_at_idx
+    on public.change_log (changed_at);
+
+-- One row: the newest transaction prune_change_log has removed entries of. A cursor at
+-- or below it may have missed changes, so sync_changes answers it with a full snapshot.
+create table if not exists public.change_log_horizon (
+    id boolean primary key default true check (id),
+    pruned_through xid8 not null
+);
+
+-- No policies: only the service role and the triggers (security definer) use these
+alter table public.change_log enable row level security;
+alter table public.change_log_horizon enable row level security;
+
+create or replace function public.log_row_changes()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op = 'DELETE' then
+        insert into public.change_log (user_id, table_name, row_id)
+        select o.user_id, tg_table_name, o.id from old_rows o;
+    else
+        insert into public.change_log (user_id, table_name, row_id)
+        select n.user_id, tg_table_name, n.id from new_rows n;
+    end if;
+    return null;
+end
+$$;
+
+create or replace function public.log_profile_changes()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op = 'DELETE' then
+        insert into public.change_log (user_id, table_name)
+        select o.user_id, tg_table_name from old_rows o;
+    else
+        insert into public.change_log (user_id, table_name)
+        select n.user_id, tg_table_name from new_rows n;
+    end if;
+    return null;
+end
+$$;
+
+-- One trigger per event: Postgres only allows transition tables on single-event triggers.
+-- Statement-level, so a 1000-row import chunk logs with one insert.
+do $$
+declare
+    t text;
+    fn text;
+begin
+    foreach t in array array['profiles', 'workout_logs', 'exercise_details', 'nutrition_logs', 'weight_tracker', 'water_intake_logs'] loop
+        fn := case when t = 'profiles' then 'log_profile_changes' else 'log_row_changes' end;
+        execute format('drop trigger if exists %I on public.%I', t || '_log_insert', t);
+        execute format('create trigger %I after insert on public.%I referencing new table as new_rows for each statement execute function public.%I()', t || '_log_insert', t, fn);
+        execute format('drop trigger if exists %I on public.%I', t || '_log_update', t);
+        execute format('create trigger %I after update on public.%I referencing new table as new_rows for each statement execute function public.%I()', t || '_log_update', t, fn);
+        execute format('drop trigger if exists %I on public.%I', t || '_log_delete', t);
+        execute format('create trigger %I after delete on public.%I referencing old table as old_rows for each statement execute function public.%I()', t || '_log_delete', t, fn);
+    end loop;
+end
+$$;
+
+-- Everything that changed for a user since p_since (a cursor from an earlier call), as
+--   {"cursor": "...", "reset": false, "tables": {"<table>": {"upserts": [rows], "deletes": [ids]}}}
+-- with only the tables that changed. Without a usable cursor (none, pruned past, or from
+-- another database) it returns every table in full with "reset": true, and the client
+-- replaces its cache. STABLE, so every statement reads the snapshot the cursor comes from.
+-- Tables are read with EXECUTE; sync runs once per app launch, so the re-planning is cheap.
+create or replace function public.sync_changes(p_user_id uuid, p_since text default null)
+returns jsonb
+language plpgsql stable
+set search_path = public
+as $$
+declare
+    v_upto xid8 := pg_snapshot_xmin(pg_current_snapshot());
+    v_since xid8 := p_since::xid8;
+    v_reset boolean;
+    v_tables jsonb := '{}';
+    v_table jsonb;
+    t text;
+    v_match text;
+begin
+    v_reset := v_since is null
+        or v_since > v_upto
+        or v_since <= coalesce((select h.pruned_through from public.change_log_horizon h), '0'::xid8);
+    foreach t in array array['profiles', 'workout_logs', 'exercise_details', 'nutrition_logs', 'weight_tracker', 'water_intake_logs'] loop
+        v_match := case when t = 'profiles' then 'r.user_id = $1' else 'r.id = c.row_id and r.user_id = $1' end;
+        if v_reset then
+            execute format($q$
+                select jsonb_build_object('upserts', coalesce(jsonb_agg(to_jsonb(r)), '[]'), 'deletes', '[]'::jsonb)
+                from public.%I r where r.user_id = $1
+            $q$, t) into v_table using p_user_id;
+        else
+            execute format($q$
+                select jsonb_build_object(
+                    'upserts', coalesce(jsonb_agg(to_jsonb(r)) filter (where r.user_id is not null), '[]'),
+                    'deletes', coalesce(jsonb_agg(c.row_id) filter (where r.user_id is null), '[]'))
+                from (select distinct l.row_id from public.change_log l
+                      where l.user_id = $1 and l.table_name = %L and l.xact >= $2 and l.xact < $3) c
+                left join public.%I r on %s
+                having count(*) > 0
+            $q$, t, t, v_match) into v_table using p_user_id, v_since, v_upto;
+        end if;
+        if v_table is not null then
+            v_tables := v_tables || jsonb_build_object(t, v_table);
+        end if;
+    end loop;
+    return jsonb_build_object('cursor', v_upto::text, 'reset', v_reset, 'tables', v_tables);
+end
+$$;
+
+-- Deletes entries older than p_older_than and moves the horizon past them.
+create or replace function public.prune_change_log(p_older_than interval)
+returns bigint
+language plpgsql volatile
+set search_path = public
+as $$
+declare
+    v_removed bigint;
+    v_through xid8;
+begin
+    with removed as (
+        delete from public.change_log where changed_at < now() - p_older_than returning xact
+    )
+    select count(*), max(xact) into v_removed, v_through from removed;
+    if v_removed > 0 then
+        insert into public.change_log_horizon (id, pruned_through) values (true, v_through)
+        on conflict (id) do update set pruned_through = greatest(change_log_horizon.pruned_through, excluded.pruned_through);
+    end if;
+    return v_removed;
+end
+$$;
@@ -0,0 +1,39 @@
+-- refresh_daily_summary (0004) recomputed the day's totals from the snapshot its statement
+-- started with. Two refreshes for the same user and day could overlap, and the one that
+-- started first (missing the other's log row) could commit last and leave stale totals.
+-- Refreshes of one (user, day) now take a transaction-level advisory lock first; the
+-- upsert after it runs with a fresh snapshot, so whichever refresh writes last has seen
+-- every log row committed before it was called.
+create or replace function public.refresh_daily_summary(p_user_id uuid, p_date date, p_sources text[])
+returns public.daily_summary
+language plpgsql volatile
+set search_path = public
+as $$
+declare
+    result public.daily_summary;
+begin
+    perform pg_advisory_xact_lock(hashtextextended(p_user_id::text || '/' || p_date::text, 0));
+
+    insert into public.daily_summary as s (
+        user_id, date, calories, protein_g, carbs_g, fat_g, nutrition_log_count,
+        water_ml, water_log_count, workout_count, workout_minutes, calories_burned, weight_kg
+    )
+    select p_user_id, p_date, t.calories, t.protein_g, t.carbs_g, t.fat_g, t.nutrition_log_count,
+           t.water_ml, t.water_log_count, t.workout_count, t.workout_minutes, t.calories_burned, t.weight_kg
+    from public.daily_log_totals(p_user_id, p_date) t
+    on conflict (user_id, date) do update set
+        calories = case when 'nutrition' = any(p_sources) then excluded.calories else s.calories end,
+        protein_g = case when 'nutrition' = any(p_sources) then excluded.protein_g else s.protein_g end,
+        carbs_g = case when 'nutrition' = any(p_sources) then excluded.carbs_g else s.carbs_g end,
+        fat_g = case when 'nutrition' = any(p_sources) then excluded.fat_g else s.fat_g end,
+        nutrition_log_count = case when 'nutrition' = any(p_sources) then excluded.nutrition_log_count else s.nutrition_log_count end,
+        water_ml = case when 'water' = any(p_sources) then excluded.water_ml else s.water_ml end,
+        water_log_count = case when 'water' = any(p_sources) then excluded.water_log_count else s.water_log_count end,
+        workout_count = case when 'workout' = any(p_sources) then excluded.workout_count else s.workout_count end,
+        workout_minutes = case when 'workout' = any(p_sources) then excluded.workout_minutes else s.workout_minutes end,
+        calories_burned = case when 'workout' = any(p_sources) then excluded.calories_burned else s.calories_burned end,
+        weight_kg = case when 'weight' = any(p_sources) then excluded.weight_kg else s.weight_kg end
+    returning s.* into result;
+    return result;
+end
+$$;
@@ -0,0 +1,480 @@
+import copy
+import json
+import re
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from db import get_db_client
+
+# Structured workout and meal plans.
+#
+# With ?format=structured, /recommend/workout and /recommend/meal ask Gemini for JSON
+# that matches WORKOUT_SCHEMA or MEAL_SCHEMA instead of free text. The reply is parsed
+# into the typed plans below and stored in `recommendation_plans` (migration 0005)
+# along with the profile inputs it was generated from:
+#   id uuid, user_id uuid, kind 'workout' | 'meal', engine text, plan jsonb,
+#   context jsonb, version integer, created_at, updated_at
+#
+# To swap one block, one day or one ingredient, the client posts a target path to
+# /recommend/plans/<id>/regenerate. Only that part is generated, against its own
+# schema (resolve_part), so the output is a fraction of a full plan. The stored plan
+# and the context go into the prompt, so the new part fits the rest of the plan.
+# Each regeneration bumps `version`. An update only applies if the version hasn't
+# moved since the plan was read; otherwise it raises PlanConflictError.
+#
+# Workout targets:  days/<d>   days/<d>/warm_up   days/<d>/cool_down   days/<d>/blocks/<b>
+# Meal targets:     ingredients/<i>   steps
+
+PLANS_TABLE = 'recommendation_plans'
+PLAN_KINDS = ('workout', 'meal')
+MAX_PLAN_DAYS = 7
+MAX_INSTRUCTIONS_LENGTH = 300
+PLAN_COLUMNS = 'id, kind, engine, plan, context, version, created_at, updated_at'
+
+
+class PlanFormatError(Exception):
+    """Generated JSON that doesn't describe a valid plan or part."""
+
+
+class PlanConflictError(Exception):
+    """The plan changed (another regeneration) since it was read."""
+
+
+# --- typed plans -------------------------------------------------------------
+
+def _text(data, key, required=True, limit=1000):
+    value = data.get(key) if isinstance(data, dict) else None
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise PlanFormatError(f"Missing '{key}'")
+        return ''
+    if isinstance(value, (dict, list)):
+        raise PlanFormatError(f"'{key}' must be text")
+    return str(value).strip()[:limit]
+
+
+def _number(data, key, low, high, integer=True):
+    value = data.get(key) if isinstance(data, dict) else None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise PlanFormatError(f"'{key}' must be a number")
+    if not low <= number <= high:
+        raise PlanFormatError(f"'{key}' must be between {low} and {high}")
+    return int(round(number)) if integer else round(number, 1)
+
+
+def _items(data, key, parse, low=1, high=30):
+    values = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(values, list) or not low <= len(values) <= high:
+        raise PlanFormatError(f"'{key}' must be a list of {low}-{high} items")
+    return [parse(value) for value in values]
+
+
+@dataclass
+class TimedExercise:
+    exercise: str
+    duration_seconds: int
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(_text(data, 'exercise', limit=120), _number(data, 'duration_seconds', 5, 1800))
+
+
+@dataclass
+class SetExercise:
+    exercise: str
+    sets: int
+    reps: str  # '8-10', '12' or '40s work'
+    rest_seconds: int
+    notes: str = ''
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            _text(data, 'exercise', limit=120),
+            _number(data, 'sets', 1, 12),
+            _text(data, 'reps', limit=40),
+            _number(data, 'rest_seconds', 0, 600),
+            _text(data, 'notes', required=False, limit=300),
+        )
+
+
+@dataclass
+class Block:
+    name: str
+    exercises: list  # [SetExercise]
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(_text(data, 'name', limit=120), _items(data, 'exercises', SetExercise.from_dict, high=12))
+
+
+@dataclass
+class WorkoutDay:
+    name: str
+    focus: str
+    duration_minutes: int
+    warm_up: list    # [TimedExercise]
+    blocks: list     # [Block]
+    cool_down: list  # [TimedExercise]
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            _text(data, 'name', limit=120),
+            _text(data, 'focus', limit=60),
+            _number(data, 'duration_minutes', 5, 240),
+            _items(data, 'warm_up', TimedExercise.from_dict, high=10),
+            _items(data, 'blocks', Block.from_dict, high=8),
+            _items(data, 'cool_down', TimedExercise.from_dict, high=10),
+        )
+
+
+@dataclass
+class WorkoutPlan:
+    title: str
+    summary: str
+    days: list  # [WorkoutDay]
+    tip: str = ''
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            _text(data, 'title', limit=200),
+            _text(data, 'summary', required=False),
+            _items(data, 'days', WorkoutDay.from_dict, high=MAX_PLAN_DAYS),
+            _text(data, 'tip', required=False),
+        )
+
+
+@dataclass
+class Ingredient:
+    item: str
+    quantity: str
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(_text(data, 'item', limit=120), _text(data, 'quantity', limit=60))
+
+
+@dataclass
+class Macros:
+    calories: int
+    protein_g: float
+    carbs_g: float
+    fat_g: float
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            _number(data, 'calories', 0, 5000),
+            _number(data, 'protein_g', 0, 500, integer=False),
+            _number(data, 'carbs_g', 0, 1000, integer=False),
+            _number(data, 'fat_g', 0, 500, integer=False),
+        )
+
+
+@dataclass
+class MealPlan:
+    title: str
+    summary: str
+    meal_type: str
+    ingredients: list  # [Ingredient]
+    steps: list        # [str]
+    macros: Macros
+    tip: str = ''
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            _text(data, 'title', limit=200),
+            _text(data, 'summary', required=False),
+            _text(data, 'meal_type', limit=30),
+            _items(data, 'ingredients', Ingredient.from_dict, high=25),
+            _items(data, 'steps', _step, high=20),
+            Macros.from_dict(data.get('macros') if isinstance(data, dict) else None),
+            _text(data, 'tip', required=False),
+        )
+
+
+def _step(value):
+    if not isinstance(value, str) or not value.strip():
+        raise PlanFormatError("Each step must be non-empty text")
+    return value.strip()[:500]
+
+
+PLAN_TYPES = {'workout': WorkoutPlan, 'meal': MealPlan}
+
+
+def parse_plan(kind, data):
+    """A WorkoutPlan or MealPlan from generated or stored JSON; raises PlanFormatError."""
+    return PLAN_TYPES[kind].from_dict(data)
+
+
+# --- Gemini response schemas (OpenAPI subset) ----------------------------------
+
+def _object(properties, optional=()):
+    return {'type': 'OBJECT', 'properties': properties, 'required': [key for key in properties if key not in optional]}
+
+
+def _array(items):
+    return {'type': 'ARRAY', 'items': items}
+
+
+STRING = {'type': 'STRING'}
+INTEGER = {'type': 'INTEGER'}
+NUMBER = {'type': 'NUMBER'}
+
+TIMED_EXERCISE_SCHEMA = _object({'exercise': STRING, 'duration_seconds': INTEGER})
+SET_EXERCISE_SCHEMA = _object({'exercise': STRING, 'sets': INTEGER, 'reps': STRING, 'rest_seconds': INTEGER, 'notes': STRING}, optional=('notes',))
+BLOCK_SCHEMA = _object({'name': STRING, 'exercises': _array(SET_EXERCISE_SCHEMA)})
+WORKOUT_DAY_SCHEMA = _object({
+    'name': STRING, 'focus': STRING, 'duration_minutes': INTEGER,
+    'warm_up': _array(TIMED_EXERCISE_SCHEMA), 'blocks': _array(BLOCK_SCHEMA), 'cool_down': _array(TIMED_EXERCISE_SCHEMA),
+})
+WORKOUT_SCHEMA = _object({'title': STRING, 'summary': STRING, 'days': _array(WORKOUT_DAY_SCHEMA), 'tip': STRING})
+
+INGREDIENT_SCHEMA = _object({'item': STRING, 'quantity': STRING})
+MACROS_SCHEMA = _object({'calories': INTEGER, 'protein_g': NUMBER, 'carbs_g': NUMBER, 'fat_g': NUMBER})
+MEAL_SCHEMA = _object({
+    'title': STRING, 'summary': STRING, 'meal_type': STRING,
+    'ingredients': _array(INGREDIENT_SCHEMA), 'steps': _array(STRING), 'macros': MACROS_SCHEMA, 'tip': STRING,
+})
+# Swapping an ingredient changes the steps and macros that mention it, so they come back too
+INGREDIENT_SWAP_SCHEMA = _object({'ingredient': INGREDIENT_SCHEMA, 'steps': _array(STRING), 'macros': MACROS_SCHEMA})
+STEPS_SCHEMA = _object({'steps': _array(STRING)})
+
+PLAN_SCHEMAS = {'workout': WORKOUT_SCHEMA, 'meal': MEAL_SCHEMA}
+
+
+# --- partial regeneration ------------------------------------------------------
+
+WORKOUT_TARGET = re.compile(r'^days/(\d+)(?:/(warm_up|cool_down)|/blocks/(\d+))?$')
+MEAL_TARGET = re.compile(r'^(?:ingredients/(\d+)|steps)$')
+
+
+class PlanPart:
+    """One regenerable part of a plan: its schema, its current value and how to put a new one in place."""
+
+    def __init__(self, target, description, schema, current, apply):
+        self.target = target
+        self.description = description
+        self.schema = schema
+        self.current = current
+        self.apply = apply  # (plan, generated dict) -> None, raises PlanFormatError
+
+
+def _index(value, items, label):
+    index = int(value)
+    if index >= len(items):
+        raise ValueError(f"{label} {index} does not exist (the plan has {len(items)})")
+    return index
+
+
+def resolve_part(kind, plan, target):
+    """The PlanPart a target path names; raises ValueError for unknown or out-of-range targets."""
+    if kind == 'workout':
+        match = WORKOUT_TARGET.match(target or '')
+        if not match:
+            raise ValueError("target must be days/<d>, days/<d>/warm_up, days/<d>/cool_down or days/<d>/blocks/<b>")
+        d = _index(match.group(1), plan.days, 'Day')
+        day = plan.days[d]
+        if match.group(2):
+            section = match.group(2)
+
+            def apply_section(plan, data):
+                setattr(plan.days[d], section, _items(data, section, TimedExercise.from_dict, high=10))
+            return PlanPart(target, f"{section.replace('_', '-')} for {day.name}", _object({section: _array(TIMED_EXERCISE_SCHEMA)}),
+                            {section: [asdict(item) for item in getattr(day, section)]}, apply_section)
+        if match.group(3) is not None:
+            b = _index(match.group(3), day.blocks, 'Block')
+
+            def apply_block(plan, data):
+                plan.days[d].blocks[b] = Block.from_dict(data)
+            return PlanPart(target, f"exercise block '{day.blocks[b].name}' of {day.name}", BLOCK_SCHEMA, asdict(day.blocks[b]), apply_block)
+
+        def apply_day(plan, data):
+            plan.days[d] = WorkoutDay.from_dict(data)
+        return PlanPart(target, f"workout day '{day.name}'", WORKOUT_DAY_SCHEMA, asdict(day), apply_day)
+
+    match = MEAL_TARGET.match(target or '')
+    if not match:
+        raise ValueError("target must be ingredients/<i> or steps")
+    if match.group(1) is not None:
+        i = _index(match.group(1), plan.ingredients, 'Ingredient')
+
+        def apply_ingredient(plan, data):
+            plan.ingredients[i] = Ingredient.from_dict(data.get('ingredient'))
+            plan.steps = _items(data, 'steps', _step, high=20)
+            plan.macros = Macros.from_dict(data.get('macros'))
+        return PlanPart(target, f"ingredient '{plan.ingredients[i].item}' (with the steps and macros updated to match)",
+                        INGREDIENT_SWAP_SCHEMA, asdict(plan.ingredients[i]), apply_ingredient)
+
+    def apply_steps(plan, data):
+        plan.steps = _items(data, 'steps', _step, high=20)
+    return PlanPart(target, 'preparation steps', STEPS_SCHEMA, {'steps': list(plan.steps)}, apply_steps)
+
+
+def apply_part(plan, part, data):
+    """A copy of `plan` with `part` replaced by the generated `data`."""
+    updated = copy.deepcopy(plan)
+    part.apply(updated, data)
+    return updated
+
+
+def part_prompt(kind, plan, context, part, instructions=''):
+    """Prompt for regenerating just `part`, with the rest of the plan for consistency."""
+    compact = lambda value: json.dumps(value, separators=(',', ':'), ensure_ascii=False)  # noqa: E731
+    if kind == 'workout':
+        # The whole plan would repeat every other day; their exercise names are enough to avoid duplicates
+        path = part.target.split('/')
+        d = int(path[1])
+        elsewhere = sorted({exercise.exercise for i, day in enumerate(plan.days) if i != d for block in day.blocks for exercise in block.exercises})
+        plan_context = []
+        if len(path) > 2:
+            day = asdict(plan.days[d])
+            if path[2] == 'blocks':
+                day['blocks'][int(path[3])] = 'PART TO REPLACE'
+            else:
+                day[path[2]] = 'PART TO REPLACE'
+            plan_context.append(f"THE DAY BEING EDITED: {compact(day)}")
+        if elsewhere:
+            plan_context.append(f"EXERCISES ON OTHER DAYS (avoid repeating them): {', '.join(elsewhere)}")
+    else:
+        plan_context = [f"THE FULL MEAL: {compact(asdict(plan))}"]
+    prompt = [
+        f"You are revising one part of a user's {kind} plan. Replace the {part.description} and return only the replacement as JSON.",
+        f"USER CONTEXT: {compact(context)}",
+        *plan_context,
+        f"PART TO REPLACE: {compact(part.current)}",
+        "Keep the replacement consistent with the rest of the plan, the user's level, goal and dietary needs, and make it clearly different from the part it replaces.",
+    ]
+    if instructions:
+        prompt.append(f"USER REQUEST FOR THIS CHANGE: {instructions[:MAX_INSTRUCTIONS_LENGTH]}")
+    return prompt
+
+
+# --- from the local recommender --------------------------------------------------
+
+def workout_plan_from_local(local_plans):
+    """The WorkoutPlan for local_recommender.build_workout_plan dicts, one per day."""
+    first = local_plans[0]
+    return WorkoutPlan(
+        title=first['title'] if len(local_plans) == 1 else f"{len(local_plans)}-Day {first['focus'].title()} Plan",
+        summary=f"{first['duration_minutes']}-minute {first['focus']} sessions matched to your {first['fitness_level']} level and your goal: {first['primary_goal']}.",
+        days=[WorkoutDay(
+            name=f"Day {number}",
+            focus=local_plan['focus'],
+            duration_minutes=local_plan['duration_minutes'],
+            warm_up=[TimedExercise(**item) for item in local_plan['warm_up']],
+            blocks=[Block('Main workout', [SetExercise(**item) for item in local_plan['main']])],
+            cool_down=[TimedExercise(**item) for item in local_plan['cool_down']],
+        ) for number, local_plan in enumerate(local_plans, 1)],
+        tip=first['tip'],
+    )
+
+
+def meal_plan_from_local(local_plan):
+    """The MealPlan for a local_recommender.build_meal_plan dict."""
+    return MealPlan(
+        title=local_plan['title'],
+        summary=f"Built for a {local_plan['calorie_range']} kcal {local_plan['meal_type']} with a solid protein anchor.",
+        meal_type=local_plan['meal_type'],
+        ingredients=[Ingredient(**item) for item in local_plan['ingredients']],
+        steps=list(local_plan['steps']),
+        macros=Macros(**local_plan['macros']),
+        tip=local_plan['tip'],
+    )
+
+
+# --- text rendering ------------------------------------------------------------
+
+def render_plan_text(kind, plan):
+    """Plain-text rendering, for clients that still show the `recommendation` string."""
+    if kind == 'meal':
+        macros = plan.macros
+        lines = [f"🍽️ {plan.title}", plan.summary, "", "🛒 Ingredients"]
+        lines.extend(f"• {item.item} - {item.quantity}" for item in plan.ingredients)
+        lines.extend(["", "👩‍🍳 Steps"])
+        lines.extend(f"{i}. {step}" for i, step in enumerate(plan.steps, 1))
+        lines.extend(["", f"📊 Approx. nutrition: {macros.calories} kcal, {macros.protein_g:g} g protein, {macros.carbs_g:g} g carbs, {macros.fat_g:g} g fat"])
+    else:
+        lines = [f"💪 {plan.title}", plan.summary]
+        for day in plan.days:
+            if len(plan.days) > 1:
+                lines.extend(["", f"📅 {day.name} - {day.focus} ({day.duration_minutes} min)"])
+            lines.extend(["", "🔥 Warm-up"])
+            lines.extend(f"• {item.exercise} - {item.duration_seconds}s" for item in day.warm_up)
+            for block in day.blocks:
+                lines.extend(["", f"🏋️ {block.name}"])
+                lines.extend(f"• {item.exercise}: {item.sets} x {item.reps}, rest {item.rest_seconds}s" + (f" ({item.notes})" if item.notes else '')
+                             for item in block.exercises)
+            lines.extend(["", "🧘 Cool-down"])
+            lines.extend(f"• {item.exercise} - {item.duration_seconds}s" for item in day.cool_down)
+    if plan.tip:
+        lines.extend(["", f"💡 {plan.tip}"])
+    return '\n'.join(lines)
+
+
+# --- storage ---------------------------------------------------------------------
+
+def _row_response(row):
+    if row is None:
+        return None
+    return {**row, 'plan': parse_plan(row['kind'], row['plan'])}
+
+
+def save_plan(user_id, kind, plan, context, engine):
+    """Stores a new plan and returns its row (with `plan` parsed)."""
+    response = get_db_client().table(PLANS_TABLE).insert({
+        'user_id': user_id, 'kind': kind, 'engine': engine, 'plan': asdict(plan), 'context': context,
+    }).execute()
+    if response is None or not response.data:
+        raise Exception('No data returned when saving the plan')
+    return _row_response(response.data[0])
+
+
+def load_plan(user_id, plan_id):
+    """The user's plan row, or None."""
+    response = get_db_client().table(PLANS_TABLE).select(PLAN_COLUMNS).eq('user_id', user_id).eq('id', plan_id).limit(1).execute()
+    return _row_response(response.data[0]) if response and response.data else None
+
+
+def latest_plan(user_id, kind):
+    """The user's newest plan of `kind`, or None."""
+    response = get_db_client().table(PLANS_TABLE).select(PLAN_COLUMNS).eq('user_id', user_id).eq('kind', kind).order('created_at', desc=True).limit(1).execute()
+    return _row_response(response.data[0]) if response and response.data else None
+
+
+def list_plans(user_id, kind=None, limit=20):
+    """Summaries of the user's newest plans (without the plan bodies)."""
+    query = get_db_client().table(PLANS_TABLE).select('id, kind, engine, version, created_at, updated_at, title:plan->>title').eq('user_id', user_id)
+    if kind:
+        query = query.eq('kind', kind)
+    response = query.order('created_at', desc=True).limit(limit).execute()
+    return (response.data or []) if response else []
+
+
+def update_plan(user_id, row, plan):
+    """Writes a regenerated plan if it is still at the version `row` was read at; returns the new row."""
+    response = get_db_client().table(PLANS_TABLE).update({
+        'plan': asdict(plan), 'version': row['version'] + 1, 'updated_at': datetime.now(timezone.utc).isoformat(),
+    }).eq('user_id', user_id).eq('id', row['id']).eq('version', row['version']).execute()
+    if response is None or not response.data:
+        raise PlanConflictError('The plan was changed by another request; reload it and try again')
+    return _row_response(response.data[0])
+
+
+def plan_body(row, **extra):
+    """API representation of a stored plan row."""
+    return {
+        'plan_id': row['id'],
+        'kind': row['kind'],
+        'engine': row['engine'],
+        'version': row['version'],
+        'plan': asdict(row['plan']),
+        'recommendation': render_plan_text(row['kind'], row['plan']),
+        'created_at': row.get('created_at'),
+        'updated_at': row.get('updated_at'),
+        **extra,
+    }
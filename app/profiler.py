@@ -0,0 +1,312 @@
+import hmac
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from flask import request
+
+# Per-request tracing and on-demand sampling profiles.
+#
+# While a trace is active, code marks where time goes with span() and record_span().
+# The spans come from a few chokepoints:
+#   auth      token verification in token_required
+#   supabase  every PostgREST/auth HTTP call (db.BreakerTransport)
+#   postgres  direct pooled reads (direct_db.read_rows)
+#   gemini    generate_content in generate_text_strict (detail: generation profile)
+#   prompt    prompt building in the AI routes
+#   json      response encoding in FastJSONProvider
+# A request's breakdown is each category's exclusive time. For example, the auth
+# HTTP call counts as supabase, not as auth. Whatever no span covers is 'app'.
+#
+# Every request is traced while SLOW_REQUEST_THRESHOLD_MS > 0. Spans are plain
+# list appends, so this costs next to nothing. Requests slower than the threshold
+# print one JSON line with the breakdown.
+#
+# A request is profiled when it sends `X-Profile: 1` with a valid `X-Admin-Token`,
+# or when it falls within PROFILER_SAMPLE_RATE. A sampler thread then snapshots
+# that thread's stack every PROFILER_SAMPLE_INTERVAL_MS. The profile, spans plus
+# folded stacks, is written to PROFILE_DIR, and the response carries an
+# X-Profile-Id header. PROFILE_DIR is shared by the host's workers, so
+# /api/admin/profiles sees every worker's profiles. The sampler only runs while a
+# profiled request is in flight.
+
+CATEGORIES = ('auth', 'supabase', 'postgres', 'gemini', 'prompt', 'json')
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]+-[0-9a-f]{8}$')
+MAX_STACK_DEPTH = 128
+
+_local = threading.local()
+
+
+class RequestTrace:
+    def __init__(self, profiled):
+        self.id = f"{int(time.time())}-{secrets.token_hex(4)}"
+        self.profiled = profiled
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.spans = []          # (category, detail, start, end) in perf_counter seconds
+        self.samples = Counter()  # folded stack -> sample count
+        self.annotations = {}
+        self.status = None
+
+
+def record_span(category, detail, started, duration):
+    """Records an already-timed span (perf_counter start, seconds) on the current request, if traced."""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.spans.append((category, detail, started, started + duration))
+
+
+@contextmanager
+def span(category, detail=''):
+    """Times the enclosed block as one span of the current request; a no-op when untraced."""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.spans.append((category, detail, started, time.perf_counter()))
+
+
+def annotate_request(**values):
+    """Attaches values (e.g. user_id) to the current request's trace."""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.annotations.update(values)
+
+
+def breakdown(trace, total):
+    """Exclusive milliseconds per category: a span's time minus the spans nested directly inside it."""
+    ordered = sorted(trace.spans, key=lambda s: (s[2], -s[3]))
+    exclusive = [end - start for _, _, start, end in ordered]
+    stack = []
+    for i, (_, _, start, end) in enumerate(ordered):
+        while stack and ordered[stack[-1]][3] <= start:
+            stack.pop()
+        if stack and end <= ordered[stack[-1]][3]:
+            exclusive[stack[-1]] -= end - start
+        stack.append(i)
+    totals = dict.fromkeys(CATEGORIES, 0.0)
+    for (category, _, _, _), seconds in zip(ordered, exclusive):
+        totals[category] = totals.get(category, 0.0) + seconds
+    totals['app'] = max(0.0, total - sum(totals.values()))
+    return {category: round(seconds * 1000, 2) for category, seconds in totals.items()}
+
+
+# --- sampling ----------------------------------------------------------------
+
+_frame_labels = {}
+
+
+def _frame_label(code):
+    label = _frame_labels.get(code)
+    if label is None:
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        label = f"{module}.{getattr(code, 'co_qualname', code.co_name)}".replace(';', ':')
+        _frame_labels[code] = label
+    return label
+
+
+def fold_stack(frame):
+    """Root-to-leaf 'module.function;...' string for one thread's stack (flamegraph folded format)."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stacks of registered threads on an interval while at least one is registered."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.active = {}  # thread id -> RequestTrace
+        self.wake = threading.Event()
+        self.thread = None
+
+    def add(self, thread_id, trace):
+        with self.lock:
+            self.active[thread_id] = trace
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def remove(self, thread_id):
+        with self.lock:
+            self.active.pop(thread_id, None)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            with self.lock:
+                active = dict(self.active)
+                if not active:
+                    self.wake.clear()
+            if not active:
+                self.wake.wait()
+                continue
+            frames = sys._current_frames()
+            for thread_id, trace in active.items():
+                frame = frames.get(thread_id)
+                if frame is not None and thread_id != own_id:
+                    trace.samples[fold_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+# --- storage -------------------------------------------------------------------
+
+def _profile_path(config, profile_id):
+    return os.path.join(config.PROFILE_DIR, f"{profile_id}.json")
+
+
+def save_profile(config, profile):
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    temp_path = _profile_path(config, profile['id']) + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as handle:
+        json.dump(profile, handle)
+    os.replace(temp_path, _profile_path(config, profile['id']))
+    names = sorted(name for name in os.listdir(config.PROFILE_DIR) if name.endswith('.json'))
+    for name in names[:max(0, len(names) - config.PROFILE_MAX_FILES)]:
+        try:
+            os.remove(os.path.join(config.PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass  # Another worker pruned it first
+
+
+def load_profile(config, profile_id):
+    """The stored profile, or None for unknown or malformed ids."""
+    if not PROFILE_ID_PATTERN.match(profile_id or ''):
+        return None
+    try:
+        with open(_profile_path(config, profile_id), 'r', encoding='utf-8') as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles(config, limit=50):
+    """Summaries of the most recent profiles, newest first."""
+    try:
+        names = sorted((name for name in os.listdir(config.PROFILE_DIR) if name.endswith('.json')), reverse=True)
+    except FileNotFoundError:
+        return []
+    summaries = []
+    for name in names[:limit]:
+        profile = load_profile(config, name[:-len('.json')])
+        if profile:
+            summaries.append({key: profile.get(key) for key in ('id', 'started_at', 'method', 'path', 'status', 'duration_ms', 'breakdown_ms', 'user_id')})
+    return summaries
+
+
+def collapsed_stacks(profile, source='samples'):
+    """
+    Folded-stack text ('frame;frame;frame count' per line) for flamegraph.pl, speedscope
+    and similar tools. 'samples' uses the sampled Python stacks; 'spans' builds stacks from
+    the span breakdown, weighted in microseconds.
+    """
+    if source == 'spans':
+        # Nest spans by containment and weight each by its exclusive time
+        ordered = sorted(profile.get('spans', []), key=lambda e: (e['start_ms'], -e['duration_ms']))
+        weights = Counter()
+        stack = []  # (end_ms, folded path)
+        for entry in ordered:
+            end = entry['start_ms'] + entry['duration_ms']
+            while stack and stack[-1][0] <= entry['start_ms']:
+                stack.pop()
+            parent = stack[-1][1] if stack and end <= stack[-1][0] else 'request'
+            detail = (entry.get('detail') or '').replace(';', ':')
+            path = f"{parent};{entry['category']}" + (f" {detail}" if detail else '')
+            weights[path] += entry['duration_ms']
+            if parent != 'request':
+                weights[parent] -= entry['duration_ms']
+            stack.append((end, path))
+        return '\n'.join(f"{folded} {int(ms * 1000)}" for folded, ms in weights.most_common() if ms > 0) + '\n'
+    return '\n'.join(f"{folded} {count}" for folded, count in Counter(profile.get('samples', {})).most_common()) + '\n'
+
+
+# --- Flask integration ---------------------------------------------------------
+
+def _wants_profile(config):
+    if request.headers.get('X-Profile') == '1' and config.ADMIN_TOKEN:
+        supplied = request.headers.get('X-Admin-Token', '')
+        if hmac.compare_digest(supplied.encode('utf-8'), config.ADMIN_TOKEN.encode('utf-8')):
+            return True
+    return config.PROFILER_SAMPLE_RATE > 0 and random.random() < config.PROFILER_SAMPLE_RATE
+
+
+def init_profiler(app, config):
+    """Registers the request hooks. Call before other hooks so the trace covers them."""
+    sampler = StackSampler(config.PROFILER_SAMPLE_INTERVAL_MS / 1000.0)
+    slow_threshold = config.SLOW_REQUEST_THRESHOLD_MS / 1000.0
+
+    @app.before_request
+    def start_trace():
+        profiled = _wants_profile(config)
+        if not profiled and slow_threshold <= 0:
+            return
+        trace = RequestTrace(profiled)
+        _local.trace = trace
+        if profiled:
+            sampler.add(threading.get_ident(), trace)
+
+    @app.after_request
+    def tag_trace(response):
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace.status = response.status_code
+            if trace.profiled:
+                response.headers['X-Profile-Id'] = trace.id
+        return response
+
+    @app.teardown_request
+    def finish_trace(exc):
+        trace = getattr(_local, 'trace', None)
+        if trace is None:
+            return
+        _local.trace = None
+        if trace.profiled:
+            sampler.remove(threading.get_ident())
+        total = time.perf_counter() - trace.started
+        if not trace.profiled and (slow_threshold <= 0 or total < slow_threshold):
+            return
+        try:
+            entry = {
+                'id': trace.id,
+                'started_at': trace.started_at,
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': trace.status if exc is None else 500,
+                'duration_ms': round(total * 1000, 2),
+                'breakdown_ms': breakdown(trace, total),
+                'supabase_calls': sum(1 for s in trace.spans if s[0] == 'supabase'),
+                **trace.annotations,
+            }
+            if slow_threshold > 0 and total >= slow_threshold:
+                print(json.dumps({'event': 'slow_request', 'threshold_ms': config.SLOW_REQUEST_THRESHOLD_MS, 'profiled': trace.profiled, **entry}))
+            if trace.profiled:
+                save_profile(config, {
+                    **entry,
+                    'sample_interval_ms': config.PROFILER_SAMPLE_INTERVAL_MS,
+                    'spans': [
+                        {'category': category, 'detail': detail,
+                         'start_ms': round((start - trace.started) * 1000, 2), 'duration_ms': round((end - start) * 1000, 2)}
+                        for category, detail, start, end in trace.spans
+                    ],
+                    'samples': dict(trace.samples),
+                })
+        except Exception as e:
+            print(f"Warning: Failed to record request trace {trace.id}: {e}")
@@ -0,0 +1,144 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import request
+
+# Per-user token-bucket rate limiting, applied by token_required once the user is known.
+#
+# Every user has a bucket of RATE_LIMIT_CAPACITY tokens that refills at
+# RATE_LIMIT_REFILL_PER_SECOND. Each request takes its route's cost (RATE_LIMIT_COSTS,
+# matched by longest route prefix), so a Gemini or dashboard call uses up far more of
+# the budget than logging a glass of water. An empty bucket gets a 429 with Retry-After.
+#
+# Buckets live in process memory by default, so each gunicorn worker enforces the limit
+# separately. With RATE_LIMIT_BACKEND=sqlite, all workers on a host share one SQLite file
+# (put it on local disk or /dev/shm) and the limit holds per host.
+# Limiter errors fail open: a broken limiter must not take the API down with it.
+
+MAX_MEMORY_BUCKETS = 50000
+SQLITE_CLEANUP_EVERY = 1000  # calls between purges of idle buckets
+
+
+def _take(tokens, updated, now, cost, capacity, refill_per_second):
+    """Refills a bucket to `now` and tries to take `cost`. Returns (allowed, tokens_left, retry_after_seconds)."""
+    if tokens is None:
+        tokens = capacity
+    else:
+        tokens = min(capacity, tokens + max(0.0, now - updated) * refill_per_second)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / refill_per_second
+
+
+class MemoryBackend:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()  # key -> (tokens, updated)
+
+    def take(self, key, cost, capacity, refill_per_second):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (None, now))
+            allowed, tokens, retry_after = _take(tokens, updated, now, cost, capacity, refill_per_second)
+            self.buckets[key] = (tokens, now)
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > MAX_MEMORY_BUCKETS:
+                self.buckets.popitem(last=False)  # Least recently seen; it would have refilled anyway
+        return allowed, tokens, retry_after
+
+
+class SqliteBackend:
+    """Buckets in a SQLite file shared by the workers on one host; each take is one short write transaction."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.calls = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=0.5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')  # Losing buckets in a crash only forgives some requests
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            self.local.connection = connection
+        return connection
+
+    def take(self, key, cost, capacity, refill_per_second):
+        connection = self._connection()
+        now = time.time()  # Wall clock: monotonic clocks aren't comparable across processes
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            allowed, tokens, retry_after = _take(row[0] if row else None, row[1] if row else now, now, cost, capacity, refill_per_second)
+            connection.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+            self.calls += 1
+            if self.calls % SQLITE_CLEANUP_EVERY == 0:
+                # Buckets idle long enough to have refilled completely carry no state
+                connection.execute('DELETE FROM buckets WHERE updated < ?', (now - capacity / refill_per_second,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, tokens, retry_after
+
+
+class RateLimiter:
+    def __init__(self, backend, capacity, refill_per_second, costs):
+        self.backend = backend
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        # Longest prefix first so '/api/logs/exercises' can differ from '/api/logs'
+        self.costs = sorted(costs.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def cost_for(self, path):
+        for prefix, cost in self.costs:
+            if path.startswith(prefix):
+                return min(float(cost), self.capacity)
+        return 1.0
+
+    def check(self, user_id, path):
+        """Returns (allowed, remaining_tokens, retry_after_seconds) for one request."""
+        try:
+            return self.backend.take(str(user_id), self.cost_for(path), self.capacity, self.refill_per_second)
+        except Exception as e:
+            print(f"Warning: Rate limiter failed, allowing request. User: {user_id}. Error: {e}")
+            return True, self.capacity, 0.0
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(config):
+    """The process-wide limiter, or None when Config.RATE_LIMIT_ENABLED is off."""
+    global _limiter
+    if not config.RATE_LIMIT_ENABLED:
+        return None
+    with _limiter_lock:
+        if _limiter is None:
+            if config.RATE_LIMIT_BACKEND == 'sqlite':
+                backend = SqliteBackend(config.RATE_LIMIT_SQLITE_PATH)
+            else:
+                backend = MemoryBackend()
+            _limiter = RateLimiter(backend, config.RATE_LIMIT_CAPACITY, config.RATE_LIMIT_REFILL_PER_SECOND, config.RATE_LIMIT_COSTS)
+        return _limiter
+
+
+def check_rate_limit(config, user_id):
+    """
+    Charges the current request to the user's bucket. Returns None when it may proceed,
+    otherwise the (retry_after, limit) to put on a 429.
+    """
+    limiter = get_rate_limiter(config)
+    if limiter is None:
+        return None
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    allowed, _, retry_after = limiter.check(user_id, rule)
+    if allowed:
+        return None
+    return max(1, int(retry_after + 0.999)), int(limiter.capacity)
@@ -0,0 +1,66 @@
+from flask import Blueprint, request, jsonify, Response
+from auth_utils import admin_required
+from config import Config
+from profiler import list_profiles, load_profile, collapsed_stacks
+from circuit_breaker import all_breakers
+from deadlines import get_hedger
+from admission import get_admission_controller
+
+admin_bp = Blueprint('admin_bp', __name__)
+
+MAX_PROFILE_LIST = 200
+
+
+@admin_bp.route('/admin/profiles', methods=['GET'])
+@admin_required
+def get_profiles():
+    """Recent request profiles (newest first) with their time breakdown. ?limit= (default 50)."""
+    try:
+        limit = max(1, min(MAX_PROFILE_LIST, int(request.args.get('limit', 50))))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify({'profiles': list_profiles(Config, limit)}), 200
+
+
+@admin_bp.route('/admin/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    """
+    One profile. ?format=
+      json      (default) breakdown, spans and sampled stacks
+      collapsed folded sampled stacks, e.g. `flamegraph.pl profile.txt > profile.svg` or speedscope
+      spans     folded stacks built from the span breakdown, weighted in microseconds
+    """
+    profile = load_profile(Config, profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    output_format = request.args.get('format', 'json')
+    if output_format == 'json':
+        return jsonify(profile), 200
+    if output_format in ('collapsed', 'spans'):
+        source = 'samples' if output_format == 'collapsed' else 'spans'
+        return Response(collapsed_stacks(profile, source), mimetype='text/plain'), 200
+    return jsonify({'error': "format must be one of 'json', 'collapsed', 'spans'"}), 400
+
+
+@admin_bp.route('/admin/upstreams', methods=['GET'])
+@admin_required
+def get_upstreams():
+    """This worker's view of each upstream: breaker state, observed latency and hedged calls."""
+    hedging = get_hedger(Config).stats()
+    upstreams = {}
+    for name, breaker in all_breakers().items():
+        latency = {f"p{p}_ms": round(seconds * 1000, 1) if seconds is not None else None
+                   for p, seconds in ((p, breaker.latency_percentile(p)) for p in (50, 95, 99))}
+        upstreams[name] = {**breaker.stats(), **latency, 'hedging': hedging.get(name)}
+    return jsonify({'upstreams': upstreams}), 200
+
+
+@admin_bp.route('/admin/admission', methods=['GET'])
+@admin_required
+def get_admission():
+    """This worker's admission control: each class's adaptive limit, load, latency and shed count."""
+    controller = get_admission_controller()
+    if controller is None:
+        return jsonify({'error': 'Admission control is disabled'}), 404
+    return jsonify(controller.stats()), 200
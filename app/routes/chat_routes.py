@@ -1,11 +1,19 @@
 from flask import Blueprint, request, jsonify
 from auth_utils import token_required
-from gemini_service import generate_text_from_gemini
+from gemini_service import generate_text_from_gemini, generate_text_strict, GeminiUnavailableError, BLOCKED_MESSAGE
+from semantic_cache import get_semantic_cache, normalize_message, is_cacheable
+from config import Config
+from profiler import span
+import hashlib
 import json
 from datetime import datetime
 
 chat_bp = Blueprint('chat_bp', __name__)
 
+# Pages with their own context in build_enhanced_context_prompt; only these are cached,
+# so a client can't create cache namespaces at will
+CHAT_PAGE_CONTEXTS = ('dashboard', 'profile', 'track_data', 'recommendations', 'progress')
+
 @chat_bp.route('/chat/context-aware', methods=['POST'])
 @token_required
 def context_aware_chat(current_user_id):
@@ -19,17 +27,44 @@ def context_aware_chat(current_user_id):
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
         
+        # FAQ-style questions are answered from the semantic cache when a close enough one was seen
+        semantic_cache = get_semantic_cache(Config)
+        normalized_message = normalize_message(user_message)
+        cache_namespace = None
+        if semantic_cache and page_context in CHAT_PAGE_CONTEXTS and is_cacheable(normalized_message, conversation_history):
+            constraints_hash = hashlib.sha1(json.dumps(user_constraints, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:12]
+            cache_namespace = f"{page_context}:{constraints_hash}"
+            cached = semantic_cache.lookup(cache_namespace, normalized_message)
+            if cached:
+                reply, similarity = cached
+                return jsonify({
+                    'reply': reply,
+                    'context': page_context,
+                    'timestamp': datetime.now().isoformat(),
+                    'cached': True,
+                    'similarity': round(similarity, 3)
+                }), 200
+
         # Build enhanced context-aware prompt
-        enhanced_prompt = build_enhanced_context_prompt(
-            user_message, 
-            conversation_history, 
-            page_context, 
-            user_constraints,
-            current_user_id
-        )
+        with span('prompt', 'chat'):
+            enhanced_prompt = build_enhanced_context_prompt(
+                user_message, 
+                conversation_history, 
+                page_context, 
+                user_constraints,
+                current_user_id
+            )
         
-        # Generate response using Gemini
-        ai_response = generate_text_from_gemini(enhanced_prompt)
+        # Generate response using Gemini. Cacheable questions use the strict call so that
+        # canned error replies never end up in the cache.
+        if cache_namespace:
+            try:
+                ai_response = generate_text_strict(enhanced_prompt, profile='chat')
+            except GeminiUnavailableError as e:
+                ai_response = e.user_message
+                cache_namespace = None
+        else:
+            ai_response = generate_text_from_gemini(enhanced_prompt, profile='chat')
         
         if not ai_response:
             return jsonify({
@@ -38,6 +73,8 @@ def context_aware_chat(current_user_id):
         
         # Clean and format the response
         formatted_response = format_chat_response(ai_response, page_context)
+        if cache_namespace and ai_response != BLOCKED_MESSAGE:
+            semantic_cache.store(cache_namespace, normalized_message, formatted_response)
         
         return jsonify({
             'reply': formatted_response,
@@ -1,11 +1,25 @@
 from flask import Blueprint, jsonify
-from db import get_db_client
+from db import get_db_client, call_rpc
+from direct_db import read_rows
 from auth_utils import token_required
+from daily_summary import get_daily_summaries, workout_streak
+from data_versions import get_data_versions
+from events import DASHBOARD_VERSION_TABLE
+from water_buffer import get_water_buffer
 from datetime import date, timedelta
 
 dashboard_bp = Blueprint('dashboard_bp', __name__)
 supabase = get_db_client()
 
+
+def _dashboard_version(user_id):
+    try:
+        return get_data_versions(user_id).get(DASHBOARD_VERSION_TABLE, 0)
+    except Exception as e:
+        print(f"Warning: Could not load data versions for dashboard summary. User: {user_id}. Error: {e}")
+        return None
+
+
 @dashboard_bp.route('/dashboard/summary', methods=['GET'])
 @token_required
 def get_dashboard_summary(current_user_id):
@@ -28,74 +42,79 @@ def get_dashboard_summary(current_user_id):
     }
 
     try:
+        # Read before the aggregates, so the numbers below include every write up to it
+        version_before = _dashboard_version(current_user_id)
+
         # Get user preferences for goals (if they exist)
-        profile_response = supabase.table('profiles').select('weekly_workout_goal, daily_activity_goal').eq('user_id', current_user_id).maybe_single().execute()
-        if profile_response and profile_response.data:
-            summary['target_workouts_weekly'] = profile_response.data.get('weekly_workout_goal', 5)
-            summary['target_activities_daily'] = profile_response.data.get('daily_activity_goal', 3)
-
-        # Nutrition for today
-        nut_response = supabase.table('nutrition_logs').select('calories, protein_g').eq('user_id', current_user_id).eq('date', today_str).execute()
-        
-        if nut_response is None:
-            print(f"Error fetching nutrition for dashboard: Supabase response was None. User: {current_user_id}, Date: {today_str}")
-        elif nut_response.data:
-            summary['nutrition_logs_today'] = len(nut_response.data)
-            for item in nut_response.data:
-                summary['calories_today'] += item.get('calories', 0) or 0
-                summary['protein_today'] += item.get('protein_g', 0) or 0
-        
-        # Workouts for today
-        wo_response = supabase.table('workout_logs').select('id', count='exact').eq('user_id', current_user_id).eq('date', today_str).execute()
-        
-        if wo_response is None:
-            print(f"Error fetching workouts for dashboard: Supabase response was None. User: {current_user_id}, Date: {today_str}")
-        elif wo_response.count:
-             summary['workouts_today_count'] = wo_response.count
+        profile_rows = read_rows('profile_goals', current_user_id)
+        if profile_rows is None:
+            profile_response = supabase.table('profiles').select('weekly_workout_goal, daily_activity_goal').eq('user_id', current_user_id).maybe_single().execute()
+            profile_rows = [profile_response.data] if profile_response and profile_response.data else []
+        if profile_rows:
+            summary['target_workouts_weekly'] = profile_rows[0].get('weekly_workout_goal', 5)
+            summary['target_activities_daily'] = profile_rows[0].get('daily_activity_goal', 3)
 
-        # Workouts this week and calories burned
-        week_workouts_response = supabase.table('workout_logs').select('id, calories_burned', count='exact').eq('user_id', current_user_id).gte('date', week_start).execute()
-        if week_workouts_response and week_workouts_response.data:
-            summary['workouts_this_week'] = len(week_workouts_response.data)
-            summary['calories_burned_this_week'] = sum(item.get('calories_burned', 0) or 0 for item in week_workouts_response.data)
+        # Daily rollups: one row per day instead of every raw log row.
+        # The last 31 days cover today, this week and the streak window.
+        streak_window_start = (date.today() - timedelta(days=31)).isoformat()
+        daily_rows = get_daily_summaries(current_user_id, start_date=streak_window_start, end_date=today_str)
+        days_by_date = {str(row['date'])[:10]: row for row in daily_rows}
 
-        # Total workouts ever
-        total_workouts_response = supabase.table('workout_logs').select('id', count='exact').eq('user_id', current_user_id).execute()
-        if total_workouts_response:
-            summary['total_workouts'] = total_workouts_response.count or 0
+        today_row = days_by_date.get(today_str)
+        if today_row:
+            summary['calories_today'] = today_row.get('calories', 0) or 0
+            summary['protein_today'] = today_row.get('protein_g', 0) or 0
+            summary['nutrition_logs_today'] = today_row.get('nutrition_log_count', 0) or 0
+            summary['workouts_today_count'] = today_row.get('workout_count', 0) or 0
+            summary['water_intake_today_ml'] = today_row.get('water_ml', 0) or 0
+            summary['water_logs_today'] = today_row.get('water_log_count', 0) or 0
+
+        water_buffer = get_water_buffer()
+        if water_buffer is not None:
+            # Water taps still waiting in the write-behind buffer
+            pending_water = water_buffer.pending_rows(current_user_id, today_str)
+            summary['water_intake_today_ml'] += sum(row['amount_ml'] for row in pending_water)
+            summary['water_logs_today'] += len(pending_water)
+
+        # Workouts this week and calories burned
+        week_rows = [row for day_str, row in days_by_date.items() if day_str >= week_start]
+        summary['workouts_this_week'] = sum(row.get('workout_count', 0) or 0 for row in week_rows)
+        summary['calories_burned_this_week'] = sum(row.get('calories_burned', 0) or 0 for row in week_rows)
 
         # Calculate current streak (simplified - consecutive days with workouts)
-        streak_days = 0
-        current_date = date.today()
-        while True:
-            day_str = current_date.isoformat()
-            day_workouts = supabase.table('workout_logs').select('id', count='exact').eq('user_id', current_user_id).eq('date', day_str).execute()
-            if day_workouts and day_workouts.count and day_workouts.count > 0:
-                streak_days += 1
-                current_date -= timedelta(days=1)
-            else:
-                break
-            if streak_days > 30:  # Prevent infinite loops
-                break
-        summary['current_streak'] = streak_days
-
-        # Latest weight
-        lw_response = supabase.table('weight_tracker').select('weight_kg').eq('user_id', current_user_id).order('date', desc=True).limit(1).maybe_single().execute()
-
-        if lw_response is None:
-            print(f"Error fetching latest weight for dashboard: Supabase response was None. User: {current_user_id}")
-        elif lw_response.data:
-            summary['current_weight_kg'] = lw_response.data.get('weight_kg')
-
-        # Water intake today
-        wi_response = supabase.table('water_intake_logs').select('amount_ml').eq('user_id', current_user_id).eq('date', today_str).execute()
-
-        if wi_response is None:
-            print(f"Error fetching water intake for dashboard: Supabase response was None. User: {current_user_id}, Date: {today_str}")
-        elif wi_response.data:
-            summary['water_logs_today'] = len(wi_response.data)
-            for item in wi_response.data:
-                 summary['water_intake_today_ml'] += item.get('amount_ml', 0) or 0
+        summary['current_streak'] = workout_streak(days_by_date, date.today())
+
+        # Total workouts ever and latest weight, in one round trip over the direct read path
+        # or when dashboard_totals (migration 0004) is deployed
+        totals = read_rows('dashboard_totals', current_user_id)
+        if totals is None:
+            totals = call_rpc('dashboard_totals', {'p_user_id': current_user_id})
+        if totals is not None:
+            totals_row = totals[0] if totals else {}
+            summary['total_workouts'] = totals_row.get('total_workouts') or 0
+            summary['current_weight_kg'] = totals_row.get('current_weight_kg')
+        else:
+            # Total workouts ever (the count comes back in Content-Range; one id row is enough)
+            total_workouts_response = supabase.table('workout_logs').select('id', count='exact').eq('user_id', current_user_id).limit(1).execute()
+            if total_workouts_response:
+                summary['total_workouts'] = total_workouts_response.count or 0
+
+            # Latest weight
+            lw_response = supabase.table('weight_tracker').select('weight_kg').eq('user_id', current_user_id).order('date', desc=True).limit(1).maybe_single().execute()
+
+            if lw_response is None:
+                print(f"Error fetching latest weight for dashboard: Supabase response was None. User: {current_user_id}")
+            elif lw_response.data:
+                summary['current_weight_kg'] = lw_response.data.get('weight_kg')
+
+        # Version these numbers include; /events?since=<version> streams the changes after it.
+        # A write during the queries may or may not be in them: read again and send the older
+        # version, which the stream answers with a resync (as it does a missing one).
+        version_after = _dashboard_version(current_user_id)
+        if version_before is None or version_after is None:
+            summary['version'] = None
+        else:
+            summary['version'] = min(version_before, version_after)
 
         return jsonify(summary), 200
     except Exception as e:
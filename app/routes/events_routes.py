@@ -0,0 +1,69 @@
+import time
+from flask import Blueprint, Response, jsonify, request
+from auth_utils import token_required
+from data_versions import get_data_versions
+from events import get_event_bus, format_event, DASHBOARD_VERSION_TABLE
+from config import Config
+
+events_bp = Blueprint('events_bp', __name__)
+
+
+@events_bp.route('/events', methods=['GET'])
+@token_required
+def stream_events(current_user_id):
+    """
+    Server-Sent Events stream of the user's dashboard changes (see events.py).
+    ?since=<version from /dashboard/summary>; EventSource sends Last-Event-ID itself on reconnect.
+    Browsers can't set headers on an EventSource, so the token may also come as ?access_token=.
+    """
+    bus = get_event_bus()
+    if bus is None:
+        return jsonify({'error': 'Event streams are disabled', 'details': 'Poll /api/dashboard/summary instead'}), 404
+
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'error': 'since must be an integer version'}), 400
+
+    subscription = bus.subscribe(current_user_id)
+    if subscription is None:
+        response = jsonify({'error': 'Too many open event streams on this server', 'details': 'Poll /api/dashboard/summary instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(1, Config.EVENTS_RETRY_MS // 1000))
+        return response
+
+    # Read after subscribing: a write in between is either already in the version or delivered
+    try:
+        current = get_data_versions(current_user_id).get(DASHBOARD_VERSION_TABLE, 0)
+    except Exception as e:
+        print(f"Warning: Could not load data versions for event stream, asking the client to resync. User: {current_user_id}. Error: {e}")
+        current = None
+
+    def stream():
+        yield f"retry: {Config.EVENTS_RETRY_MS}\n\n"
+        if since is None or current is None or current > since:
+            yield format_event('resync', {'version': current}, current)
+        ends = time.monotonic() + Config.EVENTS_STREAM_MAX_SECONDS
+        while not subscription.closed and not bus.closing:
+            left = ends - time.monotonic()
+            if left <= 0:
+                break
+            events = subscription.wait(min(Config.EVENTS_HEARTBEAT_SECONDS, left))
+            if subscription.overflowed:
+                # Fell too far behind to replay; the client reloads the summary instead
+                subscription.overflowed = False
+                yield format_event('resync', {'version': None})
+            elif events:
+                yield ''.join(format_event(message['event'], message['data'], message['id']) for message in events)
+            elif not subscription.closed:
+                yield ': ping\n\n'  # Keeps proxies from timing out the connection and finds dead clients
+
+    # Not stream_with_context: the stream needs nothing from the request, so the request's
+    # teardown (deadline, trace) finishes now instead of when the client goes away
+    response = Response(stream(), mimetype='text/event-stream')
+    response.call_on_close(lambda: bus.unsubscribe(subscription))  # Also runs if the stream never starts
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # Deliver each event now, not when a proxy buffer fills
+    return response
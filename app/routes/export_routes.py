@@ -0,0 +1,79 @@
+import csv
+import io
+from datetime import date
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from db import iter_user_rows
+from auth_utils import token_required
+
+export_bp = Blueprint('export_bp', __name__)
+
+# Tables included in a full-history export, in the order they are written.
+# Workouts come before their exercise details so importers can remap workout_log_id.
+EXPORT_TABLES = ['workout_logs', 'exercise_details', 'nutrition_logs', 'weight_tracker', 'water_intake_logs']
+
+
+def generate_ndjson(user_id):
+    """One JSON object per line: {"table": ..., "data": {...row}}."""
+    json_provider = current_app.json
+    for table in EXPORT_TABLES:
+        for row in iter_user_rows(table, user_id):
+            yield json_provider.dumps({'table': table, 'data': row}) + '\n'
+
+
+def generate_csv(user_id):
+    """
+    One CSV section per table. Each section starts with a header row whose first
+    column is `table`; every data row repeats the table name in that column.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+
+    for table in EXPORT_TABLES:
+        columns = None
+        for row in iter_user_rows(table, user_id):
+            if columns is None:
+                columns = list(row.keys())
+                writer.writerow(['table'] + columns)
+            writer.writerow([table] + ['' if row.get(column) is None else row.get(column) for column in columns])
+            if buffer.tell() >= 64 * 1024:
+                yield flush()
+        if buffer.tell():
+            yield flush()
+
+
+@export_bp.route('/export', methods=['GET'])
+@token_required
+def export_history(current_user_id):
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': "format must be 'ndjson' or 'csv'"}), 400
+
+    generator = generate_ndjson if export_format == 'ndjson' else generate_csv
+    mimetype = 'application/x-ndjson' if export_format == 'ndjson' else 'text/csv'
+    filename = f"fitmind-export-{date.today().isoformat()}.{export_format}"
+
+    def stream():
+        try:
+            yield from generator(current_user_id)
+        except Exception as e:
+            # Headers are already sent, so the status can't change; log it and end the stream.
+            print(f"Error streaming export: {e}. User: {current_user_id}")
+            # A trailing `_error` record tells clients the file is incomplete.
+            if export_format == 'ndjson':
+                yield current_app.json.dumps({'table': '_error', 'data': {'message': 'Export interrupted'}}) + '\n'
+            else:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows([['table', 'message'], ['_error', 'Export interrupted']])
+                yield buffer.getvalue()
+
+    response = Response(stream_with_context(stream()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no' # Don't let a reverse proxy buffer the whole export
+    return response
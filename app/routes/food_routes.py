@@ -0,0 +1,49 @@
+from flask import Blueprint, request, jsonify
+from auth_utils import token_required
+from config import Config
+from food_db import get_food_index, scale_nutrients
+
+food_bp = Blueprint('food_bp', __name__)
+
+MAX_SEARCH_RESULTS = 25
+UNAVAILABLE = {'error': 'Food database unavailable', 'details': 'The food index has not been built (flask build-food-index)'}
+
+
+@food_bp.route('/foods/search', methods=['GET'])
+@token_required
+def search_foods(current_user_id):
+    """
+    Autocomplete over the bundled food database. Query params:
+      q:     partial food name (every word is matched as a prefix; typos fall back to fuzzy matches)
+      limit: max results (default 10, max 25)
+    Each result carries calories and macros per serving.
+    """
+    food_index = get_food_index(Config)
+    if food_index is None:
+        return jsonify(UNAVAILABLE), 503
+    query = request.args.get('q', '').strip()
+    try:
+        limit = max(1, min(MAX_SEARCH_RESULTS, int(request.args.get('limit', 10))))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    response = jsonify({'query': query, 'results': food_index.search(query, limit) if query else []})
+    response.headers['Cache-Control'] = 'private, max-age=3600'  # Only changes when the index is rebuilt
+    return response, 200
+
+
+@food_bp.route('/foods/<int:food_id>', methods=['GET'])
+@token_required
+def get_food(current_user_id, food_id):
+    """One food, with nutrients scaled by optional ?servings= or ?quantity_g=."""
+    food_index = get_food_index(Config)
+    if food_index is None:
+        return jsonify(UNAVAILABLE), 503
+    food = food_index.get(food_id)
+    if food is None:
+        return jsonify({'error': 'Food not found'}), 404
+    try:
+        scaled = scale_nutrients(food, servings=request.args.get('servings'), quantity_g=request.args.get('quantity_g'))
+    except ValueError:
+        return jsonify({'error': 'servings and quantity_g must be positive numbers'}), 400
+    return jsonify({**food, 'scaled': scaled}), 200
@@ -0,0 +1,75 @@
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from auth_utils import token_required
+from config import Config
+from importer import HistoryImporter, IMPORT_COLUMNS, iter_csv, iter_ndjson, open_text_stream
+from data_versions import bump_data_version
+from daily_summary import rebuild_daily_summaries
+from exercise_recency import rebuild_exercise_recency
+from exercise_analytics import rebuild_exercise_stats
+
+import_bp = Blueprint('import_bp', __name__)
+
+
+@import_bp.route('/import', methods=['POST'])
+@token_required
+def import_history(current_user_id):
+    """
+    Bulk-imports history from an uploaded CSV or NDJSON file (multipart field `file`).
+    Query params:
+      format: 'csv' or 'ndjson' (default: inferred from the file name)
+      table:  target table for plain single-table files (e.g. weight_tracker)
+    The response is an NDJSON stream of progress events ending with a `done` event.
+    """
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'error': 'No file uploaded (expected multipart field "file")'}), 400
+
+    import_format = request.args.get('format')
+    if not import_format:
+        import_format = 'ndjson' if upload.filename.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+    if import_format not in ('csv', 'ndjson'):
+        return jsonify({'error': "format must be 'csv' or 'ndjson'"}), 400
+
+    default_table = request.args.get('table')
+    if default_table and default_table not in IMPORT_COLUMNS:
+        return jsonify({'error': f"table must be one of: {', '.join(IMPORT_COLUMNS)}"}), 400
+
+    importer = HistoryImporter(current_user_id, chunk_size=Config.IMPORT_CHUNK_SIZE)
+    parse = iter_ndjson if import_format == 'ndjson' else iter_csv
+
+    def stream():
+        json_provider = current_app.json
+        try:
+            for table, raw_row in parse(open_text_stream(upload), default_table):
+                if importer.add(table, raw_row):
+                    yield json_provider.dumps(importer.progress()) + '\n'
+            importer.flush()
+        except Exception as e:
+            print(f"Error importing history: {e}. User: {current_user_id}")
+            failed = importer.progress('error')
+            failed['message'] = 'Import interrupted; rows reported as inserted were saved.'
+            yield json_provider.dumps(failed) + '\n'
+            return
+        finally:
+            # Keep derived data consistent with whatever made it in, even on a partial import.
+            if importer.touched_tables:
+                if importer.touched_tables & {'workout_logs', 'nutrition_logs', 'weight_tracker', 'water_intake_logs'}:
+                    try:
+                        rebuild_daily_summaries(user_id=current_user_id, since=importer.min_date)
+                    except Exception as e:
+                        print(f"Warning: Failed to rebuild daily summary after import. User: {current_user_id}. Error: {e}")
+                if 'exercise_details' in importer.touched_tables:
+                    try:
+                        rebuild_exercise_recency(user_id=current_user_id)
+                        rebuild_exercise_stats(user_id=current_user_id)
+                    except Exception as e:
+                        print(f"Warning: Failed to rebuild exercise indexes after import. User: {current_user_id}. Error: {e}")
+                bump_data_version(current_user_id, *importer.touched_tables, 'daily_summary', 'exercise_recency', 'exercise_weekly_stats')
+
+        done = importer.progress('done')
+        done['errors'] = importer.errors
+        yield json_provider.dumps(done) + '\n'
+
+    response = Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
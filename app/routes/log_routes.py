@@ -1,11 +1,29 @@
 from flask import Blueprint, request, jsonify
 from db import get_db_client
 from auth_utils import token_required
+from data_versions import bump_data_version, conditional_get
+from daily_summary import refresh_daily_summary
+from events import publish_log
+from water_buffer import get_water_buffer
+from food_db import get_food_index, scale_nutrients
+from exercise_recency import record_workout_exercises, get_recent_exercises, SORTS as EXERCISE_SORTS
+from exercise_analytics import refresh_exercise_stats
+from direct_db import read_rows, read_json, MIN_DATE, MAX_DATE
+from config import Config
 from datetime import date
 
 log_bp = Blueprint('log_bp', __name__)
 supabase = get_db_client()
 
+
+def _is_iso_date(value):
+    try:
+        date.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
 @log_bp.route('/log/workout', methods=['POST'])
 @token_required
 def log_workout(current_user_id):
@@ -22,6 +40,56 @@ def log_workout(current_user_id):
         'notes': data.get('notes')
     }
     exercises_payload = data.get('exercises', []) # List of dictionaries for exercises
+    return save_workout(current_user_id, workout_log_payload, exercises_payload, 'Workout logged successfully')
+
+# Columns copied from a prior workout's exercise_details rows when repeating it
+REPEATED_EXERCISE_COLUMNS = ('exercise_name', 'sets', 'reps', 'weight_kg')
+
+@log_bp.route('/log/workout/repeat', methods=['POST'])
+@token_required
+def repeat_workout(current_user_id):
+    """
+    Re-logs a previous workout (default: the most recent one) with its exercises in one call.
+    Optional JSON body: workout_log_id, date (default today), and duration_minutes,
+    calories_burned or notes to override the copied values.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        query = supabase.table('workout_logs').select('*, exercise_details(*)').eq('user_id', current_user_id)
+        if data.get('workout_log_id') is not None:
+            query = query.eq('id', data['workout_log_id'])
+        else:
+            query = query.order('date', desc=True).order('id', desc=True)
+        response = query.limit(1).execute()
+        if response is None or not hasattr(response, 'data'):
+            print(f"Error repeating workout: Malformed database response. User: {current_user_id}")
+            return jsonify({'error': 'Failed to repeat workout', 'details': 'Malformed database response'}), 500
+    except Exception as e:
+        print(f"Error repeating workout: {e}")
+        return jsonify({'error': 'Failed to repeat workout', 'details': str(e)}), 500
+    if not response.data:
+        return jsonify({'error': 'No workout found to repeat'}), 404
+
+    source = response.data[0]
+    workout_log_payload = {
+        'user_id': current_user_id,
+        'date': data.get('date', date.today().isoformat()),
+        'type': source.get('type'),
+        'duration_minutes': data.get('duration_minutes', source.get('duration_minutes')),
+        'calories_burned': data.get('calories_burned', source.get('calories_burned')),
+        'notes': data.get('notes', source.get('notes'))
+    }
+    exercises_payload = [
+        {column: exercise.get(column) for column in REPEATED_EXERCISE_COLUMNS}
+        for exercise in sorted(source.get('exercise_details') or [], key=lambda exercise: exercise.get('id') or 0)
+    ]
+    body, status = save_workout(current_user_id, workout_log_payload, exercises_payload, 'Workout repeated successfully')
+    if status == 201:
+        body = jsonify({**body.get_json(), 'source_log_id': source['id'], 'exercise_count': len(exercises_payload)})
+    return body, status
+
+def save_workout(current_user_id, workout_log_payload, exercises_payload, success_message):
+    """Inserts a workout_log and its exercise_details, then updates the derived tables."""
     workout_log_id = None
 
     try:
@@ -39,6 +107,7 @@ def log_workout(current_user_id):
         workout_log_id = response.data[0]['id']
 
         # Insert exercise_details if any
+        exercises_saved = False
         if exercises_payload:
             for ex in exercises_payload:
                 ex['workout_log_id'] = workout_log_id
@@ -51,13 +120,21 @@ def log_workout(current_user_id):
                     print(f"Warning: Workout log (ID: {workout_log_id}) saved, but Supabase client returned None for exercises.")
                 elif not ex_response.data: # An insert should return data
                     print(f"Warning: Workout log (ID: {workout_log_id}) saved, but no data returned for exercises insert and no exception raised.")
+                else:
+                    exercises_saved = True
                 # If execution reached here without an exception, and data is present, it's considered successful for exercises.
             
             except Exception as ex_e: # Catch exception specifically for exercise insertion
                 print(f"Warning: Workout log (ID: {workout_log_id}) saved, but failed to save some/all exercises. Error: {ex_e}")
                 # Continue to return 201 for the main log, but with a warning logged.
 
-        return jsonify({'message': 'Workout logged successfully', 'log_id': workout_log_id}), 201
+        refresh_daily_summary(current_user_id, workout_log_payload['date'], 'workout')
+        if exercises_saved:
+            record_workout_exercises(current_user_id, workout_log_payload['date'], workout_log_id, exercises_payload)
+            refresh_exercise_stats(current_user_id, workout_log_payload['date'], exercises_payload)
+        version = bump_data_version(current_user_id, 'workout_logs', 'exercise_details', 'daily_summary', 'exercise_recency', 'exercise_weekly_stats')
+        publish_log(current_user_id, 'workout', workout_log_payload, version)
+        return jsonify({'message': success_message, 'log_id': workout_log_id}), 201
 
     except Exception as e: 
         print(f"Error logging workout: {e}")
@@ -75,7 +152,37 @@ def log_workout(current_user_id):
 @token_required
 def log_nutrition(current_user_id):
     data = request.json
-    if not data or not data.get('meal_type') or not data.get('food_item_description') or not data.get('calories'):
+    if not data or not data.get('meal_type') or not data.get('food_item_description'):
+        return jsonify({'error': 'Missing meal type, food item description or calories'}), 400
+
+    # Calories/macros the client left out are filled in from the food database, either for
+    # an explicit food_id picked from /foods/search or a food whose name has every word of
+    # the description. Anything looser comes back as candidates to confirm with food_id.
+    matched_food = None
+    candidates = []
+    if data.get('food_id') is not None or not data.get('calories'):
+        food_index = get_food_index(Config)
+        if food_index:
+            try:
+                matched_food = food_index.get(int(data['food_id'])) if data.get('food_id') is not None else food_index.best_match(data['food_item_description'])
+            except (TypeError, ValueError):
+                return jsonify({'error': 'food_id must be an integer'}), 400
+            if matched_food is None and data.get('food_id') is None:
+                candidates = food_index.suggest(data['food_item_description'])
+            elif matched_food is not None and data.get('food_id') is not None:
+                matched_food['match'] = 'food_id'
+        if matched_food:
+            try:
+                estimated = scale_nutrients(matched_food, servings=data.get('servings'), quantity_g=data.get('quantity_g'))
+            except (TypeError, ValueError):
+                return jsonify({'error': 'servings and quantity_g must be positive numbers'}), 400
+            data = {**estimated, **{key: value for key, value in data.items() if value is not None}}
+    if not data.get('calories'):
+        if candidates:
+            return jsonify({
+                'error': 'No food matches the description exactly; resend with the food_id of one of the candidates, or with calories',
+                'candidates': candidates,
+            }), 400
         return jsonify({'error': 'Missing meal type, food item description or calories'}), 400
 
     nutrition_log_payload = {
@@ -97,8 +204,14 @@ def log_nutrition(current_user_id):
         if not response.data:
             print(f"Error logging nutrition: No data returned and no exception raised. User: {current_user_id}")
             return jsonify({'error': 'Failed to log nutrition', 'details': 'No data returned from database operation'}), 500
-            
-        return jsonify({'message': 'Nutrition logged successfully', 'log_id': response.data[0]['id']}), 201
+
+        refresh_daily_summary(current_user_id, nutrition_log_payload['date'], 'nutrition')
+        version = bump_data_version(current_user_id, 'nutrition_logs', 'daily_summary')
+        publish_log(current_user_id, 'nutrition', nutrition_log_payload, version)
+        body = {'message': 'Nutrition logged successfully', 'log_id': response.data[0]['id']}
+        if matched_food:
+            body['matched_food'] = {key: matched_food[key] for key in ('id', 'name', 'serving', 'match')}
+        return jsonify(body), 201
     except Exception as e:
         print(f"Error logging nutrition: {e}")
         details = str(e)
@@ -129,7 +242,10 @@ def log_weight(current_user_id):
         if not response.data:
             print(f"Error logging weight: No data returned and no exception raised. User: {current_user_id}")
             return jsonify({'error': 'Failed to log weight', 'details': 'No data returned from database operation'}), 500
-            
+
+        refresh_daily_summary(current_user_id, weight_log_payload['date'], 'weight')
+        version = bump_data_version(current_user_id, 'weight_tracker', 'daily_summary')
+        publish_log(current_user_id, 'weight', weight_log_payload, version)
         return jsonify({'message': 'Weight logged successfully', 'log_id': response.data[0]['id']}), 201
     except Exception as e:
         print(f"Error logging weight: {e}")
@@ -152,6 +268,23 @@ def log_water(current_user_id):
         'date': data.get('date', date.today().isoformat()),
         'amount_ml': data.get('amount_ml')
     }
+
+    water_buffer = get_water_buffer()
+    if water_buffer is not None:
+        # Write-behind mode: journaled and coalesced into a bulk insert shortly after.
+        try:
+            amount_ml = int(water_log_payload['amount_ml'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'amount_ml must be a number'}), 400
+        try:
+            water_buffer.add(current_user_id, str(water_log_payload['date'])[:10], amount_ml)
+        except Exception as e:
+            print(f"Error buffering water intake: {e}")
+            return jsonify({'error': 'Failed to log water intake', 'details': str(e)}), 500
+        # Dashboards overlay buffered water, so they can count it now; the flush changes nothing they show
+        publish_log(current_user_id, 'water', {**water_log_payload, 'amount_ml': amount_ml})
+        return jsonify({'message': 'Water intake logged successfully', 'log_id': None, 'pending': True}), 202
+
     try:
         response = supabase.table('water_intake_logs').insert(water_log_payload).execute()
 
@@ -161,7 +294,10 @@ def log_water(current_user_id):
         if not response.data:
             print(f"Error logging water: No data returned and no exception raised. User: {current_user_id}")
             return jsonify({'error': 'Failed to log water intake', 'details': 'No data returned from database operation'}), 500
-            
+
+        refresh_daily_summary(current_user_id, water_log_payload['date'], 'water')
+        version = bump_data_version(current_user_id, 'water_intake_logs', 'daily_summary')
+        publish_log(current_user_id, 'water', water_log_payload, version)
         return jsonify({'message': 'Water intake logged successfully', 'log_id': response.data[0]['id']}), 201
     except Exception as e:
         print(f"Error logging water: {e}")
@@ -175,9 +311,16 @@ def log_water(current_user_id):
 # GET routes to fetch logs
 @log_bp.route('/logs/workout', methods=['GET'])
 @token_required
+@conditional_get('workout_logs', 'exercise_details')
 def get_workout_logs(current_user_id):
-    log_date_str = request.args.get('date') 
+    log_date_str = request.args.get('date')
+    if log_date_str and not _is_iso_date(log_date_str):
+        return jsonify({'error': 'date must be an ISO date (YYYY-MM-DD)'}), 400
     try:
+        direct_response = read_json('workout_logs', current_user_id, log_date_str or MIN_DATE, log_date_str or MAX_DATE)
+        if direct_response is not None:
+            return direct_response, 200
+
         query = supabase.table('workout_logs').select('*, exercise_details(*)').eq('user_id', current_user_id)
         if log_date_str:
             query = query.eq('date', log_date_str)
@@ -203,11 +346,39 @@ def get_workout_logs(current_user_id):
             details = str(e.args[0]) if isinstance(e.args[0], dict) and 'message' in e.args[0] else str(e.args)
         return jsonify({'error': 'Error fetching workout logs', 'details': details}), 500
 
+@log_bp.route('/logs/exercises/recent', methods=['GET'])
+@token_required
+@conditional_get('exercise_recency')
+def get_recent_exercise_index(current_user_id):
+    """
+    The user's exercises with their last sets/reps/weight, without fetching workout history.
+    Query params: sort=recent|frequent (default recent), limit (default 20, max 100), q (name filter).
+    """
+    sort = request.args.get('sort', 'recent')
+    if sort not in EXERCISE_SORTS:
+        return jsonify({'error': f"sort must be one of: {', '.join(EXERCISE_SORTS)}"}), 400
+    try:
+        limit = max(1, min(100, int(request.args.get('limit', 20))))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    try:
+        return jsonify(get_recent_exercises(current_user_id, sort, limit, request.args.get('q'))), 200
+    except Exception as e:
+        print(f"Error fetching recent exercises: {e}")
+        return jsonify({'error': 'Error fetching recent exercises', 'details': str(e)}), 500
+
 @log_bp.route('/logs/nutrition', methods=['GET'])
 @token_required
+@conditional_get('nutrition_logs')
 def get_nutrition_logs(current_user_id):
     log_date_str = request.args.get('date')
+    if log_date_str and not _is_iso_date(log_date_str):
+        return jsonify({'error': 'date must be an ISO date (YYYY-MM-DD)'}), 400
     try:
+        direct_response = read_json('nutrition_logs', current_user_id, log_date_str or MIN_DATE, log_date_str or MAX_DATE)
+        if direct_response is not None:
+            return direct_response, 200
+
         query = supabase.table('nutrition_logs').select('*').eq('user_id', current_user_id)
         if log_date_str:
             query = query.eq('date', log_date_str)
@@ -234,9 +405,16 @@ def get_nutrition_logs(current_user_id):
 
 @log_bp.route('/logs/weight', methods=['GET'])
 @token_required
+@conditional_get('weight_tracker')
 def get_weight_logs(current_user_id):
     log_date_str = request.args.get('date')
+    if log_date_str and not _is_iso_date(log_date_str):
+        return jsonify({'error': 'date must be an ISO date (YYYY-MM-DD)'}), 400
     try:
+        direct_response = read_json('weight_logs', current_user_id, log_date_str or MIN_DATE, log_date_str or MAX_DATE)
+        if direct_response is not None:
+            return direct_response, 200
+
         query = supabase.table('weight_tracker').select('*').eq('user_id', current_user_id)
         if log_date_str:
             query = query.eq('date', log_date_str)
@@ -263,24 +441,41 @@ def get_weight_logs(current_user_id):
 
 @log_bp.route('/logs/water', methods=['GET'])
 @token_required
+@conditional_get('water_intake_logs', extra=lambda user_id: get_water_buffer().pending_token(user_id) if get_water_buffer() else '')
 def get_water_logs(current_user_id):
     log_date_str = request.args.get('date')
+    if log_date_str and not _is_iso_date(log_date_str):
+        return jsonify({'error': 'date must be an ISO date (YYYY-MM-DD)'}), 400
     try:
-        query = supabase.table('water_intake_logs').select('*').eq('user_id', current_user_id)
-        if log_date_str:
-            query = query.eq('date', log_date_str)
-        query = query.order('date', desc=True)
-        
-        response = query.execute()
+        water_buffer = get_water_buffer()
+        if water_buffer is None:
+            direct_response = read_json('water_logs', current_user_id, log_date_str or MIN_DATE, log_date_str or MAX_DATE)
+            if direct_response is not None:
+                return direct_response, 200
+            rows = None
+        else:
+            rows = read_rows('water_logs', current_user_id, log_date_str or MIN_DATE, log_date_str or MAX_DATE)
+        if rows is None:
+            query = supabase.table('water_intake_logs').select('*').eq('user_id', current_user_id)
+            if log_date_str:
+                query = query.eq('date', log_date_str)
+            query = query.order('date', desc=True)
 
-        if response is None:
-            print(f"Error fetching water logs: Supabase client returned None. User: {current_user_id}")
-            return jsonify({'error': 'Error fetching water logs', 'details': 'Database client communication error'}), 500
-        if not hasattr(response, 'data'):
-            print(f"Error fetching water logs: Supabase response object malformed (missing 'data'). User: {current_user_id}")
-            return jsonify({'error': 'Error fetching water logs', 'details': 'Malformed database response'}), 500
-            
-        return jsonify(response.data), 200
+            response = query.execute()
+
+            if response is None:
+                print(f"Error fetching water logs: Supabase client returned None. User: {current_user_id}")
+                return jsonify({'error': 'Error fetching water logs', 'details': 'Database client communication error'}), 500
+            if not hasattr(response, 'data'):
+                print(f"Error fetching water logs: Supabase response object malformed (missing 'data'). User: {current_user_id}")
+                return jsonify({'error': 'Error fetching water logs', 'details': 'Malformed database response'}), 500
+            rows = response.data or []
+
+        if water_buffer is not None:
+            # Overlay entries that haven't been flushed yet so users see their own writes
+            return jsonify(water_buffer.pending_rows(current_user_id, log_date_str) + rows), 200
+
+        return jsonify(rows), 200
     except Exception as e:
         print(f"Error fetching water logs: {e}")
         details = str(e)
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from db import get_db_client
 from auth_utils import token_required
+from data_versions import bump_data_version
 
 profile_bp = Blueprint('profile_bp', __name__)
 supabase = get_db_client()
@@ -99,7 +100,8 @@ def upsert_profile(current_user_id):
         if not db_operation_response.data: # Insert/Update should return data
             print(f"Error upserting profile: No data returned after insert/update and no exception. User: {current_user_id}")
             return jsonify({'error': 'Failed to save profile', 'details': 'No data returned after database operation'}), 500
-        
+
+        bump_data_version(current_user_id, 'profiles')
         return jsonify(db_operation_response.data[0]), status_code
         
     except Exception as e:
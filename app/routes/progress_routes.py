@@ -1,7 +1,14 @@
 from flask import Blueprint, jsonify, request
 from db import get_db_client
 from auth_utils import token_required
-from gemini_service import generate_text_from_gemini
+from data_versions import conditional_get
+from daily_summary import get_daily_summaries
+from weight_analytics import analyze_weight_history
+from exercise_analytics import get_exercise_progress
+from gemini_service import generate_text_strict, gemini_available, GeminiUnavailableError, BLOCKED_MESSAGE
+from ai_results import remember_result, stale_or_unavailable
+from profiler import span
+from direct_db import read_rows, read_json, MIN_DATE, MAX_DATE
 from datetime import date, timedelta
 
 progress_bp = Blueprint('progress_bp', __name__)
@@ -9,28 +16,67 @@ supabase = get_db_client()
 
 @progress_bp.route('/progress/weight', methods=['GET'])
 @token_required
+@conditional_get('weight_tracker', 'profiles')
 def get_weight_progress(current_user_id):
     days = request.args.get('days')
+    mode = request.args.get('mode', 'raw') # 'raw' rows or server-side 'analytics'
     
     try:
-        query = supabase.table('weight_tracker').select('date, weight_kg').eq('user_id', current_user_id)
-        
         # Apply date filtering if days parameter is provided
+        cutoff_date = None
         if days and days != 'all':
             cutoff_date = (date.today() - timedelta(days=int(days))).isoformat()
-            query = query.gte('date', cutoff_date)
-            
-        response = query.order('date', desc=False).execute()
-        
-        if response is None:
-            print(f"Error fetching weight progress: Supabase client returned None. User: {current_user_id}")
-            return jsonify({'error': 'Database communication error (response was None)'}), 500
-        
-        if not hasattr(response, 'data'):
-            print(f"Error fetching weight progress: Supabase response object malformed (missing 'data'). User: {current_user_id}")
-            return jsonify({'error': 'Error fetching weight progress', 'details': 'Malformed database response'}), 500
-            
-        return jsonify(response.data), 200
+
+        if mode == 'analytics':
+            rows = read_rows('weight_series', current_user_id, cutoff_date or MIN_DATE, MAX_DATE)
+        else:
+            direct_response = read_json('weight_series', current_user_id, cutoff_date or MIN_DATE, MAX_DATE)
+            if direct_response is not None:
+                return direct_response, 200
+            rows = None
+        if rows is None:
+            query = supabase.table('weight_tracker').select('date, weight_kg').eq('user_id', current_user_id)
+            if cutoff_date:
+                query = query.gte('date', cutoff_date)
+
+            response = query.order('date', desc=False).execute()
+
+            if response is None:
+                print(f"Error fetching weight progress: Supabase client returned None. User: {current_user_id}")
+                return jsonify({'error': 'Database communication error (response was None)'}), 500
+
+            if not hasattr(response, 'data'):
+                print(f"Error fetching weight progress: Supabase response object malformed (missing 'data'). User: {current_user_id}")
+                return jsonify({'error': 'Error fetching weight progress', 'details': 'Malformed database response'}), 500
+            rows = response.data or []
+
+        if mode == 'analytics':
+            try:
+                points = int(request.args.get('points', 200))
+                alpha = float(request.args.get('alpha', 0.1))
+                window_days = int(request.args.get('window', 7))
+            except ValueError:
+                return jsonify({'error': 'points, alpha and window must be numeric'}), 400
+            if not 0 < alpha <= 1 or window_days < 1:
+                return jsonify({'error': 'alpha must be in (0, 1] and window at least 1 day'}), 400
+
+            profile_rows = read_rows('profile_target_weight', current_user_id)
+            if profile_rows is not None:
+                target_weight_kg = profile_rows[0].get('target_weight_kg') if profile_rows else None
+            else:
+                profile_resp = supabase.table('profiles').select('target_weight_kg').eq('user_id', current_user_id).maybe_single().execute()
+                target_weight_kg = profile_resp.data.get('target_weight_kg') if profile_resp and profile_resp.data else None
+
+            analytics = analyze_weight_history(
+                rows,
+                target_weight_kg=target_weight_kg,
+                points=max(points, 3),
+                alpha=alpha,
+                window_days=window_days,
+            )
+            return jsonify(analytics), 200
+
+        return jsonify(rows), 200
     except Exception as e:
         print(f"Error fetching weight progress: {e}")
         details = str(e)
@@ -42,8 +88,19 @@ def get_weight_progress(current_user_id):
 
 @progress_bp.route('/progress/nutrition', methods=['GET'])
 @token_required
+@conditional_get('nutrition_logs', 'daily_summary')
 def get_nutrition_progress(current_user_id):
+    granularity = request.args.get('granularity', 'entry')
     try:
+        if granularity == 'daily':
+            # One pre-aggregated row per day from the daily_summary rollup
+            daily_rows = get_daily_summaries(current_user_id, columns='date, calories, protein_g, carbs_g, fat_g, nutrition_log_count')
+            return jsonify([row for row in daily_rows if row.get('nutrition_log_count')]), 200
+
+        direct_response = read_json('nutrition_logs_asc', current_user_id, MIN_DATE, MAX_DATE)
+        if direct_response is not None:
+            return direct_response, 200
+
         response = supabase.table('nutrition_logs').select('*').eq('user_id', current_user_id).order('date', desc=False).execute()
         
         if response is None:
@@ -66,8 +123,13 @@ def get_nutrition_progress(current_user_id):
 
 @progress_bp.route('/progress/workouts', methods=['GET'])
 @token_required
+@conditional_get('workout_logs', 'exercise_details')
 def get_workout_progress(current_user_id):
     try:
+        direct_response = read_json('workout_logs_asc', current_user_id, MIN_DATE, MAX_DATE)
+        if direct_response is not None:
+            return direct_response, 200
+
         response = supabase.table('workout_logs').select('*, exercise_details(*)').eq('user_id', current_user_id).order('date', desc=False).execute()
         
         if response is None:
@@ -88,10 +150,37 @@ def get_workout_progress(current_user_id):
             details = str(e.args[0]) if isinstance(e.args[0], dict) and 'message' in e.args[0] else str(e.args)
         return jsonify({'error': 'Error fetching workout progress', 'details': details}), 500
 
+@progress_bp.route('/progress/exercises', methods=['GET'])
+@token_required
+@conditional_get('exercise_weekly_stats')
+def get_exercise_progress_route(current_user_id):
+    """
+    Per-exercise personal records (estimated 1RM, best set, heaviest weight, biggest week),
+    an 8-week e1RM trend and weekly volume/tonnage series, precomputed at log time.
+    Query params: exercise (one exercise by name), since (ISO date; trims the series only).
+    """
+    since = request.args.get('since')
+    if since:
+        try:
+            date.fromisoformat(since[:10])
+        except ValueError:
+            return jsonify({'error': 'since must be an ISO date (YYYY-MM-DD)'}), 400
+    try:
+        return jsonify(get_exercise_progress(current_user_id, request.args.get('exercise'), since)), 200
+    except Exception as e:
+        print(f"Error fetching exercise progress: {e}")
+        details = str(e)
+        if hasattr(e, 'message') and e.message:
+            details = e.message
+        return jsonify({'error': 'Error fetching exercise progress', 'details': details}), 500
+
 @progress_bp.route('/insights/generate', methods=['GET'])
 @token_required
 def generate_fitness_insights(current_user_id):
     try:
+        if not gemini_available():
+            return stale_or_unavailable(current_user_id, 'insights', 'Could not generate insights at this time.')
+
         # 1. Fetch relevant data
         profile_resp = supabase.table('profiles').select('primary_goal, fitness_level, initial_weight_kg').eq('user_id', current_user_id).maybe_single().execute()
         
@@ -116,14 +205,12 @@ def generate_fitness_insights(current_user_id):
         weight_summary_last_30_days = weight_data_resp.data if weight_data_resp.data else []
 
 
-        nutrition_summary_resp = supabase.table('nutrition_logs').select('date, calories, protein_g, carbs_g, fat_g').eq('user_id', current_user_id).gte('date', thirty_days_ago).order('date').execute()
-        if nutrition_summary_resp is None:
-            print(f"Error generating insights: Supabase client returned None for nutrition data. User: {current_user_id}")
-            return jsonify({'error': 'Database communication error (nutrition data response was None)'}), 500
-        if not hasattr(nutrition_summary_resp, 'data'):
-            print(f"Error generating insights: Supabase nutrition data response object malformed (missing 'data'). User: {current_user_id}")
-            return jsonify({'error': 'Error generating insights', 'details': 'Malformed database response for nutrition data'}), 500
-        nutrition_summary_last_30_days = nutrition_summary_resp.data if nutrition_summary_resp.data else []
+        # Daily totals from the rollup rather than every individual meal entry
+        nutrition_summary_last_30_days = [
+            {key: row.get(key) for key in ('date', 'calories', 'protein_g', 'carbs_g', 'fat_g')}
+            for row in get_daily_summaries(current_user_id, start_date=thirty_days_ago, columns='date, calories, protein_g, carbs_g, fat_g, nutrition_log_count')
+            if row.get('nutrition_log_count')
+        ]
 
 
         workout_summary_resp = supabase.table('workout_logs').select('date, type, duration_minutes').eq('user_id', current_user_id).gte('date', thirty_days_ago).order('date').execute()
@@ -158,69 +245,70 @@ def generate_fitness_insights(current_user_id):
         avg_calories = sum(n.get('calories', 0) for n in nutrition_summary_last_30_days) / len(nutrition_summary_last_30_days) if nutrition_summary_last_30_days else 0
         
         # Build comprehensive AI coach prompt
-        prompt_parts = [
-            "🧠 AI FITNESS INSIGHTS COACH ROLE: You are an expert data analyst and personal trainer with deep knowledge in fitness psychology and behavior change. Provide meaningful, actionable insights.",
-            "",
-            f"👤 USER PROFILE ANALYSIS:",
-            f"• Primary Goal: {profile.get('primary_goal', 'Not specified')}",
-            f"• Fitness Level: {profile.get('fitness_level', 'Not specified')}",
-            f"• Starting Weight: {profile.get('initial_weight_kg', 'Not recorded')} kg" if profile.get('initial_weight_kg') else "• Starting Weight: Not recorded",
-            "",
-            f"📊 30-DAY PERFORMANCE METRICS:",
-            f"• Data Collection: {max(workout_days, nutrition_days)}/30 days tracked ({round(max(workout_days, nutrition_days)/30*100)}% consistency)",
-            f"• Workout Frequency: {workout_days} days active ({round(workout_days/30*100)}% of month)",
-            f"• Total Exercise Time: {total_workout_time} minutes ({round(total_workout_time/60, 1)} hours)",
-            f"• Workout Variety: {len(workout_types)} different types: {', '.join(workout_types) if workout_types else 'None'}",
-            f"• Nutrition Tracking: {nutrition_days} days logged ({round(nutrition_days/30*100)}% of month)",
-            f"• Average Daily Calories: {round(avg_calories)} kcal" if avg_calories > 0 else "• Average Daily Calories: No data",
-            f"• Weight Progress: {weight_trend.title()} ({weight_change:+.1f} kg change)" if weight_change != 0 else "• Weight Progress: Stable (no significant change)",
-            ""
-        ]
-        
-        # Add detailed data context
-        if weight_summary_last_30_days:
-            weight_entries = len(weight_summary_last_30_days)
-            prompt_parts.append(f"🏋️ WEIGHT DATA ({weight_entries} entries): {weight_summary_last_30_days}")
+        with span('prompt', 'insights'):
+            prompt_parts = [
+                "🧠 AI FITNESS INSIGHTS COACH ROLE: You are an expert data analyst and personal trainer with deep knowledge in fitness psychology and behavior change. Provide meaningful, actionable insights.",
+                "",
+                f"👤 USER PROFILE ANALYSIS:",
+                f"• Primary Goal: {profile.get('primary_goal', 'Not specified')}",
+                f"• Fitness Level: {profile.get('fitness_level', 'Not specified')}",
+                f"• Starting Weight: {profile.get('initial_weight_kg', 'Not recorded')} kg" if profile.get('initial_weight_kg') else "• Starting Weight: Not recorded",
+                "",
+                f"📊 30-DAY PERFORMANCE METRICS:",
+                f"• Data Collection: {max(workout_days, nutrition_days)}/30 days tracked ({round(max(workout_days, nutrition_days)/30*100)}% consistency)",
+                f"• Workout Frequency: {workout_days} days active ({round(workout_days/30*100)}% of month)",
+                f"• Total Exercise Time: {total_workout_time} minutes ({round(total_workout_time/60, 1)} hours)",
+                f"• Workout Variety: {len(workout_types)} different types: {', '.join(workout_types) if workout_types else 'None'}",
+                f"• Nutrition Tracking: {nutrition_days} days logged ({round(nutrition_days/30*100)}% of month)",
+                f"• Average Daily Calories: {round(avg_calories)} kcal" if avg_calories > 0 else "• Average Daily Calories: No data",
+                f"• Weight Progress: {weight_trend.title()} ({weight_change:+.1f} kg change)" if weight_change != 0 else "• Weight Progress: Stable (no significant change)",
+                ""
+            ]
         
-        if nutrition_summary_last_30_days:
-            prompt_parts.append(f"🍽️ NUTRITION DATA ({len(nutrition_summary_last_30_days)} entries - showing calories, protein, carbs, fat): {nutrition_summary_last_30_days}")
+            # Add detailed data context
+            if weight_summary_last_30_days:
+                weight_entries = len(weight_summary_last_30_days)
+                prompt_parts.append(f"🏋️ WEIGHT DATA ({weight_entries} entries): {weight_summary_last_30_days}")
         
-        if workout_summary_last_30_days:
-            prompt_parts.append(f"💪 WORKOUT DATA ({len(workout_summary_last_30_days)} sessions): {workout_summary_last_30_days}")
+            if nutrition_summary_last_30_days:
+                prompt_parts.append(f"🍽️ NUTRITION DATA ({len(nutrition_summary_last_30_days)} days - daily totals of calories, protein, carbs, fat): {nutrition_summary_last_30_days}")
         
-        prompt_parts.extend([
-            "",
-            "🎯 ANALYSIS REQUIREMENTS:",
-            "1. PROGRESS ASSESSMENT: Analyze trends, patterns, and alignment with their stated goal",
-            "2. BEHAVIORAL INSIGHTS: Identify strengths in their routine and areas needing attention", 
-            "3. MOTIVATION BOOST: Celebrate achievements and progress, no matter how small",
-            "4. ACTIONABLE GUIDANCE: Provide 1-2 specific, implementable recommendations",
-            "5. PERSONALIZATION: Reference their actual data points and goal in your insights",
-            "",
-            "📝 OUTPUT FORMAT (Return exactly 3-4 bullet points):",
-            "• Insight 1: Highlight a positive trend or achievement with specific data",
-            "• Insight 2: Identify a key pattern or area for improvement with constructive advice", 
-            "• Insight 3: Provide one specific, actionable recommendation for next week",
-            "• [Optional] Insight 4: Motivational perspective on their overall journey",
-            "",
-            "🌟 TONE: Encouraging, professional, data-driven, and personally relevant. Act as their supportive AI fitness coach who genuinely cares about their success.",
-            "",
-            "⚠️ IMPORTANT: If data is limited, focus on encouraging consistency in tracking and celebrating the commitment to start their fitness journey. Never criticize - always motivate!"
-        ])
+            if workout_summary_last_30_days:
+                prompt_parts.append(f"💪 WORKOUT DATA ({len(workout_summary_last_30_days)} sessions): {workout_summary_last_30_days}")
         
-        gemini_insight = generate_text_from_gemini(prompt_parts)
+            prompt_parts.extend([
+                "",
+                "🎯 ANALYSIS REQUIREMENTS:",
+                "1. PROGRESS ASSESSMENT: Analyze trends, patterns, and alignment with their stated goal",
+                "2. BEHAVIORAL INSIGHTS: Identify strengths in their routine and areas needing attention", 
+                "3. MOTIVATION BOOST: Celebrate achievements and progress, no matter how small",
+                "4. ACTIONABLE GUIDANCE: Provide 1-2 specific, implementable recommendations",
+                "5. PERSONALIZATION: Reference their actual data points and goal in your insights",
+                "",
+                "📝 OUTPUT FORMAT (Return exactly 3-4 bullet points):",
+                "• Insight 1: Highlight a positive trend or achievement with specific data",
+                "• Insight 2: Identify a key pattern or area for improvement with constructive advice", 
+                "• Insight 3: Provide one specific, actionable recommendation for next week",
+                "• [Optional] Insight 4: Motivational perspective on their overall journey",
+                "",
+                "🌟 TONE: Encouraging, professional, data-driven, and personally relevant. Act as their supportive AI fitness coach who genuinely cares about their success.",
+                "",
+                "⚠️ IMPORTANT: If data is limited, focus on encouraging consistency in tracking and celebrating the commitment to start their fitness journey. Never criticize - always motivate!"
+            ])
         
-        if gemini_insight and "Sorry, I couldn\'t generate a response" not in gemini_insight:
-            for insight_line in gemini_insight.strip().split('\n'):
-                if insight_line.strip(): 
-                    insights.append(insight_line.strip())
-        else:
-            insights.append("I'm having a little trouble generating detailed insights right now. Please try again in a moment!")
-            if gemini_insight: 
-                 print(f"Gemini service returned: {gemini_insight}")
+        try:
+            gemini_insight = generate_text_strict(prompt_parts, profile='insights')
+        except GeminiUnavailableError as e:
+            return stale_or_unavailable(current_user_id, 'insights', 'Could not generate insights at this time.', e)
+
+        for insight_line in gemini_insight.strip().split('\n'):
+            if insight_line.strip(): 
+                insights.append(insight_line.strip())
 
         if not insights: 
             insights.append("Keep tracking your activities and measurements to see insights here!")
+        elif gemini_insight != BLOCKED_MESSAGE:
+            remember_result(current_user_id, 'insights', {'insights': insights})
 
         return jsonify({'insights': insights}), 200
 
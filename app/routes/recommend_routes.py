@@ -1,17 +1,103 @@
+import uuid
 from flask import Blueprint, request, jsonify
 from db import get_db_client
 from auth_utils import token_required
-from gemini_service import generate_text_from_gemini
+from config import Config
+from gemini_service import generate_text_strict, generate_json_strict, gemini_available, gemini_breaker, GeminiUnavailableError, GENERATION_PROFILES, BLOCKED_MESSAGE
+from ai_results import remember_result, stale_or_unavailable
+from plans import (
+    WORKOUT_SCHEMA, MEAL_SCHEMA, MAX_PLAN_DAYS, PLAN_KINDS, MAX_INSTRUCTIONS_LENGTH, PlanFormatError, PlanConflictError,
+    parse_plan, resolve_part, apply_part, part_prompt, workout_plan_from_local, meal_plan_from_local,
+    save_plan, load_plan, latest_plan, list_plans, update_plan, plan_body,
+)
+from local_recommender import build_workout_plan, render_workout_text, build_meal_plan, render_meal_text
+from food_db import get_food_index
+from profiler import span
 
 recommend_bp = Blueprint('recommend_bp', __name__)
 supabase = get_db_client()
 
+ENGINES = ('ai', 'local', 'auto')
+FORMATS = ('text', 'structured')
+EXTRA_DAY_OUTPUT_TOKENS = 1024  # Added to the 'workout' profile's cap per extra day of a structured plan
+COMMON_PROTEINS = ['chicken', 'beef', 'fish', 'salmon', 'tuna', 'eggs', 'tofu']
+
+
+def _profile_columns(columns):
+    """Adds the tier column to a profile select when tier-based engine selection is configured."""
+    if Config.RECOMMENDER_ENGINE_BY_TIER and Config.RECOMMENDER_TIER_COLUMN:
+        return f"{columns}, {Config.RECOMMENDER_TIER_COLUMN}"
+    return columns
+
+
+def _format_args(allow_days=False):
+    """(structured, days) from ?format= and ?days=; raises ValueError for bad values."""
+    output_format = request.args.get('format', 'text')
+    if output_format not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    days = 1
+    if allow_days and request.args.get('days'):
+        try:
+            days = int(request.args['days'])
+        except ValueError:
+            raise ValueError('days must be an integer')
+        if not 1 <= days <= MAX_PLAN_DAYS:
+            raise ValueError(f"days must be between 1 and {MAX_PLAN_DAYS}")
+        if output_format != 'structured':
+            raise ValueError('days requires format=structured')
+    return output_format == 'structured', days
+
+
+def _plan_response(current_user_id, kind, plan, context, engine):
+    """Stores a structured plan and returns it. A storage failure still returns the plan, without a plan_id."""
+    try:
+        row = save_plan(current_user_id, kind, plan, context, engine)
+    except Exception as e:
+        print(f"Warning: Failed to store {kind} plan. User: {current_user_id}. Error: {e}")
+        row = {'id': None, 'kind': kind, 'engine': engine, 'version': 0, 'plan': plan}
+    return jsonify(plan_body(row)), 200
+
+
+def _unavailable(current_user_id, kind, result_kind, structured, error_message, error=None):
+    """stale_or_unavailable, preferring the user's latest stored plan for structured requests."""
+    if structured:
+        try:
+            row = latest_plan(current_user_id, kind)
+        except Exception as e:
+            print(f"Warning: Failed to load latest {kind} plan. User: {current_user_id}. Error: {e}")
+            row = None
+        if row:
+            return jsonify(plan_body(row, stale=True)), 200
+    return stale_or_unavailable(current_user_id, result_kind, error_message, error)
+
+
+def resolve_engine(requested, profile):
+    """Picks 'ai' or 'local' from the ?engine= param, the user's tier and Gemini's current health."""
+    engine = requested or Config.RECOMMENDER_ENGINE_BY_TIER.get(profile.get(Config.RECOMMENDER_TIER_COLUMN) or '') or Config.RECOMMENDER_DEFAULT_ENGINE
+    if engine == 'auto':
+        p90 = gemini_breaker.latency_percentile(90)
+        if not gemini_available() or (p90 is not None and p90 > Config.LOCAL_FALLBACK_LATENCY_SECONDS):
+            return 'local'
+        return 'ai'
+    return engine
+
 @recommend_bp.route('/recommend/workout', methods=['GET'])
 @token_required
 def get_workout_recommendation(current_user_id):
+    requested_engine = request.args.get('engine')
+    if requested_engine and requested_engine not in ENGINES:
+        return jsonify({'error': f"engine must be one of: {', '.join(ENGINES)}"}), 400
     try:
+        structured, days = _format_args(allow_days=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if requested_engine == 'ai' and not gemini_available():
+            # Fail fast while Gemini's breaker is open: skip the DB reads and prompt entirely
+            return _unavailable(current_user_id, 'workout', 'workout_recommendation', structured, 'Could not generate workout recommendation at this time.')
+
         # Fetch user profile for context
-        profile_resp = supabase.table('profiles').select('fitness_level, primary_goal').eq('user_id', current_user_id).maybe_single().execute()
+        profile_resp = supabase.table('profiles').select(_profile_columns('fitness_level, primary_goal')).eq('user_id', current_user_id).maybe_single().execute()
         
         if profile_resp is None:
             print(f"Error getting workout recommendation: Supabase client returned None for profile. User: {current_user_id}")
@@ -30,59 +116,102 @@ def get_workout_recommendation(current_user_id):
         primary_goal = profile.get('primary_goal', 'general fitness')        # Fetch recent workout data to avoid repetition and track progress
         recent_workouts_resp = supabase.table('workout_logs').select('date, type, duration_minutes, notes').eq('user_id', current_user_id).order('date', desc=True).limit(5).execute()
         recent_workouts = recent_workouts_resp.data if recent_workouts_resp and hasattr(recent_workouts_resp, 'data') else []
-        
+
+        plan_context = {
+            'fitness_level': fitness_level,
+            'primary_goal': primary_goal,
+            'days': days,
+            'recent_workout_types': sorted({w.get('type') for w in recent_workouts if w.get('type')}),
+        } if structured else None
+
+        engine = resolve_engine(requested_engine, profile)
+        if engine == 'local':
+            return _local_workout_response(current_user_id, fitness_level, primary_goal, recent_workouts, plan_context, days)
+
         # Build comprehensive, personalized prompt
-        prompt = [
-            "🏋️ AI FITNESS COACH ROLE: You are an expert personal trainer with 10+ years of experience. Provide a personalized workout recommendation.",
-            "",
-            f"👤 USER PROFILE:",
-            f"• Fitness Level: {fitness_level.title()}",
-            f"• Primary Goal: {primary_goal.title()}",
-            f"• Recent Activity: {'Active user with ' + str(len(recent_workouts)) + ' logged workouts in past 5 sessions' if recent_workouts else 'New or returning user - design beginner-friendly routine'}",
-            "",
-            f"📊 RECENT WORKOUT HISTORY (Last 5 sessions):" if recent_workouts else "📊 WORKOUT HISTORY: No recent data - perfect opportunity for a fresh start!",
-        ]
+        with span('prompt', 'workout'):
+            prompt = [
+                "🏋️ AI FITNESS COACH ROLE: You are an expert personal trainer with 10+ years of experience. Provide a personalized workout recommendation.",
+                "",
+                f"👤 USER PROFILE:",
+                f"• Fitness Level: {fitness_level.title()}",
+                f"• Primary Goal: {primary_goal.title()}",
+                f"• Recent Activity: {'Active user with ' + str(len(recent_workouts)) + ' logged workouts in past 5 sessions' if recent_workouts else 'New or returning user - design beginner-friendly routine'}",
+                "",
+                f"📊 RECENT WORKOUT HISTORY (Last 5 sessions):" if recent_workouts else "📊 WORKOUT HISTORY: No recent data - perfect opportunity for a fresh start!",
+            ]
         
-        if recent_workouts:
-            for i, workout in enumerate(recent_workouts[:3], 1):
-                workout_type = workout.get('type', 'Unknown').title()
-                duration = workout.get('duration_minutes', 'N/A')
-                date = workout.get('date', 'Unknown')
-                prompt.append(f"  {i}. {workout_type} - {duration} min ({date})")
+            if recent_workouts:
+                for i, workout in enumerate(recent_workouts[:3], 1):
+                    workout_type = workout.get('type', 'Unknown').title()
+                    duration = workout.get('duration_minutes', 'N/A')
+                    date = workout.get('date', 'Unknown')
+                    prompt.append(f"  {i}. {workout_type} - {duration} min ({date})")
         
-        prompt.extend([
-            "",
-            "🎯 WORKOUT DESIGN REQUIREMENTS:",
-            f"• Difficulty: Match {fitness_level} level (beginner=simple movements, intermediate=moderate complexity, advanced=challenging variations)",
-            f"• Goal Alignment: Optimize for '{primary_goal}' (weight loss=cardio focus, muscle gain=strength focus, endurance=cardio+strength mix)",
-            "• Variety: Avoid repeating recent workout types unless it's a progressive program",
-            "• Time Efficient: 30-45 minute duration ideal",
-            "• Equipment: Assume basic gym access or bodyweight alternatives",
-            "",
-            "📝 OUTPUT FORMAT REQUIRED:",
-            "• Workout Title (motivational and goal-specific)",
-            "• Brief explanation (why this workout matches their profile)",
-            "• Warm-up (5-8 minutes)",
-            "• Main workout with specific exercises, sets, reps, and rest periods",
-            "• Cool-down (5 minutes)",
-            "• Motivational closing tip",
-            "",
-            "🔥 Make it engaging, specific, and actionable. Include progression tips for next time!"
-        ])
+            prompt.extend([
+                "",
+                "🎯 WORKOUT DESIGN REQUIREMENTS:",
+                f"• Difficulty: Match {fitness_level} level (beginner=simple movements, intermediate=moderate complexity, advanced=challenging variations)",
+                f"• Goal Alignment: Optimize for '{primary_goal}' (weight loss=cardio focus, muscle gain=strength focus, endurance=cardio+strength mix)",
+                "• Variety: Avoid repeating recent workout types unless it's a progressive program",
+                "• Time Efficient: 30-45 minute duration ideal",
+                "• Equipment: Assume basic gym access or bodyweight alternatives",
+            ])
+            if structured:
+                prompt.extend([
+                    "",
+                    "📝 OUTPUT: JSON matching the response schema.",
+                    f"• days: exactly {days} workout day(s)" + (", each with a different focus that together make a balanced week" if days > 1 else ""),
+                    "• Each day: a 5-8 minute warm-up, 1-3 blocks of exercises with sets, reps (e.g. '8-10' or '40s work') and rest in seconds, and a 5 minute cool-down",
+                    "• title: motivational and goal-specific; summary: why this plan matches their profile; tip: one progression tip for next time",
+                ])
+            else:
+                prompt.extend([
+                    "",
+                    "📝 OUTPUT FORMAT REQUIRED:",
+                    "• Workout Title (motivational and goal-specific)",
+                    "• Brief explanation (why this workout matches their profile)",
+                    "• Warm-up (5-8 minutes)",
+                    "• Main workout with specific exercises, sets, reps, and rest periods",
+                    "• Cool-down (5 minutes)",
+                    "• Motivational closing tip",
+                    "",
+                    "🔥 Make it engaging, specific, and actionable. Include progression tips for next time!"
+                ])
         
-        # Add variety based on recent workouts
-        if recent_workouts:
-            recent_types = [w.get('type', '').lower() for w in recent_workouts]
-            if 'strength' in ' '.join(recent_types):
-                prompt.append("\n💡 VARIETY TIP: User has done strength training recently - consider cardio or HIIT variation")
-            elif 'cardio' in ' '.join(recent_types):
-                prompt.append("\n💡 VARIETY TIP: User has done cardio recently - consider strength or functional training")
+            # Add variety based on recent workouts
+            if recent_workouts:
+                recent_types = [w.get('type', '').lower() for w in recent_workouts]
+                if 'strength' in ' '.join(recent_types):
+                    prompt.append("\n💡 VARIETY TIP: User has done strength training recently - consider cardio or HIIT variation")
+                elif 'cardio' in ' '.join(recent_types):
+                    prompt.append("\n💡 VARIETY TIP: User has done cardio recently - consider strength or functional training")
         
-        recommendation_text = generate_text_from_gemini(prompt)
-        if "Sorry, I couldn\'t generate a response" in recommendation_text:
-             return jsonify({'error': 'Could not generate workout recommendation at this time.'}), 503
+        if structured:
+            max_output_tokens = GENERATION_PROFILES['workout']['max_output_tokens'] + EXTRA_DAY_OUTPUT_TOKENS * (days - 1)
+            try:
+                plan_data = generate_json_strict(prompt, WORKOUT_SCHEMA, profile='workout', max_output_tokens=max_output_tokens)
+                if plan_data is None:
+                    return jsonify({'recommendation': BLOCKED_MESSAGE, 'engine': 'ai'}), 200
+                plan = parse_plan('workout', plan_data)
+                plan.days = plan.days[:days]
+            except (GeminiUnavailableError, PlanFormatError) as e:
+                print(f"Structured workout plan unavailable: {e}")
+                if requested_engine != 'ai':
+                    return _local_workout_response(current_user_id, fitness_level, primary_goal, recent_workouts, plan_context, days)
+                return _unavailable(current_user_id, 'workout', 'workout_recommendation', True, 'Could not generate workout recommendation at this time.', e)
+            return _plan_response(current_user_id, 'workout', plan, plan_context, 'ai')
+
+        try:
+            recommendation_text = generate_text_strict(prompt, profile='workout')
+        except GeminiUnavailableError as e:
+            if requested_engine != 'ai':
+                return _local_workout_response(current_user_id, fitness_level, primary_goal, recent_workouts)
+            return stale_or_unavailable(current_user_id, 'workout_recommendation', 'Could not generate workout recommendation at this time.', e)
 
-        return jsonify({'recommendation': recommendation_text}), 200
+        if recommendation_text != BLOCKED_MESSAGE:
+            remember_result(current_user_id, 'workout_recommendation', {'recommendation': recommendation_text})
+        return jsonify({'recommendation': recommendation_text, 'engine': 'ai'}), 200
     except Exception as e:
         print(f"Error getting workout recommendation: {e}")
         details = str(e)
@@ -96,8 +225,19 @@ def get_workout_recommendation(current_user_id):
 @token_required
 def get_meal_recommendation(current_user_id):
     meal_type = request.args.get('type', 'lunch') # e.g., 'breakfast', 'lunch', 'dinner'
+    result_kind = f"meal_recommendation:{meal_type}"
+    requested_engine = request.args.get('engine')
+    if requested_engine and requested_engine not in ENGINES:
+        return jsonify({'error': f"engine must be one of: {', '.join(ENGINES)}"}), 400
     try:
-        profile_resp = supabase.table('profiles').select('primary_goal, dietary_preferences, allergies_intolerances').eq('user_id', current_user_id).maybe_single().execute()
+        structured, _ = _format_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if requested_engine == 'ai' and not gemini_available():
+            return _unavailable(current_user_id, 'meal', result_kind, structured, 'Could not generate meal recommendation at this time.')
+
+        profile_resp = supabase.table('profiles').select(_profile_columns('primary_goal, dietary_preferences, allergies_intolerances')).eq('user_id', current_user_id).maybe_single().execute()
 
         if profile_resp is None:
             print(f"Error getting meal recommendation: Supabase client returned None for profile. User: {current_user_id}")
@@ -114,6 +254,23 @@ def get_meal_recommendation(current_user_id):
         allergies = profile.get('allergies_intolerances', 'none')        # Fetch recent nutrition data to avoid repetition and provide variety
         recent_meals_resp = supabase.table('nutrition_logs').select('date, meal_type, food_item_description, calories').eq('user_id', current_user_id).order('date', desc=True).limit(5).execute()
         recent_meals = recent_meals_resp.data if recent_meals_resp and hasattr(recent_meals_resp, 'data') else []
+
+        # Extract common ingredients to suggest variety (via the food database's word index when built)
+        all_foods = ' '.join([meal.get('food_item_description', '') for meal in recent_meals]).lower()
+        food_index = get_food_index(Config)
+        recent_proteins = food_index.protein_sources(all_foods) if food_index else [p for p in COMMON_PROTEINS if p in all_foods]
+
+        plan_context = {
+            'meal_type': meal_type,
+            'primary_goal': primary_goal,
+            'dietary_preferences': diet_prefs,
+            'allergies_intolerances': allergies,
+            'recent_proteins': recent_proteins,
+        } if structured else None
+
+        engine = resolve_engine(requested_engine, profile)
+        if engine == 'local':
+            return _local_meal_response(current_user_id, meal_type, primary_goal, diet_prefs, allergies, recent_proteins, plan_context)
         
         # Get user's calorie and macro goals if available
         profile_nutrition_resp = supabase.table('profiles').select('target_weight_kg, activity_level').eq('user_id', current_user_id).maybe_single().execute()
@@ -127,72 +284,99 @@ def get_meal_recommendation(current_user_id):
             'dinner': '400-600',
             'snack': '100-300'
         }.get(meal_type, '400-600')
+        if plan_context is not None:
+            plan_context.update({'activity_level': activity_level, 'calorie_range': calorie_range})
         
-        prompt = [
-            "🍽️ AI NUTRITION COACH ROLE: You are a certified nutritionist and meal planning expert. Create a personalized, healthy meal recommendation.",
-            "",
-            f"👤 USER PROFILE:",
-            f"• Primary Goal: {primary_goal.title()}",
-            f"• Dietary Preferences: {diet_prefs.title() if diet_prefs != 'none' else 'No specific preferences'}",
-            f"• Allergies/Intolerances: {allergies.title() if allergies != 'none' else 'None reported'}",
-            f"• Activity Level: {activity_level.title()}",
-            f"• Meal Type: {meal_type.title()}",
-            f"• Target Calorie Range: {calorie_range} calories",
-            "",            f"📊 RECENT MEAL HISTORY:" if recent_meals else "📊 MEAL HISTORY: Fresh start - design a nutritionally balanced meal!",
-        ]
+        with span('prompt', 'meal'):
+            prompt = [
+                "🍽️ AI NUTRITION COACH ROLE: You are a certified nutritionist and meal planning expert. Create a personalized, healthy meal recommendation.",
+                "",
+                f"👤 USER PROFILE:",
+                f"• Primary Goal: {primary_goal.title()}",
+                f"• Dietary Preferences: {diet_prefs.title() if diet_prefs != 'none' else 'No specific preferences'}",
+                f"• Allergies/Intolerances: {allergies.title() if allergies != 'none' else 'None reported'}",
+                f"• Activity Level: {activity_level.title()}",
+                f"• Meal Type: {meal_type.title()}",
+                f"• Target Calorie Range: {calorie_range} calories",
+                "",            f"📊 RECENT MEAL HISTORY:" if recent_meals else "📊 MEAL HISTORY: Fresh start - design a nutritionally balanced meal!",
+            ]
         
-        if recent_meals:
-            recent_foods = []
-            for meal in recent_meals[:3]:
-                food_item_description = meal.get('food_item_description', 'Unknown')
-                date = meal.get('date', 'Unknown')
-                calories = meal.get('calories', 'N/A')
-                recent_foods.append(f"  • {food_item_description} ({calories} cal) - {date}")
-            prompt.extend(recent_foods)
+            if recent_meals:
+                recent_foods = []
+                for meal in recent_meals[:3]:
+                    food_item_description = meal.get('food_item_description', 'Unknown')
+                    date = meal.get('date', 'Unknown')
+                    calories = meal.get('calories', 'N/A')
+                    recent_foods.append(f"  • {food_item_description} ({calories} cal) - {date}")
+                prompt.extend(recent_foods)
             
-            # Extract common ingredients to suggest variety
-            all_foods = ' '.join([meal.get('food_item_description', '') for meal in recent_meals]).lower()
-            common_proteins = ['chicken', 'beef', 'fish', 'salmon', 'tuna', 'eggs', 'tofu']
-            recent_proteins = [p for p in common_proteins if p in all_foods]
-            if recent_proteins:
-                prompt.append(f"  📝 Note: Recently consumed proteins: {', '.join(recent_proteins)} - suggest variety")
+                if recent_proteins:
+                    prompt.append(f"  📝 Note: Recently consumed proteins: {', '.join(recent_proteins)} - suggest variety")
         
-        prompt.extend([
-            "",
-            "🎯 MEAL DESIGN REQUIREMENTS:",
-            f"• Goal Optimization: Tailor for '{primary_goal}' (weight loss=lower cal/high protein, muscle gain=higher protein/moderate carbs, maintenance=balanced)",
-            f"• Dietary Compliance: Strictly follow '{diet_prefs}' preferences and avoid '{allergies}' allergens",
-            "• Nutritional Balance: Include quality protein, complex carbs, healthy fats, and vegetables",
-            "• Variety: Suggest different ingredients from recent meals when possible",
-            f"• Preparation: {meal_type.title()}-appropriate (breakfast=quick/energizing, lunch=satisfying/portable, dinner=hearty/relaxing)",
-            "• Accessibility: Use common ingredients available in most grocery stores",
-            "",
-            "📝 OUTPUT FORMAT REQUIRED:",
-            f"• Recipe Title (appetizing and goal-aligned for {meal_type})",
-            "• Brief nutritional overview (why this meal supports their goal)",
-            "• Ingredients list with quantities",
-            "• Step-by-step preparation instructions (clear and concise)",
-            "• Estimated nutrition facts (calories, protein, carbs, fat)",
-            "• Pro tip for meal prep or variations",
-            "",
-            "🌟 Make it delicious, nutritious, and aligned with their fitness journey!"
-        ])
+            prompt.extend([
+                "",
+                "🎯 MEAL DESIGN REQUIREMENTS:",
+                f"• Goal Optimization: Tailor for '{primary_goal}' (weight loss=lower cal/high protein, muscle gain=higher protein/moderate carbs, maintenance=balanced)",
+                f"• Dietary Compliance: Strictly follow '{diet_prefs}' preferences and avoid '{allergies}' allergens",
+                "• Nutritional Balance: Include quality protein, complex carbs, healthy fats, and vegetables",
+                "• Variety: Suggest different ingredients from recent meals when possible",
+                f"• Preparation: {meal_type.title()}-appropriate (breakfast=quick/energizing, lunch=satisfying/portable, dinner=hearty/relaxing)",
+                "• Accessibility: Use common ingredients available in most grocery stores",
+            ])
+            if structured:
+                prompt.extend([
+                    "",
+                    "📝 OUTPUT: JSON matching the response schema.",
+                    f"• title: appetizing and goal-aligned for {meal_type}; meal_type: {meal_type}; summary: why this meal supports their goal",
+                    "• ingredients with quantities, clear and concise steps, estimated macros for the whole meal, and a meal-prep tip",
+                ])
+            else:
+                prompt.extend([
+                    "",
+                    "📝 OUTPUT FORMAT REQUIRED:",
+                    f"• Recipe Title (appetizing and goal-aligned for {meal_type})",
+                    "• Brief nutritional overview (why this meal supports their goal)",
+                    "• Ingredients list with quantities",
+                    "• Step-by-step preparation instructions (clear and concise)",
+                    "• Estimated nutrition facts (calories, protein, carbs, fat)",
+                    "• Pro tip for meal prep or variations",
+                    "",
+                    "🌟 Make it delicious, nutritious, and aligned with their fitness journey!"
+                ])
         
-        # Add time-specific recommendations
-        time_tips = {
-            'breakfast': '\n⏰ BREAKFAST TIP: Focus on protein and fiber to maintain energy and satiety throughout the morning',
-            'lunch': '\n⏰ LUNCH TIP: Balance energy needs for afternoon activities while avoiding post-meal crashes',
-            'dinner': '\n⏰ DINNER TIP: Emphasize protein for overnight muscle recovery and moderate carbs for better sleep',
-            'snack': '\n⏰ SNACK TIP: Choose nutrient-dense options that complement daily macro targets'
-        }
-        if meal_type in time_tips:
-            prompt.append(time_tips[meal_type])
+            # Add time-specific recommendations
+            time_tips = {
+                'breakfast': '\n⏰ BREAKFAST TIP: Focus on protein and fiber to maintain energy and satiety throughout the morning',
+                'lunch': '\n⏰ LUNCH TIP: Balance energy needs for afternoon activities while avoiding post-meal crashes',
+                'dinner': '\n⏰ DINNER TIP: Emphasize protein for overnight muscle recovery and moderate carbs for better sleep',
+                'snack': '\n⏰ SNACK TIP: Choose nutrient-dense options that complement daily macro targets'
+            }
+            if meal_type in time_tips:
+                prompt.append(time_tips[meal_type])
         
-        recommendation_text = generate_text_from_gemini(prompt)
-        if "Sorry, I couldn\'t generate a response" in recommendation_text:
-             return jsonify({'error': 'Could not generate meal recommendation at this time.'}), 503
-             
-        return jsonify({'recommendation': recommendation_text}), 200
+        if structured:
+            try:
+                plan_data = generate_json_strict(prompt, MEAL_SCHEMA, profile='meal')
+                if plan_data is None:
+                    return jsonify({'recommendation': BLOCKED_MESSAGE, 'engine': 'ai'}), 200
+                plan = parse_plan('meal', plan_data)
+            except (GeminiUnavailableError, PlanFormatError) as e:
+                print(f"Structured meal plan unavailable: {e}")
+                if requested_engine != 'ai':
+                    return _local_meal_response(current_user_id, meal_type, primary_goal, diet_prefs, allergies, recent_proteins, plan_context)
+                return _unavailable(current_user_id, 'meal', result_kind, True, 'Could not generate meal recommendation at this time.', e)
+            return _plan_response(current_user_id, 'meal', plan, plan_context, 'ai')
+
+        try:
+            recommendation_text = generate_text_strict(prompt, profile='meal')
+        except GeminiUnavailableError as e:
+            if requested_engine != 'ai':
+                return _local_meal_response(current_user_id, meal_type, primary_goal, diet_prefs, allergies, recent_proteins)
+            return stale_or_unavailable(current_user_id, result_kind, 'Could not generate meal recommendation at this time.', e)
+
+        if recommendation_text != BLOCKED_MESSAGE:
+            remember_result(current_user_id, result_kind, {'recommendation': recommendation_text})
+        return jsonify({'recommendation': recommendation_text, 'engine': 'ai'}), 200
     except Exception as e:
         print(f"Error getting meal recommendation: {e}")
         details = str(e)
@@ -200,4 +384,120 @@ def get_meal_recommendation(current_user_id):
             details = e.message
         elif hasattr(e, 'args') and e.args:
             details = str(e.args[0]) if isinstance(e.args[0], dict) and 'message' in e.args[0] else str(e.args)
-        return jsonify({'error': 'Error getting meal recommendation', 'details': details}), 500
\ No newline at end of file
+        return jsonify({'error': 'Error getting meal recommendation', 'details': details}), 500
+
+def _local_workout_response(current_user_id, fitness_level, primary_goal, recent_workouts, plan_context=None, days=1):
+    plan = build_workout_plan(fitness_level, primary_goal, recent_workouts, seed_key=current_user_id)
+    if plan_context is not None:
+        # Later days get their own seed so they don't repeat day one's exercises
+        local_days = [plan] + [build_workout_plan(fitness_level, primary_goal, recent_workouts, seed_key=f"{current_user_id}:{day}") for day in range(1, days)]
+        return _plan_response(current_user_id, 'workout', workout_plan_from_local(local_days), plan_context, 'local')
+    return jsonify({'recommendation': render_workout_text(plan), 'plan': plan, 'engine': 'local'}), 200
+
+def _local_meal_response(current_user_id, meal_type, primary_goal, diet_prefs, allergies, recent_proteins, plan_context=None):
+    plan = build_meal_plan(meal_type, primary_goal, diet_prefs, allergies, recent_proteins, seed_key=current_user_id)
+    if plan is None:
+        return jsonify({'error': 'No protein in the offline meal catalogue is safe for your listed allergies.', 'engine': 'local'}), 422
+    if plan_context is not None:
+        return _plan_response(current_user_id, 'meal', meal_plan_from_local(plan), plan_context, 'local')
+    return jsonify({'recommendation': render_meal_text(plan), 'plan': plan, 'engine': 'local'}), 200
+
+
+@recommend_bp.route('/recommend/plans', methods=['GET'])
+@token_required
+def get_plans(current_user_id):
+    """The user's newest structured plans (summaries). ?kind=workout|meal, ?limit= (default 20)."""
+    kind = request.args.get('kind')
+    if kind and kind not in PLAN_KINDS:
+        return jsonify({'error': f"kind must be one of: {', '.join(PLAN_KINDS)}"}), 400
+    try:
+        limit = max(1, min(100, int(request.args.get('limit', 20))))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    try:
+        return jsonify({'plans': list_plans(current_user_id, kind, limit)}), 200
+    except Exception as e:
+        print(f"Error listing plans: {e}. User: {current_user_id}")
+        return jsonify({'error': 'Failed to list plans', 'details': str(e)}), 500
+
+
+def _valid_plan_id(plan_id):
+    try:
+        uuid.UUID(plan_id)
+        return True
+    except ValueError:
+        return False
+
+
+def _regeneration_unavailable(error):
+    """503 for a regeneration Gemini can't do right now; the stored plan is left as it was."""
+    body = {'error': 'Could not regenerate this part of the plan right now.'}
+    if getattr(error, 'user_message', None):
+        body['details'] = error.user_message
+    response = jsonify(body)
+    response.status_code = 503
+    response.headers['Retry-After'] = str(getattr(error, 'retry_after', None) or 30)
+    return response
+
+
+@recommend_bp.route('/recommend/plans/<plan_id>', methods=['GET'])
+@token_required
+def get_plan(current_user_id, plan_id):
+    if not _valid_plan_id(plan_id):
+        return jsonify({'error': 'Plan not found'}), 404
+    try:
+        row = load_plan(current_user_id, plan_id)
+    except Exception as e:
+        print(f"Error loading plan {plan_id}: {e}. User: {current_user_id}")
+        return jsonify({'error': 'Failed to load plan', 'details': str(e)}), 500
+    if row is None:
+        return jsonify({'error': 'Plan not found'}), 404
+    return jsonify(plan_body(row)), 200
+
+
+@recommend_bp.route('/recommend/plans/<plan_id>/regenerate', methods=['POST'])
+@token_required
+def regenerate_plan_part(current_user_id, plan_id):
+    """
+    Regenerates one part of a stored plan. Body: {"target": "days/0/blocks/1", "instructions": "no barbell"}
+    (see plans.py for the targets). Returns the updated plan with its new version.
+    """
+    data = request.get_json(silent=True) or {}
+    target = data.get('target')
+    instructions = str(data.get('instructions') or '')[:MAX_INSTRUCTIONS_LENGTH]
+    if not target:
+        return jsonify({'error': 'Missing target'}), 400
+    if not isinstance(target, str):
+        return jsonify({'error': 'target must be a string such as "days/0/blocks/1"'}), 400
+    if not _valid_plan_id(plan_id):
+        return jsonify({'error': 'Plan not found'}), 404
+    try:
+        row = load_plan(current_user_id, plan_id)
+        if row is None:
+            return jsonify({'error': 'Plan not found'}), 404
+        try:
+            part = resolve_part(row['kind'], row['plan'], target)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not gemini_available():
+            return _regeneration_unavailable(GeminiUnavailableError("I'm temporarily unavailable. Please try again later.", retry_after=gemini_breaker.retry_after()))
+
+        with span('prompt', 'plan_part'):
+            prompt = part_prompt(row['kind'], row['plan'], row.get('context') or {}, part, instructions)
+        try:
+            part_data = generate_json_strict(prompt, part.schema, profile='plan_part')
+            if part_data is None:
+                return jsonify({'error': BLOCKED_MESSAGE}), 422
+            plan = apply_part(row['plan'], part, part_data)
+        except (GeminiUnavailableError, PlanFormatError) as e:
+            print(f"Plan part regeneration failed ({target}): {e}")
+            return _regeneration_unavailable(e)
+
+        try:
+            row = update_plan(current_user_id, row, plan)
+        except PlanConflictError as e:
+            return jsonify({'error': str(e)}), 409
+        return jsonify(plan_body(row, regenerated=target)), 200
+    except Exception as e:
+        print(f"Error regenerating plan {plan_id} ({target}): {e}. User: {current_user_id}")
+        return jsonify({'error': 'Failed to regenerate plan', 'details': str(e)}), 500
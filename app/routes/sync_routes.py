@@ -0,0 +1,25 @@
+from flask import Blueprint, jsonify, request
+from auth_utils import token_required
+from change_log import get_changes, CURSOR_PATTERN
+
+sync_bp = Blueprint('sync_bp', __name__)
+
+
+@sync_bp.route('/sync', methods=['GET'])
+@token_required
+def sync(current_user_id):
+    """
+    Rows inserted, updated and deleted since ?since=<cursor> across profiles and the log
+    tables, plus the cursor to send next time (see change_log.py). No cursor: everything.
+    """
+    cursor = request.args.get('since') or None
+    if cursor is not None and not CURSOR_PATTERN.match(cursor):
+        return jsonify({'error': 'since must be a cursor returned by an earlier /sync'}), 400
+    try:
+        changes = get_changes(current_user_id, cursor)
+    except Exception as e:
+        print(f"Error syncing changes: {e}. User: {current_user_id}")
+        return jsonify({'error': 'Failed to sync changes', 'details': str(e)}), 500
+    response = jsonify(changes)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,227 @@
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+
+# Semantic answer cache for FAQ-style chat questions.
+#
+# Messages are normalized and embedded locally as sparse hashed TF-IDF vectors over
+# word uni/bigrams and character n-grams of their content words (CPU only, no model
+# download). Question scaffolding ("how much should i", "what is a good") is dropped and
+# a few common variants are folded together, so paraphrases of one FAQ land close and
+# "... protein ..." vs "... fat ..." in the same template don't. Each namespace
+# (page_context + the operational constraints sent with the request) keeps its own LRU
+# of past questions and document frequencies; a new question whose cosine similarity
+# to a cached one clears the threshold gets that cached reply. Namespaces are LRU-bounded
+# too, since the constraints come from the client.
+#
+# Questions that depend on the user's own data or on the running conversation are never
+# looked up or stored: see is_cacheable().
+
+HASH_DIMENSIONS = 1 << 18
+
+PERSONAL_PATTERNS = re.compile(
+    r"\b("
+    r"did i|have i|am i|was i|do i have|i weigh|i ate|i eat|i had|i drank|i ran|i lifted|i logged|i burned"
+    r"|my (current|last|latest|recent|today'?s|weekly|daily) \w+"
+    r"|my (weight|calories|macros|protein|intake|data|logs|history|numbers|results|plan)"
+    r"|today|yesterday|tonight|this (morning|week|month)|last (night|week|month)"
+    r")\b"
+)
+DIGITS = re.compile(r"\d")
+
+# Words that make up the question rather than its subject
+STOPWORDS = frozenset('''
+a an the i i'm me my you your it its is are am be been being was were do does did can could should would
+will may might must to of for in on at by with from about as into and or but if so than then that this
+these those what what's which who how when where why there here some any much many more most very really
+just please tell explain know want need get good best better right way ok okay also mean means
+'''.split())
+# "work out" / "working out" before splitting, so it matches "workout"
+WORK_OUT = re.compile(r"\bwork(?:s|ed|ing)? out\b")
+# Variants folded into one term before stemming
+SYNONYMS = {
+    'exercise': 'workout', 'exercising': 'workout', 'training': 'workout', 'train': 'workout',
+    'lifting': 'weights', 'lift': 'weights', 'stronger': 'strength', 'recovery': 'recover',
+    'daily': 'day', 'meal': 'eat', 'food': 'eat', 'foods': 'eat', 'snack': 'eat', 'diet': 'eat',
+}
+
+
+def normalize_message(message):
+    message = message.lower().replace("’", "'")
+    message = re.sub(r"[^a-z0-9' ]+", ' ', message)
+    return re.sub(r'\s+', ' ', message).strip()
+
+
+def is_cacheable(normalized_message, conversation_history):
+    """
+    Only standalone, non-personal questions are cached: no prior turns (the reply would
+    depend on them), no numbers (usually the user's own figures) and no phrasing that
+    asks about the user's own data or recent days.
+    """
+    if conversation_history:
+        return False
+    if not normalized_message or len(normalized_message) > 300:
+        return False
+    if DIGITS.search(normalized_message):
+        return False
+    return PERSONAL_PATTERNS.search(normalized_message) is None
+
+
+def _stem(word):
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def content_words(normalized_message):
+    words = WORK_OUT.sub('workout', normalized_message).split()
+    return [_stem(SYNONYMS.get(word, word)) for word in words if word not in STOPWORDS]
+
+
+def _hash(feature):
+    return zlib.crc32(feature.encode('utf-8')) % HASH_DIMENSIONS
+
+
+def extract_features(normalized_message):
+    """Sparse term frequencies over hashed content-word 1-2 grams and character 3-5 grams."""
+    counts = defaultdict(float)
+    words = content_words(normalized_message)
+    for word in words:
+        counts[_hash('w:' + word)] += 1.0
+    for first, second in zip(words, words[1:]):
+        counts[_hash('b:' + first + ' ' + second)] += 0.5
+    padded = f" {' '.join(words)} "
+    for n in (3, 4, 5):
+        for i in range(len(padded) - n + 1):
+            counts[_hash(f"c{n}:" + padded[i:i + n])] += 0.5
+    # Sublinear TF so repeated words don't dominate
+    return {index: 1.0 + math.log(count) if count >= 1 else count for index, count in counts.items()}
+
+
+class _Namespace:
+    def __init__(self):
+        self.entries = OrderedDict()  # normalized message -> (vector, reply, stored_at)
+        self.document_frequency = defaultdict(int)
+        self.postings = defaultdict(set)  # feature index -> keys of entries containing it
+
+    def weighted(self, features):
+        """L2-normalized TF-IDF vector using this namespace's current document frequencies."""
+        total = len(self.entries)
+        vector = {
+            index: tf * (math.log((1 + total) / (1 + self.document_frequency.get(index, 0))) + 1.0)
+            for index, tf in features.items()
+        }
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {index: v / norm for index, v in vector.items()}
+
+    def add(self, key, features, reply):
+        if key in self.entries:
+            self.remove(key)
+        for index in features:
+            self.document_frequency[index] += 1
+        # Entry vectors are weighted once at insert time; queries use the current IDF.
+        # The drift is small and keeps lookups to a sparse dot product over shared features.
+        self.entries[key] = (self.weighted(features), reply, time.monotonic())
+        for index in features:
+            self.postings[index].add(key)
+
+    def remove(self, key):
+        vector, _, _ = self.entries.pop(key)
+        for index in vector:
+            self.document_frequency[index] -= 1
+            if self.document_frequency[index] <= 0:
+                del self.document_frequency[index]
+            self.postings[index].discard(key)
+            if not self.postings[index]:
+                del self.postings[index]
+
+
+class SemanticCache:
+    def __init__(self, threshold=0.68, max_entries_per_namespace=256, ttl_seconds=24 * 3600, max_namespaces=64):
+        self.threshold = threshold
+        self.max_entries = max_entries_per_namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_namespaces = max_namespaces
+        self.namespaces = OrderedDict()  # namespace -> _Namespace, least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, namespace, normalized_message):
+        """Returns (reply, similarity) for the nearest cached question above the threshold, else None."""
+        features = extract_features(normalized_message)
+        with self.lock:
+            space = self.namespaces.get(namespace)
+            if not space or not space.entries:
+                self.misses += 1
+                return None
+            self.namespaces.move_to_end(namespace)
+            query = space.weighted(features)
+            scores = defaultdict(float)
+            for index, weight in query.items():
+                for key in space.postings.get(index, ()):
+                    scores[key] += weight * space.entries[key][0][index]
+
+            now = time.monotonic()
+            for key, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                if score < self.threshold:
+                    break
+                _, reply, stored_at = space.entries[key]
+                if now - stored_at > self.ttl_seconds:
+                    space.remove(key)
+                    continue
+                space.entries.move_to_end(key)
+                self.hits += 1
+                return reply, score
+            self.misses += 1
+            return None
+
+    def store(self, namespace, normalized_message, reply):
+        features = extract_features(normalized_message)
+        with self.lock:
+            space = self.namespaces.get(namespace)
+            if space is None:
+                space = self.namespaces[namespace] = _Namespace()
+                while len(self.namespaces) > self.max_namespaces:
+                    self.namespaces.popitem(last=False)
+            self.namespaces.move_to_end(namespace)
+            # Expired entries are otherwise only dropped when a lookup reaches them
+            now = time.monotonic()
+            for key in [key for key, (_, _, stored_at) in space.entries.items() if now - stored_at > self.ttl_seconds]:
+                space.remove(key)
+            space.add(normalized_message, features, reply)
+            while len(space.entries) > self.max_entries:
+                space.remove(next(iter(space.entries)))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'namespaces': len(self.namespaces),
+                'entries': sum(len(space.entries) for space in self.namespaces.values()),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache(config):
+    """Returns the process-wide cache, or None when Config.SEMANTIC_CACHE_ENABLED is off."""
+    global _cache
+    if not config.SEMANTIC_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache(
+                threshold=config.SEMANTIC_CACHE_THRESHOLD,
+                max_entries_per_namespace=config.SEMANTIC_CACHE_MAX_ENTRIES,
+                ttl_seconds=config.SEMANTIC_CACHE_TTL_SECONDS,
+                max_namespaces=config.SEMANTIC_CACHE_MAX_NAMESPACES,
+            )
+        return _cache
@@ -0,0 +1,229 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from db import get_db_client
+from data_versions import bump_data_version
+from daily_summary import refresh_daily_summary
+
+# Opt-in write-behind mode for /log/water (Config.WATER_WRITE_BEHIND).
+#
+# Each tap is appended to a per-worker journal file and kept in memory; a background
+# thread coalesces pending entries into one water_intake_logs row per (user, day) and
+# inserts them in bulk every WATER_FLUSH_INTERVAL_SECONDS, and once more at shutdown.
+# Journals are held with an exclusive flock, so when a worker dies its journal becomes
+# claimable and the next worker to start replays it into the database.
+#
+# Pending entries only live in the worker that accepted them; reads overlay that
+# worker's pending entries, and the short flush interval bounds how long another
+# worker can lag behind.
+
+INSERT_CHUNK_SIZE = 500
+
+_buffer = None
+
+
+class WaterWriteBuffer:
+    def __init__(self, journal_dir, flush_interval=2.0):
+        self.journal_dir = journal_dir
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = defaultdict(list)  # (user_id, date) -> [{'amount_ml', 'logged_at'}]
+        self.inflight = {}                 # snapshot currently being inserted, still visible to reads
+        self.flush_lock = threading.Lock()
+        self.journal = None
+        self.journal_path = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # --- lifecycle -------------------------------------------------------
+
+    def start(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._replay_orphaned_journals()
+        with self.lock:
+            self._open_journal()
+        self.thread = threading.Thread(target=self._run, name='water-write-behind', daemon=True)
+        self.thread.start()
+        atexit.register(self.shutdown)
+        print(f"INFO [water_buffer]: Write-behind enabled, journal {self.journal_path}, flush every {self.flush_interval}s")
+
+    def shutdown(self):
+        if self.stop_event.is_set():
+            return
+        self.stop_event.set()
+        self.flush()
+
+    def _run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"ERROR [water_buffer]: Flush failed, will retry: {e}")
+
+    # --- journal ---------------------------------------------------------
+
+    def _open_journal(self):
+        path = os.path.join(self.journal_dir, f"water-{os.getpid()}-{time.time_ns()}.jsonl")
+        journal = open(path, 'a', encoding='utf-8')
+        fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.journal, self.journal_path = journal, path
+
+    def _append_journal(self, entries):
+        for user_id, day_str, amount_ml, logged_at in entries:
+            self.journal.write(json.dumps({'user_id': user_id, 'date': day_str, 'amount_ml': amount_ml, 'logged_at': logged_at}) + '\n')
+        # Flushed to the OS so a crashed worker's entries survive; not fsync'd per tap.
+        self.journal.flush()
+
+    def _replay_orphaned_journals(self):
+        """Inserts entries left behind by workers that exited before flushing."""
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, 'water-*.jsonl'))):
+            try:
+                handle = open(path, 'r+', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()  # Still owned by a live worker
+                continue
+            try:
+                totals = defaultdict(int)
+                for line in handle:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn final line from a crash
+                    totals[(entry['user_id'], entry['date'])] += entry['amount_ml']
+                if totals:
+                    failed, error = self._insert_totals(totals)
+                    if error is not None:
+                        # Keep only what didn't make it, so the next worker doesn't insert the rest again
+                        handle.seek(0)
+                        handle.truncate()
+                        for user_id, day_str in failed:
+                            handle.write(json.dumps({'user_id': user_id, 'date': day_str, 'amount_ml': totals[(user_id, day_str)], 'logged_at': None}) + '\n')
+                        handle.flush()
+                        raise error
+                    print(f"INFO [water_buffer]: Replayed {len(totals)} pending water totals from {path}")
+                os.remove(path)
+            except Exception as e:
+                print(f"ERROR [water_buffer]: Failed to replay journal {path}, leaving it for the next worker: {e}")
+            finally:
+                handle.close()
+
+    # --- writes ----------------------------------------------------------
+
+    def add(self, user_id, day_str, amount_ml):
+        logged_at = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            self._append_journal([(user_id, day_str, amount_ml, logged_at)])
+            self.pending[(user_id, day_str)].append({'amount_ml': amount_ml, 'logged_at': logged_at})
+
+    def flush(self):
+        """Coalesces and inserts everything pending, then starts a fresh journal."""
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    return 0
+                snapshot = self.inflight = self.pending
+                self.pending = defaultdict(list)
+                old_journal, old_path = self.journal, self.journal_path
+                self._open_journal()
+
+            totals = {key: sum(entry['amount_ml'] for entry in entries) for key, entries in snapshot.items()}
+            failed, error = self._insert_totals(totals)
+            if error is not None:
+                # Put back the entries whose chunk failed (ahead of anything added meanwhile) and keep
+                # them journaled; the chunks that went in are done.
+                with self.lock:
+                    for key in failed:
+                        self.pending[key] = snapshot[key] + self.pending[key]
+                    self._append_journal([(key[0], key[1], e['amount_ml'], e['logged_at']) for key in failed for e in snapshot[key]])
+                    self.inflight = {}
+                old_journal.close()
+                os.remove(old_path)
+                raise error
+
+            with self.lock:
+                self.inflight = {}
+            old_journal.close()
+            os.remove(old_path)
+            return len(totals)
+
+    def _insert_totals(self, totals):
+        """
+        Inserts one row per (user, day) total, in chunks. Returns the keys of the chunks that
+        failed and the last error, or ([], None); a failed chunk doesn't stop the others.
+        """
+        keys = list(totals)
+        try:
+            supabase = get_db_client()
+        except Exception as e:
+            return keys, e
+        inserted, failed, error = [], [], None
+        for i in range(0, len(keys), INSERT_CHUNK_SIZE):
+            chunk = keys[i:i + INSERT_CHUNK_SIZE]
+            try:
+                supabase.table('water_intake_logs').insert([
+                    {'user_id': user_id, 'date': day_str, 'amount_ml': totals[(user_id, day_str)]} for user_id, day_str in chunk
+                ]).execute()
+            except Exception as e:
+                failed.extend(chunk)
+                error = e
+                continue
+            inserted.extend(chunk)
+        for user_id, day_str in inserted:
+            refresh_daily_summary(user_id, day_str, 'water')
+        for user_id in {user_id for user_id, _ in inserted}:
+            bump_data_version(user_id, 'water_intake_logs', 'daily_summary')
+        return failed, error
+
+    # --- reads -----------------------------------------------------------
+
+    def pending_rows(self, user_id, day_str=None):
+        """Synthetic water_intake_logs rows for entries not yet flushed, newest first."""
+        with self.lock:
+            rows = [
+                {'id': None, 'user_id': user_id, 'date': key_day, 'amount_ml': entry['amount_ml'], 'created_at': entry['logged_at'], 'pending': True}
+                for pending in (self.inflight, self.pending)
+                for (key_user, key_day), entries in pending.items()
+                if key_user == user_id and (day_str is None or key_day == day_str)
+                for entry in entries
+            ]
+        rows.sort(key=lambda row: (row['date'], row['created_at']), reverse=True)
+        return rows
+
+    def pending_token(self, user_id):
+        """
+        Changes whenever this user's pending or in-flight entries change; mixed into ETags.
+        In-flight entries count until their insert commits and bumps the data version.
+        """
+        with self.lock:
+            return ','.join(
+                f"{state}{key_day}:{len(entries)}:{entries[-1]['logged_at']}"
+                for state, buffered in (('i', self.inflight), ('p', self.pending))
+                for (key_user, key_day), entries in sorted(buffered.items())
+                if key_user == user_id and entries
+            )
+
+
+def init_water_buffer(config):
+    """Starts the write-behind buffer when Config.WATER_WRITE_BEHIND is enabled."""
+    global _buffer
+    if not config.WATER_WRITE_BEHIND or _buffer is not None:
+        return _buffer
+    water_buffer = WaterWriteBuffer(config.WATER_JOURNAL_DIR, config.WATER_FLUSH_INTERVAL_SECONDS)
+    water_buffer.start()
+    _buffer = water_buffer
+    return _buffer
+
+
+def get_water_buffer():
+    """Returns the active buffer, or None when write-behind is disabled."""
+    return _buffer
@@ -0,0 +1,135 @@
+from datetime import date, timedelta
+import numpy as np
+
+
+def _to_day_numbers(date_strings):
+    """Converts ISO date strings to float day offsets from the first entry."""
+    ordinals = np.array([date.fromisoformat(str(d)[:10]).toordinal() for d in date_strings], dtype=np.float64)
+    return ordinals, ordinals - ordinals[0]
+
+
+def exponential_trend(days, weights, alpha=0.1):
+    """
+    Exponentially smoothed trend line.
+    `alpha` is the per-day smoothing factor; gaps between weigh-ins are compounded
+    (1 - (1 - alpha) ** gap) so irregular logging doesn't distort the trend.
+    """
+    trend = np.empty_like(weights)
+    trend[0] = weights[0]
+    gaps = np.diff(days, prepend=days[0])
+    factors = 1.0 - np.power(1.0 - alpha, np.maximum(gaps, 1.0))
+    for i in range(1, len(weights)):
+        trend[i] = trend[i - 1] + factors[i] * (weights[i] - trend[i - 1])
+    return trend
+
+
+def rolling_average(days, weights, window_days=7):
+    """Mean of all weigh-ins within the trailing `window_days` (inclusive of the current day)."""
+    cumulative = np.concatenate(([0.0], np.cumsum(weights)))
+    starts = np.searchsorted(days, days - window_days + 1, side='left')
+    ends = np.arange(1, len(weights) + 1)
+    return (cumulative[ends] - cumulative[starts]) / (ends - starts)
+
+
+def weekly_rate(days, weights, regression_days=28):
+    """Least-squares slope over the last `regression_days`, in kg per week. None if not enough data."""
+    recent = days >= days[-1] - regression_days
+    x, y = days[recent], weights[recent]
+    if len(x) < 2 or np.ptp(x) == 0:
+        return None
+    slope, _ = np.polyfit(x, y, 1)
+    return float(slope * 7)
+
+
+def project_target_date(last_ordinal, current_kg, rate_per_week, target_kg, max_days=730):
+    """Date the trend reaches `target_kg` at the current rate, or None if it's moving away / too far out."""
+    if target_kg is None or rate_per_week is None or rate_per_week == 0:
+        return None
+    remaining = target_kg - current_kg
+    if remaining == 0:
+        return date.fromordinal(int(last_ordinal)).isoformat()
+    days_needed = remaining / (rate_per_week / 7)
+    if days_needed <= 0 or days_needed > max_days:
+        return None
+    return (date.fromordinal(int(last_ordinal)) + timedelta(days=int(np.ceil(days_needed)))).isoformat()
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indices of at most `threshold` points that preserve the visual shape of the series.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(np.floor(i * bucket_size)) + 1
+        end = int(np.floor((i + 1) * bucket_size)) + 1
+        next_start = end
+        next_end = min(int(np.floor((i + 2) * bucket_size)) + 1, n)
+        # Average of the next bucket (or the last point for the final bucket)
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+
+        bucket_x, bucket_y = x[start:end], y[start:end]
+        areas = np.abs((x[a] - avg_x) * (bucket_y - y[a]) - (x[a] - bucket_x) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def analyze_weight_history(rows, target_weight_kg=None, points=None, alpha=0.1, window_days=7, regression_days=28):
+    """
+    Computes trend analytics for `weight_tracker` rows ({'date', 'weight_kg'}, oldest first).
+    Returns {'points': [...], 'summary': {...}}; `points` is downsampled to at most `points` entries.
+    """
+    rows = [r for r in rows if r.get('weight_kg') is not None and r.get('date')]
+    summary = {
+        'total_points': len(rows),
+        'returned_points': 0,
+        'latest_weight_kg': None,
+        'latest_trend_kg': None,
+        'weekly_rate_kg': None,
+        'target_weight_kg': target_weight_kg,
+        'projected_target_date': None,
+    }
+    if not rows:
+        return {'points': [], 'summary': summary}
+
+    ordinals, days = _to_day_numbers([r['date'] for r in rows])
+    weights = np.array([float(r['weight_kg']) for r in rows], dtype=np.float64)
+
+    trend = exponential_trend(days, weights, alpha)
+    rolling = rolling_average(days, weights, window_days)
+    rate = weekly_rate(days, weights, regression_days)
+
+    indices = lttb_indices(days, weights, points) if points else np.arange(len(rows))
+
+    summary.update({
+        'returned_points': int(len(indices)),
+        'latest_weight_kg': float(weights[-1]),
+        'latest_trend_kg': round(float(trend[-1]), 2),
+        'weekly_rate_kg': round(rate, 3) if rate is not None else None,
+        'projected_target_date': project_target_date(
+            ordinals[-1], float(trend[-1]), rate,
+            float(target_weight_kg) if target_weight_kg is not None else None,
+        ),
+    })
+    return {
+        'points': [
+            {
+                'date': str(rows[i]['date'])[:10],
+                'weight_kg': float(weights[i]),
+                'trend_kg': round(float(trend[i]), 2),
+                'rolling_avg_kg': round(float(rolling[i]), 2),
+            }
+            for i in indices
+        ],
+        'summary': summary,
+    }
@@ -0,0 +1,63 @@
+"""
+Benchmark: `flask cohort-report` throughput as the worker count grows.
+
+Runs build_cohort_report over the data loaded by bench_log_queries.py once per --workers
+value and reports wall time, users per second and speedup over one worker. Workers only
+share the database, so the speedup flattens when it (or the host's cores) saturates.
+Profiles are created for the benchmark users first if there are none.
+
+Usage:
+    python benchmarks/bench_cohort_report.py --database-url postgresql://localhost/fitbench
+        [--workers 1,2,4,8] [--weeks 52] [--chunk-users 100]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from cohort_analytics import build_cohort_report  # noqa: E402
+
+
+def ensure_profiles(database_url):
+    connection = psycopg2.connect(database_url)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute("select count(*) from public.profiles")
+        if cursor.fetchone()[0] == 0:
+            rng = random.Random(3)
+            cursor.execute("select id from auth.users")
+            rows = [(user_id, rng.choice(['beginner', 'intermediate', 'advanced', None]),
+                     rng.choice(['lose_weight', 'build_muscle', 'endurance']), rng.choice([3, 4, 5]))
+                    for (user_id,) in cursor.fetchall()]
+            cursor.executemany("insert into public.profiles (user_id, fitness_level, primary_goal, weekly_workout_goal) values (%s, %s, %s, %s)", rows)
+        cursor.execute("select count(*) from public.profiles")
+        count = cursor.fetchone()[0]
+    connection.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'), required=os.environ.get('DATABASE_URL') is None)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--weeks', type=int, default=52)
+    parser.add_argument('--chunk-users', type=int, default=100)
+    args = parser.parse_args()
+
+    users = ensure_profiles(args.database_url)
+    print(f"{users} users, {args.weeks} weeks, {os.cpu_count()} CPU(s)")
+    baseline = None
+    for workers in (int(w) for w in args.workers.split(',')):
+        started = time.monotonic()
+        build_cohort_report(args.database_url, weeks=args.weeks, workers=workers, chunk_users=args.chunk_users, echo=lambda message: None)
+        elapsed = time.monotonic() - started
+        baseline = baseline or elapsed
+        print(f"  workers {workers:2d}: {elapsed:6.2f}s  {users / elapsed:8.0f} users/s  speedup {baseline / elapsed:4.2f}x")
+
+
+if __name__ == '__main__':
+    main()
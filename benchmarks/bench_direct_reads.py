@@ -0,0 +1,183 @@
+"""
+Benchmark: the direct pooled read path (app/direct_db.py) against the PostgREST path.
+
+Times the reads the dashboard, progress and log-list routes make, for --samples random
+users, up to and including the response body the route would send, with each of these paths:
+  direct            read_rows: pooled connection, prepared statement, rows cast to
+                    PostgREST's shapes, then encoded for the response
+  direct-json       read_json: same statement wrapped in json_agg, text sent as-is
+  direct-unprepared read_rows with plain parameterized SQL (for transaction-mode poolers)
+  connect-per-call  a new connection for every read (what the pool saves)
+  json-path         the work PostgREST adds on the database and client side: the rows
+                    rendered to JSON by Postgres (as PostgREST does), parsed by the client,
+                    then encoded again for the response
+  postgrest         the real supabase-py client, only with --supabase-url/--service-key
+
+For each path and read it reports wall-clock p50/p95 and client CPU per call (process time).
+The json-path has no HTTP hop, so it is a lower bound on PostgREST's cost.
+
+Uses the data loaded by bench_log_queries.py (run that first against the same database).
+
+Usage:
+    python benchmarks/bench_direct_reads.py --database-url postgresql://localhost/fitbench
+        [--samples 200] [--supabase-url https://x.supabase.co --service-key ...]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+import psycopg2
+
+try:
+    import orjson
+    encode = orjson.dumps
+except ImportError:
+    encode = lambda obj: json.dumps(obj).encode('utf-8')  # noqa: E731
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from direct_db import ConnectionPool, READS, MIN_DATE, MAX_DATE  # noqa: E402
+
+# (label, READS name, extra parameters from a sample, PostgREST query builder)
+CASES = [
+    ('dashboard: totals', 'dashboard_totals', lambda s: (), None),
+    ('dashboard: 31-day summaries', 'daily_summaries', lambda s: (s['month_ago'], s['today']),
+     lambda c, s: c.table('daily_summary').select('*').eq('user_id', s['user']).gte('date', s['month_ago']).lte('date', s['today']).order('date')),
+    ('logs/nutrition?date=', 'nutrition_logs', lambda s: (s['day'], s['day']),
+     lambda c, s: c.table('nutrition_logs').select('*').eq('user_id', s['user']).eq('date', s['day']).order('date', desc=True).order('id', desc=True)),
+    ('logs/workout?date=', 'workout_logs', lambda s: (s['day'], s['day']),
+     lambda c, s: c.table('workout_logs').select('*, exercise_details(*)').eq('user_id', s['user']).eq('date', s['day']).order('date', desc=True)),
+    ('progress/weight 90d', 'weight_series', lambda s: (s['since'], MAX_DATE),
+     lambda c, s: c.table('weight_tracker').select('date, weight_kg').eq('user_id', s['user']).gte('date', s['since']).order('date')),
+    ('logs/water (all)', 'water_logs', lambda s: (MIN_DATE, MAX_DATE),
+     lambda c, s: c.table('water_intake_logs').select('*').eq('user_id', s['user']).order('date', desc=True)),
+    ('progress/workouts (all)', 'workout_logs_asc', lambda s: (MIN_DATE, MAX_DATE),
+     lambda c, s: c.table('workout_logs').select('*, exercise_details(*)').eq('user_id', s['user']).order('date')),
+]
+
+
+def plain_sql(name):
+    """READS[name] with $n placeholders rewritten for psycopg2."""
+    return re.sub(r'\$(\d+)', lambda m: f"%(p{m.group(1)})s", READS[name][1])
+
+
+def as_params(values):
+    return {f"p{i}": value for i, value in enumerate(values, start=1)}
+
+
+def measure(call, samples, budget_seconds):
+    walls, cpus = [], []
+    for sample in samples:
+        wall, cpu = time.perf_counter(), time.process_time()
+        call(sample)
+        walls.append((time.perf_counter() - wall) * 1000)
+        cpus.append((time.process_time() - cpu) * 1000)
+        if len(walls) >= 5 and sum(walls) > budget_seconds * 1000:
+            break
+    walls.sort()
+    return {
+        'runs': len(walls),
+        'p50': statistics.median(walls),
+        'p95': walls[max(0, int(len(walls) * 0.95) - 1)],
+        'cpu': statistics.mean(cpus),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'), required=os.environ.get('DATABASE_URL') is None)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--budget', type=float, default=10.0, help='Seconds per path and read')
+    parser.add_argument('--supabase-url')
+    parser.add_argument('--service-key')
+    args = parser.parse_args()
+
+    setup = psycopg2.connect(args.database_url)
+    with setup.cursor() as cursor:
+        cursor.execute("select distinct user_id::text from workout_logs")
+        users = [row[0] for row in cursor.fetchall()]
+    setup.close()
+    if not users:
+        sys.exit('No data: run bench_log_queries.py against this database first.')
+
+    rng = random.Random(11)
+    today = date.today()
+    samples = [{
+        'user': rng.choice(users),
+        'day': (today - timedelta(days=rng.randrange(1, 365))).isoformat(),
+        'since': (today - timedelta(days=90)).isoformat(),
+        'month_ago': (today - timedelta(days=31)).isoformat(),
+        'today': today.isoformat(),
+    } for _ in range(args.samples)]
+
+    prepared_pool = ConnectionPool(args.database_url, max_size=2, acquire_timeout=5, statement_timeout_ms=60000, prepare=True)
+    plain_pool = ConnectionPool(args.database_url, max_size=2, acquire_timeout=5, statement_timeout_ms=60000, prepare=False)
+    json_connection = psycopg2.connect(args.database_url)
+    json_connection.autocommit = True
+    client = None
+    if args.supabase_url and args.service_key:
+        from supabase import create_client
+        client = create_client(args.supabase_url, args.service_key)
+
+    results = {}
+    for label, name, extra, postgrest_query in CASES:
+        def direct(sample, pool=prepared_pool):
+            return encode(pool.execute(name, (sample['user'],) + extra(sample)))
+
+        def direct_json(sample):
+            return prepared_pool.execute(name, (sample['user'],) + extra(sample), as_json=True).encode('utf-8')
+
+        def connect_per_call(sample):
+            connection = psycopg2.connect(args.database_url)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(plain_sql(name), as_params((sample['user'],) + extra(sample)))
+                    return cursor.fetchall()
+            finally:
+                connection.close()
+
+        def json_path(sample):
+            with json_connection.cursor() as cursor:
+                cursor.execute(f"select coalesce(json_agg(t), '[]')::text from ({plain_sql(name)}) t",
+                               as_params((sample['user'],) + extra(sample)))
+                return encode(json.loads(cursor.fetchone()[0]))
+
+        paths = {
+            'direct': direct,
+            'direct-json': direct_json,
+            'direct-unprepared': lambda sample: direct(sample, plain_pool),
+            'connect-per-call': connect_per_call,
+            'json-path': json_path,
+        }
+        if client is not None and postgrest_query is not None:
+            paths['postgrest'] = lambda sample: encode(postgrest_query(client, sample).execute().data)
+
+        for path, call in paths.items():
+            call(samples[0])  # prepare / warm the connection
+            results[(label, path)] = measure(call, samples, args.budget)
+
+    print(f"{'read':30s} {'path':18s} {'p50 ms':>8s} {'p95 ms':>8s} {'cpu ms':>8s} {'runs':>5s}")
+    for (label, path), result in results.items():
+        print(f"{label:30s} {path:18s} {result['p50']:8.2f} {result['p95']:8.2f} {result['cpu']:8.3f} {result['runs']:5d}")
+
+    print("\n== json-path vs direct paths (ratio of p50 wall / mean client cpu; >1 means the direct path is cheaper)")
+    for label, _, _, _ in CASES:
+        json_result = results[(label, 'json-path')]
+        ratios = []
+        for path in ('direct', 'direct-json'):
+            result = results[(label, path)]
+            ratios.append(f"{path} {json_result['p50'] / max(result['p50'], 1e-6):5.2f}x / {json_result['cpu'] / max(result['cpu'], 1e-6):5.2f}x")
+        print(f"  {label:30s} " + '   '.join(ratios))
+
+    prepared_pool.close()
+    plain_pool.close()
+    json_connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: food autocomplete latency on the memory-mapped index (app/food_db.py).
+
+Builds the index from the bundled CSV into a temp file, then times FoodIndex.search
+and best_match over typical autocomplete keystroke sequences, typos and free-text
+meal descriptions, next to a naive linear substring scan over the parsed CSV.
+--synthetic N expands the dataset to N rows (brand/preparation variants of the
+bundled foods) to show how both approaches scale with a full-size database.
+
+Usage:
+    python benchmarks/bench_food_search.py [--repeat 200] [--synthetic 50000]
+"""
+import argparse
+import csv
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from food_db import FoodIndex, build_food_index, normalize_food_name  # noqa: E402
+
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'data', 'foods.csv')
+TYPED = ['c', 'ch', 'chi', 'chic', 'chick', 'chicken', 'chicken b', 'chicken br', 'g', 'gr', 'gre', 'greek y',
+         'o', 'oa', 'oat', 'b', 'ba', 'ban', 'sal', 'salm', 'pe', 'pean', 'peanut butter']
+TYPOS = ['salmn', 'oatmeel', 'brocoli steamed', 'bananna', 'yoghurt', 'chiken wrap']
+DESCRIPTIONS = ['grilled chicken breast', 'two scrambled eggs', 'oatmeal with honey', 'Greek yogurt with blueberries',
+                'salmon and rice', 'mystery casserole', '2 bananas', 'turkey sandwich on whole wheat']
+
+
+BRANDS = ['Acme', 'Harvest', 'Golden', 'Valley', 'Nordic', 'Sunny', 'Prairie', 'Coastal', 'Alpine', 'Urban',
+          'Farmhouse', 'Meadow', 'Summit', 'Orchard', 'Riverside', 'Heritage', 'Pioneer', 'Evergreen']
+STYLES = ['organic', 'low sodium', 'family size', 'light', 'classic', 'spicy', 'original', 'homestyle',
+          'frozen', 'fresh', 'reduced fat', 'extra large', 'mini', 'snack pack', 'value', 'premium']
+
+
+def write_synthetic(path, rows):
+    """Bundled foods plus brand/style variants with jittered nutrients, `rows` in total."""
+    with open(SOURCE, newline='', encoding='utf-8') as handle:
+        base = list(csv.DictReader(handle))
+    rng = random.Random(7)
+    variants = itertools.product(BRANDS, STYLES)
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.DictWriter(out, fieldnames=list(base[0].keys()))
+        writer.writeheader()
+        writer.writerows(base)
+        for i in range(rows - len(base)):
+            if i % len(base) == 0:
+                brand, style = next(variants)
+            row = dict(base[i % len(base)])
+            row['name'] = f"{brand} {row['name']} {style}"
+            factor = rng.uniform(0.85, 1.15)
+            for key in ('calories', 'protein_g', 'carbs_g', 'fat_g'):
+                row[key] = f"{float(row[key]) * factor:.1f}"
+            writer.writerow(row)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        'p50': statistics.median(samples),
+        'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        'max': samples[-1],
+    }
+
+
+def timed(fn, queries, repeat):
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            fn(query)
+            samples.append((time.perf_counter() - started) * 1e6)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--synthetic', type=int, default=0, help='Expand the dataset to this many rows')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = SOURCE
+        if args.synthetic:
+            source = os.path.join(tmp, 'foods.csv')
+            write_synthetic(source, args.synthetic)
+        index_path = os.path.join(tmp, 'foods.idx')
+        started = time.perf_counter()
+        count = build_food_index(source, index_path)
+        print(f"Built index: {count} foods, {os.path.getsize(index_path)} bytes in {(time.perf_counter() - started) * 1e3:.1f} ms")
+
+        started = time.perf_counter()
+        index = FoodIndex(index_path)
+        print(f"Opened (mmap): {(time.perf_counter() - started) * 1e6:.0f} us")
+
+        with open(source, newline='', encoding='utf-8') as handle:
+            rows = [(normalize_food_name(row['name']), row) for row in csv.DictReader(handle)]
+
+        def linear_scan(query):
+            needle = normalize_food_name(query)
+            return [row for name, row in rows if needle in name][:10]
+
+        cases = [
+            ('search, typed prefixes', lambda q: index.search(q, 10), TYPED),
+            ('search, typos (fuzzy)', lambda q: index.search(q, 10), TYPOS),
+            ('best_match, descriptions', index.best_match, DESCRIPTIONS),
+            ('linear substring scan', linear_scan, TYPED),
+        ]
+        print(f"\n{'case':<28}{'p50 us':>10}{'p99 us':>10}{'max us':>10}")
+        for name, fn, queries in cases:
+            stats = timed(fn, queries, args.repeat)
+            print(f"{name:<28}{stats['p50']:>10.1f}{stats['p99']:>10.1f}{stats['max']:>10.1f}")
+        index.buffer.close()
+
+
+if __name__ == '__main__':
+    main()
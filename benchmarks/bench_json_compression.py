@@ -0,0 +1,107 @@
+"""
+Benchmark: JSON encoding and response compression for large workout histories.
+
+Builds a synthetic /progress/workouts payload (5k workout_logs rows with nested
+exercise_details) and compares stdlib json vs orjson encoding time, and the body
+size / CPU cost of gzip and brotli at the levels used by compression.py.
+
+Usage:
+    python benchmarks/bench_json_compression.py [--rows 5000] [--repeat 20]
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import date, timedelta
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+EXERCISES = ['Bench Press', 'Squat', 'Deadlift', 'Overhead Press', 'Barbell Row', 'Pull Up', 'Lunge', 'Plank']
+TYPES = ['Strength', 'Cardio', 'HIIT', 'Yoga', 'Cycling', 'Running']
+
+
+def synthetic_workouts(rows, seed=42):
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=rows)
+    user_id = '8a1f6a2e-4c1b-4f0e-9d7a-2b0c5f3e9a11'
+    history = []
+    for i in range(rows):
+        log_id = i + 1
+        history.append({
+            'id': log_id,
+            'user_id': user_id,
+            'date': (start + timedelta(days=i)).isoformat(),
+            'type': rng.choice(TYPES),
+            'duration_minutes': rng.randint(20, 90),
+            'calories_burned': rng.randint(150, 800),
+            'notes': rng.choice([None, 'Felt strong', 'Tired today', 'New PR on the last set']),
+            'created_at': f"{(start + timedelta(days=i)).isoformat()}T18:{rng.randint(10, 59)}:00+00:00",
+            'exercise_details': [
+                {
+                    'id': log_id * 10 + j,
+                    'workout_log_id': log_id,
+                    'user_id': user_id,
+                    'exercise_name': rng.choice(EXERCISES),
+                    'sets': rng.randint(2, 5),
+                    'reps': rng.randint(5, 12),
+                    'weight_kg': round(rng.uniform(20, 140), 1),
+                }
+                for j in range(rng.randint(2, 6))
+            ],
+        })
+    return history
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    payload = synthetic_workouts(args.rows)
+    print(f"Synthetic history: {args.rows} workouts, {sum(len(w['exercise_details']) for w in payload)} exercise rows\n")
+
+    stdlib_time, stdlib_body = timed(lambda: json.dumps(payload).encode('utf-8'), args.repeat)
+    print(f"{'encoder':<12}{'best ms':>10}{'bytes':>12}")
+    print(f"{'json':<12}{stdlib_time * 1000:>10.2f}{len(stdlib_body):>12}")
+    body = stdlib_body
+    if orjson is not None:
+        orjson_time, body = timed(lambda: orjson.dumps(payload), args.repeat)
+        print(f"{'orjson':<12}{orjson_time * 1000:>10.2f}{len(body):>12}   ({stdlib_time / orjson_time:.1f}x faster)")
+    else:
+        print("orjson not installed - skipping")
+
+    print(f"\n{'encoding':<12}{'best ms':>10}{'bytes':>12}{'ratio':>8}")
+    print(f"{'identity':<12}{0:>10.2f}{len(body):>12}{1:>8.1f}")
+    for level in (1, 6, 9):
+        gz_time, gz_body = timed(lambda: gzip.compress(body, compresslevel=level), args.repeat)
+        print(f"{'gzip -' + str(level):<12}{gz_time * 1000:>10.2f}{len(gz_body):>12}{len(body) / len(gz_body):>8.1f}")
+    if brotli is not None:
+        for quality in (1, 4, 6):
+            br_time, br_body = timed(lambda: brotli.compress(body, quality=quality, mode=brotli.MODE_TEXT), args.repeat)
+            print(f"{'br q' + str(quality):<12}{br_time * 1000:>10.2f}{len(br_body):>12}{len(body) / len(br_body):>8.1f}")
+    else:
+        print("brotli not installed - skipping")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""
+Benchmark: log-table query plans and latency before/after the app/migrations indexes and RPCs.
+
+Loads a synthetic multi-user history into a local Postgres:
+- each user gets --days days of data;
+- per day a user logs ~0.6 workouts with exercises, 4 meals, 6 waters and ~0.7 weigh-ins;
+- rows are written day by day across all users, so a user's rows are spread over the
+  heap, as in production.
+
+It then times the app's hot queries for --samples users in three phases:
+  baseline  tables from 0001/0002 only (primary keys, no log indexes)
+  indexed   after 0003 (composite + covering indexes)
+  rpc       0004 functions vs the separate queries they replace
+
+For each query it reports p50/p95 latency and the plan's scan nodes (from EXPLAIN).
+
+Needs psycopg2 and a throwaway database: --reset drops the app's tables in it first.
+A stub `auth` schema stands in for Supabase's.
+
+Usage:
+    python benchmarks/bench_log_queries.py --database-url postgresql://localhost/fitbench --reset
+        [--users 500] [--days 365] [--samples 200]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from migrate import discover_migrations, apply_migration, _ensure_migrations_table  # noqa: E402
+
+AUTH_STUB = """
+create schema if not exists auth;
+create table if not exists auth.users (id uuid primary key);
+create or replace function auth.uid() returns uuid language sql stable as 'select null::uuid';
+"""
+
+RESET = """
+drop function if exists public.dashboard_totals(uuid), public.refresh_daily_summary(uuid, date, text[]), public.daily_log_totals(uuid, date);
+drop table if exists public.exercise_details, public.workout_logs, public.nutrition_logs, public.weight_tracker,
+    public.water_intake_logs, public.profiles, public.user_data_versions, public.daily_summary, public.ai_last_results,
+    public.exercise_recency, public.exercise_weekly_stats, public.app_schema_migrations cascade;
+drop schema if exists auth cascade;
+"""
+
+TYPES = ['Strength', 'Cardio', 'HIIT', 'Yoga', 'Cycling', 'Running']
+MEALS = ['breakfast', 'lunch', 'dinner', 'snack']
+EXERCISES = ['Bench Press', 'Squat', 'Deadlift', 'Overhead Press', 'Barbell Row', 'Pull Up', 'Lunge', 'Plank']
+
+# The hot paths, as PostgREST would run them. Parameters: user_id, day, since.
+QUERIES = {
+    'logs/workout (with exercises)': (
+        "select w.*, (select json_agg(e) from exercise_details e where e.workout_log_id = w.id) as exercise_details "
+        "from workout_logs w where w.user_id = %(user)s order by w.date desc"),
+    'logs/nutrition?date=': "select * from nutrition_logs where user_id = %(user)s and date = %(day)s order by date desc, id desc",
+    'progress/weight 90d': "select date, weight_kg from weight_tracker where user_id = %(user)s and date >= %(since)s order by date",
+    'summary refresh: nutrition': "select calories, protein_g, carbs_g, fat_g from nutrition_logs where user_id = %(user)s and date = %(day)s",
+    'summary refresh: water': "select amount_ml from water_intake_logs where user_id = %(user)s and date = %(day)s",
+    'summary refresh: workout': "select duration_minutes, calories_burned from workout_logs where user_id = %(user)s and date = %(day)s",
+    'summary refresh: weight': "select weight_kg, created_at from weight_tracker where user_id = %(user)s and date = %(day)s",
+    'dashboard: total workouts': "select count(*) from workout_logs where user_id = %(user)s",
+    'dashboard: latest weight': "select weight_kg from weight_tracker where user_id = %(user)s order by date desc limit 1",
+    'export page (keyset)': "select * from nutrition_logs where user_id = %(user)s and id > 0 order by id limit 1000",
+}
+
+RPC_QUERIES = {
+    'dashboard_totals()': "select * from dashboard_totals(%(user)s)",
+    'daily_log_totals()': "select * from daily_log_totals(%(user)s, %(day)s)",
+}
+
+
+def generate(connection, users, days, seed=42):
+    rng = random.Random(seed)
+    user_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(users)]
+    start = date.today() - timedelta(days=days)
+    buffers = {name: io.StringIO() for name in ('workout_logs', 'exercise_details', 'nutrition_logs', 'water_intake_logs', 'weight_tracker')}
+    workout_id = exercise_id = 0
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).isoformat()
+        for user in user_ids:
+            if rng.random() < 0.6:
+                workout_id += 1
+                buffers['workout_logs'].write(f"{workout_id}\t{user}\t{day}\t{rng.choice(TYPES)}\t{rng.randint(20, 90)}\t{rng.randint(150, 800)}\t\\N\t{day} 18:00:00+00\n")
+                for _ in range(rng.randint(3, 6)):
+                    exercise_id += 1
+                    buffers['exercise_details'].write(f"{exercise_id}\t{workout_id}\t{user}\t{rng.choice(EXERCISES)}\t{rng.randint(2, 5)}\t{rng.randint(5, 12)}\t{round(rng.uniform(20, 140), 1)}\t{day} 18:00:00+00\n")
+            for hour, meal in zip((8, 13, 19, 16), MEALS):
+                buffers['nutrition_logs'].write(f"{user}\t{day}\t{meal}\tsynthetic meal\t{rng.randint(150, 900)}\t{rng.randint(5, 60)}\t{rng.randint(10, 120)}\t{rng.randint(3, 40)}\t{day} {hour}:00:00+00\n")
+            for hour in range(8, 20, 2):
+                buffers['water_intake_logs'].write(f"{user}\t{day}\t{rng.choice((250, 330, 500))}\t{day} {hour}:00:00+00\n")
+            if rng.random() < 0.7:
+                buffers['weight_tracker'].write(f"{user}\t{day}\t{round(rng.uniform(55, 110), 1)}\t{day} 07:00:00+00\n")
+
+    columns = {
+        'workout_logs': '(id, user_id, date, type, duration_minutes, calories_burned, notes, created_at)',
+        'exercise_details': '(id, workout_log_id, user_id, exercise_name, sets, reps, weight_kg, created_at)',
+        'nutrition_logs': '(user_id, date, meal_type, food_item_description, calories, protein_g, carbs_g, fat_g, created_at)',
+        'water_intake_logs': '(user_id, date, amount_ml, created_at)',
+        'weight_tracker': '(user_id, date, weight_kg, created_at)',
+    }
+    with connection.cursor() as cursor:
+        cursor.copy_expert("copy auth.users (id) from stdin", io.StringIO(''.join(f"{u}\n" for u in user_ids)))
+        for table in ('workout_logs', 'exercise_details', 'nutrition_logs', 'water_intake_logs', 'weight_tracker'):
+            buffers[table].seek(0)
+            cursor.copy_expert(f"copy public.{table} {columns[table]} from stdin", buffers[table])
+            cursor.execute(f"select count(*) from public.{table}")
+            print(f"  {table}: {cursor.fetchone()[0]:,} rows")
+    return user_ids, start
+
+
+def vacuum_analyze(connection):
+    # VACUUM sets the visibility map, which index-only scans need to skip heap fetches
+    with connection.cursor() as cursor:
+        cursor.execute("vacuum analyze")
+
+
+def scan_nodes(plan):
+    """'Index Only Scan on x (heap fetches 0)' style summary of a JSON EXPLAIN plan's scans."""
+    nodes = []
+
+    def walk(node):
+        if 'Scan' in node['Node Type']:
+            label = node['Node Type']
+            if 'Relation Name' in node:
+                label += f" on {node['Relation Name']}"
+            if 'Index Name' in node:
+                label += f" using {node['Index Name']}"
+            if 'Heap Fetches' in node:
+                label += f" (heap fetches {node['Heap Fetches']})"
+            nodes.append(label)
+        for child in node.get('Plans', []):
+            walk(child)
+    walk(plan['Plan'])
+    return nodes
+
+
+def run_phase(connection, queries, params_list, label, budget_seconds=20.0):
+    """Times each query over params_list, stopping early (min 5 runs) once it has used budget_seconds."""
+    results = {}
+    with connection.cursor() as cursor:
+        for name, sql in queries.items():
+            cursor.execute("explain (analyze, buffers, format json) " + sql, params_list[0])
+            plan = cursor.fetchone()[0]
+            plan = plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+            timings = []
+            for params in params_list:
+                started = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+                if len(timings) >= 5 and sum(timings) > budget_seconds * 1000:
+                    break
+            timings.sort()
+            results[name] = {
+                'runs': len(timings),
+                'p50': statistics.median(timings),
+                'p95': timings[max(0, int(len(timings) * 0.95) - 1)],
+                'buffers': plan['Plan'].get('Shared Hit Blocks', 0) + plan['Plan'].get('Shared Read Blocks', 0),
+                'scans': scan_nodes(plan),
+            }
+    print(f"\n== {label}")
+    for name, result in results.items():
+        print(f"  {name:34s} p50 {result['p50']:8.2f} ms  p95 {result['p95']:8.2f} ms  buffers {result['buffers']:6d}  ({result['runs']} runs)")
+        for scan in result['scans']:
+            print(f"  {'':34s}   {scan}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'), required=os.environ.get('DATABASE_URL') is None)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--reset', action='store_true', help="Drop the app's tables in this database first")
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(args.database_url)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        if args.reset:
+            cursor.execute(RESET)
+        cursor.execute(AUTH_STUB)
+    _ensure_migrations_table(connection)
+    migrations = {m.version: m for m in discover_migrations()}
+
+    for version in ('0001', '0002'):
+        apply_migration(connection, migrations[version])
+    print(f"Loading {args.users} users x {args.days} days...")
+    started = time.perf_counter()
+    user_ids, start = generate(connection, args.users, args.days)
+    vacuum_analyze(connection)
+    print(f"Loaded in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(7)
+    params_list = [
+        {
+            'user': rng.choice(user_ids),
+            'day': (start + timedelta(days=rng.randrange(args.days))).isoformat(),
+            'since': (date.today() - timedelta(days=90)).isoformat(),
+        }
+        for _ in range(args.samples)
+    ]
+
+    baseline = run_phase(connection, QUERIES, params_list, 'baseline: 0001-0002 (primary keys only)')
+    started = time.perf_counter()
+    apply_migration(connection, migrations['0003'])
+    vacuum_analyze(connection)
+    print(f"\nBuilt 0003 indexes in {time.perf_counter() - started:.1f}s")
+    indexed = run_phase(connection, QUERIES, params_list, 'indexed: after 0003')
+
+    print("\n== speedup (baseline p50 / indexed p50)")
+    for name in QUERIES:
+        print(f"  {name:34s} {baseline[name]['p50'] / max(indexed[name]['p50'], 1e-6):8.1f}x")
+
+    apply_migration(connection, migrations['0004'])
+    rpc = run_phase(connection, RPC_QUERIES, params_list, 'rpc: after 0004 (one round trip each)')
+    separate_dashboard = indexed['dashboard: total workouts']['p50'] + indexed['dashboard: latest weight']['p50']
+    separate_refresh = sum(indexed[name]['p50'] for name in QUERIES if name.startswith('summary refresh'))
+    print("\n== rpc vs separate queries (server time; each saved query is also one less network round trip)")
+    print(f"  dashboard_totals   {rpc['dashboard_totals()']['p50']:8.2f} ms vs {separate_dashboard:8.2f} ms over 2 queries")
+    print(f"  daily_log_totals   {rpc['daily_log_totals()']['p50']:8.2f} ms vs {separate_refresh:8.2f} ms over 4 queries")
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
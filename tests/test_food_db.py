@@ -0,0 +1,56 @@
+"""
+Auto-filling a nutrition log only picks a food whose name has every word of the
+description; looser matches are offered as candidates instead.
+
+Run with: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+from food_db import FoodIndex, build_food_index, scale_nutrients  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def food_index(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('food') / 'foods.idx')
+    build_food_index(os.path.join(APP_DIR, 'data', 'foods.csv'), path)
+    return FoodIndex(path)
+
+
+@pytest.mark.parametrize('description, name', [
+    ('chicken breast', 'Chicken breast grilled'),
+    ('grilled chicken breast', 'Chicken breast grilled'),
+    ('bananas', 'Banana'),
+    ('a bowl of oatmeal', 'Oatmeal cooked'),
+    ('ham', 'Ham sliced'),
+])
+def test_best_match_fills_in_whole_word_matches(food_index, description, name):
+    assert food_index.best_match(description)['name'] == name
+
+
+@pytest.mark.parametrize('description', [
+    'apple pie', 'beef stew', 'ham sandwich', 'big mac', 'chicken curry', 'cottage pie', 'chiken breast',
+])
+def test_best_match_leaves_partial_matches_to_the_user(food_index, description):
+    assert food_index.best_match(description) is None
+
+
+def test_suggest_offers_candidates(food_index):
+    assert 'Chicken breast grilled' in [food['name'] for food in food_index.suggest('chiken breast')]
+
+
+@pytest.mark.parametrize('amounts', [
+    {'quantity_g': 'inf'}, {'servings': 'nan'}, {'servings': -1}, {'quantity_g': 0}, {'servings': 'two'},
+])
+def test_scale_nutrients_rejects_bad_amounts(food_index, amounts):
+    with pytest.raises(ValueError):
+        scale_nutrients(food_index.get(0), **amounts)
+
+
+def test_scale_nutrients_scales_by_grams(food_index):
+    food = food_index.get(0)
+    assert scale_nutrients(food, quantity_g=food['serving_g'] * 2)['calories'] == pytest.approx(food['calories'] * 2, abs=1)
